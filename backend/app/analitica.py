@@ -0,0 +1,355 @@
+"""
+Analítica de volumen de entrenamiento sobre los ejercicios guardados.
+
+Las filas se leen en forma de columnas (arrays de NumPy) y todos los
+cálculos son operaciones vectorizadas (bincount, digitize, histogram,
+unique): no hay bucles de Python por fila. La base de datos ya devuelve el
+día como número (0 = lunes) y el grupo muscular como código (los nombres
+distintos, que son pocos, se clasifican antes), así que las columnas son
+todas enteras.
+
+- volumen_semanal: series, repeticiones y volumen por día de la semana.
+- distribucion_intensidad: series por zona de repeticiones y por tramo de carga.
+- balance_muscular: series y volumen por grupo muscular (según el nombre).
+- comparar_rutinas: totales de varias rutinas y su percentil de volumen.
+
+volumen = series × repeticiones × peso (peso nulo cuenta como 0, igual que
+en el plan semanal).
+
+Todo se calcula sobre las rutinas del tenant de la petición (también el
+percentil de comparar_rutinas).
+"""
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import case, func, literal, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from app.consultas import RUTINA_EJERCICIOS
+from app.models import DiaEnum, Ejercicio, Rutina, RutinaResumen
+from app.plan import ORDEN_DIAS
+from app.tenants import filtro_tenant, ids_del_tenant
+
+LOTE_FILAS = 50_000
+# Nombres distintos a partir de los cuales se clasifica con LIKE en la BD
+MAX_NOMBRES = 2000
+
+# Grupo muscular según el nombre del ejercicio: gana el primero cuyo patrón
+# LIKE coincide con el nombre en minúsculas (_ cubre las letras con tilde)
+GRUPOS_MUSCULARES = {
+    "piernas": ("%sentadilla%", "%prensa%", "%driceps%", "%isquio%", "%pierna%",
+                "%zancada%", "%gemelo%", "%peso muerto%", "%gl_teo%"),
+    "pecho": ("%banca%", "%apertura%", "%fondos%", "%flexiones%", "%pecho%"),
+    "espalda": ("%remo%", "%dominada%", "%jal_n%", "%espalda%"),
+    "hombros": ("%militar%", "%hombro%", "%lateral%"),
+    "brazos": ("%tr_ceps%", "%b_ceps%", "%curl%"),
+    "core": ("%plancha%", "%abdominal%", "%crunch%", "%core%"),
+}
+GRUPOS = tuple(GRUPOS_MUSCULARES) + ("otros",)
+EMPUJE, TIRON = ("pecho", "hombros"), ("espalda",)
+TREN_SUPERIOR, TREN_INFERIOR = ("pecho", "espalda", "hombros", "brazos"), ("piernas",)
+
+# Zonas por repeticiones: [1, 6) fuerza, [6, 13) hipertrofia, 13+ resistencia
+ZONAS_INTENSIDAD = (("fuerza", "1-5"), ("hipertrofia", "6-12"), ("resistencia", "13+"))
+LIMITES_ZONAS = (6, 13)
+
+DIAS = tuple(DiaEnum)
+
+_nombre = func.lower(Ejercicio.nombre)
+GRUPO_MUSCULAR = case(
+    *[
+        (or_(*[_nombre.like(patron) for patron in patrones]), codigo)
+        for codigo, patrones in enumerate(GRUPOS_MUSCULARES.values())
+    ],
+    else_=len(GRUPOS) - 1,
+)
+
+
+def _like_a_regex(patron: str):
+    return re.compile("".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in patron), re.DOTALL)
+
+
+_REGEX_GRUPOS = {grupo: [_like_a_regex(p) for p in patrones] for grupo, patrones in GRUPOS_MUSCULARES.items()}
+
+
+def grupo_de(nombre: str) -> str:
+    """Lo mismo que GRUPO_MUSCULAR, en Python (referencia para comprobar resultados)"""
+    nombre = nombre.lower()
+    for grupo, patrones in _REGEX_GRUPOS.items():
+        if any(patron.fullmatch(nombre) for patron in patrones):
+            return grupo
+    return "otros"
+
+
+# ============ CARGA EN COLUMNAS ============
+
+@dataclass
+class Columnas:
+    """Una posición por ejercicio; peso = -1 si no tiene (peso corporal)"""
+    rutina_id: np.ndarray
+    dia: np.ndarray
+    grupo: np.ndarray
+    series: np.ndarray
+    repeticiones: np.ndarray
+    peso: np.ndarray
+
+    def __len__(self):
+        return len(self.series)
+
+    @property
+    def volumen(self) -> np.ndarray:
+        return self.series * self.repeticiones * np.maximum(self.peso, 0)
+
+
+def _matriz_enteros(db: Session, consulta, columnas: int) -> np.ndarray:
+    """
+    Resultado de una consulta de columnas enteras como matriz de NumPy.
+    Se leen las tuplas del cursor del driver por bloques, sin crear un Row
+    por fila, y NumPy las convierte en C. Sin stream_results: el cursor con
+    buffer de SQLAlchemy ya habría leído las primeras filas y se perderían.
+    """
+    resultado = db.connection().execute(consulta)
+    bloques = []
+    try:
+        while filas := resultado.cursor.fetchmany(LOTE_FILAS):
+            bloques.append(np.array(filas, dtype=np.int64))
+    finally:
+        resultado.close()
+    return np.concatenate(bloques) if bloques else np.empty((0, columnas), dtype=np.int64)
+
+
+def _grupo_por_nombre(db: Session, filtros: list):
+    """
+    CASE nombre IN (...) con los nombres distintos ya clasificados en Python:
+    comparar por igualdad es mucho más barato que evaluar todos los LIKE de
+    GRUPO_MUSCULAR en cada fila. Con demasiados nombres distintos se usa este.
+    """
+    nombres = db.scalars(select(Ejercicio.nombre).where(*filtros).distinct().limit(MAX_NOMBRES + 1)).all()
+    if len(nombres) > MAX_NOMBRES:
+        return GRUPO_MUSCULAR
+
+    por_grupo = defaultdict(list)
+    for nombre in nombres:
+        por_grupo[grupo_de(nombre)].append(nombre)
+    condiciones = [
+        (Ejercicio.nombre.in_(por_grupo[grupo]), codigo)
+        for codigo, grupo in enumerate(GRUPOS[:-1])
+        if por_grupo[grupo]
+    ]
+    if not condiciones:
+        return literal(len(GRUPOS) - 1)
+    return case(*condiciones, else_=len(GRUPOS) - 1)
+
+
+def cargar_columnas(db: Session, tenant_id: int, rutina_ids: Optional[list[int]] = None) -> Columnas:
+    """
+    Lee los ejercicios del tenant (todos o los de esas rutinas) en arrays, por
+    bloques de LOTE_FILAS filas. Las rutinas salen de (tenant_id, ...) y sus
+    ejercicios, del índice por rutina_id. Las rutinas que comparten una
+    plantilla (no tienen ejercicios propios) aportan los de esta con su propio
+    rutina_id, en una segunda rama que parte del índice por plantilla_id.
+    """
+    rutinas = ids_del_tenant(tenant_id, rutina_ids)
+    grupo = _grupo_por_nombre(db, [Ejercicio.rutina_id.in_(rutinas.with_only_columns(RUTINA_EJERCICIOS))])
+    columnas = (
+        ORDEN_DIAS,
+        grupo,
+        Ejercicio.series,
+        Ejercicio.repeticiones,
+        func.coalesce(Ejercicio.peso, -1),
+    )
+    consulta = union_all(
+        select(Ejercicio.rutina_id, *columnas).where(Ejercicio.rutina_id.in_(rutinas)),
+        select(Rutina.id, *columnas)
+        .join(Ejercicio, Ejercicio.rutina_id == Rutina.plantilla_id)
+        .where(rutinas.whereclause, Rutina.plantilla_id.isnot(None)),
+    )
+
+    matriz = _matriz_enteros(db, consulta, 6)
+    return Columnas(
+        rutina_id=matriz[:, 0],
+        dia=matriz[:, 1].astype(np.int8),
+        grupo=matriz[:, 2].astype(np.int8),
+        series=matriz[:, 3],
+        repeticiones=matriz[:, 4],
+        peso=matriz[:, 5],
+    )
+
+
+def _suma(indices, pesos, tamano):
+    """Suma de `pesos` por índice (GROUP BY vectorizado), como enteros"""
+    return np.bincount(indices, weights=pesos, minlength=tamano).round().astype(np.int64)
+
+
+def _estadisticas(valores: np.ndarray) -> dict:
+    if len(valores) == 0:
+        return {"media": 0.0, "p50": 0.0, "p90": 0.0, "maximo": 0.0}
+    p50, p90 = np.percentile(valores, [50, 90])
+    return {
+        "media": round(float(valores.mean()), 2),
+        "p50": float(p50),
+        "p90": float(p90),
+        "maximo": float(valores.max()),
+    }
+
+
+# ============ ANÁLISIS ============
+
+def volumen_semanal(db: Session, tenant_id: int, rutina_ids: Optional[list[int]] = None) -> dict:
+    """Totales por día de la semana y distribución del volumen semanal por rutina"""
+    c = cargar_columnas(db, tenant_id, rutina_ids)
+    volumen = c.volumen
+
+    series = _suma(c.dia, c.series, len(DIAS))
+    repeticiones = _suma(c.dia, c.repeticiones, len(DIAS))
+    volumen_dia = _suma(c.dia, volumen, len(DIAS))
+    ejercicios = np.bincount(c.dia, minlength=len(DIAS))
+
+    rutinas, indice = np.unique(c.rutina_id, return_inverse=True)
+    volumen_rutina = _suma(indice, volumen, len(rutinas))
+
+    return {
+        "rutinas": len(rutinas),
+        "ejercicios": len(c),
+        "dias": [
+            {
+                "dia_semana": dia,
+                "num_ejercicios": int(ejercicios[i]),
+                "series": int(series[i]),
+                "repeticiones": int(repeticiones[i]),
+                "volumen": int(volumen_dia[i]),
+            }
+            for i, dia in enumerate(DIAS)
+        ],
+        "volumen_total": int(volumen_dia.sum()),
+        "volumen_por_rutina": _estadisticas(volumen_rutina),
+    }
+
+
+def distribucion_intensidad(
+    db: Session, tenant_id: int, rutina_ids: Optional[list[int]] = None, tramo_kg: int = 20
+) -> dict:
+    """Series por zona de repeticiones y por tramo de carga de tramo_kg kg"""
+    c = cargar_columnas(db, tenant_id, rutina_ids)
+    total_series = int(c.series.sum())
+
+    zonas = _suma(np.digitize(c.repeticiones, LIMITES_ZONAS), c.series, len(ZONAS_INTENSIDAD))
+
+    con_peso = c.peso >= 0
+    peso, series_con_peso = c.peso[con_peso], c.series[con_peso]
+    cargas = []
+    carga_media = None
+    if len(peso):
+        limites = np.arange(0, peso.max() + tramo_kg + 1, tramo_kg)
+        conteos, limites = np.histogram(peso, bins=limites, weights=series_con_peso)
+        cargas = [
+            {"desde": int(limites[i]), "hasta": int(limites[i + 1]), "series": int(conteo)}
+            for i, conteo in enumerate(conteos.round().astype(np.int64))
+            if conteo
+        ]
+        carga_media = round(float(np.average(peso, weights=series_con_peso)), 2)
+
+    return {
+        "series": total_series,
+        "zonas": [
+            {
+                "zona": nombre,
+                "repeticiones": rango,
+                "series": int(zonas[i]),
+                "porcentaje": round(100 * zonas[i] / total_series, 2) if total_series else 0.0,
+            }
+            for i, (nombre, rango) in enumerate(ZONAS_INTENSIDAD)
+        ],
+        "cargas": cargas,
+        "series_sin_peso": int(c.series[~con_peso].sum()),
+        "carga_media": carga_media,
+    }
+
+
+def _cociente(series_por_grupo: dict, numerador, denominador) -> Optional[float]:
+    abajo = sum(series_por_grupo[g] for g in denominador)
+    if not abajo:
+        return None
+    return round(sum(series_por_grupo[g] for g in numerador) / abajo, 3)
+
+
+def balance_muscular(db: Session, tenant_id: int, rutina_ids: Optional[list[int]] = None) -> dict:
+    """Series y volumen por grupo muscular y cocientes empuje/tirón y superior/inferior"""
+    c = cargar_columnas(db, tenant_id, rutina_ids)
+    total_series = int(c.series.sum())
+
+    ejercicios = np.bincount(c.grupo, minlength=len(GRUPOS))
+    series = _suma(c.grupo, c.series, len(GRUPOS))
+    volumen = _suma(c.grupo, c.volumen, len(GRUPOS))
+    series_por_grupo = dict(zip(GRUPOS, series.tolist()))
+
+    return {
+        "grupos": [
+            {
+                "grupo": grupo,
+                "num_ejercicios": int(ejercicios[i]),
+                "series": int(series[i]),
+                "volumen": int(volumen[i]),
+                "porcentaje_series": round(100 * series[i] / total_series, 2) if total_series else 0.0,
+            }
+            for i, grupo in enumerate(GRUPOS)
+        ],
+        "empuje_tiron": _cociente(series_por_grupo, EMPUJE, TIRON),
+        "superior_inferior": _cociente(series_por_grupo, TREN_SUPERIOR, TREN_INFERIOR),
+    }
+
+
+def comparar_rutinas(db: Session, tenant_id: int, rutina_ids: list[int]) -> dict:
+    """Totales de cada rutina y su percentil de volumen entre las rutinas del tenant"""
+    nombres = dict(db.execute(
+        select(Rutina.id, Rutina.nombre).where(Rutina.id.in_(rutina_ids), filtro_tenant(Rutina, tenant_id))
+    ).all())
+    if not nombres:
+        raise HTTPException(status_code=404, detail="Ninguna de las rutinas existe")
+    ids = np.array(sorted(nombres), dtype=np.int64)
+
+    c = cargar_columnas(db, tenant_id, ids.tolist())
+    n = len(ids)
+    # Posición de la rutina de cada fila en ids (ids está ordenado)
+    indice = np.searchsorted(ids, c.rutina_id)
+    volumen = c.volumen
+
+    ejercicios = np.bincount(indice, minlength=n)
+    series = _suma(indice, c.series, n)
+    repeticiones = _suma(indice, c.repeticiones, n)
+    volumen_rutina = _suma(indice, volumen, n)
+    # Días distintos: pares (rutina, día) únicos contados por rutina
+    dias = np.bincount(np.unique(indice * len(DIAS) + c.dia) // len(DIAS), minlength=n)
+
+    con_peso = c.peso >= 0
+    series_con_peso = np.bincount(indice[con_peso], weights=c.series[con_peso], minlength=n)
+    carga = np.bincount(indice[con_peso], weights=(c.series * c.peso)[con_peso], minlength=n)
+
+    series_grupo = _suma(indice * len(GRUPOS) + c.grupo, c.series, n * len(GRUPOS)).reshape(n, len(GRUPOS))
+
+    # Percentil entre las rutinas del tenant, sobre el volumen del resumen precalculado
+    volumenes = select(RutinaResumen.volumen).where(RutinaResumen.rutina_id.in_(ids_del_tenant(tenant_id)))
+    todos = np.sort(_matriz_enteros(db, volumenes, 1)[:, 0])
+    percentiles = 100 * np.searchsorted(todos, volumen_rutina, side="right") / max(len(todos), 1)
+
+    return {
+        "rutinas": [
+            {
+                "rutina_id": int(rutina_id),
+                "nombre": nombres[int(rutina_id)],
+                "num_ejercicios": int(ejercicios[i]),
+                "num_dias": int(dias[i]),
+                "series": int(series[i]),
+                "repeticiones": int(repeticiones[i]),
+                "volumen": int(volumen_rutina[i]),
+                "carga_media": round(float(carga[i] / series_con_peso[i]), 2) if series_con_peso[i] else None,
+                "percentil_volumen": round(float(percentiles[i]), 1),
+                "series_por_grupo": dict(zip(GRUPOS, series_grupo[i].tolist())),
+            }
+            for i, rutina_id in enumerate(ids)
+        ],
+    }
@@ -0,0 +1,197 @@
+"""
+Búsqueda de rutinas por texto con índices.
+
+Busca en el nombre y la descripción de la rutina y en los nombres de sus
+ejercicios. Cada motor de base de datos usa su propio índice:
+
+- PostgreSQL: índices GIN con pg_trgm sobre lower(...), que sí sirven para
+  LIKE '%texto%'; la relevancia se calcula con word_similarity().
+- SQLite: tablas virtuales FTS5 con tokenizer trigram, mantenidas con
+  triggers; la relevancia se calcula con bm25().
+
+Los índices los crean las migraciones (0002 y, por tenant, 0007 y 0013);
+este módulo solo los consulta.
+
+Si el índice no está disponible (otro motor, SQLite sin FTS5 o textos de
+menos de 3 caracteres, que no forman un trigrama) se usa el recorrido con
+LIKE de siempre.
+
+Solo se buscan las rutinas del tenant, filtradas antes del LIMIT, y cada
+índice se recorre solo dentro del tenant: en PostgreSQL todos empiezan por
+tenant_id (btree_gin; los ejercicios llevan el tenant_id de su rutina) y en
+SQLite el rowid de las tablas FTS5 es tenant_id * 2^32 + id, así que el
+tenant es un rango de rowid. El IDF de bm25() sí se cuenta sobre la tabla
+entera: la relevancia compara frecuencias de todos los tenants.
+
+Una rutina que comparte una plantilla coincide por los ejercicios de esta:
+cada búsqueda tiene una rama más que une los ejercicios con las rutinas por
+plantilla_id (índice parcial ix_rutinas_plantilla_id).
+"""
+from sqlalchemy import case, exists, func, literal, or_, select, text, union
+from sqlalchemy.orm import Session
+
+from app.models import Rutina, Ejercicio
+from app.consultas import RUTINA_EJERCICIOS, consulta_listado, fila_listado
+from app.tenants import filtro_tenant
+
+# Longitud mínima para poder usar los índices de trigramas
+LONGITUD_MINIMA_INDICE = 3
+
+# Pesos de relevancia: coincidir en el nombre vale más que en la descripción
+PESO_NOMBRE = 3.0
+PESO_DESCRIPCION = 1.0
+PESO_EJERCICIOS = 1.5
+
+# Tramo de rowids de cada tenant en las tablas FTS5 (migración 0013)
+TRAMO_TENANT = 1 << 32
+
+# ============ BÚSQUEDA ============
+
+# Carácter de escape para LIKE ("!" se escribe igual en todos los motores)
+ESCAPE_LIKE = "!"
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def _buscar_postgresql(db: Session, tenant_id: int, texto: str, limite: int):
+    patron = f"%{_escapar_like(texto)}%"
+    nombre = func.lower(Rutina.nombre)
+    descripcion = func.lower(func.coalesce(Rutina.descripcion, ""))
+    del_tenant = filtro_tenant(Rutina, tenant_id)
+
+    # Cada rama usa su propio índice GIN; UNION evita un OR que forzaría seq scan
+    candidatos = union(
+        select(Rutina.id).where(del_tenant, nombre.like(patron, escape=ESCAPE_LIKE)),
+        select(Rutina.id).where(del_tenant, descripcion.like(patron, escape=ESCAPE_LIKE)),
+        select(Ejercicio.rutina_id)
+        .join(Rutina, Rutina.id == Ejercicio.rutina_id)
+        .where(
+            del_tenant, Ejercicio.tenant_id == tenant_id,
+            func.lower(Ejercicio.nombre).like(patron, escape=ESCAPE_LIKE),
+        ),
+        select(Rutina.id)
+        .join(Ejercicio, Ejercicio.rutina_id == Rutina.plantilla_id)
+        .where(
+            del_tenant, Ejercicio.tenant_id == tenant_id,
+            func.lower(Ejercicio.nombre).like(patron, escape=ESCAPE_LIKE),
+        ),
+    ).subquery()
+
+    en_ejercicios = exists().where(
+        Ejercicio.rutina_id == RUTINA_EJERCICIOS,
+        func.lower(Ejercicio.nombre).like(patron, escape=ESCAPE_LIKE),
+    )
+    relevancia = (
+        func.word_similarity(texto, nombre) * PESO_NOMBRE
+        + func.word_similarity(texto, descripcion) * PESO_DESCRIPCION
+        + case((en_ejercicios, PESO_EJERCICIOS), else_=0.0)
+    )
+
+    return (
+        consulta_listado(db)
+        .join(candidatos, candidatos.c.id == Rutina.id)
+        .filter(del_tenant)
+        .order_by(relevancia.desc(), Rutina.nombre, Rutina.id)
+        .limit(limite)
+        .all()
+    )
+
+
+def _buscar_sqlite_fts(db: Session, tenant_id: int, texto: str, limite: int):
+    # Entre comillas dobles el texto es una frase literal para FTS5.
+    # bm25() es negativo (menor = mejor): se invierte y se suman las
+    # coincidencias de la rutina y de cada uno de sus ejercicios.
+    # Cada rama recorre solo el tramo de rowid del tenant; el JOIN con
+    # rutinas (por clave primaria) descarta las de la papelera.
+    frase = '"' + texto.replace('"', '""') + '"'
+    filas = db.execute(
+        text(
+            "SELECT c.rutina_id FROM ("
+            "  SELECT rowid - :desde AS rutina_id,"
+            "  -bm25(rutinas_fts, :peso_nombre, :peso_descripcion) AS puntaje"
+            "  FROM rutinas_fts WHERE rutinas_fts MATCH :frase AND rowid BETWEEN :desde AND :hasta"
+            "  UNION ALL"
+            "  SELECT rutina_id, -bm25(ejercicios_fts) * :peso_ejercicios"
+            "  FROM ejercicios_fts WHERE ejercicios_fts MATCH :frase AND rowid BETWEEN :desde AND :hasta"
+            "  UNION ALL"
+            "  SELECT r.id, -bm25(ejercicios_fts) * :peso_ejercicios"
+            "  FROM ejercicios_fts JOIN rutinas AS r ON r.plantilla_id = ejercicios_fts.rutina_id"
+            "  WHERE ejercicios_fts MATCH :frase AND ejercicios_fts.rowid BETWEEN :desde AND :hasta"
+            "  AND r.tenant_id = :tenant_id"
+            ") AS c JOIN rutinas ON rutinas.id = c.rutina_id AND rutinas.tenant_id = :tenant_id"
+            " AND rutinas.deleted_at IS NULL"
+            " GROUP BY c.rutina_id ORDER BY sum(c.puntaje) DESC LIMIT :limite"
+        ),
+        {
+            "frase": frase,
+            "tenant_id": tenant_id,
+            "desde": tenant_id * TRAMO_TENANT,
+            "hasta": (tenant_id + 1) * TRAMO_TENANT - 1,
+            "peso_nombre": PESO_NOMBRE,
+            "peso_descripcion": PESO_DESCRIPCION,
+            "peso_ejercicios": PESO_EJERCICIOS,
+            "limite": limite,
+        },
+    ).all()
+
+    ids = [int(fila[0]) for fila in filas]
+    if not ids:
+        return []
+    por_id = {
+        fila.id: fila
+        for fila in consulta_listado(db).filter(Rutina.id.in_(ids), filtro_tenant(Rutina, tenant_id))
+    }
+    return [por_id[i] for i in ids if i in por_id]
+
+
+def _buscar_like(db: Session, tenant_id: int, texto: str, limite: int):
+    """Recorrido secuencial con LIKE (sin índice); también sirve de referencia"""
+    patron = f"%{_escapar_like(texto)}%"
+    en_ejercicios = exists().where(
+        Ejercicio.rutina_id == RUTINA_EJERCICIOS,
+        func.lower(Ejercicio.nombre).like(patron, escape=ESCAPE_LIKE),
+    )
+    return (
+        consulta_listado(db)
+        .filter(filtro_tenant(Rutina, tenant_id), or_(
+            func.lower(Rutina.nombre).like(patron, escape=ESCAPE_LIKE),
+            func.lower(func.coalesce(Rutina.descripcion, literal(""))).like(patron, escape=ESCAPE_LIKE),
+            en_ejercicios,
+        ))
+        .order_by(Rutina.nombre, Rutina.id)
+        .limit(limite)
+        .all()
+    )
+
+
+# Cache por motor: la tabla FTS5 no aparece ni desaparece en caliente
+_fts_por_motor = {}
+
+
+def _tiene_fts(db: Session) -> bool:
+    motor = db.get_bind()
+    if motor not in _fts_por_motor:
+        _fts_por_motor[motor] = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'ejercicios_fts'")
+        ).first() is not None
+    return _fts_por_motor[motor]
+
+
+def _buscar(db: Session, tenant_id: int, texto: str, limite: int):
+    dialecto = db.get_bind().dialect.name
+    if len(texto) >= LONGITUD_MINIMA_INDICE:
+        if dialecto == "postgresql":
+            return _buscar_postgresql(db, tenant_id, texto, limite)
+        if dialecto == "sqlite" and _tiene_fts(db):
+            return _buscar_sqlite_fts(db, tenant_id, texto, limite)
+    return _buscar_like(db, tenant_id, texto, limite)
+
+
+def buscar_rutinas(db: Session, tenant_id: int, texto: str, limite: int = 20) -> list[dict]:
+    """Rutinas del tenant que contienen el texto, ordenadas por relevancia (forma de RutinaListado)"""
+    texto = texto.strip().lower()
+    if not texto:
+        return []
+    return [fila_listado(fila) for fila in _buscar(db, tenant_id, texto, limite)]
@@ -0,0 +1,293 @@
+"""
+Cache de respuestas GET con ETag y respuestas condicionales (304).
+
+Se guarda el JSON ya serializado junto con su ETag y, si el recurso lo
+tiene, su fecha de modificación (Last-Modified / If-Modified-Since). Las lecturas de
+rutinas pasan por respuesta_cacheada() y cada endpoint que modifica datos
+invalida solo las claves afectadas (invalidar_rutina / invalidar_listas).
+
+El almacenamiento es intercambiable (BackendCache). Por defecto se usa
+CacheLRULocal, en memoria del proceso: con varios workers de uvicorn cada
+uno tiene su propia cache y las invalidaciones no se propagan, por eso las
+entradas también caducan por TTL. Para compartirla entre procesos se puede
+registrar otro backend con configurar_cache().
+
+Las claves empiezan por el tenant (t<id>:): los ids de rutina son globales,
+pero cada tenant solo puede leer las suyas, e invalidar los listados de un
+tenant no toca los de los demás.
+"""
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+
+from app.compresion import etag_sin_codificacion
+from app.config import ajustes
+
+CACHE_TTL_SEGUNDOS = ajustes.cache_ttl_segundos
+CACHE_MAX_ENTRADAS = ajustes.cache_max_entradas
+CACHE_MAX_BYTES = ajustes.cache_max_bytes
+
+# Sin max-age el cliente revalida siempre (barato: 304 sin cuerpo)
+if ajustes.http_max_age_segundos > 0:
+    CACHE_CONTROL = f"max-age={ajustes.http_max_age_segundos}, must-revalidate"
+else:
+    CACHE_CONTROL = "no-cache"
+
+PREFIJO_LISTAS = "rutinas:lista:"
+PREFIJO_ANALITICA = "analitica:"
+
+
+def _tenant(tenant_id: int) -> str:
+    return f"t{tenant_id}:"
+
+
+@dataclass
+class EntradaCache:
+    cuerpo: bytes
+    etag: str
+    expira: float
+    modificada: Optional[datetime] = None  # UTC sin zona, como en la BD
+
+
+def calcular_etag(cuerpo: bytes) -> str:
+    """ETag fuerte: hash del contenido exacto de la respuesta"""
+    return '"' + hashlib.blake2b(cuerpo, digest_size=16).hexdigest() + '"'
+
+
+# ============ BACKENDS ============
+
+class BackendCache(ABC):
+    """Interfaz de almacenamiento de la cache"""
+
+    @abstractmethod
+    def obtener(self, clave: str) -> Optional[EntradaCache]:
+        ...
+
+    @abstractmethod
+    def guardar(self, clave: str, cuerpo: bytes, epoca: int,
+                modificada: Optional[datetime] = None) -> EntradaCache:
+        """Guarda la entrada solo si no hubo invalidaciones desde `epoca`"""
+
+    @abstractmethod
+    def epoca(self) -> int:
+        """Contador que cambia con cada invalidación"""
+
+    @abstractmethod
+    def eliminar(self, *claves: str):
+        ...
+
+    @abstractmethod
+    def eliminar_prefijo(self, prefijo: str):
+        ...
+
+    @abstractmethod
+    def limpiar(self):
+        ...
+
+
+class CacheLRULocal(BackendCache):
+    """LRU en memoria del proceso con TTL y límites de entradas y bytes"""
+
+    def __init__(self, ttl: float = CACHE_TTL_SEGUNDOS, max_entradas: int = CACHE_MAX_ENTRADAS,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas: "OrderedDict[str, EntradaCache]" = OrderedDict()
+        self._bytes = 0
+        self._epoca = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada.expira < time.monotonic():
+                self._quitar(clave)
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada
+
+    def guardar(self, clave, cuerpo, epoca, modificada=None):
+        entrada = EntradaCache(cuerpo, calcular_etag(cuerpo), time.monotonic() + self.ttl, modificada)
+        if len(cuerpo) > self.max_bytes:
+            return entrada
+
+        with self._lock:
+            # Si hubo una escritura mientras se generaba la respuesta, no se guarda
+            if epoca != self._epoca:
+                return entrada
+            self._quitar(clave)
+            self._entradas[clave] = entrada
+            self._bytes += len(cuerpo)
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._entradas)))
+        return entrada
+
+    def epoca(self):
+        return self._epoca
+
+    def eliminar(self, *claves):
+        with self._lock:
+            self._epoca += 1
+            for clave in claves:
+                self._quitar(clave)
+
+    def eliminar_prefijo(self, prefijo):
+        with self._lock:
+            self._epoca += 1
+            for clave in [c for c in self._entradas if c.startswith(prefijo)]:
+                self._quitar(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._epoca += 1
+            self._entradas.clear()
+            self._bytes = 0
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            self._bytes -= len(entrada.cuerpo)
+
+
+cache: BackendCache = CacheLRULocal()
+
+
+def configurar_cache(backend: BackendCache):
+    """Reemplaza el backend de la cache (por ejemplo, uno compartido entre procesos)"""
+    global cache
+    cache = backend
+
+
+# ============ CLAVES E INVALIDACIÓN ============
+
+def clave_rutina(tenant_id: int, rutina_id: int) -> str:
+    return f"{_tenant(tenant_id)}rutinas:{rutina_id}"
+
+
+def clave_plan(tenant_id: int, rutina_id: int) -> str:
+    return f"{_tenant(tenant_id)}rutinas:{rutina_id}:plan"
+
+
+def clave_lista(tenant_id: int, request: Request) -> str:
+    """Los mismos parámetros en distinto orden comparten la entrada"""
+    parametros = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return _tenant(tenant_id) + PREFIJO_LISTAS + parametros
+
+
+def clave_analitica(tenant_id: int, request: Request) -> str:
+    parametros = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{_tenant(tenant_id)}{PREFIJO_ANALITICA}{request.url.path}?{parametros}"
+
+
+def invalidar_listas(tenant_id: int):
+    """Listados y analítica del tenant: dependen de muchas rutinas a la vez"""
+    cache.eliminar_prefijo(_tenant(tenant_id) + PREFIJO_LISTAS)
+    cache.eliminar_prefijo(_tenant(tenant_id) + PREFIJO_ANALITICA)
+
+
+def invalidar_rutina(tenant_id: int, rutina_id: int, listas: bool = False):
+    """Invalida el detalle y el plan de la rutina y, si cambia lo que muestran, los listados"""
+    cache.eliminar(clave_rutina(tenant_id, rutina_id), clave_plan(tenant_id, rutina_id))
+    if listas:
+        invalidar_listas(tenant_id)
+
+
+# Eventos que no cambian nada de lo que se guarda en la cache
+EVENTOS_SIN_CACHE = {"sesiones.registradas"}
+
+
+def invalidar_por_evento(evento: dict):
+    """
+    Oyente del hub de eventos: con varios procesos (EVENTOS_BACKEND=postgres)
+    cada uno invalida su cache con los cambios hechos en los demás, en lugar
+    de esperar al TTL.
+    """
+    if evento["tipo"] in EVENTOS_SIN_CACHE:
+        return
+    tenant_id = evento.get("tenant_id")
+    # resync: se pudieron perder eventos; sin tenant no se sabe qué invalidar
+    if evento["tipo"] == "resync" or tenant_id is None:
+        cache.limpiar()
+    elif "rutina_id" in evento:
+        invalidar_rutina(tenant_id, evento["rutina_id"], listas=True)
+    elif "rutina_ids" in evento:
+        for rutina_id in evento["rutina_ids"]:
+            invalidar_rutina(tenant_id, rutina_id)
+        invalidar_listas(tenant_id)
+    else:
+        invalidar_listas(tenant_id)
+
+
+# ============ RESPUESTAS ============
+
+def _coincide_etag(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: se ignora el prefijo W/. Los ETag de
+    # las versiones comprimidas (compresion.py) valen igual que el original
+    etiquetas = [etag_sin_codificacion(e.strip().removeprefix("W/")) for e in if_none_match.split(",")]
+    return etag in etiquetas
+
+
+def _sin_modificar(if_modified_since: Optional[str], modificada: datetime) -> bool:
+    """If-Modified-Since tiene precisión de segundos, como Last-Modified"""
+    if not if_modified_since:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        return False
+    return modificada.replace(microsecond=0, tzinfo=timezone.utc) <= desde
+
+
+def formato_http(fecha: datetime) -> str:
+    """Fecha HTTP (RFC 9110): 'Sun, 18 Oct 2026 10:00:00 GMT'"""
+    return format_datetime(fecha.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+async def respuesta_cacheada(
+    request: Request, clave: str,
+    producir: Callable[[], Awaitable[tuple[bytes, Optional[datetime]]]]
+) -> Response:
+    """
+    Devuelve la respuesta cacheada para la clave o la genera con producir(),
+    que devuelve el cuerpo y la fecha de modificación (None en los listados).
+    Responde 304 si el cliente ya tiene la versión actual: If-None-Match y,
+    solo si no lo envía, If-Modified-Since.
+    """
+    entrada = cache.obtener(clave)
+    if entrada is None:
+        epoca = cache.epoca()
+        cuerpo, modificada = await producir()
+        entrada = cache.guardar(clave, cuerpo, epoca, modificada)
+
+    cabeceras = {"ETag": entrada.etag, "Cache-Control": CACHE_CONTROL}
+    if entrada.modificada is not None:
+        cabeceras["Last-Modified"] = formato_http(entrada.modificada)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        no_modificada = _coincide_etag(if_none_match, entrada.etag)
+    else:
+        no_modificada = entrada.modificada is not None and _sin_modificar(
+            request.headers.get("if-modified-since"), entrada.modificada
+        )
+    if no_modificada:
+        return Response(status_code=304, headers=cabeceras)
+
+    return Response(content=entrada.cuerpo, media_type="application/json", headers=cabeceras)
@@ -0,0 +1,209 @@
+"""
+Tareas de base de datos fuera del proceso que atiende peticiones.
+
+    python -m app.cli bootstrap                 # migraciones + datos de ejemplo
+    python -m app.cli migrar                    # solo migraciones
+    python -m app.cli seed                      # solo datos de ejemplo (si la BD está vacía)
+    python -m app.cli sinteticos --rutinas 100000 --ejercicios-por-rutina 5
+    python -m app.cli sinteticos --rutinas 100000 --tenants 100   # repartidas entre los tenants 1..100
+    python -m app.cli tenant "Gimnasio Centro"  # crea un tenant y muestra su id
+    python -m app.cli verificar                 # sale con código 1 si faltan migraciones
+    python -m app.cli resumenes                 # recalcula rutina_resumen
+    python -m app.cli progreso                  # recalcula el progreso de los usuarios desde sus series
+    python -m app.cli verificar-progreso        # sale con código 1 si el progreso no cuadra con las series
+    python -m app.cli worker --procesos 4       # atiende los trabajos en segundo plano
+    python -m app.cli purgar                    # borra las rutinas que pasaron el plazo de la papelera
+    python -m app.cli particiones               # particiones de los próximos meses y retención de las series
+
+Se ejecutan una sola vez por despliegue (no una por worker de uvicorn),
+salvo worker, que se deja corriendo junto a uvicorn, y purgar y particiones,
+que los hace el worker cada hora (sin worker, se programan con cron).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import timedelta
+
+from fastapi import HTTPException
+
+from app import entrenamientos, papelera, progreso
+from app.database import SessionLocal, engine, init_db, revisiones_esquema
+from app.plan import reconstruir_resumenes
+from app.seed_data import cargar_sinteticos, seed_database
+from app.tenants import crear_tenant
+from app.trabajos import servir
+
+
+def migrar(args):
+    inicio = time.perf_counter()
+    init_db()
+    print(f"✓ Migraciones aplicadas ({time.perf_counter() - inicio:.2f} s)")
+
+
+def seed(args):
+    seed_database(engine)
+
+
+def bootstrap(args):
+    migrar(args)
+    if not args.sin_ejemplos:
+        seed(args)
+
+
+def sinteticos(args):
+    inicio = time.perf_counter()
+    cargar_sinteticos(
+        engine, args.rutinas, args.ejercicios_por_rutina, args.semilla, range(1, args.tenants + 1)
+    )
+    print(
+        f"✓ {args.rutinas} rutinas y {args.rutinas * args.ejercicios_por_rutina} ejercicios "
+        f"cargados en {args.tenants} tenant(s) en {time.perf_counter() - inicio:.2f} s"
+    )
+
+
+def tenant(args):
+    with SessionLocal() as db:
+        try:
+            tenant_id = crear_tenant(db, args.nombre)
+        except HTTPException as error:
+            print(f"✗ {error.detail}")
+            sys.exit(1)
+    print(f"✓ Tenant {tenant_id}: {args.nombre} (cabecera X-Tenant-ID: {tenant_id})")
+
+
+def resumenes(args):
+    inicio = time.perf_counter()
+    with engine.begin() as conn:
+        reconstruir_resumenes(conn)
+    print(f"✓ Resúmenes recalculados ({time.perf_counter() - inicio:.2f} s)")
+
+
+def recalcular_progreso(args):
+    inicio = time.perf_counter()
+    with engine.begin() as conn:
+        progreso.reconstruir(conn, args.tenant)
+    print(f"✓ Progreso recalculado ({time.perf_counter() - inicio:.2f} s)")
+
+
+def verificar_progreso(args):
+    inicio = time.perf_counter()
+    with engine.connect() as conn:
+        resultado = progreso.verificar(conn, args.tenant)
+    correcto = True
+    for tabla, diferencias in resultado.items():
+        if diferencias["faltan"] or diferencias["sobran"]:
+            correcto = False
+            print(f"✗ {tabla}: faltan o difieren {diferencias['faltan']} filas, sobran {diferencias['sobran']}")
+            for fila in diferencias["ejemplos_faltan"]:
+                print(f"    recalculada: {fila}")
+            for fila in diferencias["ejemplos_sobran"]:
+                print(f"    guardada:    {fila}")
+    if not correcto:
+        print("  Se corrige con `python -m app.cli progreso`")
+        sys.exit(1)
+    print(f"✓ El progreso cuadra con las series ({time.perf_counter() - inicio:.2f} s)")
+
+
+def purgar(args):
+    inicio = time.perf_counter()
+    retencion = papelera.PAPELERA_RETENCION if args.horas is None else timedelta(hours=args.horas)
+    with SessionLocal() as db:
+        borradas = papelera.purgar(db, retencion, args.lote)
+    print(f"✓ {borradas} rutinas purgadas de la papelera ({time.perf_counter() - inicio:.2f} s)")
+
+
+def particiones(args):
+    inicio = time.perf_counter()
+    with SessionLocal() as db:
+        resultado = entrenamientos.mantener(db, args.meses, args.retencion_meses)
+    print(
+        f"✓ Particiones creadas: {', '.join(resultado['creadas']) or 'ninguna'}; "
+        f"borradas: {', '.join(resultado['borradas']) or 'ninguna'}; "
+        f"{resultado['sesiones']} sesiones antiguas borradas ({time.perf_counter() - inicio:.2f} s)"
+    )
+
+
+def worker(args):
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(servir(args.procesos))
+
+
+def verificar(args):
+    actuales, esperadas = revisiones_esquema()
+    if actuales != esperadas:
+        print(f"✗ Esquema en {sorted(actuales) or 'ninguna revisión'}, se esperaba {sorted(esperadas)}")
+        sys.exit(1)
+    print(f"✓ Esquema al día ({', '.join(sorted(actuales))})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    p = comandos.add_parser("bootstrap", help="Aplica las migraciones y carga los datos de ejemplo")
+    p.add_argument("--sin-ejemplos", action="store_true", help="No cargar las rutinas de ejemplo")
+    p.set_defaults(funcion=bootstrap)
+
+    comandos.add_parser("migrar", help="Aplica las migraciones pendientes").set_defaults(funcion=migrar)
+    comandos.add_parser("seed", help="Carga las rutinas de ejemplo").set_defaults(funcion=seed)
+    comandos.add_parser("verificar", help="Comprueba la revisión del esquema").set_defaults(funcion=verificar)
+    comandos.add_parser(
+        "resumenes", help="Recalcula los totales de todas las rutinas (tras cargas manuales)"
+    ).set_defaults(funcion=resumenes)
+
+    p = comandos.add_parser("progreso", help="Recalcula el progreso de los usuarios desde las series realizadas")
+    p.add_argument("--tenant", type=int, help="Solo este tenant")
+    p.set_defaults(funcion=recalcular_progreso)
+
+    p = comandos.add_parser(
+        "verificar-progreso", help="Compara el progreso guardado con el recalculado desde las series"
+    )
+    p.add_argument("--tenant", type=int, help="Solo este tenant")
+    p.set_defaults(funcion=verificar_progreso)
+
+    p = comandos.add_parser("sinteticos", help="Carga rutinas sintéticas (benchmarks)")
+    p.add_argument("--rutinas", type=int, default=10_000)
+    p.add_argument("--ejercicios-por-rutina", type=int, default=5)
+    p.add_argument("--semilla", type=int, default=42)
+    p.add_argument("--tenants", type=int, default=1, help="Repartir las rutinas entre los tenants 1..N")
+    p.set_defaults(funcion=sinteticos)
+
+    p = comandos.add_parser("worker", help="Ejecuta los trabajos en segundo plano hasta Ctrl+C")
+    p.add_argument("--procesos", type=int, default=os.cpu_count() or 1, help="Trabajos a la vez (uno por proceso)")
+    p.set_defaults(funcion=worker)
+
+    p = comandos.add_parser("purgar", help="Borra las rutinas que pasaron el plazo de la papelera")
+    p.add_argument(
+        "--horas", type=float, help="Plazo en horas (por defecto PAPELERA_RETENCION_HORAS; 0: vaciar la papelera)"
+    )
+    p.add_argument("--lote", type=int, default=papelera.PAPELERA_LOTE, help="Filas por sentencia")
+    p.set_defaults(funcion=purgar)
+
+    p = comandos.add_parser(
+        "particiones", help="Crea las particiones de las series de los próximos meses y borra los meses antiguos"
+    )
+    p.add_argument(
+        "--meses", type=int, default=entrenamientos.ENTRENAMIENTOS_MESES_ADELANTO,
+        help="Meses por adelantado además del actual (solo PostgreSQL)"
+    )
+    p.add_argument(
+        "--retencion-meses", type=int, default=entrenamientos.ENTRENAMIENTOS_RETENCION_MESES,
+        help="Meses de series que se conservan (0: todos)"
+    )
+    p.set_defaults(funcion=particiones)
+
+    p = comandos.add_parser("tenant", help="Crea un tenant")
+    p.add_argument("nombre")
+    p.set_defaults(funcion=tenant)
+
+    args = parser.parse_args(argv)
+    args.funcion(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Compresión de las respuestas (middleware ASGI).
+
+Negocia el algoritmo con Accept-Encoding entre los de COMPRESION_ALGORITMOS,
+en ese orden de preferencia: zstd y br solo si están instalados los paquetes
+opcionales zstandard y brotli; gzip siempre (zlib de la biblioteca estándar).
+
+Solo se comprimen los tipos de COMPRESION_TIPOS y los cuerpos de al menos
+COMPRESION_MINIMO_BYTES. Las respuestas que llegan en varios trozos
+(exportaciones) se comprimen por trozos, sin juntarlas en memoria.
+
+Cada codificación es una representación distinta con su propio ETag fuerte:
+al comprimir, el algoritmo se añade dentro de las comillas ("abc" pasa a
+"abc-gzip") y la respuesta lleva Vary: Accept-Encoding. cache.py compara
+If-None-Match sin ese sufijo, y el 304 devuelve el ETag que envió el cliente.
+"""
+import logging
+import zlib
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import ajustes
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # Opcional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Opcional: pip install zstandard
+    zstandard = None
+
+# Cuerpos a partir de este tamaño se comprimen en el threadpool, sin bloquear el event loop
+UMBRAL_THREADPOOL = 256 * 1024
+
+NIVELES = {
+    "gzip": ajustes.compresion_nivel_gzip,
+    "br": ajustes.compresion_nivel_br,
+    "zstd": ajustes.compresion_nivel_zstd,
+}
+
+
+# ============ COMPRESORES ============
+
+class _Gzip:
+    def __init__(self, nivel: int):
+        self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31: cabecera gzip
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.compress(datos)
+
+    def terminar(self) -> bytes:
+        return self._compresor.flush()
+
+
+class _Brotli:
+    def __init__(self, nivel: int):
+        self._compresor = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.process(datos)
+
+    def terminar(self) -> bytes:
+        return self._compresor.finish()
+
+
+class _Zstd:
+    def __init__(self, nivel: int):
+        self._compresor = zstandard.ZstdCompressor(level=nivel).compressobj()
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.compress(datos)
+
+    def terminar(self) -> bytes:
+        return self._compresor.flush()
+
+
+COMPRESORES = {"gzip": _Gzip}
+if brotli is not None:
+    COMPRESORES["br"] = _Brotli
+if zstandard is not None:
+    COMPRESORES["zstd"] = _Zstd
+
+
+# ============ ETAG ============
+
+# Sufijos de los ETag de las representaciones comprimidas (de todos los
+# algoritmos conocidos, estén instalados o no)
+SUFIJOS_ETAG = tuple(f'-{algoritmo}"' for algoritmo in NIVELES)
+
+
+def etag_codificado(etag: bytes, algoritmo: str) -> bytes:
+    """ETag de la representación comprimida: "abc" -> "abc-gzip" (W/ se conserva)"""
+    if not etag.endswith(b'"'):
+        return etag
+    return etag[:-1] + b"-" + algoritmo.encode() + b'"'
+
+
+def etag_sin_codificacion(etiqueta: str) -> str:
+    """ETag de la representación sin comprimir: "abc-gzip" -> "abc" """
+    for sufijo in SUFIJOS_ETAG:
+        if etiqueta.endswith(sufijo):
+            return etiqueta[:-len(sufijo)] + '"'
+    return etiqueta
+
+
+def algoritmos_disponibles(preferencia=None) -> list[str]:
+    """Algoritmos configurados que se pueden usar, en orden de preferencia"""
+    return [a for a in (preferencia or ajustes.compresion_algoritmos) if a in COMPRESORES]
+
+
+def comprimir(algoritmo: str, datos: bytes, nivel: Optional[int] = None) -> bytes:
+    """Comprime un cuerpo completo (también lo usa el benchmark)"""
+    compresor = COMPRESORES[algoritmo](NIVELES[algoritmo] if nivel is None else nivel)
+    return compresor.comprimir(datos) + compresor.terminar()
+
+
+def elegir_algoritmo(accept_encoding: str, algoritmos: list[str]) -> Optional[str]:
+    """Primer algoritmo de la lista que el cliente acepta (q > 0) en Accept-Encoding"""
+    aceptados, comodin = {}, None
+    for parte in accept_encoding.lower().split(","):
+        nombre, *parametros = [p.strip() for p in parte.split(";")]
+        calidad = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    calidad = float(parametro[2:])
+                except ValueError:
+                    calidad = 0.0
+        if nombre == "*":
+            comodin = calidad
+        elif nombre:
+            aceptados[nombre] = calidad
+    for algoritmo in algoritmos:
+        calidad = aceptados.get(algoritmo, comodin)
+        if calidad:
+            return algoritmo
+    return None
+
+
+# ============ MIDDLEWARE ============
+
+class MiddlewareCompresion:
+    """Middleware ASGI puro que comprime el cuerpo de las respuestas"""
+
+    def __init__(self, app, algoritmos=None, minimo_bytes: int = ajustes.compresion_minimo_bytes,
+                 tipos=None):
+        self.app = app
+        self.algoritmos = algoritmos_disponibles(algoritmos)
+        self.minimo_bytes = minimo_bytes
+        self.tipos = tuple(tipos or ajustes.compresion_tipos)
+        faltan = set(algoritmos or ajustes.compresion_algoritmos) - set(self.algoritmos)
+        if faltan:
+            logger.info("Compresión sin %s (paquete no instalado)", ", ".join(sorted(faltan)))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.algoritmos:
+            return await self.app(scope, receive, send)
+
+        cabeceras = dict(scope["headers"])
+        algoritmo = elegir_algoritmo(cabeceras.get(b"accept-encoding", b"").decode("latin-1"), self.algoritmos)
+        if algoritmo is None:
+            return await self.app(scope, receive, send)
+        if_none_match = cabeceras.get(b"if-none-match", b"")
+
+        inicio = None  # Mensaje http.response.start retenido hasta ver el cuerpo
+        compresor = None
+        pasar = False  # La respuesta no se comprime: los mensajes pasan tal cual
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor, pasar
+            if pasar:
+                return await send(mensaje)
+
+            if mensaje["type"] == "http.response.start":
+                if mensaje["status"] == 304:
+                    pasar = True
+                    return await send(_etag_304(mensaje, algoritmo, if_none_match))
+                respuesta = {clave.lower(): valor for clave, valor in mensaje.get("headers", [])}
+                tipo = respuesta.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in respuesta or not tipo.startswith(self.tipos):
+                    pasar = True
+                    return await send(mensaje)
+                inicio = mensaje
+                return
+
+            if mensaje["type"] != "http.response.body":
+                return await send(mensaje)
+
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+
+            if compresor is None and not mas:
+                # Cuerpo completo en un solo mensaje (lo habitual)
+                pasar = True
+                if len(cuerpo) < self.minimo_bytes:  # No compensa comprimirlo
+                    await send(_con_vary(inicio))
+                    return await send(mensaje)
+                if len(cuerpo) >= UMBRAL_THREADPOOL:
+                    datos = await run_in_threadpool(comprimir, algoritmo, cuerpo)
+                else:
+                    datos = comprimir(algoritmo, cuerpo)
+                await send(_cabeceras_comprimidas(inicio, algoritmo, len(datos)))
+                return await send({"type": "http.response.body", "body": datos})
+
+            if compresor is None:
+                compresor = COMPRESORES[algoritmo](NIVELES[algoritmo])
+                await send(_cabeceras_comprimidas(inicio, algoritmo))
+
+            datos = compresor.comprimir(cuerpo)
+            if not mas:
+                datos += compresor.terminar()
+            if datos or not mas:
+                await send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+        await self.app(scope, receive, enviar)
+
+
+def _con_vary(inicio: dict) -> dict:
+    """La respuesta depende de Accept-Encoding (para las caches intermedias)"""
+    cabeceras = [(k, v) for k, v in inicio.get("headers", []) if k.lower() != b"vary"]
+    vary = [v for k, v in inicio.get("headers", []) if k.lower() == b"vary"]
+    valores = [p.strip() for v in vary for p in v.split(b",") if p.strip()]
+    if b"accept-encoding" not in [v.lower() for v in valores]:
+        valores.append(b"Accept-Encoding")
+    cabeceras.append((b"vary", b", ".join(valores)))
+    return {**inicio, "headers": cabeceras}
+
+
+def _cabeceras_comprimidas(inicio: dict, algoritmo: str, longitud: Optional[int] = None) -> dict:
+    """Sin longitud (respuesta por trozos) se quita Content-Length"""
+    inicio = _con_vary(inicio)
+    cabeceras = []
+    for clave, valor in inicio["headers"]:
+        clave_min = clave.lower()
+        if clave_min == b"content-length":
+            continue
+        if clave_min == b"etag":
+            valor = etag_codificado(valor, algoritmo)
+        cabeceras.append((clave, valor))
+    cabeceras.append((b"content-encoding", algoritmo.encode()))
+    if longitud is not None:
+        cabeceras.append((b"content-length", str(longitud).encode()))
+    return {**inicio, "headers": cabeceras}
+
+
+def _etag_304(inicio: dict, algoritmo: str, if_none_match: bytes) -> dict:
+    """Un 304 lleva el ETag de la representación que tiene el cliente: la comprimida si la envió"""
+    cabeceras = []
+    for clave, valor in inicio.get("headers", []):
+        if clave.lower() == b"etag" and etag_codificado(valor, algoritmo) in if_none_match:
+            valor = etag_codificado(valor, algoritmo)
+        cabeceras.append((clave, valor))
+    return _con_vary({**inicio, "headers": cabeceras})
@@ -0,0 +1,83 @@
+"""
+Lecturas de rutinas y ejercicios por columnas, sin objetos ORM.
+
+Las lecturas que solo se serializan piden tuplas de columnas y las
+convierten en dicts con la forma de los esquemas de schemas.py (ver
+serializacion.py):
+
+- Detalle: leer_rutina_detalle(), la rutina del tenant con sus ejercicios
+  en una sola consulta (LEFT JOIN). Lo usan GET /rutinas/{id} y las
+  escrituras que responden con el detalle.
+- Listado y búsqueda: consulta_listado() y fila_listado(), la rutina con su
+  resumen (rutina_resumen); no leen ejercicios.
+- Plan, exportación, analítica, plantillas y papelera hacen sus propias
+  consultas con las columnas y RUTINA_EJERCICIOS de aquí.
+
+Una rutina que comparte una plantilla no tiene ejercicios propios: se unen
+los de la plantilla con RUTINA_EJERCICIOS (ver plantillas.py). La relación
+Rutina.ejercicios solo ve los propios, por eso ninguna respuesta la usa.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import Ejercicio, Rutina, RutinaResumen
+from app.tenants import filtro_tenant
+
+
+# ============ LECTURA POR COLUMNAS ============
+
+# Rutina de la que se leen los ejercicios: la plantilla que comparte o ella misma
+RUTINA_EJERCICIOS = func.coalesce(Rutina.plantilla_id, Rutina.id)
+
+# Columnas en el orden de los campos de los esquemas Rutina, ResumenRutina y Ejercicio
+CAMPOS_RUTINA = (
+    "nombre", "descripcion", "id", "fecha_creacion", "version", "updated_at", "usuario_id",
+    "es_plantilla", "plantilla_id"
+)
+CAMPOS_RESUMEN = ("num_ejercicios", "series", "repeticiones", "volumen", "num_dias")
+CAMPOS_EJERCICIO = (
+    "nombre", "dia_semana", "series", "repeticiones", "peso", "notas", "orden", "id", "rutina_id", "version"
+)
+COLUMNAS_RUTINA = tuple(getattr(Rutina, campo) for campo in CAMPOS_RUTINA)
+COLUMNAS_RESUMEN = tuple(getattr(RutinaResumen, campo) for campo in CAMPOS_RESUMEN)
+COLUMNAS_EJERCICIO = tuple(getattr(Ejercicio, campo) for campo in CAMPOS_EJERCICIO)
+
+_N_RUTINA = len(CAMPOS_RUTINA)
+_ID_EJERCICIO = _N_RUTINA + CAMPOS_EJERCICIO.index("id")
+
+
+def consulta_listado(db: Session):
+    """Columnas de la rutina y de su resumen (LEFT JOIN uno a uno), sin objetos ORM"""
+    return (
+        db.query(*COLUMNAS_RUTINA, *COLUMNAS_RESUMEN)
+        .outerjoin(RutinaResumen, RutinaResumen.rutina_id == Rutina.id)
+    )
+
+
+def fila_listado(fila) -> dict:
+    """Fila de consulta_listado() con la forma de RutinaListado"""
+    rutina = dict(zip(CAMPOS_RUTINA, fila))
+    # Sin fila en rutina_resumen las columnas del resumen llegan a None
+    rutina["resumen"] = None if fila[_N_RUTINA] is None else dict(zip(CAMPOS_RESUMEN, fila[_N_RUTINA:]))
+    return rutina
+
+
+def fila_ejercicio(fila) -> dict:
+    return dict(zip(CAMPOS_EJERCICIO, fila))
+
+
+def leer_rutina_detalle(db: Session, tenant_id: int, rutina_id: int) -> dict | None:
+    """Rutina del tenant con sus ejercicios ordenados, con la forma de RutinaDetalle, en una consulta"""
+    filas = db.execute(
+        select(*COLUMNAS_RUTINA, *COLUMNAS_EJERCICIO)
+        .outerjoin(Ejercicio, Ejercicio.rutina_id == RUTINA_EJERCICIOS)
+        .where(Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id))
+        .order_by(Ejercicio.orden, Ejercicio.id)
+    ).all()
+    if not filas:
+        return None
+
+    rutina = dict(zip(CAMPOS_RUTINA, filas[0]))
+    # Una rutina sin ejercicios da una sola fila con las columnas del ejercicio a None
+    rutina["ejercicios"] = [fila_ejercicio(fila[_N_RUTINA:]) for fila in filas if fila[_ID_EJERCICIO] is not None]
+    return rutina
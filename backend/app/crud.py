@@ -0,0 +1,498 @@
+"""
+Operaciones de base de datos de rutinas y ejercicios.
+
+Son funciones síncronas que reciben una Session. Los endpoints de routes.py
+las ejecutan con database.ejecutar(), que las corre en el threadpool con el
+motor síncrono o dentro de AsyncSession.run_sync() con el motor asíncrono.
+
+Todas reciben el tenant de la petición y solo ven sus filas: una rutina de
+otro tenant responde 404, igual que una que no existe.
+
+Los ejercicios de una plantilla no se modifican (409) y escribir en los de
+una rutina que comparte una plantilla primero los copia (ver plantillas.py).
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, case, cast, column, delete, func, insert, literal, select, true, tuple_, update, values
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import Rutina, Ejercicio
+from app.consultas import (
+    COLUMNAS_EJERCICIO, consulta_listado, fila_listado, leer_rutina_detalle
+)
+from app.plan import CAMPOS_RESUMEN, refrescar_resumen
+from app.plantillas import PLANTILLA_INMUTABLE, copia_de_ejercicios, dejar_de_compartir, materializar, preparar_escritura
+from app.paginacion import paginar
+from app.tenants import filtro_tenant
+from app.schemas import (
+    RutinaCreate, EjercicioCreate, ReordenarEjercicios,
+    Rutina as RutinaSchema, Ejercicio as EjercicioSchema
+)
+
+# ============ ERRORES ============
+
+VERSION_NO_COINCIDE = (
+    "La versión no coincide con If-Match: fue modificado por otra petición; recarga e intenta de nuevo"
+)
+
+def _es_duplicado(error: IntegrityError) -> bool:
+    """Violación de un índice único (y no de otra restricción)"""
+    return getattr(error.orig, "pgcode", None) == "23505" or "unique" in str(error.orig).lower()
+
+def _error_integridad(error: IntegrityError, detalle_duplicado: str) -> HTTPException:
+    if _es_duplicado(error):
+        return HTTPException(status_code=400, detail=detalle_duplicado)
+    return HTTPException(status_code=409, detail="La operación viola una restricción de la base de datos")
+
+def _validar_no_nulos(modelo, cambios: dict):
+    nulos = [campo for campo, valor in cambios.items()
+             if valor is None and not modelo.__table__.c[campo].nullable]
+    if nulos:
+        raise HTTPException(status_code=400, detail=f"Estos campos no pueden ser nulos: {', '.join(nulos)}")
+
+def _sin_actualizar(db: Session, modelo, tenant_id: int, id_: int, detalle_404: str):
+    """El UPDATE no tocó ninguna fila: no existe en el tenant (404) o cambió la versión (412)"""
+    if not db.query(modelo.id).filter(modelo.id == id_, filtro_tenant(modelo, tenant_id)).first():
+        raise HTTPException(status_code=404, detail=detalle_404)
+    if modelo is Ejercicio and _es_de_plantilla(db, id_):
+        raise HTTPException(status_code=409, detail=PLANTILLA_INMUTABLE)
+    raise HTTPException(status_code=412, detail=VERSION_NO_COINCIDE)
+
+def _es_de_plantilla(db: Session, ejercicio_id: int) -> bool:
+    return bool(db.scalar(
+        select(Rutina.es_plantilla).join(Ejercicio, Ejercicio.rutina_id == Rutina.id).where(Ejercicio.id == ejercicio_id)
+    ))
+
+def _filtro_escritura(modelo, tenant_id: int):
+    """filtro_tenant que además deja fuera los ejercicios de las plantillas"""
+    if modelo is Rutina:
+        return filtro_tenant(Rutina, tenant_id)
+    return select(Rutina.id).where(
+        Rutina.id == modelo.rutina_id, filtro_tenant(Rutina, tenant_id), ~Rutina.es_plantilla
+    ).exists()
+
+def _actualizar(db: Session, modelo, esquema, tenant_id: int, id_: int, cambios: dict, version: Optional[int],
+                detalle_404: str, detalle_duplicado: str, antes_del_commit=None):
+    """
+    UPDATE ... SET cambios, version = version + 1 WHERE id = :id AND <del tenant>
+    [AND version = :version] RETURNING *, en una sola sentencia. Devuelve el
+    esquema de respuesta. antes_del_commit(db, resultado) corre en la misma transacción.
+    """
+    _validar_no_nulos(modelo, cambios)
+
+    condiciones = [modelo.id == id_, _filtro_escritura(modelo, tenant_id)]
+    if version is not None:
+        condiciones.append(modelo.version == version)
+    sentencia = (
+        update(modelo)
+        .where(*condiciones)
+        .values(**cambios, version=modelo.version + 1)
+        .returning(modelo)
+    )
+
+    try:
+        fila = db.scalars(sentencia, execution_options={"synchronize_session": False}).first()
+    except IntegrityError as error:
+        db.rollback()
+        raise _error_integridad(error, detalle_duplicado)
+
+    if fila is None:
+        _sin_actualizar(db, modelo, tenant_id, id_, detalle_404)
+
+    # Se serializa antes del commit para no recargar el objeto después
+    resultado = esquema.model_validate(fila)
+    if antes_del_commit is not None:
+        antes_del_commit(db, resultado)
+    db.commit()
+    return resultado
+
+# ============ RUTINAS ============
+
+def listar_rutinas(
+    db: Session,
+    tenant_id: int,
+    limite: int,
+    cursor: Optional[str],
+    orden: str,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    incluir_total: bool = False,
+    usuario_id: Optional[int] = None,
+    plantillas: bool = False
+):
+    """
+    Página de rutinas del tenant según el cursor, con el resumen de cada una
+    (forma de RutinaPagina). Con usuario_id, solo las que creó ese usuario;
+    con plantillas, solo las de la biblioteca (índice parcial).
+    """
+    filtros = [filtro_tenant(Rutina, tenant_id)]
+    if usuario_id is not None:
+        filtros.append(Rutina.usuario_id == usuario_id)
+    if plantillas:
+        filtros.append(Rutina.es_plantilla == true())
+    if desde:
+        filtros.append(Rutina.fecha_creacion >= desde)
+    if hasta:
+        filtros.append(Rutina.fecha_creacion < hasta)
+
+    total = db.query(Rutina).filter(*filtros).count() if incluir_total else None
+    filas, next_cursor = paginar(consulta_listado(db).filter(*filtros), orden, limite, cursor)
+
+    return {"items": [fila_listado(fila) for fila in filas], "next_cursor": next_cursor, "total": total}
+
+def obtener_rutina(db: Session, tenant_id: int, rutina_id: int):
+    """Rutina con todos sus ejercicios (forma de RutinaDetalle)"""
+    rutina = leer_rutina_detalle(db, tenant_id, rutina_id)
+
+    if not rutina:
+        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+
+    return rutina
+
+def crear_rutina(db: Session, tenant_id: int, rutina: RutinaCreate, usuario_id: Optional[int] = None):
+    """Crea una rutina; el índice único (tenant_id, lower(nombre)) impide los duplicados"""
+
+    nueva_rutina = Rutina(
+        nombre=rutina.nombre.strip(),
+        descripcion=rutina.descripcion,
+        tenant_id=tenant_id,
+        usuario_id=usuario_id
+    )
+
+    db.add(nueva_rutina)
+    try:
+        db.flush()
+    except IntegrityError as error:
+        db.rollback()
+        raise _error_integridad(error, "Ya existe una rutina con ese nombre")
+
+    resultado = RutinaSchema.model_validate(nueva_rutina)
+    db.commit()
+
+    return resultado
+
+def actualizar_rutina(db: Session, tenant_id: int, rutina_id: int, cambios: dict, version: Optional[int] = None):
+    """
+    Actualiza los campos recibidos con un solo UPDATE ... RETURNING.
+    Con version (cabecera If-Match) solo se aplica si la rutina sigue en esa versión.
+    """
+    if "nombre" in cambios and cambios["nombre"] is not None:
+        cambios["nombre"] = cambios["nombre"].strip()
+        if not cambios["nombre"]:
+            raise HTTPException(status_code=400, detail="El nombre no puede estar vacío")
+
+    return _actualizar(
+        db, Rutina, RutinaSchema, tenant_id, rutina_id, cambios, version,
+        "Rutina no encontrada", "Ya existe una rutina con ese nombre"
+    )
+
+# ============ EJERCICIOS ============
+
+def _tocar_rutina(db: Session, rutina_id: int):
+    """Cambiar ejercicios cambia el detalle de la rutina: actualiza su Last-Modified"""
+    db.execute(
+        update(Rutina).where(Rutina.id == rutina_id).values(updated_at=datetime.utcnow()),
+        execution_options={"synchronize_session": False}
+    )
+
+def crear_ejercicio(db: Session, tenant_id: int, rutina_id: int, ejercicio: EjercicioCreate):
+    """Agrega un ejercicio a una rutina existente"""
+
+    # Verificar que la rutina existe (en el tenant)
+    rutina = db.query(Rutina).filter(Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id)).first()
+
+    if not rutina:
+        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+
+    preparar_escritura(db, rutina)
+
+    # Crear el ejercicio
+    nuevo_ejercicio = Ejercicio(
+        nombre=ejercicio.nombre,
+        dia_semana=ejercicio.dia_semana,
+        series=ejercicio.series,
+        repeticiones=ejercicio.repeticiones,
+        peso=ejercicio.peso,
+        notas=ejercicio.notas,
+        orden=ejercicio.orden,
+        rutina_id=rutina_id,
+        tenant_id=tenant_id
+    )
+
+    db.add(nuevo_ejercicio)
+    rutina.updated_at = datetime.utcnow()
+    db.flush()
+    resultado = EjercicioSchema.model_validate(nuevo_ejercicio)
+    refrescar_resumen(db, rutina_id)
+    db.commit()
+
+    return resultado
+
+def crear_ejercicios_lote(
+    db: Session, tenant_id: int, rutina_id: int, ejercicios: list[EjercicioCreate], reemplazar: bool = False
+):
+    """
+    Inserta varios ejercicios en una sola transacción con un INSERT ... RETURNING
+    de varias filas. Con reemplazar=True antes se borran los ejercicios actuales.
+    """
+
+    rutina = db.query(Rutina.id, Rutina.es_plantilla, Rutina.plantilla_id).filter(
+        Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id)
+    ).first()
+
+    if not rutina:
+        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+
+    if reemplazar and not rutina.es_plantilla and rutina.plantilla_id is not None:
+        # Se reemplazan todos: no hace falta copiar los de la plantilla
+        dejar_de_compartir(db, rutina_id, rutina.plantilla_id)
+    else:
+        preparar_escritura(db, rutina)
+
+    if reemplazar:
+        db.execute(delete(Ejercicio).where(Ejercicio.rutina_id == rutina_id))
+
+    nuevos = []
+    if ejercicios:
+        filas = [{**ejercicio.model_dump(), "rutina_id": rutina_id, "tenant_id": tenant_id} for ejercicio in ejercicios]
+        creados = db.scalars(insert(Ejercicio).returning(Ejercicio), filas).all()
+        # Se serializa antes del commit para no recargar cada objeto después.
+        # RETURNING no garantiza el orden: se devuelven como en la rutina.
+        creados = sorted(creados, key=lambda e: (e.orden, e.id))
+        nuevos = [EjercicioSchema.model_validate(e) for e in creados]
+
+    _tocar_rutina(db, rutina_id)
+    refrescar_resumen(db, rutina_id)
+    db.commit()
+
+    return nuevos
+
+def _sentencia_reordenar(db: Session, rutina_id: int, filas: list[tuple]):
+    """UPDATE único que asigna (dia_semana, orden) a cada id de ejercicio"""
+    tipo_dia = Ejercicio.dia_semana.type
+
+    if db.get_bind().dialect.name == "postgresql":
+        # UPDATE ... FROM (VALUES (id, dia, orden), ...)
+        nuevo_orden = values(
+            column("id", Integer), column("dia_semana", tipo_dia), column("orden", Integer),
+            name="nuevo_orden"
+        ).data(filas)
+        return (
+            update(Ejercicio)
+            .where(Ejercicio.id == nuevo_orden.c.id, Ejercicio.rutina_id == rutina_id)
+            .values(
+                dia_semana=cast(nuevo_orden.c.dia_semana, tipo_dia),
+                orden=nuevo_orden.c.orden,
+                version=Ejercicio.version + 1
+            )
+        )
+
+    # SQLite no admite alias de columnas en (VALUES ...): se usa CASE por id
+    ids = [fila[0] for fila in filas]
+    return (
+        update(Ejercicio)
+        .where(Ejercicio.id.in_(ids), Ejercicio.rutina_id == rutina_id)
+        .values(
+            dia_semana=case({i: dia for i, dia, _ in filas}, value=Ejercicio.id),
+            orden=case({i: orden for i, _, orden in filas}, value=Ejercicio.id),
+            version=Ejercicio.version + 1
+        )
+    )
+
+def _reordenar_compartida(db: Session, rutina_id: int, plantilla_id: int, filas: list[tuple]):
+    """Materializa la rutina con el nuevo (dia_semana, orden) de cada ejercicio de la plantilla"""
+    ids = [fila[0] for fila in filas]
+    encontrados = db.scalar(
+        select(func.count()).where(Ejercicio.id.in_(ids), Ejercicio.rutina_id == plantilla_id)
+    )
+    if encontrados != len(filas):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Algún ejercicio no existe o no pertenece a la rutina")
+
+    # La fila de la rutina ya está bloqueada por el cambio de versión
+    materializar(db, rutina_id, plantilla_id, {
+        "dia_semana": cast(
+            case({i: dia for i, dia, _ in filas}, value=Ejercicio.id, else_=Ejercicio.dia_semana),
+            Ejercicio.dia_semana.type
+        ),
+        "orden": case({i: orden for i, _, orden in filas}, value=Ejercicio.id, else_=Ejercicio.orden),
+    })
+
+def reordenar_ejercicios(
+    db: Session, tenant_id: int, rutina_id: int, datos: ReordenarEjercicios, version: Optional[int] = None
+):
+    """
+    Reescribe dia_semana y orden de los ejercicios con una sola sentencia.
+    Con version (cabecera If-Match, o la del cuerpo en clientes anteriores)
+    solo se aplica si la rutina sigue en esa versión; si otra petición la
+    cambió antes, se responde 412 en lugar de mezclar ambos órdenes.
+    Si la rutina comparte una plantilla, los ids son los de la plantilla y
+    sus ejercicios se copian ya con el nuevo orden. Sin ejercicios que mover
+    no se escribe nada: ni la versión cambia.
+    """
+    if version is None:
+        version = datos.version
+
+    filas = [
+        (ejercicio_id, dia.dia_semana.name, posicion)
+        for dia in datos.dias
+        for posicion, ejercicio_id in enumerate(dia.ejercicios, start=1)
+    ]
+    ids = [fila[0] for fila in filas]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Hay ejercicios repetidos en el nuevo orden")
+
+    if not filas:
+        rutina = leer_rutina_detalle(db, tenant_id, rutina_id)
+        if rutina is None or (version is not None and rutina["version"] != version):
+            _sin_actualizar(db, Rutina, tenant_id, rutina_id, "Rutina no encontrada")
+        if rutina["es_plantilla"]:
+            raise HTTPException(status_code=409, detail=PLANTILLA_INMUTABLE)
+        return rutina
+
+    # Incrementar la versión bloquea la fila de la rutina hasta el commit
+    # (y updated_at se actualiza solo, por onupdate)
+    condiciones = [Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id)]
+    if version is not None:
+        condiciones.append(Rutina.version == version)
+    rutina = db.execute(
+        update(Rutina)
+        .where(*condiciones)
+        .values(version=Rutina.version + 1)
+        .returning(Rutina.es_plantilla, Rutina.plantilla_id)
+    ).first()
+    if rutina is None:
+        _sin_actualizar(db, Rutina, tenant_id, rutina_id, "Rutina no encontrada")
+    if rutina.es_plantilla:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=PLANTILLA_INMUTABLE)
+
+    if rutina.plantilla_id is not None:
+        _reordenar_compartida(db, rutina_id, rutina.plantilla_id, filas)
+    else:
+        resultado = db.execute(
+            _sentencia_reordenar(db, rutina_id, filas),
+            execution_options={"synchronize_session": False}
+        )
+        if resultado.rowcount != len(filas):
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail="Algún ejercicio no existe o no pertenece a la rutina"
+            )
+    # Mover ejercicios de día puede cambiar el número de días
+    refrescar_resumen(db, rutina_id)
+
+    db.commit()
+
+    return leer_rutina_detalle(db, tenant_id, rutina_id)
+
+def _plantilla_de(db: Session, tenant_id: int, rutina_id: int) -> Optional[int]:
+    """Plantilla que comparte la rutina del tenant (None si tiene ejercicios propios)"""
+    rutina = db.query(Rutina.plantilla_id).filter(Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id)).first()
+    if not rutina:
+        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+    return rutina.plantilla_id
+
+def _materializar_sin(
+    db: Session, rutina_id: int, plantilla_id: int, ejercicio_id: int, version: Optional[int], solo_anteriores: bool
+):
+    """
+    Copia en la rutina los ejercicios de su plantilla salvo ejercicio_id (o solo
+    los anteriores a él en el orden de la rutina) y devuelve ese ejercicio.
+    """
+    actual = db.execute(
+        select(Ejercicio.version, Ejercicio.orden)
+        .where(Ejercicio.id == ejercicio_id, Ejercicio.rutina_id == plantilla_id)
+    ).first()
+    if actual is None:
+        raise HTTPException(status_code=404, detail="Ejercicio no encontrado")
+    if version is not None and version != actual.version:
+        raise HTTPException(status_code=412, detail=VERSION_NO_COINCIDE)
+
+    if solo_anteriores:
+        condicion = tuple_(Ejercicio.orden, Ejercicio.id) < tuple_(actual.orden, ejercicio_id)
+    else:
+        condicion = Ejercicio.id != ejercicio_id
+    if not materializar(db, rutina_id, plantilla_id, None, condicion):
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="La rutina fue modificada por otra petición; recarga e intenta de nuevo"
+        )
+    return actual
+
+def actualizar_ejercicio(
+    db: Session, tenant_id: int, ejercicio_id: int, cambios: dict, version: Optional[int] = None,
+    rutina_id: Optional[int] = None
+):
+    """
+    Actualiza los campos recibidos con un solo UPDATE ... RETURNING (ver actualizar_rutina).
+    Con rutina_id, si esa rutina comparte la plantilla del ejercicio, se
+    materializa con el ejercicio ya modificado (id nuevo, versión + 1). Se
+    copia en tres partes (antes, él y después) para que los ids nuevos
+    conserven el orden de la rutina.
+    """
+    plantilla_id = None if rutina_id is None else _plantilla_de(db, tenant_id, rutina_id)
+    if plantilla_id is not None:
+        _validar_no_nulos(Ejercicio, cambios)
+        actual = _materializar_sin(db, rutina_id, plantilla_id, ejercicio_id, version, solo_anteriores=True)
+        valores = {campo: literal(valor, getattr(Ejercicio, campo).type) for campo, valor in cambios.items()}
+        valores["version"] = literal(actual.version + 1)
+        fila = db.execute(
+            copia_de_ejercicios(plantilla_id, rutina_id, valores, Ejercicio.id == ejercicio_id)
+            .returning(*COLUMNAS_EJERCICIO)
+        ).one()
+        db.execute(copia_de_ejercicios(
+            plantilla_id, rutina_id, None,
+            tuple_(Ejercicio.orden, Ejercicio.id) > tuple_(actual.orden, ejercicio_id)
+        ))
+        resultado = EjercicioSchema.model_validate(fila._asdict())
+        if CAMPOS_RESUMEN & cambios.keys():
+            refrescar_resumen(db, rutina_id)
+        db.commit()
+        return resultado
+
+    def antes_del_commit(db, ejercicio):
+        _tocar_rutina(db, ejercicio.rutina_id)
+        if CAMPOS_RESUMEN & cambios.keys():
+            refrescar_resumen(db, ejercicio.rutina_id)
+
+    return _actualizar(
+        db, Ejercicio, EjercicioSchema, tenant_id, ejercicio_id, cambios, version,
+        "Ejercicio no encontrado", "Ya existe un ejercicio con esos datos", antes_del_commit
+    )
+
+def eliminar_ejercicio(db: Session, tenant_id: int, ejercicio_id: int, rutina_id: Optional[int] = None):
+    """
+    Elimina un ejercicio y devuelve el id de su rutina. Con rutina_id, si esa
+    rutina comparte la plantilla del ejercicio, se materializa sin él.
+    """
+    plantilla_id = None if rutina_id is None else _plantilla_de(db, tenant_id, rutina_id)
+    if plantilla_id is not None:
+        _materializar_sin(db, rutina_id, plantilla_id, ejercicio_id, None, solo_anteriores=False)
+        refrescar_resumen(db, rutina_id)
+        db.commit()
+        return rutina_id
+
+    fila = db.query(Ejercicio, Rutina.es_plantilla).join(Rutina, Rutina.id == Ejercicio.rutina_id).filter(
+        Ejercicio.id == ejercicio_id, filtro_tenant(Rutina, tenant_id)
+    ).first()
+
+    if not fila:
+        raise HTTPException(status_code=404, detail="Ejercicio no encontrado")
+
+    db_ejercicio, es_plantilla = fila
+    if es_plantilla:
+        raise HTTPException(status_code=409, detail=PLANTILLA_INMUTABLE)
+
+    rutina_id = db_ejercicio.rutina_id
+    db.delete(db_ejercicio)
+    _tocar_rutina(db, rutina_id)
+    refrescar_resumen(db, rutina_id)
+    db.commit()
+
+    return rutina_id
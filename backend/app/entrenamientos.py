@@ -0,0 +1,400 @@
+"""
+Registro de entrenamientos: sesiones con las series que se hicieron de verdad
+(repeticiones y peso de cada una), frente a lo planificado en los ejercicios
+de las rutinas.
+
+- Registrar: el cliente envía las sesiones por lotes, también las que grabó
+  sin conexión. Cada lote es una transacción: un INSERT ... ON CONFLICT DO
+  NOTHING RETURNING de las sesiones (cliente_id es único por tenant: reenviar
+  un lote tras un corte no duplica nada) y un executemany con todas sus
+  series. Los totales de la sesión se calculan aquí, porque las series no se
+  modifican después, y en la misma transacción se suman al progreso de cada
+  usuario (progreso.py).
+- Particiones: en PostgreSQL series_realizadas está particionada por mes.
+  Antes de insertar se crean, en su propia transacción, las particiones que
+  falten para las fechas del lote. El mantenimiento del despachador de
+  trabajos.py y `python -m app.cli particiones` crean por adelantado las de
+  los próximos ENTRENAMIENTOS_MESES_ADELANTO meses, así que al registrar casi
+  nunca hace falta. Con ENTRENAMIENTOS_RETENCION_MESES los meses antiguos se
+  borran con un DROP de su partición, sin recorrer filas; en SQLite, que no
+  tiene particiones, se borran las sesiones por lotes.
+- Consultas: una sesión lee sus series entre iniciada_en y terminada_en, así
+  PostgreSQL solo abre las particiones de esas fechas. El historial de un
+  ejercicio usa el índice (tenant_id, ejercicio_id, usuario_id, realizada_en)
+  y la actividad del tenant en un rango de fechas, el BRIN de realizada_en.
+  Los dos agregan en la BD, por sesión, día, semana o mes.
+
+Las series guardan el ejercicio_id con el que se registraron. Si una rutina
+compartida se modifica, sus ejercicios se copian con ids nuevos
+(plantillas.py) y el historial anterior sigue con los de la plantilla.
+"""
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, delete, func, insert, literal_column, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import progreso
+from app.config import ajustes
+from app.models import Ejercicio, Rutina, SerieRealizada, SesionEntrenamiento
+from app.schemas import SesionCreate
+from app.tenants import filtro_tenant
+
+logger = logging.getLogger(__name__)
+
+ENTRENAMIENTOS_MESES_ADELANTO = ajustes.entrenamientos_meses_adelanto
+ENTRENAMIENTOS_RETENCION_MESES = ajustes.entrenamientos_retencion_meses
+
+BLOQUEO_PARTICIONES = 4_815_163  # Advisory lock de PostgreSQL al crear o borrar particiones
+PARTICION = re.compile(r"^series_realizadas_(\d{4})_(\d{2})$")
+MARGEN_FUTURO = timedelta(days=1)  # Relojes adelantados de los dispositivos
+LOTE_BORRADO = 1000  # Sesiones por transacción al borrar los meses antiguos
+
+CAMPOS_SESION = (
+    "id", "usuario_id", "rutina_id", "cliente_id", "iniciada_en", "terminada_en", "notas",
+    "num_series", "repeticiones", "volumen", "fecha_registro",
+)
+COLUMNAS_SESION = tuple(getattr(SesionEntrenamiento, campo) for campo in CAMPOS_SESION)
+CAMPOS_SERIE = ("orden", "ejercicio_id", "ejercicio", "repeticiones", "peso", "realizada_en")
+
+# Meses cuya partición ya se comprobó en este proceso
+_particiones: set[date] = set()
+
+
+def _mes(fecha: datetime) -> date:
+    return date(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(mes: date, meses: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _inicio_retencion(ahora: datetime, meses: int) -> Optional[datetime]:
+    """Primer instante que se conserva (None: se conserva todo)"""
+    return datetime.combine(_sumar_meses(_mes(ahora), -meses), datetime.min.time()) if meses else None
+
+
+# ============ PARTICIONES ============
+
+def nombre_particion(mes: date) -> str:
+    return f"series_realizadas_{mes:%Y_%m}"
+
+
+def crear_particiones(db: Session, meses: Iterable[date]) -> list[str]:
+    """
+    PostgreSQL: crea las particiones mensuales que falten y confirma la
+    transacción. En otros motores no hace nada. Devuelve las creadas.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return []
+    pendientes = set(meses) - _particiones
+    if not pendientes:
+        return []
+    # Varios procesos pueden necesitar la misma a la vez: de uno en uno
+    db.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": BLOQUEO_PARTICIONES})
+    creadas = []
+    for mes in sorted(pendientes):
+        nombre = nombre_particion(mes)
+        if not db.scalar(text("SELECT to_regclass(:nombre) IS NOT NULL"), {"nombre": nombre}):
+            db.execute(text(
+                f"CREATE TABLE {nombre} PARTITION OF series_realizadas "
+                f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{_sumar_meses(mes, 1).isoformat()}')"
+            ))
+            creadas.append(nombre)
+    db.commit()
+    _particiones.update(pendientes)
+    if creadas:
+        logger.info("Particiones creadas: %s", ", ".join(creadas))
+    return creadas
+
+
+def borrar_meses_antiguos(
+    db: Session, meses: int = ENTRENAMIENTOS_RETENCION_MESES, ahora: Optional[datetime] = None
+) -> dict:
+    """
+    Borra las series de antes del mes de hace `meses` meses (0: nada) y las
+    sesiones que terminaron antes. En PostgreSQL las series se van con sus
+    particiones; las sesiones, por lotes de LOTE_BORRADO.
+    """
+    limite = _inicio_retencion(ahora or datetime.utcnow(), meses)
+    if limite is None:
+        return {"borradas": [], "sesiones": 0}
+
+    borradas = []
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": BLOQUEO_PARTICIONES})
+        particiones = db.scalars(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'series_realizadas'::regclass"
+        )).all()
+        for nombre in sorted(particiones):
+            coincide = PARTICION.match(nombre)
+            mes = coincide and date(int(coincide[1]), int(coincide[2]), 1)
+            if mes and mes < limite.date():
+                db.execute(text(f"DROP TABLE {nombre}"))
+                _particiones.discard(mes)
+                borradas.append(nombre)
+        db.commit()
+
+    antiguas = select(SesionEntrenamiento.id).where(SesionEntrenamiento.terminada_en < limite).limit(LOTE_BORRADO)
+    sesiones = 0
+    while ids := db.scalars(antiguas).all():
+        db.execute(
+            delete(SerieRealizada).where(SerieRealizada.sesion_id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        db.execute(
+            delete(SesionEntrenamiento).where(SesionEntrenamiento.id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        sesiones += len(ids)
+    return {"borradas": borradas, "sesiones": sesiones}
+
+
+def mantener(
+    db: Session, adelanto: int = ENTRENAMIENTOS_MESES_ADELANTO, retencion: int = ENTRENAMIENTOS_RETENCION_MESES
+) -> dict:
+    """
+    Crea las particiones de este mes y de los `adelanto` siguientes y borra
+    los meses que pasaron la retención, recalculando entonces el progreso:
+    {"creadas", "borradas", "sesiones"}
+    """
+    ahora = datetime.utcnow()
+    creadas = crear_particiones(db, (_sumar_meses(_mes(ahora), n) for n in range(adelanto + 1)))
+    borrado = borrar_meses_antiguos(db, retencion, ahora)
+    if borrado["borradas"] or borrado["sesiones"]:
+        progreso.reconstruir(db.connection())
+        db.commit()
+    return {"creadas": creadas, **borrado}
+
+
+# ============ REGISTRO ============
+
+def _existentes(db: Session, tenant_id: int, clientes) -> dict[str, int]:
+    """{cliente_id: id} de las sesiones ya registradas"""
+    return {
+        cliente_id: sesion_id
+        for sesion_id, cliente_id in db.execute(
+            select(SesionEntrenamiento.id, SesionEntrenamiento.cliente_id)
+            .where(SesionEntrenamiento.tenant_id == tenant_id, SesionEntrenamiento.cliente_id.in_(clientes))
+        )
+    }
+
+
+def _error(sesion: SesionCreate, ahora: datetime, rutinas: set, ejercicios: set) -> Optional[str]:
+    if sesion.iniciada_en > ahora + MARGEN_FUTURO:
+        return "La sesión empieza en el futuro"
+    limite = _inicio_retencion(ahora, ENTRENAMIENTOS_RETENCION_MESES)
+    if limite is not None and sesion.iniciada_en < limite:
+        return "La sesión es anterior a los meses que se conservan"
+    if sesion.rutina_id is not None and sesion.rutina_id not in rutinas:
+        return "Rutina no encontrada"
+    for serie in sesion.series:
+        if serie.ejercicio_id not in ejercicios:
+            return f"Ejercicio no encontrado: {serie.ejercicio_id}"
+    return None
+
+
+def registrar(db: Session, tenant_id: int, usuario_id: Optional[int], sesiones: list[SesionCreate]) -> dict:
+    """
+    Registra un lote de sesiones con sus series en una transacción (forma de
+    ResultadoRegistro). Las que ya estaban registradas (mismo cliente_id) se
+    devuelven con su id y duplicada; las que tienen errores se informan y se
+    saltan sin abortar el lote.
+    """
+    ahora = datetime.utcnow()
+    registradas, errores = [], []
+
+    existentes = _existentes(db, tenant_id, {sesion.cliente_id for sesion in sesiones})
+    nuevas, vistos = [], set()
+    for indice, sesion in enumerate(sesiones):
+        if sesion.cliente_id in existentes:
+            registradas.append({
+                "indice": indice, "cliente_id": sesion.cliente_id, "id": existentes[sesion.cliente_id],
+                "duplicada": True,
+            })
+        elif sesion.cliente_id in vistos:
+            errores.append({
+                "indice": indice, "cliente_id": sesion.cliente_id, "error": "cliente_id repetido en el lote"
+            })
+        else:
+            vistos.add(sesion.cliente_id)
+            nuevas.append((indice, sesion))
+
+    # Rutinas y ejercicios del tenant (los de una plantilla compartida también valen)
+    rutina_ids = {sesion.rutina_id for _, sesion in nuevas if sesion.rutina_id is not None}
+    rutinas = set(db.scalars(
+        select(Rutina.id).where(Rutina.id.in_(rutina_ids), filtro_tenant(Rutina, tenant_id))
+    )) if rutina_ids else set()
+    ejercicio_ids = {serie.ejercicio_id for _, sesion in nuevas for serie in sesion.series}
+    ejercicios = set(db.scalars(
+        select(Ejercicio.id).where(Ejercicio.id.in_(ejercicio_ids), filtro_tenant(Ejercicio, tenant_id))
+    )) if ejercicio_ids else set()
+
+    validas = []
+    for indice, sesion in nuevas:
+        error = _error(sesion, ahora, rutinas, ejercicios)
+        if error is None:
+            validas.append((indice, sesion))
+        else:
+            errores.append({"indice": indice, "cliente_id": sesion.cliente_id, "error": error})
+    ids, insertadas = {}, 0
+    if validas:
+        ids, insertadas = _insertar(db, tenant_id, usuario_id, [sesion for _, sesion in validas], ahora)
+
+    # Las que registró a la vez otra petición cuentan como duplicadas
+    perdidas = [sesion.cliente_id for _, sesion in validas if sesion.cliente_id not in ids]
+    otras = _existentes(db, tenant_id, perdidas) if perdidas else {}
+    ids.update(otras)
+    registradas.extend(
+        {"indice": indice, "cliente_id": sesion.cliente_id, "id": ids[sesion.cliente_id],
+         "duplicada": sesion.cliente_id in otras}
+        for indice, sesion in validas
+    )
+    registradas.sort(key=lambda registrada: registrada["indice"])
+    errores.sort(key=lambda error: error["indice"])
+    return {"registradas": registradas, "series": insertadas, "errores": errores}
+
+
+def _insertar(
+    db: Session, tenant_id: int, usuario_id: Optional[int], sesiones: list[SesionCreate], ahora: datetime
+) -> tuple[dict[str, int], int]:
+    """Inserta las sesiones y sus series y confirma: ({cliente_id: id} de las insertadas, series insertadas)"""
+    crear_particiones(db, {_mes(serie.realizada_en) for sesion in sesiones for serie in sesion.series})
+
+    dialectos = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+    insertar = dialectos.get(db.get_bind().dialect.name)
+    # ON CONFLICT DO NOTHING (índice único (tenant_id, cliente_id)): si otra
+    # petición registra la misma sesión a la vez, esta no devuelve su id
+    sentencia = insertar(SesionEntrenamiento).on_conflict_do_nothing() if insertar else insert(SesionEntrenamiento)
+    ids = {
+        cliente_id: sesion_id
+        for sesion_id, cliente_id in db.execute(
+            sentencia.returning(SesionEntrenamiento.id, SesionEntrenamiento.cliente_id),
+            [
+                {
+                    "tenant_id": tenant_id, "usuario_id": usuario_id, "rutina_id": sesion.rutina_id,
+                    "cliente_id": sesion.cliente_id, "iniciada_en": sesion.iniciada_en,
+                    "terminada_en": sesion.terminada_en, "notas": sesion.notas,
+                    "num_series": len(sesion.series),
+                    "repeticiones": sum(serie.repeticiones for serie in sesion.series),
+                    "volumen": sum(serie.repeticiones * (serie.peso or 0) for serie in sesion.series),
+                    "fecha_registro": ahora,
+                }
+                for sesion in sesiones
+            ],
+        )
+    }
+    series = [
+        {
+            "sesion_id": ids[sesion.cliente_id], "orden": orden, "realizada_en": serie.realizada_en,
+            "tenant_id": tenant_id, "usuario_id": usuario_id, "ejercicio_id": serie.ejercicio_id,
+            "repeticiones": serie.repeticiones, "peso": serie.peso,
+        }
+        for sesion in sesiones if sesion.cliente_id in ids
+        for orden, serie in enumerate(sesion.series, 1)
+    ]
+    if series:
+        # Con la conexión (Core) y no con la sesión: sin el paso del ORM por cada fila
+        db.connection().execute(insert(SerieRealizada.__table__), series)
+        progreso.acumular(db, tenant_id, usuario_id, series)
+    db.commit()
+    return ids, len(series)
+
+
+# ============ CONSULTAS ============
+
+def listar_sesiones(
+    db: Session, tenant_id: int, limite: int, usuario_id: Optional[int] = None,
+    desde: Optional[datetime] = None, hasta: Optional[datetime] = None
+) -> list[dict]:
+    """Sesiones del tenant (o de un usuario), las más recientes primero (forma de Sesion)"""
+    consulta = (
+        select(*COLUMNAS_SESION)
+        .where(SesionEntrenamiento.tenant_id == tenant_id)
+        .order_by(SesionEntrenamiento.iniciada_en.desc(), SesionEntrenamiento.id.desc())
+        .limit(limite)
+    )
+    if usuario_id is not None:
+        consulta = consulta.where(SesionEntrenamiento.usuario_id == usuario_id)
+    if desde is not None:
+        consulta = consulta.where(SesionEntrenamiento.iniciada_en >= desde)
+    if hasta is not None:
+        consulta = consulta.where(SesionEntrenamiento.iniciada_en < hasta)
+    return [dict(zip(CAMPOS_SESION, fila)) for fila in db.execute(consulta)]
+
+
+def obtener_sesion(db: Session, tenant_id: int, sesion_id: int) -> dict:
+    """Sesión con sus series en orden (forma de SesionDetalle)"""
+    fila = db.execute(
+        select(*COLUMNAS_SESION)
+        .where(SesionEntrenamiento.id == sesion_id, SesionEntrenamiento.tenant_id == tenant_id)
+    ).first()
+    if fila is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    sesion = dict(zip(CAMPOS_SESION, fila))
+    filas = db.execute(
+        select(
+            SerieRealizada.orden, SerieRealizada.ejercicio_id, Ejercicio.nombre,
+            SerieRealizada.repeticiones, SerieRealizada.peso, SerieRealizada.realizada_en,
+        )
+        .outerjoin(
+            Ejercicio,
+            and_(Ejercicio.id == SerieRealizada.ejercicio_id, filtro_tenant(Ejercicio, tenant_id))
+        )
+        # Con las fechas de la sesión, PostgreSQL solo lee sus particiones
+        .where(
+            SerieRealizada.sesion_id == sesion_id,
+            SerieRealizada.realizada_en.between(sesion["iniciada_en"], sesion["terminada_en"]),
+        )
+        .order_by(SerieRealizada.orden)
+    )
+    sesion["series"] = [dict(zip(CAMPOS_SERIE, fila)) for fila in filas]
+    return sesion
+
+
+def _dia(valor) -> date:
+    """date del inicio de un periodo o datetime del inicio de una sesión"""
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def historial(
+    db: Session, tenant_id: int, agrupar: str, ejercicio_id: Optional[int] = None,
+    usuario_id: Optional[int] = None, desde: Optional[datetime] = None, hasta: Optional[datetime] = None
+) -> list[dict]:
+    """
+    Totales de las series del tenant por sesión, día, semana (de lunes a
+    domingo) o mes, en orden cronológico (forma de PuntoHistorial). Se puede
+    limitar a un ejercicio, a un usuario y a un rango de fechas [desde, hasta).
+    """
+    volumen = SerieRealizada.repeticiones * func.coalesce(SerieRealizada.peso, 0)
+    totales = (
+        func.count(func.distinct(SerieRealizada.sesion_id)), func.count(),
+        func.sum(SerieRealizada.repeticiones), func.sum(volumen), func.max(SerieRealizada.peso),
+    )
+    if agrupar == "sesion":
+        periodo = func.min(SerieRealizada.realizada_en)
+        consulta = select(periodo, SerieRealizada.sesion_id, *totales).group_by(SerieRealizada.sesion_id)
+    else:
+        periodo = progreso.inicio_periodo(db.get_bind().dialect.name, agrupar)
+        consulta = select(periodo, literal_column("NULL"), *totales).group_by(periodo)
+    consulta = consulta.where(SerieRealizada.tenant_id == tenant_id).order_by(periodo)
+    if ejercicio_id is not None:
+        consulta = consulta.where(SerieRealizada.ejercicio_id == ejercicio_id)
+    if usuario_id is not None:
+        consulta = consulta.where(SerieRealizada.usuario_id == usuario_id)
+    if desde is not None:
+        consulta = consulta.where(SerieRealizada.realizada_en >= desde)
+    if hasta is not None:
+        consulta = consulta.where(SerieRealizada.realizada_en < hasta)
+    return [
+        {"periodo": _dia(inicio), "sesion_id": sesion_id, "sesiones": sesiones, "series": series,
+         "repeticiones": repeticiones or 0, "volumen": volumen or 0, "peso_maximo": peso_maximo}
+        for inicio, sesion_id, sesiones, series, repeticiones, volumen, peso_maximo in db.execute(consulta)
+    ]
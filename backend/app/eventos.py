@@ -0,0 +1,366 @@
+"""
+Eventos de cambios en rutinas y ejercicios (SSE y WebSocket).
+
+Los endpoints de escritura de routes.py publican un evento por cambio con
+publicar(), después del commit; los clientes suscritos a /api/eventos (SSE)
+o /api/eventos/ws lo reciben y vuelven a pedir solo lo que cambió, en lugar
+de sondear los listados.
+
+Cada proceso tiene un Hub en memoria que reparte los eventos entre sus
+suscriptores. El reparto entre procesos lo hace un BackendEventos
+intercambiable, como el de la cache: BackendLocal (un solo proceso, por
+defecto) o BackendPostgres (LISTEN/NOTIFY, para varios workers). Todos los
+eventos, también los del propio proceso, llegan al hub a través del backend.
+
+Cada evento lleva el tenant_id de la rutina y cada cliente se suscribe a
+su tenant: solo recibe (y solo se le reenvían al reconectar) los eventos de
+ese tenant. "resync" llega a todos.
+
+Contrapresión: cada suscriptor tiene una cola acotada (EVENTOS_COLA_MAXIMA).
+Si un cliente lento la llena, se vacía y se le envía un único evento
+"resync": debe volver a cargar lo que muestra. Un cliente lento no hace
+crecer la memoria ni retrasa a los demás.
+
+El hub y los backends solo se usan desde el event loop (sin locks).
+"""
+import asyncio
+import logging
+import secrets
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import orjson
+from sqlalchemy.engine import make_url
+
+from app import metricas
+from app.config import ajustes
+from app.serializacion import a_json
+
+logger = logging.getLogger(__name__)
+
+EVENTOS_COLA_MAXIMA = ajustes.eventos_cola_maxima
+EVENTOS_HISTORIAL = ajustes.eventos_historial
+EVENTOS_KEEPALIVE_SEGUNDOS = ajustes.eventos_keepalive_segundos
+
+# Límite de NOTIFY en PostgreSQL: 8000 bytes por mensaje
+MAX_BYTES_NOTIFY = 8000
+
+
+class Mensaje:
+    """Evento ya codificado una vez para todos los suscriptores (tenant None: para todos)"""
+    __slots__ = ("id", "json", "sse", "tenant_id")
+
+    def __init__(self, id_: Optional[str], datos: bytes, tenant_id: Optional[int] = None):
+        self.id = id_
+        self.tenant_id = tenant_id
+        if id_ is None:
+            self.json = datos
+            self.sse = b"data: " + datos + b"\n\n"
+        else:
+            # datos es siempre un objeto JSON: se le añade el id al principio
+            self.json = b'{"id":"' + id_.encode() + b'",' + datos[1:]
+            self.sse = b"id: " + id_.encode() + b"\ndata: " + self.json + b"\n\n"
+
+
+# Los clientes que lo reciben deben recargar lo que muestran
+RESYNC = Mensaje(None, b'{"tipo":"resync"}')
+
+
+# ============ SUSCRIPCIONES ============
+
+class Suscripcion:
+    """Cola acotada de un cliente"""
+
+    def __init__(self, maximo: int = EVENTOS_COLA_MAXIMA):
+        self._cola: asyncio.Queue = asyncio.Queue(maximo)
+
+    def entregar(self, mensaje: Mensaje):
+        try:
+            self._cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo pendiente y se le pide que resincronice
+            while not self._cola.empty():
+                self._cola.get_nowait()
+            self._cola.put_nowait(RESYNC)
+            metricas.eventos_desbordes.incrementar()
+
+    async def siguiente(self, timeout: Optional[float] = None) -> Optional[Mensaje]:
+        """Siguiente mensaje, o None si pasan `timeout` segundos sin ninguno"""
+        try:
+            return await asyncio.wait_for(self._cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+# ============ BACKENDS ============
+
+class BackendEventos(ABC):
+    """Reparto de eventos entre procesos; entrega cada evento a hub.entregar()"""
+
+    @abstractmethod
+    async def iniciar(self, hub: "Hub"):
+        ...
+
+    @abstractmethod
+    def publicar(self, datos: bytes):
+        """No bloquea: la petición que publica no espera al reparto"""
+
+    async def detener(self):
+        pass
+
+
+class BackendLocal(BackendEventos):
+    """Un solo proceso: los eventos van directamente al hub"""
+
+    _hub = None  # Sin iniciar (sin lifespan) no hay a quién entregar
+
+    async def iniciar(self, hub):
+        self._hub = hub
+
+    def publicar(self, datos):
+        if self._hub is not None:
+            self._hub.entregar(datos)
+
+
+class BackendPostgres(BackendEventos):
+    """
+    LISTEN/NOTIFY en una conexión asyncpg propia de cada proceso (fuera del
+    pool). Los NOTIFY se envían en segundo plano, en lotes; si se pierde la
+    conexión se reconecta con espera creciente y se envía "resync" a los
+    suscriptores locales, porque pudieron perderse eventos.
+    """
+
+    MAX_PENDIENTES = 10_000
+    ESPERA_MAXIMA_SEGUNDOS = 30
+
+    def __init__(self, dsn: str, canal: str = ajustes.eventos_canal):
+        self.dsn = dsn
+        self.canal = canal
+        self._conexion = None
+        self._pendientes: deque = deque(maxlen=self.MAX_PENDIENTES)
+        self._hay_pendientes = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+
+    async def iniciar(self, hub):
+        self._hub = hub
+        await self._conectar()
+        self._tarea = asyncio.create_task(self._enviar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+        if self._conexion is not None:
+            await self._conexion.close()
+
+    def publicar(self, datos):
+        if len(datos) > MAX_BYTES_NOTIFY:
+            logger.warning("Evento de %d bytes descartado (máximo de NOTIFY: %d)", len(datos), MAX_BYTES_NOTIFY)
+            return
+        if len(self._pendientes) == self._pendientes.maxlen:
+            logger.warning("Cola de NOTIFY llena: se descarta el evento más antiguo")
+        self._pendientes.append(datos.decode())
+        self._hay_pendientes.set()
+
+    async def _conectar(self):
+        import asyncpg
+
+        self._conexion = await asyncpg.connect(self.dsn)
+        await self._conexion.add_listener(self.canal, self._notificacion)
+        # Si la conexión se cae sin publicar nada, la tarea de envío lo ve y reconecta
+        self._conexion.add_termination_listener(lambda conexion: self._hay_pendientes.set())
+
+    def _notificacion(self, conexion, pid, canal, payload):
+        self._hub.entregar(payload.encode())
+
+    async def _enviar(self):
+        while True:
+            await self._hay_pendientes.wait()
+            self._hay_pendientes.clear()
+            if self._conexion.is_closed():
+                await self._reconectar()
+            if not self._pendientes:
+                continue
+            lote = [self._pendientes.popleft() for _ in range(len(self._pendientes))]
+            try:
+                # Una sentencia por lote (PostgreSQL descarta los NOTIFY repetidos en una transacción)
+                await self._conexion.execute(
+                    "SELECT pg_notify($1, evento) FROM unnest($2::text[]) AS evento", self.canal, lote
+                )
+            except Exception:
+                logger.exception("Fallo enviando NOTIFY; reconectando")
+                self._pendientes.extendleft(reversed(lote))
+                await self._reconectar()
+                self._hay_pendientes.set()
+
+    async def _reconectar(self):
+        espera = 1
+        while True:
+            try:
+                if self._conexion is not None and not self._conexion.is_closed():
+                    await self._conexion.close()
+                await self._conectar()
+                break
+            except Exception:
+                logger.exception("No se pudo reconectar a LISTEN/NOTIFY; reintento en %s s", espera)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.ESPERA_MAXIMA_SEGUNDOS)
+        self._hub.resincronizar()
+
+
+def crear_backend(config=ajustes) -> BackendEventos:
+    """Backend según EVENTOS_BACKEND; postgres usa la BD de DATABASE_URL"""
+    if config.eventos_backend == "local":
+        return BackendLocal()
+    url = make_url(config.database_url)
+    if url.get_backend_name() != "postgresql":
+        raise RuntimeError("EVENTOS_BACKEND=postgres requiere una DATABASE_URL de PostgreSQL")
+    return BackendPostgres(url.set(drivername="postgresql").render_as_string(hide_password=False), config.eventos_canal)
+
+
+# ============ HUB ============
+
+class Hub:
+    """Reparte los eventos del backend entre los suscriptores del proceso"""
+
+    def __init__(self, backend: BackendEventos, historial: int = EVENTOS_HISTORIAL):
+        self.backend = backend
+        # Los ids de evento son de este proceso: un cliente que reconecta a
+        # otro worker no puede continuar desde su Last-Event-ID y resincroniza
+        self.instancia = secrets.token_hex(4)
+        self._secuencia = 0
+        self._historial: deque = deque(maxlen=historial)
+        # Suscripciones por tenant: un evento solo recorre las de su tenant
+        self._suscripciones: dict[int, set[Suscripcion]] = {}
+        # Funciones que reciben cada evento como dict (p. ej. invalidar la cache local)
+        self.oyentes: list[Callable[[dict], None]] = []
+
+    async def iniciar(self):
+        await self.backend.iniciar(self)
+
+    async def detener(self):
+        await self.backend.detener()
+
+    def publicar(self, tipo: str, tenant_id: int, **datos):
+        """Publica un evento {"tipo": ..., "tenant_id": ..., **datos} para todos los procesos"""
+        metricas.eventos_publicados.incrementar(tipo=tipo)
+        try:
+            self.backend.publicar(a_json({"tipo": tipo, "tenant_id": tenant_id, **datos}))
+        except Exception:
+            # La escritura ya se hizo: un fallo del reparto no la deshace
+            logger.exception("No se pudo publicar el evento %s", tipo)
+
+    def entregar(self, datos: bytes):
+        """Lo llama el backend con cada evento (JSON), también los de este proceso"""
+        evento = orjson.loads(datos)
+        self._secuencia += 1
+        mensaje = Mensaje(f"{self.instancia}-{self._secuencia}", datos, evento.get("tenant_id"))
+        self._historial.append(mensaje)
+        if mensaje.tenant_id is None:
+            destinatarios = [s for suscripciones in self._suscripciones.values() for s in suscripciones]
+        else:
+            destinatarios = self._suscripciones.get(mensaje.tenant_id, ())
+        for suscripcion in destinatarios:
+            suscripcion.entregar(mensaje)
+        if self.oyentes:
+            self._avisar_oyentes(evento)
+
+    def resincronizar(self):
+        """Se pudieron perder eventos: todos los suscriptores deben recargar"""
+        # Un hueco en la secuencia: quien reconecte con un id anterior también resincroniza
+        self._secuencia += 1
+        self._historial.clear()
+        for suscripciones in self._suscripciones.values():
+            for suscripcion in suscripciones:
+                suscripcion.entregar(RESYNC)
+        self._avisar_oyentes({"tipo": "resync"})
+
+    def _avisar_oyentes(self, evento: dict):
+        for oyente in self.oyentes:
+            try:
+                oyente(evento)
+            except Exception:
+                logger.exception("Error en un oyente de eventos")
+
+    @property
+    def suscriptores(self) -> int:
+        return sum(len(suscripciones) for suscripciones in self._suscripciones.values())
+
+    @contextmanager
+    def suscribir(self, tenant_id: int, ultimo_id: Optional[str] = None, maximo: int = EVENTOS_COLA_MAXIMA):
+        """
+        Suscripción a los eventos del tenant mientras dure el bloque. Con
+        ultimo_id (Last-Event-ID) se reenvían primero los eventos posteriores
+        del historial; si ya no están, el primer mensaje es "resync".
+        """
+        suscripcion = Suscripcion(maximo)
+        if ultimo_id:
+            for mensaje in self._pendientes_desde(ultimo_id):
+                if mensaje.tenant_id in (None, tenant_id):
+                    suscripcion.entregar(mensaje)
+        self._suscripciones.setdefault(tenant_id, set()).add(suscripcion)
+        try:
+            yield suscripcion
+        finally:
+            suscripciones = self._suscripciones[tenant_id]
+            suscripciones.discard(suscripcion)
+            if not suscripciones:
+                del self._suscripciones[tenant_id]
+
+    def _pendientes_desde(self, ultimo_id: str) -> list[Mensaje]:
+        instancia, _, secuencia = ultimo_id.partition("-")
+        if instancia != self.instancia or not secuencia.isdigit():
+            return [RESYNC]
+        secuencia = int(secuencia)
+        if secuencia >= self._secuencia:
+            return []
+        primera = self._secuencia - len(self._historial) + 1
+        if secuencia + 1 < primera:
+            return [RESYNC]  # Demasiado antiguos: ya no están en el historial
+        return list(self._historial)[secuencia + 1 - primera:]
+
+
+hub = Hub(crear_backend())
+
+
+def configurar_eventos(backend: BackendEventos):
+    """Reemplaza el backend de eventos (antes de arrancar la aplicación)"""
+    hub.backend = backend
+
+
+def publicar(tipo: str, tenant_id: int, **datos):
+    hub.publicar(tipo, tenant_id, **datos)
+
+
+# ============ TRANSPORTES ============
+
+async def flujo_sse(tenant_id: int, ultimo_id: Optional[str] = None):
+    """Cuerpo de una respuesta text/event-stream (el comentario mantiene viva la conexión)"""
+    with hub.suscribir(tenant_id, ultimo_id) as suscripcion:
+        yield b"retry: 3000\n\n"
+        while True:
+            mensaje = await suscripcion.siguiente(EVENTOS_KEEPALIVE_SEGUNDOS)
+            yield b": keepalive\n\n" if mensaje is None else mensaje.sse
+
+
+async def atender_websocket(websocket, tenant_id: int, ultimo_id: Optional[str] = None):
+    """Envía los eventos del tenant al WebSocket (ya aceptado) hasta que el cliente cierre"""
+    with hub.suscribir(tenant_id, ultimo_id) as suscripcion:
+        async def enviar():
+            while True:
+                mensaje = await suscripcion.siguiente()
+                await websocket.send_text(mensaje.json.decode())
+
+        async def esperar_cierre():
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass  # Los mensajes del cliente se ignoran
+
+        tareas = {asyncio.ensure_future(enviar()), asyncio.ensure_future(esperar_cierre())}
+        try:
+            await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
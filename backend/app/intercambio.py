@@ -0,0 +1,373 @@
+"""
+Exportación e importación de rutinas con sus ejercicios (copias de
+seguridad y traspasos entre gimnasios).
+
+Formatos:
+- ndjson: una línea JSON por rutina, con la lista de sus ejercicios
+  (el esquema RutinaExportada).
+- csv: una fila por ejercicio, con el nombre y la descripción de la rutina
+  en las dos primeras columnas. Una rutina sin ejercicios ocupa una fila
+  con las columnas del ejercicio vacías.
+
+Se exportan las rutinas del tenant de la petición y se importan en él (los
+nombres se comparan con los suyos).
+
+La exportación recorre una única consulta (rutinas LEFT JOIN ejercicios,
+ordenada por rutina) con un cursor del servidor (stream_results/yield_per),
+de LOTE_LECTURA en LOTE_LECTURA filas: la memoria no depende del tamaño de
+la base de datos, solo del lote y de la rutina más larga.
+
+La importación lee el cuerpo de la petición a trozos, valida cada rutina
+con los esquemas de schemas.py y escribe en lotes de LOTE_ESCRITURA rutinas,
+cada uno en su transacción, con executemany. Las líneas con errores (o con
+un nombre que ya existe) se informan y se saltan sin abortar el archivo.
+"""
+import codecs
+import csv
+import io
+import json
+from itertools import zip_longest
+from typing import AsyncIterator, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from starlette.concurrency import iterate_in_threadpool
+
+from app.consultas import RUTINA_EJERCICIOS
+from app.models import Ejercicio, Rutina
+from app.plan import ORDEN_DIAS, crear_resumenes
+from app.schemas import EjercicioCreate, RutinaExportada
+from app.tenants import filtro_tenant
+
+FORMATOS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+LOTE_LECTURA = 2000  # Filas que se traen del cursor cada vez
+LOTE_ESCRITURA = 500  # Rutinas por transacción al importar
+MAX_ERRORES = 1000  # Errores que se devuelven en detalle (se cuentan todos)
+
+CAMPOS_EJERCICIO = ("nombre", "dia_semana", "series", "repeticiones", "peso", "notas", "orden")
+COLUMNAS_CSV = ("rutina", "descripcion_rutina") + CAMPOS_EJERCICIO
+
+def consulta_exportacion(tenant_id: int):
+    """
+    Rutinas del tenant con sus ejercicios. Se ordenan por (fecha_creacion, id)
+    para recorrer el índice (tenant_id, fecha_creacion, id) sin ordenar aparte.
+    Las que comparten una plantilla se exportan con los ejercicios de esta.
+    """
+    return (
+        select(
+            Rutina.id, Rutina.nombre, Rutina.descripcion,
+            *[getattr(Ejercicio, campo) for campo in CAMPOS_EJERCICIO],
+        )
+        .select_from(Rutina)
+        .outerjoin(Ejercicio, Ejercicio.rutina_id == RUTINA_EJERCICIOS)
+        .where(filtro_tenant(Rutina, tenant_id))
+        .order_by(Rutina.fecha_creacion, Rutina.id, ORDEN_DIAS, Ejercicio.orden, Ejercicio.id)
+    )
+
+
+# ============ EXPORTACIÓN ============
+
+class _Exportador:
+    """Convierte bloques de filas de consulta_exportacion() en texto"""
+
+    def __init__(self, formato: str):
+        self.formato = formato
+        # Rutina en curso en NDJSON (puede seguir en el siguiente bloque)
+        self.rutina_id, self.rutina = None, None
+        self.salida = io.StringIO()
+        self.csv = csv.writer(self.salida, lineterminator="\n")
+        if formato == "csv":
+            self.csv.writerow(COLUMNAS_CSV)
+
+    def _vaciar(self) -> str:
+        texto = self.salida.getvalue()
+        self.salida.seek(0)
+        self.salida.truncate()
+        return texto
+
+    def _cerrar_rutina(self):
+        if self.rutina is not None:
+            self.salida.write(json.dumps(self.rutina, ensure_ascii=False))
+            self.salida.write("\n")
+            self.rutina = None
+
+    def bloque(self, filas) -> str:
+        for fila in filas:
+            rutina_id, nombre, descripcion, *ejercicio = fila
+            if ejercicio[1] is not None:
+                ejercicio[1] = ejercicio[1].value
+            if self.formato == "csv":
+                self.csv.writerow((nombre, descripcion, *ejercicio))
+                continue
+            if self.rutina is None or self.rutina_id != rutina_id:
+                self._cerrar_rutina()
+                self.rutina_id = rutina_id
+                self.rutina = {"nombre": nombre, "descripcion": descripcion, "ejercicios": []}
+            if ejercicio[0] is not None:
+                self.rutina["ejercicios"].append(dict(zip(CAMPOS_EJERCICIO, ejercicio)))
+        # La última rutina de NDJSON se escribe cuando llega la siguiente (o en fin())
+        return self._vaciar()
+
+    def fin(self) -> str:
+        self._cerrar_rutina()
+        return self._vaciar()
+
+
+def exportar_en(conn: Connection, tenant_id: int, formato: str) -> Iterator[str]:
+    """
+    Como exportar_sincrono, sobre una conexión ya abierta: trabajos.py
+    escribe el archivo por la misma (en SQLite, otra conexión no podría
+    hacer commit mientras el cursor esté abierto).
+    """
+    exportador = _Exportador(formato)
+    resultado = conn.execution_options(stream_results=True, yield_per=LOTE_LECTURA).execute(
+        consulta_exportacion(tenant_id)
+    )
+    for filas in resultado.partitions():
+        yield exportador.bloque(filas)
+    yield exportador.fin()
+
+
+def exportar_sincrono(motor: Engine, tenant_id: int, formato: str) -> Iterator[str]:
+    with motor.connect() as conn:
+        yield from exportar_en(conn, tenant_id, formato)
+
+
+async def _exportar_async(motor: AsyncEngine, tenant_id: int, formato: str) -> AsyncIterator[str]:
+    exportador = _Exportador(formato)
+    async with motor.connect() as conn:
+        resultado = await conn.stream(consulta_exportacion(tenant_id).execution_options(yield_per=LOTE_LECTURA))
+        async for filas in resultado.partitions():
+            yield exportador.bloque(filas)
+    yield exportador.fin()
+
+
+async def exportar(motor: Engine | AsyncEngine, tenant_id: int, formato: str) -> AsyncIterator[bytes]:
+    """
+    Todas las rutinas del tenant con sus ejercicios, a trozos. Usa su propia
+    conexión del motor: la respuesta se sigue enviando después de que el endpoint termine.
+    """
+    if isinstance(motor, AsyncEngine):
+        trozos = _exportar_async(motor, tenant_id, formato)
+    else:
+        # Cada trozo se lee del cursor en el threadpool
+        trozos = iterate_in_threadpool(exportar_sincrono(motor, tenant_id, formato))
+    async for texto in trozos:
+        if texto:
+            yield texto.encode()
+
+
+# ============ IMPORTACIÓN ============
+
+def _mensaje(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in detalle['loc']) or 'línea'}: {detalle['msg']}"
+        for detalle in error.errors()
+    )
+
+
+async def _lineas(trozos: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Líneas completas del cuerpo, decodificadas como UTF-8 según llegan"""
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    pendiente = ""
+    async for trozo in trozos:
+        pendiente += decodificador.decode(trozo)
+        *lineas, pendiente = pendiente.split("\n")
+        for linea in lineas:
+            yield linea.removesuffix("\r")
+    pendiente += decodificador.decode(b"", final=True)
+    if pendiente:
+        yield pendiente.removesuffix("\r")
+
+
+async def _rutinas_ndjson(lineas: AsyncIterator[str]):
+    """(línea, RutinaExportada o None, error o None) por cada línea no vacía"""
+    numero = 0
+    async for linea in lineas:
+        numero += 1
+        if not linea.strip():
+            continue
+        try:
+            yield numero, RutinaExportada.model_validate_json(linea), None
+        except ValidationError as error:
+            yield numero, None, {"linea": numero, "rutina": None, "error": _mensaje(error)}
+
+
+async def _registros_csv(lineas: AsyncIterator[str]):
+    """
+    (línea donde empieza, campos, error) de cada registro; un campo entre
+    comillas puede ocupar varias líneas.
+    """
+    numero, inicio, partes = 0, 0, []
+    async for linea in lineas:
+        numero += 1
+        if not partes:
+            inicio = numero
+        partes.append(linea)
+        if sum(parte.count('"') for parte in partes) % 2:
+            continue  # Comillas sin cerrar: el registro sigue en la línea siguiente
+        registro, partes = "\n".join(partes), []
+        if registro.strip():
+            try:
+                yield inicio, next(csv.reader([registro])), None
+            except csv.Error as error:
+                yield inicio, None, str(error)
+    if partes:
+        yield inicio, None, "Comillas sin cerrar al final del archivo"
+
+
+async def _rutinas_csv(lineas: AsyncIterator[str]):
+    """
+    Agrupa las filas consecutivas de la misma rutina. Si alguna fila tiene
+    errores, la rutina entera se descarta y se informa de cada fila.
+    """
+    registros = _registros_csv(lineas)
+    cabecera = None
+    actual = None  # [línea, nombre, descripcion, ejercicios, errores]
+
+    def terminar():
+        linea, nombre, descripcion, ejercicios, errores = actual
+        if errores:
+            return linea, None, {"linea": linea, "rutina": nombre, "error": "; ".join(errores)}
+        try:
+            return linea, RutinaExportada(nombre=nombre, descripcion=descripcion, ejercicios=ejercicios), None
+        except ValidationError as error:
+            return linea, None, {"linea": linea, "rutina": nombre, "error": _mensaje(error)}
+
+    async for numero, campos, error in registros:
+        if error is not None:
+            if actual is None:
+                yield numero, None, {"linea": numero, "rutina": None, "error": error}
+            else:
+                actual[4].append(f"línea {numero}: {error}")
+            continue
+        if cabecera is None:
+            cabecera = [campo.strip() for campo in campos]
+            faltan = [columna for columna in COLUMNAS_CSV if columna not in cabecera]
+            if faltan:
+                error = f"Faltan columnas en la cabecera: {', '.join(faltan)}"
+                yield numero, None, {"linea": numero, "rutina": None, "error": error}
+                return
+            continue
+        fila = dict(zip_longest(cabecera, campos, fillvalue=""))
+        nombre, descripcion = fila["rutina"], fila["descripcion_rutina"] or None
+        if actual is None or actual[1] != nombre:
+            if actual is not None:
+                yield terminar()
+            actual = [numero, nombre, descripcion, [], []]
+        if not fila["nombre"]:
+            continue  # Rutina sin ejercicios
+        try:
+            # Las columnas vacías toman el valor por defecto (peso y notas: None)
+            actual[3].append(EjercicioCreate.model_validate(
+                {campo: fila[campo] for campo in CAMPOS_EJERCICIO if fila[campo] != ""}
+            ))
+        except ValidationError as error:
+            actual[4].append(f"línea {numero}: {_mensaje(error)}")
+    if actual is not None:
+        yield terminar()
+
+
+def guardar_lote(
+    db: Session, tenant_id: int, lote: list[tuple[int, RutinaExportada]], usuario_id: Optional[int] = None
+) -> dict:
+    """
+    Inserta un lote de rutinas en el tenant con sus ejercicios y su resumen en
+    una transacción. Las rutinas cuyo nombre ya existe en el tenant se
+    devuelven como errores.
+    """
+    # Un nombre repetido dentro del mismo lote: solo vale la primera
+    errores, vistos, filas = [], set(), []
+    for linea, rutina in lote:
+        clave = rutina.nombre.lower()
+        if clave in vistos:
+            errores.append({"linea": linea, "rutina": rutina.nombre, "error": "Nombre repetido en el archivo"})
+            continue
+        vistos.add(clave)
+        filas.append((linea, rutina))
+
+    dialectos = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+    insertar = dialectos.get(db.get_bind().dialect.name)
+    if insertar is not None:
+        # ON CONFLICT DO NOTHING (índice único (tenant_id, lower(nombre))): las que ya existen no devuelven id
+        sentencia = insertar(Rutina).on_conflict_do_nothing()
+    else:
+        existentes = set(db.scalars(
+            select(func.lower(Rutina.nombre))
+            .where(filtro_tenant(Rutina, tenant_id), func.lower(Rutina.nombre).in_(vistos))
+        ))
+        filas = [(linea, rutina) for linea, rutina in filas if rutina.nombre.lower() not in existentes]
+        sentencia = insert(Rutina)
+
+    ids = {}
+    if filas:
+        ids = {
+            nombre.lower(): rutina_id
+            for rutina_id, nombre in db.execute(
+                sentencia.returning(Rutina.id, Rutina.nombre),
+                [
+                    {"nombre": rutina.nombre, "descripcion": rutina.descripcion,
+                     "tenant_id": tenant_id, "usuario_id": usuario_id}
+                    for _, rutina in filas
+                ],
+            )
+        }
+
+    ejercicios = []
+    for linea, rutina in filas:
+        rutina_id = ids.get(rutina.nombre.lower())
+        if rutina_id is None:
+            errores.append({"linea": linea, "rutina": rutina.nombre, "error": "Ya existe una rutina con ese nombre"})
+            continue
+        ejercicios.extend(
+            {**ejercicio.model_dump(), "rutina_id": rutina_id, "tenant_id": tenant_id} for ejercicio in rutina.ejercicios
+        )
+
+    if ejercicios:
+        # Con la conexión (Core) y no con la sesión: sin el paso del ORM por cada fila
+        db.connection().execute(insert(Ejercicio.__table__), ejercicios)
+    if ids:
+        crear_resumenes(db, list(ids.values()))
+    db.commit()
+
+    return {"rutinas": len(ids), "ejercicios": len(ejercicios), "errores": errores}
+
+
+async def importar(trozos: AsyncIterator[bytes], formato: str, guardar) -> dict:
+    """
+    Lee el archivo a trozos y llama a `await guardar(lote)` cada
+    LOTE_ESCRITURA rutinas válidas. Devuelve los totales y los errores.
+    """
+    lineas = _lineas(trozos)
+    rutinas = _rutinas_csv(lineas) if formato == "csv" else _rutinas_ndjson(lineas)
+    informe = {"rutinas_importadas": 0, "ejercicios_importados": 0, "total_errores": 0, "errores": []}
+
+    def anotar_error(error: dict):
+        informe["total_errores"] += 1
+        if len(informe["errores"]) < MAX_ERRORES:
+            informe["errores"].append(error)
+
+    async def escribir(lote):
+        resultado = await guardar(lote)
+        informe["rutinas_importadas"] += resultado["rutinas"]
+        informe["ejercicios_importados"] += resultado["ejercicios"]
+        for error in resultado["errores"]:
+            anotar_error(error)
+
+    lote = []
+    async for linea, rutina, error in rutinas:
+        if error is not None:
+            anotar_error(error)
+            continue
+        lote.append((linea, rutina))
+        if len(lote) >= LOTE_ESCRITURA:
+            await escribir(lote)
+            lote = []
+    if lote:
+        await escribir(lote)
+    return informe
@@ -0,0 +1,313 @@
+"""
+Instrumentación de peticiones y de la base de datos.
+
+- MiddlewareMetricas (ASGI puro) mide cada petición y la agrupa por la ruta
+  declarada (/api/rutinas/{rutina_id}), no por la URL concreta.
+- Los eventos de SQLAlchemy sobre database.MOTORES suman a la petición en
+  curso (contextvar) las sentencias y su tiempo, y registran en el log las
+  consultas que superan SQL_UMBRAL_LENTA_MS.
+- La espera para obtener una conexión del pool se mide envolviendo
+  Pool._do_get.
+
+Todo se expone en /metrics con el formato de texto de Prometheus. Los
+valores son por proceso: con varios workers de uvicorn cada uno tiene los
+suyos (Prometheus los suma al consultarlos).
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, text
+from starlette.concurrency import run_in_threadpool
+
+from app.config import ajustes
+
+logger = logging.getLogger(__name__)
+
+SQL_UMBRAL_LENTA_MS = ajustes.sql_umbral_lenta_ms
+SALUD_TIMEOUT_SEGUNDOS = ajustes.salud_timeout_segundos
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_SENTENCIAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+# ============ REGISTRO ============
+
+class Histograma:
+    """Histograma acumulativo por combinación de etiquetas"""
+
+    def __init__(self, nombre: str, ayuda: str, buckets: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self._series = {}  # etiquetas -> [conteos por bucket..., +Inf, suma]
+
+    def observar(self, valor: float, **etiquetas):
+        clave = tuple(sorted(etiquetas.items()))
+        with _lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [0] * (len(self.buckets) + 2)
+            serie[bisect_left(self.buckets, valor)] += 1
+            serie[-1] += valor
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for clave, serie in sorted(self._series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ("+Inf",), serie):
+                acumulado += conteo
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(clave + (('le', limite),))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(clave)} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(clave)} {acumulado}")
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._series = {}
+
+    def incrementar(self, **etiquetas):
+        clave = tuple(sorted(etiquetas.items()))
+        with _lock:
+            self._series[clave] = self._series.get(clave, 0) + 1
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for clave, valor in sorted(self._series.items()):
+            lineas.append(f"{self.nombre}{_etiquetas(clave)} {valor}")
+        return lineas
+
+
+def _etiquetas(clave) -> str:
+    if not clave:
+        return ""
+    pares = []
+    for nombre, valor in clave:
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+_lock = threading.Lock()
+
+peticiones_total = Contador("gym_http_peticiones_total", "Peticiones HTTP atendidas")
+duracion_peticion = Histograma(
+    "gym_http_duracion_segundos", "Duración de las peticiones HTTP", BUCKETS_SEGUNDOS
+)
+sentencias_peticion = Histograma(
+    "gym_sql_sentencias_por_peticion", "Sentencias SQL ejecutadas por petición", BUCKETS_SENTENCIAS
+)
+tiempo_sql_peticion = Histograma(
+    "gym_sql_segundos_por_peticion", "Tiempo total en la base de datos por petición", BUCKETS_SEGUNDOS
+)
+duracion_sentencia = Histograma(
+    "gym_sql_duracion_segundos", "Duración de cada sentencia SQL", BUCKETS_SEGUNDOS
+)
+consultas_lentas = Contador("gym_sql_consultas_lentas_total", "Sentencias por encima de SQL_UMBRAL_LENTA_MS")
+espera_pool = Histograma(
+    "gym_pool_espera_segundos", "Espera para obtener una conexión del pool", BUCKETS_SEGUNDOS
+)
+eventos_publicados = Contador("gym_eventos_publicados_total", "Eventos de cambios publicados por tipo")
+eventos_desbordes = Contador(
+    "gym_eventos_desbordes_total", "Suscriptores lentos cuya cola se llenó (se les envió resync)"
+)
+
+METRICAS = [
+    peticiones_total, duracion_peticion, sentencias_peticion, tiempo_sql_peticion,
+    duracion_sentencia, consultas_lentas, espera_pool, eventos_publicados, eventos_desbordes,
+]
+
+
+# ============ PETICIÓN EN CURSO ============
+
+@dataclass
+class EstadoPeticion:
+    sentencias: int = 0
+    segundos_sql: float = 0.0
+
+
+# El threadpool y run_sync() copian el contexto: el objeto es el mismo
+_peticion: contextvars.ContextVar[Optional[EstadoPeticion]] = contextvars.ContextVar(
+    "peticion_metricas", default=None
+)
+
+
+def _ruta(scope) -> str:
+    """Plantilla de la ruta que atendió la petición (baja cardinalidad)"""
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return "sin_ruta"
+    rutas = getattr(app.state, "rutas_por_endpoint", None)
+    if rutas is None:
+        rutas = app.state.rutas_por_endpoint = {
+            getattr(r, "endpoint", None): r.path for r in app.routes
+        }
+    return rutas.get(endpoint, "sin_ruta")
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro: no envuelve la respuesta, solo lee el estado"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        estado = EstadoPeticion()
+        token = _peticion.set(estado)
+        codigo = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _peticion.reset(token)
+            duracion = time.perf_counter() - inicio
+            ruta = _ruta(scope)
+            metodo = scope["method"]
+            peticiones_total.incrementar(metodo=metodo, ruta=ruta, estado=codigo)
+            duracion_peticion.observar(duracion, metodo=metodo, ruta=ruta)
+            sentencias_peticion.observar(estado.sentencias, ruta=ruta)
+            tiempo_sql_peticion.observar(estado.segundos_sql, ruta=ruta)
+
+
+# ============ BASE DE DATOS ============
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicios_metricas", []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    duracion = time.perf_counter() - conn.info["inicios_metricas"].pop()
+    duracion_sentencia.observar(duracion)
+
+    estado = _peticion.get()
+    if estado is not None:
+        estado.sentencias += 1
+        estado.segundos_sql += duracion
+
+    if duracion * 1000 >= SQL_UMBRAL_LENTA_MS:
+        consultas_lentas.incrementar()
+        logger.warning("Consulta lenta (%.1f ms): %s", duracion * 1000, " ".join(statement.split())[:500])
+
+
+def _error(contexto):
+    # Una sentencia que falla no llega a after_cursor_execute
+    if contexto.connection is not None and contexto.connection.info.get("inicios_metricas"):
+        contexto.connection.info["inicios_metricas"].pop()
+
+
+def _medir_checkout(pool, motor: str):
+    """Envuelve Pool._do_get, que es donde se espera si el pool está agotado"""
+    original = pool._do_get
+
+    def _do_get():
+        inicio = time.perf_counter()
+        try:
+            return original()
+        finally:
+            espera_pool.observar(time.perf_counter() - inicio, motor=motor)
+
+    pool._do_get = _do_get
+
+
+_instrumentados = set()
+
+
+def instrumentar(motores):
+    """Registra los eventos y la medición del pool en cada motor (una vez)"""
+    for motor in motores:
+        if motor in _instrumentados:
+            continue
+        event.listen(motor, "before_cursor_execute", _antes)
+        event.listen(motor, "after_cursor_execute", _despues)
+        event.listen(motor, "handle_error", _error)
+        _medir_checkout(motor.pool, _nombre_motor(motor))
+        _instrumentados.add(motor)
+
+
+def _nombre_motor(motor) -> str:
+    return motor.url.get_driver_name() or motor.dialect.name
+
+
+def estado_pools(motores):
+    """Conexiones en uso y capacidad de cada pool (None si el pool no las expone)"""
+    estados = {}
+    for motor in motores:
+        pool = motor.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        maximo_extra = getattr(pool, "_max_overflow", 0)
+        estados[_nombre_motor(motor)] = {
+            "en_uso": pool.checkedout(),
+            "libres": pool.checkedin(),
+            "tamano": pool.size(),
+            "desborde": pool.overflow(),
+            # max_overflow=-1 significa sin límite
+            "maximo": None if maximo_extra < 0 else pool.size() + maximo_extra,
+        }
+    return estados
+
+
+def exportar(motores) -> str:
+    """Todas las métricas en el formato de texto de Prometheus"""
+    with _lock:
+        lineas = [linea for metrica in METRICAS for linea in metrica.exportar()]
+
+    lineas += ["# HELP gym_pool_conexiones Conexiones del pool por estado", "# TYPE gym_pool_conexiones gauge"]
+    for motor, estado in estado_pools(motores).items():
+        for clave in ("en_uso", "libres", "tamano", "desborde", "maximo"):
+            if estado[clave] is not None:
+                lineas.append(f"gym_pool_conexiones{_etiquetas((('motor', motor), ('estado', clave)))} {estado[clave]}")
+    return "\n".join(lineas) + "\n"
+
+
+# ============ SALUD ============
+
+async def comprobar_salud(motor_sincrono, motor_async=None):
+    """
+    Probe de readiness: el pool no está agotado y la BD responde a SELECT 1
+    en menos de SALUD_TIMEOUT_SEGUNDOS. Devuelve (listo, detalle).
+    """
+    motores = [motor_sincrono] + ([motor_async.sync_engine] if motor_async else [])
+    pools = estado_pools(motores)
+    detalle = {"bd": "ok", "pools": pools}
+
+    agotados = [m for m, e in pools.items() if e["maximo"] is not None and e["en_uso"] >= e["maximo"]]
+    if agotados:
+        detalle["bd"] = f"pool agotado: {', '.join(agotados)}"
+        return False, detalle
+
+    async def ping():
+        if motor_async is not None:
+            async with motor_async.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        else:
+            def consultar():
+                with motor_sincrono.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            await run_in_threadpool(consultar)
+
+    try:
+        await asyncio.wait_for(ping(), SALUD_TIMEOUT_SEGUNDOS)
+    except Exception as error:
+        detalle["bd"] = f"error: {type(error).__name__}"
+        return False, detalle
+    return True, detalle
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import BigInteger, Boolean, Column, Date, Float, Integer, JSON, LargeBinary, SmallInteger, String, Text, DateTime, ForeignKey, Index, false, func, true, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -16,17 +16,83 @@ class DiaEnum(str, enum.Enum):
     SABADO = "Sábado"
     DOMINGO = "Domingo"
 
+# Tenant (gimnasio u organización): cada uno ve y modifica solo sus rutinas
+class Tenant(Base):
+    __tablename__ = "tenants"
+    
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(100), nullable=False)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<Tenant(id={self.id}, nombre={self.nombre})>"
+
+# Usuario de un tenant (la autenticación la hace el gateway, ver tenants.py)
+class Usuario(Base):
+    __tablename__ = "usuarios"
+    
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
+    nombre = Column(String(100), nullable=False)
+    email = Column(String(255), nullable=False)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<Usuario(id={self.id}, tenant_id={self.tenant_id}, email={self.email})>"
+
 # Modelo de Rutina
 class Rutina(Base):
     __tablename__ = "rutinas"
     
     id = Column(Integer, primary_key=True, index=True)
-    nombre = Column(String(100), unique=True, nullable=False, index=True)
+    nombre = Column(String(100), nullable=False)
     descripcion = Column(Text, nullable=True)
     fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Se incrementa en cada modificación para detectar cambios concurrentes
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Última modificación de la rutina o de sus ejercicios (NULL: no cambió desde
+    # fecha_creacion). Es el Last-Modified del detalle y del plan.
+    updated_at = Column(DateTime, nullable=True, onupdate=datetime.utcnow)
+    # Dueños: el tenant (obligatorio) y el usuario que la creó (si se conoce)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True)
+    # Plantilla de la biblioteca del tenant: sus ejercicios no se modifican (ver plantillas.py)
+    es_plantilla = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Plantilla cuyos ejercicios comparte esta rutina hasta que se modifican (copy-on-write)
+    plantilla_id = Column(Integer, ForeignKey("rutinas.id"), nullable=True)
+    # Borrado lógico: la rutina está en la papelera desde esta fecha (ver papelera.py)
+    deleted_at = Column(DateTime, nullable=True)
+    
+    # Relación con ejercicios (uno a muchos), siempre ordenados por "orden"
+    ejercicios = relationship(
+        "Ejercicio",
+        back_populates="rutina",
+        cascade="all, delete-orphan",
+        order_by="(Ejercicio.orden, Ejercicio.id)"
+    )
+    
+    # Totales precalculados para los listados (se cargan solo bajo pedido)
+    resumen = relationship("RutinaResumen", uselist=False, cascade="all, delete-orphan")
     
-    # Relación con ejercicios (uno a muchos)
-    ejercicios = relationship("Ejercicio", back_populates="rutina", cascade="all, delete-orphan")
+    # Todas las consultas filtran por tenant_id: los índices empiezan por él,
+    # así cada tenant recorre solo sus filas sin importar cuántos haya. Son
+    # parciales: las rutinas de la papelera no ocupan sitio en ellos
+    __table_args__ = (
+        # Paginación por cursor (keyset) sobre (fecha_creacion, id) y (nombre, id)
+        Index(
+            "ix_rutinas_tenant_fecha_id", "tenant_id", "fecha_creacion", "id",
+            postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)
+        ),
+        Index(
+            "ix_rutinas_tenant_nombre_id", "tenant_id", "nombre", "id",
+            postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)
+        ),
+        # Rutinas de un usuario, por fecha
+        Index(
+            "ix_rutinas_tenant_usuario_fecha", "tenant_id", "usuario_id", "fecha_creacion", "id",
+            postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)
+        ),
+    )
     
     def __repr__(self):
         return f"<Rutina(id={self.id}, nombre={self.nombre})>"
@@ -43,12 +109,242 @@ class Ejercicio(Base):
     peso = Column(Integer, nullable=True)  # En kilogramos, puede ser null
     notas = Column(Text, nullable=True)
     orden = Column(Integer, nullable=False, default=0)
+    # Se incrementa en cada modificación (If-Match en PATCH)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Llave foránea
     rutina_id = Column(Integer, ForeignKey("rutinas.id", ondelete="CASCADE"), nullable=False)
+    # El de su rutina, repetido para que los índices de búsqueda empiecen por tenant_id
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
     
     # Relación con rutina
     rutina = relationship("Rutina", back_populates="ejercicios")
     
+    __table_args__ = (
+        # Carga ordenada del detalle y borrado en cascada por rutina_id
+        Index("ix_ejercicios_rutina_orden", "rutina_id", "orden", "id"),
+        # Vista del plan por día
+        Index("ix_ejercicios_rutina_dia_orden", "rutina_id", "dia_semana", "orden"),
+    )
+    
+    def __repr__(self):
+        return f"<Ejercicio(id={self.id}, nombre={self.nombre}, dia={self.dia_semana})>"
+
+# Totales de una rutina, mantenidos por plan.refrescar_resumen en cada
+# cambio de sus ejercicios (las tarjetas del listado no cargan el detalle)
+class RutinaResumen(Base):
+    __tablename__ = "rutina_resumen"
+    
+    rutina_id = Column(Integer, ForeignKey("rutinas.id", ondelete="CASCADE"), primary_key=True)
+    num_ejercicios = Column(Integer, nullable=False, default=0, server_default="0")
+    num_dias = Column(Integer, nullable=False, default=0, server_default="0")
+    series = Column(Integer, nullable=False, default=0, server_default="0")
+    repeticiones = Column(Integer, nullable=False, default=0, server_default="0")
+    volumen = Column(BigInteger, nullable=False, default=0, server_default="0")  # series × repeticiones × peso
+    
+    def __repr__(self):
+        return f"<RutinaResumen(rutina_id={self.rutina_id}, ejercicios={self.num_ejercicios})>"
+
+# Estados de un trabajo en segundo plano (ver trabajos.py)
+ESTADOS_TRABAJO = ("pendiente", "en_curso", "completado", "fallido", "cancelado")
+
+# Trabajo en segundo plano: la tabla es la cola (sin broker). Lo reclama y
+# ejecuta el despachador de trabajos.py
+class Trabajo(Base):
+    __tablename__ = "trabajos"
+    
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True)
+    tipo = Column(String(30), nullable=False)
+    estado = Column(String(20), nullable=False, default="pendiente", server_default="pendiente")
+    parametros = Column(JSON, nullable=True)
+    # Archivo recibido (importar); el generado por exportar va en trabajos_trozos
+    entrada = Column(LargeBinary, nullable=True)
+    resultado = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    # Avance en las unidades de cada tipo (bytes, rutinas, clones); total NULL si no se conoce
+    hecho = Column(Integer, nullable=False, default=0, server_default="0")
+    total = Column(Integer, nullable=True)
+    intentos = Column(Integer, nullable=False, default=0, server_default="0")
+    max_intentos = Column(Integer, nullable=False, default=3, server_default="3")
+    # Cancelación pedida mientras estaba en curso (se atiende en el siguiente progreso)
+    cancelar = Column(Boolean, nullable=False, default=False, server_default=false())
+    # No se reclama antes de esta fecha (espera entre reintentos)
+    disponible_en = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Lo renueva el despachador mientras el trabajo está en curso
+    latido = Column(DateTime, nullable=True)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    iniciado_en = Column(DateTime, nullable=True)
+    terminado_en = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Trabajos del tenant, los más recientes primero
+        Index("ix_trabajos_tenant_fecha_id", "tenant_id", "fecha_creacion", "id"),
+        # Limpieza de los terminados (ver trabajos.TRABAJOS_RETENCION_HORAS)
+        Index("ix_trabajos_terminado_en", "terminado_en"),
+    )
+    
     def __repr__(self):
-        return f"<Ejercicio(id={self.id}, nombre={self.nombre}, dia={self.dia_semana})>"
\ No newline at end of file
+        return f"<Trabajo(id={self.id}, tipo={self.tipo}, estado={self.estado})>"
+
+# Archivo generado por un trabajo "exportar", en trozos de como mucho
+# trabajos.TROZO_SALIDA bytes: se escribe y se descarga sin tenerlo entero en
+# memoria. Cada intento escribe los suyos; vale el del intento que completó el trabajo
+class TrozoSalida(Base):
+    __tablename__ = "trabajos_trozos"
+    
+    trabajo_id = Column(Integer, ForeignKey("trabajos.id", ondelete="CASCADE"), primary_key=True)
+    intento = Column(Integer, primary_key=True)
+    numero = Column(Integer, primary_key=True)
+    datos = Column(LargeBinary, nullable=False)
+    
+    def __repr__(self):
+        return f"<TrozoSalida(trabajo_id={self.trabajo_id}, intento={self.intento}, numero={self.numero})>"
+
+# Sesión de entrenamiento: lo que se hizo (las series, en SerieRealizada), no
+# lo planificado. La registra entrenamientos.py de una vez con todas sus series
+# y ya no se modifica: los totales se calculan al registrarla
+class SesionEntrenamiento(Base):
+    __tablename__ = "sesiones"
+    
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True)
+    rutina_id = Column(Integer, ForeignKey("rutinas.id", ondelete="SET NULL"), nullable=True)
+    # Identificador que genera el cliente: reenviar una sesión grabada sin conexión no la duplica
+    cliente_id = Column(String(64), nullable=False)
+    iniciada_en = Column(DateTime, nullable=False)
+    # Todas sus series están entre iniciada_en y terminada_en (acota las particiones que se leen)
+    terminada_en = Column(DateTime, nullable=False)
+    notas = Column(Text, nullable=True)
+    num_series = Column(Integer, nullable=False)
+    repeticiones = Column(Integer, nullable=False)
+    volumen = Column(BigInteger, nullable=False)  # Σ repeticiones × peso
+    fecha_registro = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ux_sesiones_tenant_cliente", "tenant_id", "cliente_id", unique=True),
+        # Sesiones del tenant y de cada usuario, las más recientes primero
+        Index("ix_sesiones_tenant_fecha_id", "tenant_id", "iniciada_en", "id"),
+        Index("ix_sesiones_tenant_usuario_fecha", "tenant_id", "usuario_id", "iniciada_en", "id"),
+    )
+    
+    def __repr__(self):
+        return f"<SesionEntrenamiento(id={self.id}, tenant_id={self.tenant_id}, iniciada_en={self.iniciada_en})>"
+
+# Serie realizada en una sesión. Tabla de solo inserción, la más grande con
+# diferencia: en PostgreSQL está particionada por mes de realizada_en (las
+# particiones las crea entrenamientos.py). La clave primaria (sesion_id,
+# orden, realizada_en) incluye la columna de partición, como exige PostgreSQL,
+# y sirve también para leer una sesión. Sin claves foráneas: insertar no
+# consulta otras tablas y el historial se conserva aunque se borren el
+# ejercicio o su rutina. tenant_id y usuario_id se copian de la sesión para
+# filtrar sin join
+class SerieRealizada(Base):
+    __tablename__ = "series_realizadas"
+    
+    sesion_id = Column(Integer, primary_key=True, autoincrement=False)
+    orden = Column(SmallInteger, primary_key=True, autoincrement=False)  # Posición en la sesión
+    realizada_en = Column(DateTime, primary_key=True)
+    tenant_id = Column(Integer, nullable=False)
+    usuario_id = Column(Integer, nullable=True)
+    ejercicio_id = Column(Integer, nullable=False)
+    repeticiones = Column(Integer, nullable=False)
+    peso = Column(Integer, nullable=True)  # En kilogramos
+    
+    __table_args__ = (
+        # Historial de un ejercicio (del tenant o de un usuario) por rango de fechas
+        Index("ix_series_tenant_ejercicio_usuario_fecha", "tenant_id", "ejercicio_id", "usuario_id", "realizada_en"),
+        # Rangos de fechas de todo el tenant: en PostgreSQL un BRIN (unos pocos
+        # bloques por partición: las filas llegan más o menos en orden de fecha)
+        Index("ix_series_realizada_en", "realizada_en", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (realizada_en)"},
+    )
+    
+    def __repr__(self):
+        return f"<SerieRealizada(sesion_id={self.sesion_id}, orden={self.orden}, ejercicio_id={self.ejercicio_id})>"
+
+# Progreso de cada usuario en cada ejercicio: totales y récords de sus series
+# realizadas. progreso.py lo actualiza en la misma transacción que inserta las
+# series; se puede reconstruir entero desde series_realizadas, así que, como
+# ellas, no tiene claves foráneas. La clave primaria sirve para leer el de un
+# ejercicio y todos los de un usuario
+class ProgresoEjercicio(Base):
+    __tablename__ = "progreso_ejercicios"
+    
+    tenant_id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, primary_key=True, autoincrement=False)
+    ejercicio_id = Column(Integer, primary_key=True, autoincrement=False)
+    series = Column(Integer, nullable=False)
+    repeticiones = Column(Integer, nullable=False)
+    volumen = Column(BigInteger, nullable=False)  # Σ repeticiones × peso
+    peso_maximo = Column(Integer, nullable=True)
+    peso_maximo_en = Column(DateTime, nullable=True)  # Primera serie con ese peso
+    mejor_1rm = Column(Float, nullable=True)  # 1RM estimado (Epley) más alto
+    mejor_1rm_en = Column(DateTime, nullable=True)
+    primera_serie_en = Column(DateTime, nullable=False)
+    ultima_serie_en = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return (
+            f"<ProgresoEjercicio(usuario_id={self.usuario_id}, ejercicio_id={self.ejercicio_id}, "
+            f"peso_maximo={self.peso_maximo})>"
+        )
+
+# Progreso semanal (semanas de lunes a domingo, en UTC) de cada usuario en
+# cada ejercicio: la tendencia de las últimas semanas es un rango de la clave
+class ProgresoSemanal(Base):
+    __tablename__ = "progreso_semanas"
+    
+    tenant_id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, primary_key=True, autoincrement=False)
+    ejercicio_id = Column(Integer, primary_key=True, autoincrement=False)
+    semana = Column(Date, primary_key=True)  # Lunes de la semana
+    series = Column(Integer, nullable=False)
+    repeticiones = Column(Integer, nullable=False)
+    volumen = Column(BigInteger, nullable=False)
+    peso_maximo = Column(Integer, nullable=True)
+    mejor_1rm = Column(Float, nullable=True)
+    
+    def __repr__(self):
+        return f"<ProgresoSemanal(usuario_id={self.usuario_id}, ejercicio_id={self.ejercicio_id}, semana={self.semana})>"
+
+# Nombre de rutina único dentro de cada tenant, sin distinguir mayúsculas/minúsculas
+# (las de la papelera no lo reservan)
+Index(
+    "ux_rutinas_tenant_nombre_lower", Rutina.tenant_id, func.lower(Rutina.nombre), unique=True,
+    postgresql_where=Rutina.deleted_at.is_(None), sqlite_where=Rutina.deleted_at.is_(None)
+)
+Index("ux_tenants_nombre_lower", func.lower(Tenant.nombre), unique=True)
+Index("ux_usuarios_tenant_email_lower", Usuario.tenant_id, func.lower(Usuario.email), unique=True)
+# Índices parciales: las plantillas del tenant (pocas entre muchas rutinas) y
+# las rutinas que comparten cada plantilla
+Index(
+    "ix_rutinas_tenant_plantillas", Rutina.tenant_id, Rutina.fecha_creacion, Rutina.id,
+    postgresql_where=(Rutina.es_plantilla == true()) & Rutina.deleted_at.is_(None),
+    sqlite_where=(Rutina.es_plantilla == true()) & Rutina.deleted_at.is_(None)
+)
+Index(
+    "ix_rutinas_plantilla_id", Rutina.plantilla_id,
+    postgresql_where=Rutina.plantilla_id.isnot(None), sqlite_where=Rutina.plantilla_id.isnot(None)
+)
+# Papelera: la del tenant, por fecha de borrado, y todas para la purga
+Index(
+    "ix_rutinas_tenant_eliminadas", Rutina.tenant_id, Rutina.deleted_at, Rutina.id,
+    postgresql_where=Rutina.deleted_at.isnot(None), sqlite_where=Rutina.deleted_at.isnot(None)
+)
+Index(
+    "ix_rutinas_eliminadas", Rutina.deleted_at,
+    postgresql_where=Rutina.deleted_at.isnot(None), sqlite_where=Rutina.deleted_at.isnot(None)
+)
+# Cola de trabajos: solo los pendientes (por fecha en que se pueden reclamar)
+# y los que están en curso (por latido, para detectar workers caídos)
+Index(
+    "ix_trabajos_pendientes", Trabajo.disponible_en, Trabajo.id,
+    postgresql_where=Trabajo.estado == "pendiente", sqlite_where=Trabajo.estado == "pendiente"
+)
+Index(
+    "ix_trabajos_en_curso", Trabajo.latido,
+    postgresql_where=Trabajo.estado == "en_curso", sqlite_where=Trabajo.estado == "en_curso"
+)
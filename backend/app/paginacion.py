@@ -0,0 +1,98 @@
+"""
+Paginación por cursor (keyset) para el listado de rutinas.
+
+En lugar de OFFSET, cada página continúa desde la última fila de la anterior
+usando la tupla (clave de orden, id). Así la consulta siempre usa el índice
+y el costo por página no depende del tamaño de la tabla.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Literal
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from app.models import Rutina
+
+# Claves de orden permitidas: nombre -> (columna, descendente)
+ORDENES = {
+    "fecha_creacion": (Rutina.fecha_creacion, False),
+    "-fecha_creacion": (Rutina.fecha_creacion, True),
+    "nombre": (Rutina.nombre, False),
+    "-nombre": (Rutina.nombre, True),
+}
+
+OrdenRutinas = Literal["fecha_creacion", "-fecha_creacion", "nombre", "-nombre"]
+
+ORDEN_POR_DEFECTO = "fecha_creacion"
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+
+def codificar_cursor(orden: str, rutina) -> str:
+    """Genera un cursor opaco a partir de la última rutina de la página"""
+    columna, _ = ORDENES[orden]
+    valor = getattr(rutina, columna.key)
+    if isinstance(valor, datetime):
+        valor = valor.isoformat()
+    datos = json.dumps({"o": orden, "v": valor, "id": rutina.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, orden: str):
+    """Devuelve la tupla (valor, id) codificada en el cursor"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        valor, ultimo_id = datos["v"], int(datos["id"])
+        orden_cursor = datos["o"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    if orden_cursor != orden:
+        raise HTTPException(
+            status_code=400,
+            detail="El cursor no corresponde al orden solicitado"
+        )
+
+    # El valor se compara con la columna en SQL: solo texto (nombre) o una
+    # fecha ISO (fecha_creacion), nunca listas, objetos o números
+    if not isinstance(valor, str):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    columna, _ = ORDENES[orden]
+    if columna is Rutina.fecha_creacion:
+        try:
+            valor = datetime.fromisoformat(valor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    return valor, ultimo_id
+
+
+def paginar(query, orden: str, limite: int, cursor: str | None = None):
+    """
+    Aplica orden, cursor y límite a una consulta de rutinas (objetos Rutina
+    o filas con sus columnas).
+    Devuelve (rutinas, next_cursor); next_cursor es None en la última página.
+    """
+    columna, descendente = ORDENES[orden]
+
+    if cursor:
+        valor, ultimo_id = decodificar_cursor(cursor, orden)
+        clave = tuple_(columna, Rutina.id)
+        query = query.filter(clave < (valor, ultimo_id) if descendente else clave > (valor, ultimo_id))
+
+    if descendente:
+        query = query.order_by(columna.desc(), Rutina.id.desc())
+    else:
+        query = query.order_by(columna.asc(), Rutina.id.asc())
+
+    # Pedimos una fila extra para saber si existe una página siguiente
+    rutinas = query.limit(limite + 1).all()
+    if len(rutinas) <= limite:
+        return rutinas, None
+
+    rutinas = rutinas[:limite]
+    return rutinas, codificar_cursor(orden, rutinas[-1])
@@ -0,0 +1,188 @@
+"""
+Papelera de rutinas: borrado lógico, restauración y purga por lotes.
+
+Eliminar una rutina es un solo UPDATE que fija deleted_at: no se cargan sus
+ejercicios ni se borran fila a fila (el cascade del ORM lo hacía así). Desde
+ese momento la rutina no existe para la API (tenants.filtro_tenant) y deja
+libre su nombre; los índices de rutinas son parciales y no la incluyen.
+
+Durante PAPELERA_RETENCION_HORAS se puede restaurar. Pasado ese plazo,
+purgar() la borra de verdad con sus ejercicios y su resumen, en sentencias
+de como mucho PAPELERA_LOTE filas, cada una en su transacción (sin
+transacciones largas ni bloqueos sobre muchas filas). La corre el despachador
+de trabajos.py y `python -m app.cli purgar`. Restaurar solo toca rutinas
+dentro del plazo y purgar solo las que lo pasaron, así que no se pisan.
+
+Una plantilla que comparten rutinas vigentes no se puede eliminar (409). Las
+de la papelera que la comparten la mantienen: no se purga mientras alguna la
+referencie, y una de ellas solo se restaura si su plantilla está vigente.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from app.config import ajustes
+from app.consultas import CAMPOS_RUTINA, COLUMNAS_RUTINA
+from app.models import Ejercicio, Rutina, RutinaResumen
+from app.schemas import RestaurarRutina
+from app.tenants import filtro_tenant
+
+PAPELERA_RETENCION = timedelta(hours=ajustes.papelera_retencion_horas)
+PAPELERA_LOTE = ajustes.papelera_lote
+
+NO_ENCONTRADA = "Rutina no encontrada"
+PLANTILLA_COMPARTIDA = "Hay rutinas que comparten los ejercicios de esta plantilla; no se puede eliminar"
+
+
+def _en_plazo(ahora: Optional[datetime] = None):
+    """Rutinas de la papelera que aún se pueden restaurar"""
+    return Rutina.deleted_at >= (ahora or datetime.utcnow()) - PAPELERA_RETENCION
+
+
+# ============ ELIMINAR ============
+
+def eliminar_rutinas(db: Session, tenant_id: int, ids: list[int]) -> dict:
+    """
+    Pasa a la papelera las rutinas indicadas con un solo UPDATE ... RETURNING
+    (forma de ResultadoEliminacion). No se eliminan las que no existen ni las
+    plantillas que comparten rutinas vigentes que no se eliminan a la vez.
+    """
+    ids = list(dict.fromkeys(ids))
+    otra = aliased(Rutina)
+    compartida = select(otra.id).where(
+        otra.plantilla_id == Rutina.id, otra.deleted_at.is_(None), otra.id.notin_(ids)
+    ).exists()
+    eliminadas = db.scalars(
+        update(Rutina)
+        .where(Rutina.id.in_(ids), filtro_tenant(Rutina, tenant_id), ~compartida)
+        .values(deleted_at=datetime.utcnow())
+        .returning(Rutina.id),
+        execution_options={"synchronize_session": False}
+    ).all()
+    db.commit()
+
+    hechas = set(eliminadas)
+    restantes = [rutina_id for rutina_id in ids if rutina_id not in hechas]
+    errores = []
+    if restantes:
+        # Las que siguen vigentes no se eliminaron por ser plantillas compartidas
+        vigentes = set(db.scalars(select(Rutina.id).where(Rutina.id.in_(restantes), filtro_tenant(Rutina, tenant_id))))
+        errores = [
+            {"id": rutina_id, "error": PLANTILLA_COMPARTIDA if rutina_id in vigentes else NO_ENCONTRADA}
+            for rutina_id in restantes
+        ]
+    return {"eliminadas": sorted(eliminadas), "errores": errores}
+
+
+def eliminar_rutina(db: Session, tenant_id: int, rutina_id: int):
+    """Pasa una rutina a la papelera (404 si no existe, 409 si es una plantilla compartida)"""
+    errores = eliminar_rutinas(db, tenant_id, [rutina_id])["errores"]
+    if errores:
+        detalle = errores[0]["error"]
+        raise HTTPException(status_code=409 if detalle == PLANTILLA_COMPARTIDA else 404, detail=detalle)
+
+
+# ============ PAPELERA DEL TENANT ============
+
+def listar_eliminadas(db: Session, tenant_id: int, limite: int) -> list[dict]:
+    """Rutinas que aún se pueden restaurar, las últimas eliminadas primero (forma de RutinaEliminada)"""
+    filas = db.execute(
+        select(Rutina.id, Rutina.nombre, Rutina.deleted_at)
+        .where(Rutina.tenant_id == tenant_id, Rutina.deleted_at.isnot(None), _en_plazo())
+        .order_by(Rutina.deleted_at.desc(), Rutina.id.desc())
+        .limit(limite)
+    ).all()
+    return [
+        {"id": fila.id, "nombre": fila.nombre, "deleted_at": fila.deleted_at,
+         "purga_en": fila.deleted_at + PAPELERA_RETENCION}
+        for fila in filas
+    ]
+
+
+def restaurar_rutina(db: Session, tenant_id: int, rutina_id: int, datos: RestaurarRutina) -> dict:
+    """
+    Saca una rutina de la papelera y la devuelve con la forma de Rutina. 404
+    si no está en la papelera del tenant (o pasó el plazo), 400 si otra usa
+    ya su nombre (se puede indicar otro) y 409 si comparte una plantilla
+    que sigue en la papelera.
+    """
+    valores = {"deleted_at": None, "version": Rutina.version + 1}
+    if datos.nombre is not None:
+        valores["nombre"] = datos.nombre.strip()
+        if not valores["nombre"]:
+            raise HTTPException(status_code=400, detail="El nombre no puede estar vacío")
+
+    plantilla = aliased(Rutina)
+    plantilla_vigente = or_(
+        Rutina.plantilla_id.is_(None),
+        select(plantilla.id).where(plantilla.id == Rutina.plantilla_id, plantilla.deleted_at.is_(None)).exists(),
+    )
+    en_papelera = (Rutina.id == rutina_id, Rutina.tenant_id == tenant_id, _en_plazo())
+    try:
+        fila = db.execute(
+            update(Rutina)
+            .where(*en_papelera, plantilla_vigente)
+            .values(**valores)
+            .returning(*COLUMNAS_RUTINA),
+            execution_options={"synchronize_session": False}
+        ).first()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=400, detail="Ya existe una rutina con ese nombre; indica otro nombre para restaurarla"
+        )
+
+    if fila is None:
+        db.rollback()
+        if db.scalar(select(Rutina.id).where(*en_papelera)) is None:
+            raise HTTPException(status_code=404, detail="La rutina no está en la papelera")
+        raise HTTPException(
+            status_code=409,
+            detail="La rutina comparte los ejercicios de una plantilla que está en la papelera; restáurala antes"
+        )
+    db.commit()
+    return dict(zip(CAMPOS_RUTINA, fila))
+
+
+# ============ PURGA ============
+
+def purgar(db: Session, retencion: timedelta = PAPELERA_RETENCION, lote: int = PAPELERA_LOTE) -> int:
+    """
+    Borra las rutinas que llevan en la papelera más que `retencion`, con sus
+    ejercicios y su resumen. Cada sentencia borra como mucho `lote` filas y
+    se confirma aparte. Devuelve cuántas rutinas borró.
+    """
+    limite = datetime.utcnow() - retencion
+    otra = aliased(Rutina)
+    caducadas = (
+        select(Rutina.id)
+        # Las plantillas que aún comparten otras rutinas de la papelera esperan a que se purguen
+        .where(Rutina.deleted_at < limite, ~select(otra.id).where(otra.plantilla_id == Rutina.id).exists())
+        .order_by(Rutina.deleted_at)
+        .limit(lote)
+    )
+    borradas = 0
+    while ids := db.scalars(caducadas).all():
+        # Los ejercicios primero y por lotes (en SQLite las claves foráneas no borran en cascada)
+        de_las_rutinas = select(Ejercicio.id).where(Ejercicio.rutina_id.in_(ids)).limit(lote)
+        while db.execute(
+            delete(Ejercicio).where(Ejercicio.id.in_(de_las_rutinas)),
+            execution_options={"synchronize_session": False}
+        ).rowcount:
+            db.commit()
+        db.execute(
+            delete(RutinaResumen).where(RutinaResumen.rutina_id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        resultado = db.execute(
+            delete(Rutina).where(Rutina.id.in_(ids)), execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        borradas += resultado.rowcount
+        if len(ids) < lote or not resultado.rowcount:
+            break
+    return borradas
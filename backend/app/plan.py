@@ -0,0 +1,154 @@
+"""
+Plan semanal de una rutina y resumen de totales para los listados.
+
+El plan agrupa los ejercicios por día (de lunes a domingo) y calcula en SQL,
+con GROUP BY, los totales de cada día: series, repeticiones y volumen
+(series × repeticiones × peso, con peso nulo = 0).
+
+rutina_resumen guarda esos totales para toda la rutina. crud.py llama a
+refrescar_resumen() dentro de la misma transacción que modifica los
+ejercicios; las cargas masivas (seed, sintéticos) usan reconstruir_resumenes()
+y la importación, crear_resumenes().
+"""
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, distinct, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.consultas import COLUMNAS_EJERCICIO, RUTINA_EJERCICIOS, fila_ejercicio
+from app.models import DiaEnum, Ejercicio, Rutina, RutinaResumen
+from app.tenants import filtro_tenant
+
+COLUMNAS_RESUMEN = ("rutina_id", "num_ejercicios", "num_dias", "series", "repeticiones", "volumen")
+
+# Campos de un ejercicio que cambian el resumen al modificarse
+CAMPOS_RESUMEN = {"dia_semana", "series", "repeticiones", "peso"}
+
+# Posición de cada día; con SQLite el enum se guarda como texto y no ordenaría bien
+ORDEN_DIAS = case(*[(Ejercicio.dia_semana == dia, posicion) for posicion, dia in enumerate(DiaEnum)])
+
+VOLUMEN = Ejercicio.series * Ejercicio.repeticiones * func.coalesce(Ejercicio.peso, 0)
+
+
+def _totales():
+    return (
+        func.count(Ejercicio.id).label("num_ejercicios"),
+        func.coalesce(func.sum(Ejercicio.series), 0).label("series"),
+        func.coalesce(func.sum(Ejercicio.repeticiones), 0).label("repeticiones"),
+        func.coalesce(func.sum(VOLUMEN), 0).label("volumen"),
+    )
+
+
+# ============ PLAN ============
+
+def obtener_plan(db: Session, tenant_id: int, rutina_id: int) -> dict:
+    """Ejercicios agrupados por día, ordenados, con los totales de cada día (forma de PlanSemanal)"""
+    rutina = db.execute(
+        select(
+            Rutina.id, Rutina.nombre, Rutina.descripcion, Rutina.version, Rutina.fecha_creacion, Rutina.updated_at,
+            RUTINA_EJERCICIOS.label("origen")
+        )
+        .where(Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id))
+    ).first()
+    if rutina is None:
+        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+    # Los ejercicios de la plantilla, si la rutina la comparte
+    origen = rutina.origen
+
+    totales_por_dia = {
+        fila.dia_semana: fila._asdict()
+        for fila in db.execute(
+            select(*_totales(), Ejercicio.dia_semana)
+            .where(Ejercicio.rutina_id == origen)
+            .group_by(Ejercicio.dia_semana)
+        )
+    }
+
+    # Tuplas de columnas en lugar de objetos ORM: solo se van a serializar
+    ejercicios = db.execute(
+        select(*COLUMNAS_EJERCICIO)
+        .where(Ejercicio.rutina_id == origen)
+        .order_by(ORDEN_DIAS, Ejercicio.orden, Ejercicio.id)
+    ).all()
+
+    dias = []
+    for ejercicio in ejercicios:
+        if not dias or dias[-1]["dia_semana"] != ejercicio.dia_semana:
+            dias.append({**totales_por_dia[ejercicio.dia_semana], "ejercicios": []})
+        dias[-1]["ejercicios"].append(fila_ejercicio(ejercicio))
+
+    totales = {
+        campo: sum(dia[campo] for dia in dias)
+        for campo in ("num_ejercicios", "series", "repeticiones", "volumen")
+    }
+    return {
+        "rutina_id": rutina.id,
+        "nombre": rutina.nombre,
+        "descripcion": rutina.descripcion,
+        "version": rutina.version,
+        "fecha_creacion": rutina.fecha_creacion,
+        "updated_at": rutina.updated_at,
+        "dias": dias,
+        "totales": {**totales, "num_dias": len(dias)},
+    }
+
+
+# ============ RESUMEN ============
+
+def _consulta_resumen(desde_id: Optional[int] = None):
+    """Totales por rutina (también las que no tienen ejercicios) en el orden de COLUMNAS_RESUMEN"""
+    totales = {columna.name: columna for columna in _totales()}
+    consulta = (
+        select(
+            Rutina.id,
+            totales["num_ejercicios"],
+            func.count(distinct(Ejercicio.dia_semana)),
+            totales["series"],
+            totales["repeticiones"],
+            totales["volumen"],
+        )
+        .select_from(Rutina)
+        .outerjoin(Ejercicio, Ejercicio.rutina_id == RUTINA_EJERCICIOS)
+        .group_by(Rutina.id)
+    )
+    if desde_id is not None:
+        consulta = consulta.where(Rutina.id >= desde_id)
+    return consulta
+
+
+def refrescar_resumen(db: Session, rutina_id: int):
+    """Recalcula el resumen de una rutina (no hace commit)"""
+    db.flush()
+    consulta = _consulta_resumen().where(Rutina.id == rutina_id)
+
+    dialectos = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+    insertar = dialectos.get(db.get_bind().dialect.name)
+    if insertar is None:
+        db.execute(delete(RutinaResumen).where(RutinaResumen.rutina_id == rutina_id))
+        db.execute(insert(RutinaResumen).from_select(COLUMNAS_RESUMEN, consulta))
+        return
+
+    # INSERT ... SELECT ... ON CONFLICT DO UPDATE: una sola sentencia
+    sentencia = insertar(RutinaResumen).from_select(COLUMNAS_RESUMEN, consulta)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[RutinaResumen.rutina_id],
+        set_={columna: sentencia.excluded[columna] for columna in COLUMNAS_RESUMEN[1:]},
+    )
+    db.execute(sentencia)
+
+
+def reconstruir_resumenes(conn, desde_id: Optional[int] = None):
+    """Recalcula el resumen de todas las rutinas (o de las que tienen id >= desde_id)"""
+    borrar = delete(RutinaResumen)
+    if desde_id is not None:
+        borrar = borrar.where(RutinaResumen.rutina_id >= desde_id)
+    conn.execute(borrar)
+    conn.execute(insert(RutinaResumen).from_select(COLUMNAS_RESUMEN, _consulta_resumen(desde_id)))
+
+
+def crear_resumenes(db: Session, rutina_ids: list[int]):
+    """Inserta el resumen de rutinas recién creadas (sin resumen todavía)"""
+    consulta = _consulta_resumen().where(Rutina.id.in_(rutina_ids))
+    db.execute(insert(RutinaResumen).from_select(COLUMNAS_RESUMEN, consulta))
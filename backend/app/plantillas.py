@@ -0,0 +1,140 @@
+"""
+Clonado de rutinas y plantillas con ejercicios compartidos (copy-on-write).
+
+POST /rutinas/{id}/clonar crea la rutina nueva en el servidor, sin una
+petición por ejercicio. Según el modo:
+
+- copia: la rutina nueva recibe una copia de los ejercicios, hecha en la BD
+  con un solo INSERT ... SELECT (las filas no pasan por Python).
+- plantilla: igual, pero la copia queda en la biblioteca del tenant
+  (es_plantilla) y sus ejercicios ya no se pueden modificar (409).
+- compartida: solo a partir de una plantilla. No se copia ningún ejercicio:
+  la rutina guarda plantilla_id y las lecturas usan los de la plantilla
+  (consultas.RUTINA_EJERCICIOS).
+
+Compartir es seguro porque los ejercicios de una plantilla no cambian. La
+primera escritura en los ejercicios de una rutina compartida los copia en
+ella y deja plantilla_id a NULL (materializar), en la misma transacción que
+la escritura. Así las filas y las escrituras crecen con los miembros que
+modifican su rutina, no con todos los que la reciben.
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.consultas import CAMPOS_RUTINA, COLUMNAS_RUTINA, RUTINA_EJERCICIOS
+from app.models import Ejercicio, Rutina
+from app.plan import crear_resumenes
+from app.schemas import ClonarRutina
+from app.tenants import filtro_tenant
+
+# Columnas que se copian de cada ejercicio (id y version son los de la fila nueva;
+# tenant_id es el mismo: solo se copia entre rutinas del tenant)
+CAMPOS_COPIA = ("nombre", "dia_semana", "series", "repeticiones", "peso", "notas", "orden", "tenant_id")
+
+PLANTILLA_INMUTABLE = (
+    "Los ejercicios de una plantilla no se modifican "
+    "(en una rutina que la comparte, indica el rutina_id de esa rutina)"
+)
+
+
+def copia_de_ejercicios(origen_id: int, destino_id: int, valores: Optional[dict] = None, *condiciones):
+    """
+    INSERT ... SELECT que copia los ejercicios de origen_id (los que cumplen
+    las condiciones) en destino_id. valores reemplaza columnas por
+    expresiones SQL. Se insertan en el orden de la rutina.
+    """
+    columnas = {campo: getattr(Ejercicio, campo) for campo in CAMPOS_COPIA}
+    columnas.update(valores or {})
+    consulta = (
+        select(*columnas.values(), literal(destino_id))
+        .where(Ejercicio.rutina_id == origen_id, *condiciones)
+        .order_by(Ejercicio.orden, Ejercicio.id)
+    )
+    return insert(Ejercicio).from_select([*columnas, "rutina_id"], consulta)
+
+
+def dejar_de_compartir(db: Session, rutina_id: int, plantilla_id: int) -> bool:
+    """
+    Quita plantilla_id de la rutina (no hace commit). False si ya no la
+    compartía: otra transacción la materializó antes.
+    """
+    resultado = db.execute(
+        update(Rutina)
+        .where(Rutina.id == rutina_id, Rutina.plantilla_id == plantilla_id)
+        .values(plantilla_id=None, updated_at=datetime.utcnow()),
+        execution_options={"synchronize_session": False}
+    )
+    return resultado.rowcount == 1
+
+
+def materializar(db: Session, rutina_id: int, plantilla_id: int, valores: Optional[dict] = None, *condiciones) -> bool:
+    """Copia en la rutina los ejercicios de la plantilla que compartía (ver copia_de_ejercicios)"""
+    if not dejar_de_compartir(db, rutina_id, plantilla_id):
+        return False
+    db.execute(copia_de_ejercicios(plantilla_id, rutina_id, valores, *condiciones))
+    return True
+
+
+def preparar_escritura(db: Session, rutina):
+    """
+    Antes de escribir en los ejercicios de una rutina (objeto o fila con id,
+    es_plantilla y plantilla_id): 409 si es una plantilla; si comparte una,
+    se materializa.
+    """
+    if rutina.es_plantilla:
+        raise HTTPException(status_code=409, detail=PLANTILLA_INMUTABLE)
+    if rutina.plantilla_id is not None:
+        materializar(db, rutina.id, rutina.plantilla_id)
+
+
+def clonar_rutina(
+    db: Session, tenant_id: int, rutina_id: int, datos: ClonarRutina, usuario_id: Optional[int] = None
+) -> dict:
+    """Crea una rutina a partir de otra del tenant y la devuelve con la forma de Rutina"""
+    original = db.execute(
+        select(Rutina.nombre, Rutina.descripcion, Rutina.es_plantilla, RUTINA_EJERCICIOS.label("origen"))
+        .where(Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id))
+    ).first()
+    if original is None:
+        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+
+    # Una rutina que comparte una plantilla se clona a partir de esa plantilla
+    compartida = datos.modo == "compartida"
+    if compartida and not original.es_plantilla and original.origen == rutina_id:
+        raise HTTPException(
+            status_code=400,
+            detail="Solo se pueden compartir los ejercicios de una plantilla (clona la rutina con modo plantilla)"
+        )
+
+    nombre = (datos.nombre or f"{original.nombre[:92]} (copia)").strip()
+    if not nombre:
+        raise HTTPException(status_code=400, detail="El nombre no puede estar vacío")
+
+    try:
+        fila = db.execute(
+            insert(Rutina)
+            .values(
+                nombre=nombre,
+                descripcion=original.descripcion if datos.descripcion is None else datos.descripcion,
+                tenant_id=tenant_id,
+                usuario_id=usuario_id,
+                es_plantilla=datos.modo == "plantilla",
+                plantilla_id=original.origen if compartida else None,
+            )
+            .returning(*COLUMNAS_RUTINA)
+        ).one()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Ya existe una rutina con ese nombre")
+
+    nueva = dict(zip(CAMPOS_RUTINA, fila))
+    if not compartida:
+        db.execute(copia_de_ejercicios(original.origen, nueva["id"]))
+    crear_resumenes(db, [nueva["id"]])
+    db.commit()
+    return nueva
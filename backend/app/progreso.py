@@ -0,0 +1,389 @@
+"""
+Progreso de cada usuario en cada ejercicio: récords (peso máximo y 1RM
+estimado), totales y volumen por semana, leídos de progreso_ejercicios y
+progreso_semanas sin recorrer el historial de series.
+
+- Incremental: entrenamientos.py llama a acumular() en la misma transacción
+  que inserta las series. El lote se agrega aquí por ejercicio y por semana y
+  se suma a las filas con un INSERT ... ON CONFLICT DO UPDATE por tabla.
+  Sumas y máximos no dependen del orden: una sesión grabada sin conexión que
+  llega semanas después deja lo mismo que si hubiera llegado a tiempo, y dos
+  lotes concurrentes del mismo usuario no se pisan (cada upsert bloquea sus
+  filas; van ordenadas por clave para no interbloquearse).
+- Reconstruir: reconstruir() recalcula las tablas desde series_realizadas con
+  un INSERT ... SELECT (`python -m app.cli progreso`). Lo usa el mantenimiento
+  de entrenamientos.py cuando borra meses antiguos: el progreso cubre las
+  series que se conservan.
+- Verificar: verificar() compara las tablas con el recálculo completo (EXCEPT
+  en los dos sentidos, en la BD) y devuelve cuántas filas difieren y algunas
+  de ejemplo (`python -m app.cli verificar-progreso`).
+
+Las series sin usuario (sesiones registradas sin X-Usuario-ID) no cuentan. El
+1RM se estima con la fórmula de Epley y solo con series de 1 a
+REPETICIONES_MAXIMAS_1RM repeticiones: con más, la estimación no es fiable.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Date, Float, and_, case, cast, delete, except_, func, insert, literal_column, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+
+from app.models import Ejercicio, ProgresoEjercicio, ProgresoSemanal, SerieRealizada
+from app.tenants import filtro_tenant
+
+REPETICIONES_MAXIMAS_1RM = 12
+SEMANAS_MEDIA = 4  # Semanas de la media móvil del volumen
+EJEMPLOS_VERIFICACION = 10
+
+CLAVE = ("tenant_id", "usuario_id", "ejercicio_id")
+COLUMNAS_EJERCICIO = tuple(columna.name for columna in ProgresoEjercicio.__table__.columns)
+COLUMNAS_SEMANA = tuple(columna.name for columna in ProgresoSemanal.__table__.columns)
+CAMPOS_PROGRESO = ("ejercicio_id", "ejercicio") + COLUMNAS_EJERCICIO[3:]
+
+
+# ============ PERIODOS ============
+
+# Inicio del periodo de cada serie, calculado en la BD (las unidades van como
+# literales: el GROUP BY tiene que repetir exactamente la expresión del SELECT)
+UNIDADES_POSTGRESQL = {"dia": "day", "semana": "week", "mes": "month"}
+MODIFICADORES_SQLITE = {"dia": (), "semana": ("weekday 0", "-6 days"), "mes": ("start of month",)}
+
+
+def inicio_periodo(dialecto: str, agrupar: str, columna=SerieRealizada.realizada_en):
+    """Primer día del día, semana (lunes) o mes de `columna`, como Date"""
+    if dialecto == "postgresql":
+        unidad = literal_column(f"'{UNIDADES_POSTGRESQL[agrupar]}'")
+        return cast(func.date_trunc(unidad, columna), Date)
+    modificadores = (literal_column(f"'{modificador}'") for modificador in MODIFICADORES_SQLITE[agrupar])
+    return func.date(columna, *modificadores, type_=Date)
+
+
+def semana(fecha: datetime) -> date:
+    """Lunes de la semana de `fecha` (lo mismo que inicio_periodo con "semana")"""
+    return fecha.date() - timedelta(days=fecha.weekday())
+
+
+def estimar_1rm(peso: Optional[int], repeticiones: int) -> Optional[float]:
+    """1RM estimado de una serie (Epley); None sin peso o fuera de 1..REPETICIONES_MAXIMAS_1RM"""
+    if peso is None or not 1 <= repeticiones <= REPETICIONES_MAXIMAS_1RM:
+        return None
+    if repeticiones == 1:
+        return float(peso)
+    return peso * (1.0 + repeticiones / 30.0)
+
+
+def _1rm(serie):
+    """estimar_1rm en SQL, con las mismas operaciones en coma flotante"""
+    peso = cast(serie.peso, Float)
+    return case(
+        (serie.repeticiones == 1, peso),
+        (
+            serie.repeticiones.between(2, REPETICIONES_MAXIMAS_1RM),
+            peso * (1.0 + cast(serie.repeticiones, Float) / 30.0)
+        ),
+    )
+
+
+# ============ ACTUALIZACIÓN INCREMENTAL ============
+
+def _supera(valor, en, actual, actual_en) -> bool:
+    """Un récord supera al actual si es mayor o, si empata, anterior"""
+    return valor is not None and (actual is None or valor > actual or (valor == actual and en < actual_en))
+
+
+def _mayor(valor, actual):
+    return valor if actual is None or (valor is not None and valor > actual) else actual
+
+
+def _agregar(tenant_id: int, usuario_id: int, series: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Filas de progreso_ejercicios y progreso_semanas de un lote de series, ordenadas por clave"""
+    ejercicios, semanas = {}, {}
+    for serie in series:
+        ejercicio_id, peso, repeticiones, en = (
+            serie["ejercicio_id"], serie["peso"], serie["repeticiones"], serie["realizada_en"]
+        )
+        volumen, estimado = repeticiones * (peso or 0), estimar_1rm(peso, repeticiones)
+
+        fila = ejercicios.get(ejercicio_id)
+        if fila is None:
+            fila = ejercicios[ejercicio_id] = {
+                "tenant_id": tenant_id, "usuario_id": usuario_id, "ejercicio_id": ejercicio_id,
+                "series": 0, "repeticiones": 0, "volumen": 0, "peso_maximo": None, "peso_maximo_en": None,
+                "mejor_1rm": None, "mejor_1rm_en": None, "primera_serie_en": en, "ultima_serie_en": en,
+            }
+        fila["series"] += 1
+        fila["repeticiones"] += repeticiones
+        fila["volumen"] += volumen
+        if _supera(peso, en, fila["peso_maximo"], fila["peso_maximo_en"]):
+            fila["peso_maximo"], fila["peso_maximo_en"] = peso, en
+        if _supera(estimado, en, fila["mejor_1rm"], fila["mejor_1rm_en"]):
+            fila["mejor_1rm"], fila["mejor_1rm_en"] = estimado, en
+        fila["primera_serie_en"] = min(fila["primera_serie_en"], en)
+        fila["ultima_serie_en"] = max(fila["ultima_serie_en"], en)
+
+        clave = (ejercicio_id, semana(en))
+        fila = semanas.get(clave)
+        if fila is None:
+            fila = semanas[clave] = {
+                "tenant_id": tenant_id, "usuario_id": usuario_id, "ejercicio_id": ejercicio_id, "semana": clave[1],
+                "series": 0, "repeticiones": 0, "volumen": 0, "peso_maximo": None, "mejor_1rm": None,
+            }
+        fila["series"] += 1
+        fila["repeticiones"] += repeticiones
+        fila["volumen"] += volumen
+        fila["peso_maximo"] = _mayor(peso, fila["peso_maximo"])
+        fila["mejor_1rm"] = _mayor(estimado, fila["mejor_1rm"])
+    return [ejercicios[k] for k in sorted(ejercicios)], [semanas[k] for k in sorted(semanas)]
+
+
+def _maximo(nueva, actual, columna):
+    """SET de un máximo: lo mismo que _mayor en SQL"""
+    mayor = or_(actual[columna].is_(None), nueva[columna] > actual[columna])
+    return case((mayor, nueva[columna]), else_=actual[columna])
+
+
+def _record(nueva, actual, columna, en) -> dict:
+    """SET del valor de un récord y su fecha: lo mismo que _supera en SQL"""
+    supera = and_(nueva[columna].isnot(None), or_(
+        actual[columna].is_(None), nueva[columna] > actual[columna],
+        and_(nueva[columna] == actual[columna], nueva[en] < actual[en]),
+    ))
+    return {
+        columna: case((supera, nueva[columna]), else_=actual[columna]),
+        en: case((supera, nueva[en]), else_=actual[en]),
+    }
+
+
+def acumular(db: Session, tenant_id: int, usuario_id: Optional[int], series: list[dict]):
+    """Suma al progreso del usuario las series recién insertadas (no hace commit)"""
+    if usuario_id is None or not series:
+        return
+    ejercicios, semanas = _agregar(tenant_id, usuario_id, series)
+
+    dialectos = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+    insertar = dialectos.get(db.get_bind().dialect.name)
+    if insertar is None:
+        refrescar(db, tenant_id, usuario_id, [fila["ejercicio_id"] for fila in ejercicios])
+        return
+
+    # Con la conexión (Core) y no con la sesión: el ORM repartiría el
+    # executemany en una sentencia por fila, compilada cada vez
+    conexion = db.connection()
+    sentencia = insertar(ProgresoEjercicio.__table__)
+    nueva, actual = sentencia.excluded, ProgresoEjercicio.__table__.c
+    conexion.execute(sentencia.on_conflict_do_update(index_elements=CLAVE, set_={
+        **{columna: actual[columna] + nueva[columna] for columna in ("series", "repeticiones", "volumen")},
+        **_record(nueva, actual, "peso_maximo", "peso_maximo_en"),
+        **_record(nueva, actual, "mejor_1rm", "mejor_1rm_en"),
+        "primera_serie_en": case(
+            (nueva.primera_serie_en < actual.primera_serie_en, nueva.primera_serie_en), else_=actual.primera_serie_en
+        ),
+        "ultima_serie_en": case(
+            (nueva.ultima_serie_en > actual.ultima_serie_en, nueva.ultima_serie_en), else_=actual.ultima_serie_en
+        ),
+    }), ejercicios)
+
+    sentencia = insertar(ProgresoSemanal.__table__)
+    nueva, actual = sentencia.excluded, ProgresoSemanal.__table__.c
+    conexion.execute(sentencia.on_conflict_do_update(index_elements=CLAVE + ("semana",), set_={
+        **{columna: actual[columna] + nueva[columna] for columna in ("series", "repeticiones", "volumen")},
+        **{columna: _maximo(nueva, actual, columna) for columna in ("peso_maximo", "mejor_1rm")},
+    }), semanas)
+
+
+# ============ RECÁLCULO ============
+
+def _consulta_ejercicios(*filtros):
+    """progreso_ejercicios calculado desde las series (columnas en el orden de COLUMNAS_EJERCICIO)"""
+    serie = SerieRealizada
+    totales = (
+        select(
+            serie.tenant_id, serie.usuario_id, serie.ejercicio_id,
+            func.count().label("series"),
+            func.sum(serie.repeticiones).label("repeticiones"),
+            func.sum(serie.repeticiones * func.coalesce(serie.peso, 0)).label("volumen"),
+            func.max(serie.peso).label("peso_maximo"),
+            func.max(_1rm(serie)).label("mejor_1rm"),
+            func.min(serie.realizada_en).label("primera_serie_en"),
+            func.max(serie.realizada_en).label("ultima_serie_en"),
+        )
+        .where(serie.usuario_id.isnot(None), *filtros)
+        .group_by(serie.tenant_id, serie.usuario_id, serie.ejercicio_id)
+        .subquery()
+    )
+    otra = aliased(SerieRealizada)
+
+    def primera(condicion):
+        """Primera serie del grupo que cumple la condición (índice del historial del ejercicio)"""
+        return select(func.min(otra.realizada_en)).where(
+            otra.tenant_id == totales.c.tenant_id, otra.ejercicio_id == totales.c.ejercicio_id,
+            otra.usuario_id == totales.c.usuario_id, condicion,
+        ).scalar_subquery()
+
+    return select(
+        totales.c.tenant_id, totales.c.usuario_id, totales.c.ejercicio_id,
+        totales.c.series, totales.c.repeticiones, totales.c.volumen,
+        totales.c.peso_maximo, primera(otra.peso == totales.c.peso_maximo),
+        totales.c.mejor_1rm, primera(_1rm(otra) == totales.c.mejor_1rm),
+        totales.c.primera_serie_en, totales.c.ultima_serie_en,
+    )
+
+
+def _consulta_semanas(dialecto: str, *filtros):
+    """progreso_semanas calculado desde las series (columnas en el orden de COLUMNAS_SEMANA)"""
+    serie = SerieRealizada
+    inicio = inicio_periodo(dialecto, "semana")
+    return (
+        select(
+            serie.tenant_id, serie.usuario_id, serie.ejercicio_id, inicio,
+            func.count(), func.sum(serie.repeticiones),
+            func.sum(serie.repeticiones * func.coalesce(serie.peso, 0)),
+            func.max(serie.peso), func.max(_1rm(serie)),
+        )
+        .where(serie.usuario_id.isnot(None), *filtros)
+        .group_by(serie.tenant_id, serie.usuario_id, serie.ejercicio_id, inicio)
+    )
+
+
+def _filtros(tenant_id: Optional[int]):
+    return () if tenant_id is None else (SerieRealizada.tenant_id == tenant_id,)
+
+
+def reconstruir(conn, tenant_id: Optional[int] = None):
+    """Recalcula el progreso de todos los tenants (o de uno) desde las series"""
+    for modelo in (ProgresoEjercicio, ProgresoSemanal):
+        borrar = delete(modelo)
+        if tenant_id is not None:
+            borrar = borrar.where(modelo.tenant_id == tenant_id)
+        conn.execute(borrar)
+    filtros = _filtros(tenant_id)
+    conn.execute(insert(ProgresoEjercicio).from_select(COLUMNAS_EJERCICIO, _consulta_ejercicios(*filtros)))
+    conn.execute(insert(ProgresoSemanal).from_select(COLUMNAS_SEMANA, _consulta_semanas(conn.dialect.name, *filtros)))
+
+
+def refrescar(db: Session, tenant_id: int, usuario_id: int, ejercicio_ids: list[int]):
+    """Recalcula el progreso de un usuario en unos ejercicios (motores sin upsert; no hace commit)"""
+    filtros = (
+        SerieRealizada.tenant_id == tenant_id, SerieRealizada.usuario_id == usuario_id,
+        SerieRealizada.ejercicio_id.in_(ejercicio_ids),
+    )
+    for modelo in (ProgresoEjercicio, ProgresoSemanal):
+        db.execute(
+            delete(modelo).where(
+                modelo.tenant_id == tenant_id, modelo.usuario_id == usuario_id, modelo.ejercicio_id.in_(ejercicio_ids)
+            ),
+            execution_options={"synchronize_session": False}
+        )
+    db.execute(insert(ProgresoEjercicio).from_select(COLUMNAS_EJERCICIO, _consulta_ejercicios(*filtros)))
+    db.execute(
+        insert(ProgresoSemanal).from_select(COLUMNAS_SEMANA, _consulta_semanas(db.get_bind().dialect.name, *filtros))
+    )
+
+
+def verificar(conn, tenant_id: Optional[int] = None) -> dict:
+    """
+    Compara las tablas con el recálculo completo. Por tabla: "faltan" (filas
+    del recálculo que no están o tienen otros valores), "sobran" (filas
+    guardadas que no salen del recálculo) y hasta EJEMPLOS_VERIFICACION de
+    cada una. Una fila con valores distintos cuenta en las dos.
+    """
+    tablas = (
+        ("ejercicios", ProgresoEjercicio, COLUMNAS_EJERCICIO, _consulta_ejercicios(*_filtros(tenant_id))),
+        ("semanas", ProgresoSemanal, COLUMNAS_SEMANA, _consulta_semanas(conn.dialect.name, *_filtros(tenant_id))),
+    )
+    resultado = {}
+    for nombre, modelo, columnas, recalculo in tablas:
+        guardadas = select(*(modelo.__table__.c[columna] for columna in columnas))
+        if tenant_id is not None:
+            guardadas = guardadas.where(modelo.tenant_id == tenant_id)
+        diferencias = {}
+        for tipo, consulta in (("faltan", except_(recalculo, guardadas)), ("sobran", except_(guardadas, recalculo))):
+            total, ejemplos = 0, []
+            for fila in conn.execute(consulta.execution_options(stream_results=True)):
+                total += 1
+                if len(ejemplos) < EJEMPLOS_VERIFICACION:
+                    ejemplos.append(dict(zip(columnas, fila)))
+            diferencias[tipo] = total
+            diferencias[f"ejemplos_{tipo}"] = ejemplos
+        resultado[nombre] = diferencias
+    return resultado
+
+
+# ============ CONSULTAS ============
+
+def _con_nombre(tenant_id: int):
+    """Columnas de CAMPOS_PROGRESO, con el nombre del ejercicio si sigue existiendo"""
+    return (
+        select(ProgresoEjercicio.ejercicio_id, Ejercicio.nombre, *(
+            getattr(ProgresoEjercicio, columna) for columna in COLUMNAS_EJERCICIO[3:]
+        ))
+        .outerjoin(
+            Ejercicio,
+            and_(Ejercicio.id == ProgresoEjercicio.ejercicio_id, filtro_tenant(Ejercicio, tenant_id))
+        )
+    )
+
+
+def _progreso(fila) -> dict:
+    progreso = dict(zip(CAMPOS_PROGRESO, fila))
+    if progreso["mejor_1rm"] is not None:
+        progreso["mejor_1rm"] = round(progreso["mejor_1rm"], 1)
+    return progreso
+
+
+def listar(db: Session, tenant_id: int, usuario_id: int) -> list[dict]:
+    """Progreso de un usuario en cada ejercicio, los últimos entrenados primero (forma de Progreso)"""
+    filas = db.execute(
+        _con_nombre(tenant_id)
+        .where(ProgresoEjercicio.tenant_id == tenant_id, ProgresoEjercicio.usuario_id == usuario_id)
+        .order_by(ProgresoEjercicio.ultima_serie_en.desc(), ProgresoEjercicio.ejercicio_id)
+    )
+    return [_progreso(fila) for fila in filas]
+
+
+def obtener(
+    db: Session, tenant_id: int, usuario_id: int, ejercicio_id: int, semanas: int,
+    ahora: Optional[datetime] = None
+) -> dict:
+    """
+    Progreso de un usuario en un ejercicio con las últimas `semanas` semanas
+    (la actual incluida, sin huecos) y la media móvil de su volumen en
+    SEMANAS_MEDIA semanas (forma de ProgresoDetalle)
+    """
+    clave = (
+        ProgresoEjercicio.tenant_id == tenant_id, ProgresoEjercicio.usuario_id == usuario_id,
+        ProgresoEjercicio.ejercicio_id == ejercicio_id,
+    )
+    fila = db.execute(_con_nombre(tenant_id).where(*clave)).first()
+    if fila is None:
+        raise HTTPException(status_code=404, detail="El usuario no tiene series de este ejercicio")
+    progreso = _progreso(fila)
+
+    actual = semana(ahora or datetime.utcnow())
+    # Las semanas anteriores a la primera que se muestra entran en su media
+    lunes = [actual - timedelta(weeks=n) for n in range(semanas + SEMANAS_MEDIA - 2, -1, -1)]
+    guardadas = {
+        fila.semana: fila
+        for fila in db.execute(
+            select(ProgresoSemanal).where(
+                ProgresoSemanal.tenant_id == tenant_id, ProgresoSemanal.usuario_id == usuario_id,
+                ProgresoSemanal.ejercicio_id == ejercicio_id, ProgresoSemanal.semana.between(lunes[0], actual),
+            )
+        ).scalars()
+    }
+    volumenes = [guardadas[dia].volumen if dia in guardadas else 0 for dia in lunes]
+    progreso["semanas"] = []
+    for indice in range(SEMANAS_MEDIA - 1, len(lunes)):
+        guardada = guardadas.get(lunes[indice])
+        progreso["semanas"].append({
+            "semana": lunes[indice],
+            "series": guardada.series if guardada else 0,
+            "repeticiones": guardada.repeticiones if guardada else 0,
+            "volumen": volumenes[indice],
+            "peso_maximo": guardada.peso_maximo if guardada else None,
+            "mejor_1rm": round(guardada.mejor_1rm, 1) if guardada and guardada.mejor_1rm is not None else None,
+            "volumen_medio": round(sum(volumenes[indice - SEMANAS_MEDIA + 1:indice + 1]) / SEMANAS_MEDIA, 1),
+        })
+    return progreso
@@ -1,188 +1,664 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database import get_db
-from app.models import Rutina, Ejercicio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from datetime import datetime
+from typing import Literal, Optional
+from app import crud
+from app import entrenamientos
+from app import intercambio
+from app.database import async_engine, engine, get_db, ejecutar, SesionBD
+from app.busqueda import buscar_rutinas as buscar_por_texto
+from app import analitica
+from app import eventos
+from app import papelera
+from app import plantillas
+from app import progreso
+from app import tenants
+from app import trabajos
+from app.eventos import publicar
+from app.tenants import Contexto, contexto_actual, contexto_eventos
+from app.cache import (
+    clave_analitica, clave_lista, clave_plan, clave_rutina, invalidar_listas, invalidar_rutina, respuesta_cacheada
+)
+from app.plan import obtener_plan
+from app.serializacion import a_json
+from app.paginacion import (
+    OrdenRutinas, ORDEN_POR_DEFECTO, LIMITE_POR_DEFECTO, LIMITE_MAXIMO
+)
 from app.schemas import (
-    RutinaCreate, RutinaUpdate, Rutina as RutinaSchema,
-    RutinaDetalle, EjercicioCreate, EjercicioUpdate, Ejercicio as EjercicioSchema
+    RutinaCreate, RutinaUpdate, ClonarRutina, Rutina as RutinaSchema, RutinaListado, RutinaPagina,
+    RutinaDetalle, PlanSemanal, EjercicioCreate, EjercicioUpdate, EjerciciosLote,
+    ReordenarEjercicios, Ejercicio as EjercicioSchema,
+    VolumenSemanal, DistribucionIntensidad, BalanceMuscular, ComparacionRutinas,
+    InformeImportacion, UsuarioCreate, Usuario as UsuarioSchema, ClonarLote, Trabajo as TrabajoSchema,
+    EliminarRutinas, ResultadoEliminacion, RestaurarRutina, RutinaEliminada,
+    RegistroSesiones, ResultadoRegistro, Sesion as SesionSchema, SesionDetalle, PuntoHistorial,
+    Progreso as ProgresoSchema, ProgresoDetalle
 )
 
 router = APIRouter(tags=["api"])
 
+# Los endpoints son async: el trabajo con la BD se delega a las funciones
+# de crud.py mediante ejecutar(), que no bloquea el event loop.
+# Las lecturas de rutinas se sirven desde la cache (con ETag) y cada
+# escritura invalida las claves que cambian. Los listados incluyen el resumen
+# de ejercicios, así que cambiar ejercicios también invalida los listados.
+# Las lecturas llegan de crud.py como dicts y se codifican con orjson sin
+# volver a validarlas (serializacion.py); response_model queda para /docs.
+# Tras cada escritura se publica un evento (eventos.py) para los clientes
+# suscritos a /eventos, que así no necesitan volver a pedir los listados.
+# Cada petición trabaja en su tenant (cabecera X-Tenant-ID, ver tenants.py):
+# crud.py filtra por él y las claves de cache y los eventos lo incluyen.
+# Las operaciones largas (importar, exportar, recalcular, clonar en lote)
+# también se pueden encolar como trabajos en segundo plano (trabajos.py).
+# Eliminar una rutina la pasa a la papelera (papelera.py), de donde se puede
+# restaurar hasta que la purga la borra.
+# Los entrenamientos realizados (sesiones y series) están en entrenamientos.py
+# y el progreso de cada usuario (récords y volumen semanal), en progreso.py.
+
+def version_if_match(if_match: Optional[str] = Header(None, description='Versión esperada, p. ej. "3"')):
+    """Versión de la cabecera If-Match ("3" o W/"3"); None si no se envía o es *"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    valor = if_match.strip().removeprefix("W/").strip('"')
+    if not valor.isdigit():
+        raise HTTPException(status_code=400, detail='If-Match debe ser la versión entre comillas, p. ej. "3"')
+    return int(valor)
+
 # ============ ENDPOINTS DE RUTINAS ============
 
-@router.get("/rutinas", response_model=list[RutinaSchema])
-def obtener_rutinas(db: Session = Depends(get_db)):
-    """Obtener todas las rutinas"""
-    rutinas = db.query(Rutina).all()
-    return rutinas
-
-@router.get("/rutinas/buscar", response_model=list[RutinaSchema])
-def buscar_rutinas(nombre: str = Query(..., min_length=1), db: Session = Depends(get_db)):
-    """Buscar rutinas por nombre (búsqueda parcial, no case-sensitive)"""
-    rutinas = db.query(Rutina).filter(
-        func.lower(Rutina.nombre).contains(nombre.lower())
-    ).all()
-    
-    if not rutinas:
-        return []
+@router.get("/rutinas", response_model=RutinaPagina)
+async def obtener_rutinas(
+    request: Request,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en next_cursor"),
+    orden: OrdenRutinas = Query(ORDEN_POR_DEFECTO),
+    desde: Optional[datetime] = Query(None, description="Creadas en o después de esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Creadas antes de esta fecha"),
+    incluir_total: bool = Query(False, description="Incluir el total de rutinas (consulta extra)"),
+    usuario_id: Optional[int] = Query(None, description="Solo las rutinas que creó este usuario"),
+    plantillas: bool = Query(False, description="Solo las plantillas de la biblioteca del tenant"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Obtener las rutinas del tenant paginadas por cursor"""
+    async def producir():
+        pagina = await ejecutar(
+            db, crud.listar_rutinas, contexto.tenant_id, limit, cursor, orden, desde, hasta, incluir_total,
+            usuario_id, plantillas
+        )
+        # Sin Last-Modified: borrar una rutina no mueve ninguna fecha, solo el ETag
+        return a_json(pagina), None
     
-    return rutinas
+    return await respuesta_cacheada(request, clave_lista(contexto.tenant_id, request), producir)
+
+@router.get("/rutinas/buscar", response_model=list[RutinaListado])
+async def buscar_rutinas(
+    nombre: str = Query(..., min_length=1, description="Texto a buscar en nombre, descripción y ejercicios"),
+    limite: int = Query(20, ge=1, le=100),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Buscar rutinas por texto (búsqueda parcial, no case-sensitive, ordenada por relevancia)"""
+    return ORJSONResponse(await ejecutar(db, buscar_por_texto, contexto.tenant_id, nombre, limite))
+
+@router.get("/rutinas/exportar", response_class=StreamingResponse)
+async def exportar_rutinas(
+    formato: Literal["ndjson", "csv"] = Query("ndjson"),
+    contexto: Contexto = Depends(contexto_actual)
+):
+    """Todas las rutinas del tenant con sus ejercicios, enviadas a trozos según se leen de la BD"""
+    return StreamingResponse(
+        intercambio.exportar(async_engine or engine, contexto.tenant_id, formato),
+        media_type=intercambio.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="rutinas.{formato}"'},
+    )
+
+@router.post("/rutinas/importar", response_model=InformeImportacion)
+async def importar_rutinas(
+    request: Request,
+    formato: Literal["ndjson", "csv"] = Query("ndjson"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """
+    Importa un archivo como el de /rutinas/exportar (en el cuerpo, sin multipart).
+    Las líneas con errores se informan y el resto se importa.
+    """
+    async def guardar(lote):
+        resultado = await ejecutar(db, intercambio.guardar_lote, contexto.tenant_id, lote, contexto.usuario_id)
+        if resultado["rutinas"]:
+            invalidar_listas(contexto.tenant_id)
+            publicar("rutinas.importadas", contexto.tenant_id, rutinas=resultado["rutinas"])
+        return resultado
+
+    return await intercambio.importar(request.stream(), formato, guardar)
+
+@router.get("/rutinas/papelera", response_model=list[RutinaEliminada])
+async def listar_papelera(
+    limite: int = Query(50, ge=1, le=LIMITE_MAXIMO),
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Rutinas eliminadas que aún se pueden restaurar, las últimas primero"""
+    return ORJSONResponse(await ejecutar(db, papelera.listar_eliminadas, contexto.tenant_id, limite))
+
+@router.post("/rutinas/eliminar", response_model=ResultadoEliminacion)
+async def eliminar_rutinas(
+    datos: EliminarRutinas, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Pasar varias rutinas a la papelera; las que no se pueden eliminar se informan en errores"""
+    resultado = await ejecutar(db, papelera.eliminar_rutinas, contexto.tenant_id, datos.ids)
+    if resultado["eliminadas"]:
+        for rutina_id in resultado["eliminadas"]:
+            invalidar_rutina(contexto.tenant_id, rutina_id)
+        invalidar_listas(contexto.tenant_id)
+        publicar("rutinas.eliminadas", contexto.tenant_id, rutina_ids=resultado["eliminadas"])
+    return ORJSONResponse(resultado)
+
+def _modificada(rutina: dict) -> datetime:
+    """Last-Modified de una rutina: updated_at es NULL si no cambió desde su creación"""
+    return rutina["updated_at"] or rutina["fecha_creacion"]
 
 @router.get("/rutinas/{rutina_id}", response_model=RutinaDetalle)
-def obtener_rutina(rutina_id: int, db: Session = Depends(get_db)):
+async def obtener_rutina(
+    rutina_id: int, request: Request,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
     """Obtener una rutina con todos sus ejercicios"""
-    rutina = db.query(Rutina).filter(Rutina.id == rutina_id).first()
-    
-    if not rutina:
-        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+    async def producir():
+        rutina = await ejecutar(db, crud.obtener_rutina, contexto.tenant_id, rutina_id)
+        return a_json(rutina), _modificada(rutina)
     
-    return rutina
+    return await respuesta_cacheada(request, clave_rutina(contexto.tenant_id, rutina_id), producir)
+
+@router.get("/rutinas/{rutina_id}/plan", response_model=PlanSemanal)
+async def obtener_plan_semanal(
+    rutina_id: int, request: Request,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Plan de la rutina agrupado por día, en orden, con los totales de cada día"""
+    async def producir():
+        plan = await ejecutar(db, obtener_plan, contexto.tenant_id, rutina_id)
+        return a_json(plan), _modificada(plan)
+    
+    return await respuesta_cacheada(request, clave_plan(contexto.tenant_id, rutina_id), producir)
 
 @router.post("/rutinas", response_model=RutinaSchema, status_code=201)
-def crear_rutina(rutina: RutinaCreate, db: Session = Depends(get_db)):
-    """Crear una nueva rutina"""
-    
-    # Verificar que el nombre sea único
-    rutina_existente = db.query(Rutina).filter(
-        func.lower(Rutina.nombre) == rutina.nombre.lower()
-    ).first()
-    
-    if rutina_existente:
-        raise HTTPException(
-            status_code=400,
-            detail="Ya existe una rutina con ese nombre"
-        )
-    
-    # Crear la nueva rutina
-    nueva_rutina = Rutina(
-        nombre=rutina.nombre.strip(),
-        descripcion=rutina.descripcion
-    )
-    
-    db.add(nueva_rutina)
-    db.commit()
-    db.refresh(nueva_rutina)
-    
-    return nueva_rutina
+async def crear_rutina(
+    rutina: RutinaCreate, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Crear una nueva rutina en el tenant (a nombre del usuario de X-Usuario-ID)"""
+    nueva = await ejecutar(db, crud.crear_rutina, contexto.tenant_id, rutina, contexto.usuario_id)
+    invalidar_listas(contexto.tenant_id)
+    publicar("rutina.creada", contexto.tenant_id, rutina_id=nueva.id, version=nueva.version)
+    return nueva
+
+@router.post("/rutinas/{rutina_id}/clonar", response_model=RutinaSchema, status_code=201)
+async def clonar_rutina(
+    rutina_id: int, datos: ClonarRutina,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Copiar una rutina con sus ejercicios en el servidor (o compartir los de una plantilla)"""
+    nueva = await ejecutar(db, plantillas.clonar_rutina, contexto.tenant_id, rutina_id, datos, contexto.usuario_id)
+    invalidar_listas(contexto.tenant_id)
+    publicar("rutina.creada", contexto.tenant_id, rutina_id=nueva["id"], version=nueva["version"])
+    return nueva
 
 @router.put("/rutinas/{rutina_id}", response_model=RutinaSchema)
-def actualizar_rutina(rutina_id: int, rutina: RutinaUpdate, db: Session = Depends(get_db)):
-    """Actualizar una rutina existente"""
-    
-    db_rutina = db.query(Rutina).filter(Rutina.id == rutina_id).first()
-    
-    if not db_rutina:
-        raise HTTPException(status_code=404, detail="Rutina no encontrada")
-    
-    # Validar que el nuevo nombre sea único (si se cambió)
-    if rutina.nombre and rutina.nombre.lower() != db_rutina.nombre.lower():
-        rutina_existente = db.query(Rutina).filter(
-            func.lower(Rutina.nombre) == rutina.nombre.lower()
-        ).first()
-        
-        if rutina_existente:
-            raise HTTPException(
-                status_code=400,
-                detail="Ya existe una rutina con ese nombre"
-            )
-    
-    # Actualizar campos
-    if rutina.nombre:
-        db_rutina.nombre = rutina.nombre.strip()
-    if rutina.descripcion is not None:
-        db_rutina.descripcion = rutina.descripcion
-    
-    db.commit()
-    db.refresh(db_rutina)
-    
-    return db_rutina
+async def actualizar_rutina(
+    rutina_id: int, rutina: RutinaUpdate,
+    version: Optional[int] = Depends(version_if_match),
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Actualizar una rutina existente (los campos nulos se ignoran)"""
+    cambios = rutina.model_dump(exclude_none=True)
+    actualizada = await ejecutar(db, crud.actualizar_rutina, contexto.tenant_id, rutina_id, cambios, version)
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("rutina.actualizada", contexto.tenant_id, rutina_id=rutina_id, version=actualizada.version)
+    return actualizada
+
+@router.patch("/rutinas/{rutina_id}", response_model=RutinaSchema)
+async def modificar_rutina(
+    rutina_id: int, rutina: RutinaUpdate,
+    version: Optional[int] = Depends(version_if_match),
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Modificar solo los campos enviados (If-Match: "<version>" para evitar pisar otros cambios)"""
+    cambios = rutina.model_dump(exclude_unset=True)
+    actualizada = await ejecutar(db, crud.actualizar_rutina, contexto.tenant_id, rutina_id, cambios, version)
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("rutina.actualizada", contexto.tenant_id, rutina_id=rutina_id, version=actualizada.version)
+    return actualizada
 
 @router.delete("/rutinas/{rutina_id}", status_code=204)
-def eliminar_rutina(rutina_id: int, db: Session = Depends(get_db)):
-    """Eliminar una rutina (se eliminan todos sus ejercicios en cascada)"""
-    
-    db_rutina = db.query(Rutina).filter(Rutina.id == rutina_id).first()
-    
-    if not db_rutina:
-        raise HTTPException(status_code=404, detail="Rutina no encontrada")
-    
-    db.delete(db_rutina)
-    db.commit()
-    
+async def eliminar_rutina(
+    rutina_id: int, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Eliminar una rutina: pasa a la papelera y sus ejercicios se borran al purgarla"""
+    await ejecutar(db, papelera.eliminar_rutina, contexto.tenant_id, rutina_id)
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("rutina.eliminada", contexto.tenant_id, rutina_id=rutina_id)
     return None
 
+@router.post("/rutinas/{rutina_id}/restaurar", response_model=RutinaSchema)
+async def restaurar_rutina(
+    rutina_id: int, datos: Optional[RestaurarRutina] = None,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Sacar una rutina de la papelera (con otro nombre si el suyo ya está en uso)"""
+    rutina = await ejecutar(db, papelera.restaurar_rutina, contexto.tenant_id, rutina_id, datos or RestaurarRutina())
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("rutina.restaurada", contexto.tenant_id, rutina_id=rutina_id, version=rutina["version"])
+    return rutina
+
 # ============ ENDPOINTS DE EJERCICIOS ============
 
 @router.post("/rutinas/{rutina_id}/ejercicios", response_model=EjercicioSchema, status_code=201)
-def crear_ejercicio(rutina_id: int, ejercicio: EjercicioCreate, db: Session = Depends(get_db)):
+async def crear_ejercicio(
+    rutina_id: int, ejercicio: EjercicioCreate,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
     """Agregar un ejercicio a una rutina"""
-    
-    # Verificar que la rutina existe
-    rutina = db.query(Rutina).filter(Rutina.id == rutina_id).first()
-    
-    if not rutina:
-        raise HTTPException(status_code=404, detail="Rutina no encontrada")
-    
-    # Crear el ejercicio
-    nuevo_ejercicio = Ejercicio(
-        nombre=ejercicio.nombre,
-        dia_semana=ejercicio.dia_semana,
-        series=ejercicio.series,
-        repeticiones=ejercicio.repeticiones,
-        peso=ejercicio.peso,
-        notas=ejercicio.notas,
-        orden=ejercicio.orden,
-        rutina_id=rutina_id
-    )
-    
-    db.add(nuevo_ejercicio)
-    db.commit()
-    db.refresh(nuevo_ejercicio)
-    
-    return nuevo_ejercicio
+    nuevo = await ejecutar(db, crud.crear_ejercicio, contexto.tenant_id, rutina_id, ejercicio)
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("ejercicio.creado", contexto.tenant_id, rutina_id=rutina_id, ejercicio_id=nuevo.id)
+    return nuevo
+
+@router.post("/rutinas/{rutina_id}/ejercicios/lote", response_model=list[EjercicioSchema], status_code=201)
+async def crear_ejercicios_lote(
+    rutina_id: int, lote: EjerciciosLote,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Agregar varios ejercicios a una rutina en una sola transacción"""
+    nuevos = await ejecutar(db, crud.crear_ejercicios_lote, contexto.tenant_id, rutina_id, lote.ejercicios)
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("ejercicios.creados", contexto.tenant_id, rutina_id=rutina_id, ejercicios=len(nuevos))
+    return nuevos
+
+@router.put("/rutinas/{rutina_id}/ejercicios", response_model=list[EjercicioSchema])
+async def reemplazar_ejercicios(
+    rutina_id: int, lote: EjerciciosLote,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Reemplazar todos los ejercicios de una rutina por los enviados"""
+    nuevos = await ejecutar(db, crud.crear_ejercicios_lote, contexto.tenant_id, rutina_id, lote.ejercicios, True)
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("ejercicios.reemplazados", contexto.tenant_id, rutina_id=rutina_id, ejercicios=len(nuevos))
+    return nuevos
+
+@router.put("/rutinas/{rutina_id}/ejercicios/orden", response_model=RutinaDetalle)
+async def reordenar_ejercicios(
+    rutina_id: int, datos: ReordenarEjercicios,
+    version: Optional[int] = Depends(version_if_match),
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Reordenar los ejercicios de una rutina por día en una sola operación (admite If-Match: "<version>")"""
+    rutina = await ejecutar(db, crud.reordenar_ejercicios, contexto.tenant_id, rutina_id, datos, version)
+    # Cambian la versión y el resumen, que también aparecen en los listados
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("ejercicios.reordenados", contexto.tenant_id, rutina_id=rutina_id, version=rutina["version"])
+    return rutina
+
+# Los ejercicios de una rutina que comparte una plantilla son los de la
+# plantilla: con rutina_id, modificarlos o eliminarlos materializa esa rutina
+# (ver plantillas.py) y la respuesta trae el id del ejercicio copiado.
+RUTINA_DEL_EJERCICIO = Query(None, description="Rutina desde la que se edita (obligatoria si comparte una plantilla)")
 
 @router.put("/ejercicios/{ejercicio_id}", response_model=EjercicioSchema)
-def actualizar_ejercicio(ejercicio_id: int, ejercicio: EjercicioUpdate, db: Session = Depends(get_db)):
-    """Actualizar un ejercicio existente"""
-    
-    db_ejercicio = db.query(Ejercicio).filter(Ejercicio.id == ejercicio_id).first()
-    
-    if not db_ejercicio:
-        raise HTTPException(status_code=404, detail="Ejercicio no encontrado")
-    
-    # Actualizar solo los campos que se proporcionan
-    if ejercicio.nombre is not None:
-        db_ejercicio.nombre = ejercicio.nombre
-    if ejercicio.dia_semana is not None:
-        db_ejercicio.dia_semana = ejercicio.dia_semana
-    if ejercicio.series is not None:
-        db_ejercicio.series = ejercicio.series
-    if ejercicio.repeticiones is not None:
-        db_ejercicio.repeticiones = ejercicio.repeticiones
-    if ejercicio.peso is not None:
-        db_ejercicio.peso = ejercicio.peso
-    if ejercicio.notas is not None:
-        db_ejercicio.notas = ejercicio.notas
-    if ejercicio.orden is not None:
-        db_ejercicio.orden = ejercicio.orden
-    
-    db.commit()
-    db.refresh(db_ejercicio)
-    
-    return db_ejercicio
+async def actualizar_ejercicio(
+    ejercicio_id: int, ejercicio: EjercicioUpdate,
+    version: Optional[int] = Depends(version_if_match),
+    rutina_id: Optional[int] = RUTINA_DEL_EJERCICIO,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Actualizar un ejercicio existente (los campos nulos se ignoran)"""
+    cambios = ejercicio.model_dump(exclude_none=True)
+    actualizado = await ejecutar(
+        db, crud.actualizar_ejercicio, contexto.tenant_id, ejercicio_id, cambios, version, rutina_id
+    )
+    invalidar_rutina(contexto.tenant_id, actualizado.rutina_id, listas=True)
+    publicar(
+        "ejercicio.actualizado", contexto.tenant_id,
+        rutina_id=actualizado.rutina_id, ejercicio_id=actualizado.id, version=actualizado.version
+    )
+    return actualizado
+
+@router.patch("/ejercicios/{ejercicio_id}", response_model=EjercicioSchema)
+async def modificar_ejercicio(
+    ejercicio_id: int, ejercicio: EjercicioUpdate,
+    version: Optional[int] = Depends(version_if_match),
+    rutina_id: Optional[int] = RUTINA_DEL_EJERCICIO,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Modificar solo los campos enviados (admite If-Match: "<version>")"""
+    cambios = ejercicio.model_dump(exclude_unset=True)
+    actualizado = await ejecutar(
+        db, crud.actualizar_ejercicio, contexto.tenant_id, ejercicio_id, cambios, version, rutina_id
+    )
+    invalidar_rutina(contexto.tenant_id, actualizado.rutina_id, listas=True)
+    publicar(
+        "ejercicio.actualizado", contexto.tenant_id,
+        rutina_id=actualizado.rutina_id, ejercicio_id=actualizado.id, version=actualizado.version
+    )
+    return actualizado
 
 @router.delete("/ejercicios/{ejercicio_id}", status_code=204)
-def eliminar_ejercicio(ejercicio_id: int, db: Session = Depends(get_db)):
+async def eliminar_ejercicio(
+    ejercicio_id: int, rutina_id: Optional[int] = RUTINA_DEL_EJERCICIO,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
     """Eliminar un ejercicio"""
+    rutina_id = await ejecutar(db, crud.eliminar_ejercicio, contexto.tenant_id, ejercicio_id, rutina_id)
+    invalidar_rutina(contexto.tenant_id, rutina_id, listas=True)
+    publicar("ejercicio.eliminado", contexto.tenant_id, rutina_id=rutina_id, ejercicio_id=ejercicio_id)
+    return None
+
+# ============ EVENTOS ============
+
+# Un evento por escritura: {"id", "tipo", "tenant_id", "rutina_id", ...}. Cada
+# cliente recibe solo los de su tenant. "resync" indica que se perdieron
+# eventos (cliente lento o reconexión) y hay que recargar.
+
+@router.get("/eventos", response_class=StreamingResponse)
+async def eventos_sse(
+    request: Request,
+    ultimo: Optional[str] = Query(None, description="Último id recibido (si no se envía Last-Event-ID)"),
+    contexto: Contexto = Depends(contexto_eventos)
+):
+    """Eventos de cambios del tenant como Server-Sent Events"""
+    return StreamingResponse(
+        eventos.flujo_sse(contexto.tenant_id, request.headers.get("last-event-id") or ultimo),
+        media_type="text/event-stream",
+        # Sin buffer en proxies como nginx
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/eventos/ws")
+async def eventos_websocket(
+    websocket: WebSocket, ultimo: Optional[str] = None, tenant: Optional[int] = None,
+    db: SesionBD = Depends(get_db)
+):
+    """Los mismos eventos por WebSocket, un mensaje JSON por evento"""
+    cabecera = websocket.headers.get("x-tenant-id")
+    try:
+        if cabecera is not None and not cabecera.isdigit():
+            raise HTTPException(status_code=400, detail="X-Tenant-ID debe ser un número")
+        tenant_id = int(cabecera) if cabecera is not None else tenant
+        contexto = await tenants.resolver_contexto(db, tenant_id, None)
+    except HTTPException as error:
+        # 1008: política incumplida (tenant desconocido o sin indicar)
+        await websocket.close(code=1008, reason=error.detail)
+        return
+    await websocket.accept()
+    await eventos.atender_websocket(websocket, contexto.tenant_id, ultimo)
+
+# ============ ENDPOINTS DE ANALÍTICA ============
+
+# Sin rutina_id se analizan todas las rutinas del tenant. Las respuestas se
+# cachean y se invalidan junto con los listados (cualquier cambio de ejercicios).
+
+FILTRO_RUTINAS = Query(None, max_length=500, description="Analizar solo estas rutinas (repetible)")
+
+async def _analitica(request: Request, db: SesionBD, contexto: Contexto, esquema, funcion, *args):
+    async def producir():
+        datos = await ejecutar(db, funcion, contexto.tenant_id, *args)
+        return esquema.model_validate(datos).model_dump_json().encode(), None
     
-    db_ejercicio = db.query(Ejercicio).filter(Ejercicio.id == ejercicio_id).first()
-    
-    if not db_ejercicio:
-        raise HTTPException(status_code=404, detail="Ejercicio no encontrado")
-    
-    db.delete(db_ejercicio)
-    db.commit()
-    
-    return None
\ No newline at end of file
+    return await respuesta_cacheada(request, clave_analitica(contexto.tenant_id, request), producir)
+
+@router.get("/analytics/volumen-semanal", response_model=VolumenSemanal)
+async def volumen_semanal(
+    request: Request, rutina_id: Optional[list[int]] = FILTRO_RUTINAS,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Series, repeticiones y volumen por día de la semana"""
+    return await _analitica(request, db, contexto, VolumenSemanal, analitica.volumen_semanal, rutina_id)
+
+@router.get("/analytics/intensidad", response_model=DistribucionIntensidad)
+async def distribucion_intensidad(
+    request: Request,
+    rutina_id: Optional[list[int]] = FILTRO_RUTINAS,
+    tramo_kg: int = Query(20, ge=1, le=500, description="Ancho de cada tramo de carga"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Series por zona de repeticiones (fuerza, hipertrofia, resistencia) y por tramo de carga"""
+    return await _analitica(
+        request, db, contexto, DistribucionIntensidad, analitica.distribucion_intensidad, rutina_id, tramo_kg
+    )
+
+@router.get("/analytics/grupos-musculares", response_model=BalanceMuscular)
+async def balance_muscular(
+    request: Request, rutina_id: Optional[list[int]] = FILTRO_RUTINAS,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Series y volumen por grupo muscular (deducido del nombre del ejercicio)"""
+    return await _analitica(request, db, contexto, BalanceMuscular, analitica.balance_muscular, rutina_id)
+
+@router.get("/analytics/comparar", response_model=ComparacionRutinas)
+async def comparar_rutinas(
+    request: Request,
+    rutina_id: Optional[list[int]] = Query(None, max_length=50, description="Rutinas a comparar (repetible)"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Totales de varias rutinas lado a lado, con su percentil de volumen"""
+    if not rutina_id:
+        raise HTTPException(status_code=400, detail="Indica al menos una rutina con rutina_id")
+    return await _analitica(request, db, contexto, ComparacionRutinas, analitica.comparar_rutinas, rutina_id)
+
+# ============ TRABAJOS EN SEGUNDO PLANO ============
+
+# Responden 202 con el trabajo (Location: /api/trabajos/{id}) y los ejecuta el
+# despachador de trabajos.py en otros procesos. El cliente consulta el
+# trabajo o espera el evento "trabajo.terminado".
+
+def _aceptado(response: Response, trabajo: dict) -> dict:
+    response.headers["Location"] = f"/api/trabajos/{trabajo['id']}"
+    return trabajo
+
+@router.post("/trabajos/importar", response_model=TrabajoSchema, status_code=202)
+async def importar_en_segundo_plano(
+    request: Request, response: Response,
+    formato: Literal["ndjson", "csv"] = Query("ndjson"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Encolar la importación de un archivo como el de /rutinas/exportar (el informe queda en resultado)"""
+    entrada = bytearray()
+    async for trozo in request.stream():
+        entrada += trozo
+        if len(entrada) > trabajos.TRABAJOS_MAX_ENTRADA_BYTES:
+            raise HTTPException(
+                status_code=413, detail=f"El archivo supera {trabajos.TRABAJOS_MAX_ENTRADA_BYTES} bytes"
+            )
+    trabajo = await ejecutar(
+        db, trabajos.encolar, contexto.tenant_id, "importar", {"formato": formato}, bytes(entrada),
+        contexto.usuario_id
+    )
+    return _aceptado(response, trabajo)
+
+@router.post("/trabajos/exportar", response_model=TrabajoSchema, status_code=202)
+async def exportar_en_segundo_plano(
+    response: Response,
+    formato: Literal["ndjson", "csv"] = Query("ndjson"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Encolar la exportación de las rutinas del tenant (el archivo se descarga de /trabajos/{id}/archivo)"""
+    trabajo = await ejecutar(
+        db, trabajos.encolar, contexto.tenant_id, "exportar", {"formato": formato}, None, contexto.usuario_id
+    )
+    return _aceptado(response, trabajo)
+
+@router.post("/trabajos/resumenes", response_model=TrabajoSchema, status_code=202)
+async def recalcular_resumenes(
+    response: Response, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Encolar el recálculo de los totales de todas las rutinas del tenant"""
+    trabajo = await ejecutar(
+        db, trabajos.encolar, contexto.tenant_id, "resumenes", None, None, contexto.usuario_id
+    )
+    return _aceptado(response, trabajo)
+
+@router.post("/rutinas/{rutina_id}/clonar/lote", response_model=TrabajoSchema, status_code=202)
+async def clonar_en_lote(
+    rutina_id: int, datos: ClonarLote, response: Response,
+    contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Encolar una copia de la rutina por cada nombre (los ids quedan en resultado.rutinas)"""
+    trabajo = await ejecutar(
+        db, trabajos.encolar_clonado, contexto.tenant_id, rutina_id, datos, contexto.usuario_id
+    )
+    return _aceptado(response, trabajo)
+
+@router.get("/trabajos", response_model=list[TrabajoSchema])
+async def listar_trabajos(
+    limite: int = Query(50, ge=1, le=200),
+    estado: Optional[Literal["pendiente", "en_curso", "completado", "fallido", "cancelado"]] = Query(None),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Trabajos del tenant, los más recientes primero"""
+    return ORJSONResponse(await ejecutar(db, trabajos.listar_trabajos, contexto.tenant_id, limite, estado))
+
+@router.get("/trabajos/{trabajo_id}", response_model=TrabajoSchema)
+async def obtener_trabajo(
+    trabajo_id: int, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Estado, progreso y resultado de un trabajo"""
+    return ORJSONResponse(await ejecutar(db, trabajos.obtener_trabajo, contexto.tenant_id, trabajo_id))
+
+@router.get("/trabajos/{trabajo_id}/archivo", response_class=StreamingResponse)
+async def descargar_archivo(
+    trabajo_id: int, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Archivo generado por un trabajo de exportación completado, enviado trozo a trozo"""
+    archivo = await ejecutar(db, trabajos.obtener_archivo, contexto.tenant_id, trabajo_id)
+    formato = archivo["formato"]
+    return StreamingResponse(
+        trabajos.trozos_archivo(async_engine or engine, trabajo_id, archivo["intento"]),
+        media_type=intercambio.FORMATOS[formato],
+        headers={
+            "Content-Disposition": f'attachment; filename="rutinas.{formato}"',
+            "Content-Length": str(archivo["bytes"]),
+        },
+    )
+
+@router.post("/trabajos/{trabajo_id}/cancelar", response_model=TrabajoSchema)
+async def cancelar_trabajo(
+    trabajo_id: int, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Cancelar un trabajo pendiente o, si está en curso, pedir que se detenga (409 si ya terminó)"""
+    return ORJSONResponse(await ejecutar(db, trabajos.cancelar_trabajo, contexto.tenant_id, trabajo_id))
+
+# ============ ENTRENAMIENTOS ============
+
+# Sesiones con las series realizadas (entrenamientos.py). Se registran por
+# lotes y no se modifican; las lecturas no pasan por la cache. Sin
+# usuario_id, las consultas abarcan todo el tenant.
+
+@router.post("/sesiones", response_model=ResultadoRegistro)
+async def registrar_sesiones(
+    datos: RegistroSesiones, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Registrar un lote de sesiones con sus series (reenviar una sesión no la duplica)"""
+    resultado = await ejecutar(
+        db, entrenamientos.registrar, contexto.tenant_id, contexto.usuario_id, datos.sesiones
+    )
+    nuevas = [registrada["id"] for registrada in resultado["registradas"] if not registrada["duplicada"]]
+    if nuevas:
+        publicar("sesiones.registradas", contexto.tenant_id, sesion_ids=nuevas, usuario_id=contexto.usuario_id)
+    return ORJSONResponse(resultado)
+
+@router.get("/sesiones", response_model=list[SesionSchema])
+async def listar_sesiones(
+    limite: int = Query(50, ge=1, le=LIMITE_MAXIMO),
+    usuario_id: Optional[int] = Query(None, description="Solo las sesiones de este usuario"),
+    desde: Optional[datetime] = Query(None, description="Iniciadas en o después de esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Iniciadas antes de esta fecha (la página siguiente)"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Sesiones del tenant, las más recientes primero"""
+    return ORJSONResponse(await ejecutar(
+        db, entrenamientos.listar_sesiones, contexto.tenant_id, limite, usuario_id, desde, hasta
+    ))
+
+AgruparHistorial = Literal["sesion", "dia", "semana", "mes"]
+
+@router.get("/sesiones/actividad", response_model=list[PuntoHistorial])
+async def actividad(
+    agrupar: AgruparHistorial = Query("semana"),
+    usuario_id: Optional[int] = Query(None, description="Solo las series de este usuario"),
+    desde: Optional[datetime] = Query(None, description="Series realizadas en o después de esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Series realizadas antes de esta fecha"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Totales de las series del tenant por sesión, día, semana o mes"""
+    return ORJSONResponse(await ejecutar(
+        db, entrenamientos.historial, contexto.tenant_id, agrupar, None, usuario_id, desde, hasta
+    ))
+
+@router.get("/sesiones/{sesion_id}", response_model=SesionDetalle)
+async def obtener_sesion(
+    sesion_id: int, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Una sesión con sus series en el orden en que se hicieron"""
+    return ORJSONResponse(await ejecutar(db, entrenamientos.obtener_sesion, contexto.tenant_id, sesion_id))
+
+@router.get("/ejercicios/{ejercicio_id}/historial", response_model=list[PuntoHistorial])
+async def historial_ejercicio(
+    ejercicio_id: int,
+    agrupar: AgruparHistorial = Query("sesion"),
+    usuario_id: Optional[int] = Query(None, description="Solo las series de este usuario"),
+    desde: Optional[datetime] = Query(None, description="Series realizadas en o después de esta fecha"),
+    hasta: Optional[datetime] = Query(None, description="Series realizadas antes de esta fecha"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Evolución de un ejercicio: series, repeticiones, volumen y peso máximo por periodo"""
+    return ORJSONResponse(await ejecutar(
+        db, entrenamientos.historial, contexto.tenant_id, agrupar, ejercicio_id, usuario_id, desde, hasta
+    ))
+
+# Progreso de un usuario: se lee de las tablas que mantiene progreso.py al
+# registrar series (una fila por ejercicio y otra por semana), sin recorrer
+# el historial.
+
+@router.get("/usuarios/{usuario_id}/progreso", response_model=list[ProgresoSchema])
+async def progreso_usuario(
+    usuario_id: int, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Récords y totales del usuario en cada ejercicio, los últimos entrenados primero"""
+    return ORJSONResponse(await ejecutar(db, progreso.listar, contexto.tenant_id, usuario_id))
+
+@router.get("/usuarios/{usuario_id}/progreso/{ejercicio_id}", response_model=ProgresoDetalle)
+async def progreso_ejercicio(
+    usuario_id: int,
+    ejercicio_id: int,
+    semanas: int = Query(12, ge=1, le=104, description="Semanas de la tendencia, la actual incluida"),
+    contexto: Contexto = Depends(contexto_actual),
+    db: SesionBD = Depends(get_db)
+):
+    """Récords del usuario en un ejercicio y su volumen semanal con la media móvil"""
+    return ORJSONResponse(await ejecutar(
+        db, progreso.obtener, contexto.tenant_id, usuario_id, ejercicio_id, semanas
+    ))
+
+# ============ ENDPOINTS DE USUARIOS ============
+
+# Los tenants se crean con `python -m app.cli tenant <nombre>`; los usuarios,
+# dentro del tenant de la petición.
+
+@router.get("/usuarios", response_model=list[UsuarioSchema])
+async def listar_usuarios(contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)):
+    """Usuarios del tenant"""
+    return ORJSONResponse(await ejecutar(db, tenants.listar_usuarios, contexto.tenant_id))
+
+@router.post("/usuarios", response_model=UsuarioSchema, status_code=201)
+async def crear_usuario(
+    usuario: UsuarioCreate, contexto: Contexto = Depends(contexto_actual), db: SesionBD = Depends(get_db)
+):
+    """Crear un usuario en el tenant (email único dentro del tenant)"""
+    return await ejecutar(db, tenants.crear_usuario, contexto.tenant_id, usuario.nombre, usuario.email)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Dict, Literal, Optional, List
+from datetime import date, datetime, timezone
 from enum import Enum
 
 # Enum para los días
@@ -39,10 +39,27 @@ class EjercicioUpdate(BaseModel):
     notas: Optional[str] = None
     orden: Optional[int] = Field(None, ge=0)
 
+class EjerciciosLote(BaseModel):
+    """Varios ejercicios para crear (o reemplazar) en una sola operación"""
+    ejercicios: List[EjercicioCreate] = Field(..., max_length=500)
+
+class OrdenDia(BaseModel):
+    """Ids de los ejercicios de un día, en el orden deseado"""
+    dia_semana: DiaEnum
+    ejercicios: List[int] = Field(..., max_length=500)
+
+class ReordenarEjercicios(BaseModel):
+    """Nuevo orden de los ejercicios de una rutina, agrupados por día"""
+    version: Optional[int] = Field(
+        None, description="Obsoleto: la versión de la rutina va en la cabecera If-Match"
+    )
+    dias: List[OrdenDia] = Field(..., min_length=1, max_length=7)
+
 class Ejercicio(EjercicioBase):
     """Respuesta de lectura de ejercicio"""
     id: int
     rutina_id: int
+    version: int
     
     class Config:
         from_attributes = True  # Permite convertir objetos SQLAlchemy a dict
@@ -74,10 +91,348 @@ class Rutina(RutinaBase):
     """Respuesta de lectura de rutina (sin ejercicios)"""
     id: int
     fecha_creacion: datetime
+    version: int
+    updated_at: Optional[datetime] = None
+    usuario_id: Optional[int] = None  # Quién la creó (cabecera X-Usuario-ID)
+    es_plantilla: bool = False  # De la biblioteca del tenant: sus ejercicios no se modifican
+    plantilla_id: Optional[int] = None  # Plantilla cuyos ejercicios comparte (hasta modificarlos)
+    
+    class Config:
+        from_attributes = True
+
+class ClonarRutina(BaseModel):
+    """Copia de una rutina en el mismo tenant (ver plantillas.py)"""
+    nombre: Optional[str] = Field(None, min_length=1, max_length=100, description="Por defecto, «<nombre> (copia)»")
+    descripcion: Optional[str] = Field(None, description="Por defecto, la de la rutina original")
+    modo: Literal["copia", "plantilla", "compartida"] = Field(
+        "copia",
+        description="copia: ejercicios propios; plantilla: copia de solo lectura para la biblioteca; "
+                    "compartida: usa los ejercicios de la plantilla hasta que se modifican"
+    )
+
+class ClonarLote(BaseModel):
+    """Varias copias de una rutina, una por nombre, en un trabajo en segundo plano"""
+    nombres: List[str] = Field(..., min_length=1, max_length=5000)
+    modo: Literal["copia", "plantilla", "compartida"] = "copia"
+    
+    @field_validator('nombres')
+    @classmethod
+    def nombres_validos(cls, v):
+        nombres = [nombre.strip() for nombre in v]
+        if not all(0 < len(nombre) <= 100 for nombre in nombres):
+            raise ValueError('Cada nombre debe tener entre 1 y 100 caracteres')
+        return nombres
+
+class EliminarRutinas(BaseModel):
+    """Rutinas que pasan a la papelera en una sola operación"""
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+class ErrorEliminacion(BaseModel):
+    id: int
+    error: str
+
+class ResultadoEliminacion(BaseModel):
+    """Las que se eliminaron y por qué no las demás"""
+    eliminadas: List[int]
+    errores: List[ErrorEliminacion] = []
+
+class RestaurarRutina(BaseModel):
+    """Con nombre, la rutina se restaura con ese (si otra ya usa el suyo)"""
+    nombre: Optional[str] = Field(None, min_length=1, max_length=100)
+
+class RutinaEliminada(BaseModel):
+    """Rutina de la papelera"""
+    id: int
+    nombre: str
+    deleted_at: datetime
+    purga_en: datetime  # Desde entonces ya no se puede restaurar
+
+class TotalesPlan(BaseModel):
+    """Totales de un conjunto de ejercicios; volumen = Σ series × repeticiones × peso"""
+    num_ejercicios: int = 0
+    series: int = 0
+    repeticiones: int = 0
+    volumen: int = 0
+
+class ResumenRutina(TotalesPlan):
+    """Totales de toda la rutina"""
+    num_dias: int = 0
     
     class Config:
         from_attributes = True
 
+class RutinaListado(Rutina):
+    """Rutina de un listado, con sus totales (None si nunca tuvo ejercicios)"""
+    resumen: Optional[ResumenRutina] = None
+
 class RutinaDetalle(Rutina):
     """Respuesta completa de rutina con todos sus ejercicios"""
-    ejercicios: List[Ejercicio] = []
\ No newline at end of file
+    ejercicios: List[Ejercicio] = []
+
+class RutinaExportada(RutinaCreate):
+    """Rutina con sus ejercicios tal como se exporta e importa (una línea NDJSON)"""
+    ejercicios: List[EjercicioCreate] = Field(default=[], max_length=500)
+
+class RutinaPagina(BaseModel):
+    """Página de rutinas con cursor para pedir la siguiente"""
+    items: List[RutinaListado]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+# ============ ESQUEMAS DE USUARIO ============
+
+class UsuarioCreate(BaseModel):
+    """Usuario nuevo del tenant de la petición"""
+    nombre: str = Field(..., min_length=1, max_length=100)
+    email: str = Field(..., min_length=3, max_length=255, pattern=r"^[^@\s]+@[^@\s]+$")
+
+class Usuario(UsuarioCreate):
+    id: int
+    tenant_id: int
+    fecha_creacion: datetime
+
+# ============ ESQUEMAS DEL PLAN SEMANAL ============
+
+class DiaPlan(TotalesPlan):
+    """Ejercicios de un día en orden, con sus totales"""
+    dia_semana: DiaEnum
+    ejercicios: List[Ejercicio]
+
+class PlanSemanal(BaseModel):
+    """Plan de una rutina agrupado por día (solo los días con ejercicios, de lunes a domingo)"""
+    rutina_id: int
+    nombre: str
+    descripcion: Optional[str] = None
+    version: int
+    fecha_creacion: datetime
+    updated_at: Optional[datetime] = None
+    dias: List[DiaPlan]
+    totales: ResumenRutina
+
+# ============ ESQUEMAS DE ANALÍTICA ============
+
+class Distribucion(BaseModel):
+    media: float
+    p50: float
+    p90: float
+    maximo: float
+
+class VolumenDia(TotalesPlan):
+    dia_semana: DiaEnum
+
+class VolumenSemanal(BaseModel):
+    """Totales por día de la semana de las rutinas analizadas"""
+    rutinas: int
+    ejercicios: int
+    dias: List[VolumenDia]
+    volumen_total: int
+    volumen_por_rutina: Distribucion
+
+class ZonaIntensidad(BaseModel):
+    zona: str
+    repeticiones: str
+    series: int
+    porcentaje: float
+
+class TramoCarga(BaseModel):
+    """Series con peso en [desde, hasta) kg"""
+    desde: int
+    hasta: int
+    series: int
+
+class DistribucionIntensidad(BaseModel):
+    series: int
+    zonas: List[ZonaIntensidad]
+    cargas: List[TramoCarga]
+    series_sin_peso: int
+    carga_media: Optional[float] = None
+
+class GrupoMuscular(BaseModel):
+    grupo: str
+    num_ejercicios: int
+    series: int
+    volumen: int
+    porcentaje_series: float
+
+class BalanceMuscular(BaseModel):
+    """Series por grupo; los cocientes son None si el denominador es 0"""
+    grupos: List[GrupoMuscular]
+    empuje_tiron: Optional[float] = None
+    superior_inferior: Optional[float] = None
+
+class ComparacionRutina(ResumenRutina):
+    rutina_id: int
+    nombre: str
+    carga_media: Optional[float] = None
+    percentil_volumen: float
+    series_por_grupo: Dict[str, int]
+
+class ComparacionRutinas(BaseModel):
+    rutinas: List[ComparacionRutina]
+
+# ============ ESQUEMAS DE IMPORTACIÓN ============
+
+class ErrorImportacion(BaseModel):
+    """Línea del archivo que no se importó"""
+    linea: int
+    rutina: Optional[str] = None
+    error: str
+
+class InformeImportacion(BaseModel):
+    """Resultado de una importación; errores trae como mucho los primeros 1000"""
+    rutinas_importadas: int
+    ejercicios_importados: int
+    total_errores: int
+    errores: List[ErrorImportacion]
+
+# ============ ESQUEMAS DE TRABAJOS ============
+
+class Trabajo(BaseModel):
+    """Trabajo en segundo plano (ver trabajos.py)"""
+    id: int
+    tipo: str
+    estado: Literal["pendiente", "en_curso", "completado", "fallido", "cancelado"]
+    hecho: int = Field(..., description="Avance en las unidades del tipo: bytes, rutinas o clones")
+    total: Optional[int] = None
+    intentos: int
+    max_intentos: int
+    cancelar: bool = Field(..., description="Se pidió cancelarlo mientras estaba en curso")
+    error: Optional[str] = None
+    resultado: Optional[dict] = None
+    fecha_creacion: datetime
+    disponible_en: datetime
+    iniciado_en: Optional[datetime] = None
+    terminado_en: Optional[datetime] = None
+
+# ============ ESQUEMAS DE ENTRENAMIENTOS ============
+
+def _en_utc(fecha: Optional[datetime]) -> Optional[datetime]:
+    """Las fechas se guardan en UTC sin zona horaria (como datetime.utcnow)"""
+    if fecha is not None and fecha.tzinfo is not None:
+        return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+class SerieCreate(BaseModel):
+    """Serie realizada; sin realizada_en, se toma el inicio de la sesión"""
+    ejercicio_id: int
+    repeticiones: int = Field(..., ge=0)
+    peso: Optional[int] = Field(None, ge=0, description="Peso en kg, opcional")
+    realizada_en: Optional[datetime] = None
+    
+    @field_validator('realizada_en')
+    @classmethod
+    def realizada_en_utc(cls, v):
+        return _en_utc(v)
+
+class SesionCreate(BaseModel):
+    """Sesión de entrenamiento (también grabada sin conexión), con sus series en el orden en que se hicieron"""
+    cliente_id: str = Field(
+        ..., min_length=1, max_length=64,
+        description="Identificador que genera el cliente (p. ej. un UUID): reenviar la sesión no la duplica"
+    )
+    rutina_id: Optional[int] = None
+    iniciada_en: datetime
+    terminada_en: Optional[datetime] = Field(None, description="Por defecto, la hora de la última serie")
+    notas: Optional[str] = None
+    series: List[SerieCreate] = Field(..., min_length=1, max_length=500)
+    
+    @field_validator('iniciada_en', 'terminada_en')
+    @classmethod
+    def fechas_utc(cls, v):
+        return _en_utc(v)
+    
+    @model_validator(mode='after')
+    def series_dentro_de_la_sesion(self):
+        for serie in self.series:
+            if serie.realizada_en is None:
+                serie.realizada_en = self.iniciada_en
+            elif serie.realizada_en < self.iniciada_en:
+                raise ValueError('Las series no pueden ser anteriores al inicio de la sesión')
+        ultima = max(serie.realizada_en for serie in self.series)
+        if self.terminada_en is None:
+            self.terminada_en = ultima
+        elif ultima > self.terminada_en:
+            raise ValueError('Las series no pueden ser posteriores al final de la sesión')
+        return self
+
+class RegistroSesiones(BaseModel):
+    """Lote de sesiones que se registra en una transacción"""
+    sesiones: List[SesionCreate] = Field(..., min_length=1, max_length=100)
+
+class SesionRegistrada(BaseModel):
+    indice: int  # Posición en el lote
+    cliente_id: str
+    id: int
+    duplicada: bool = Field(..., description="Ya estaba registrada (se reenvió)")
+
+class ErrorRegistro(BaseModel):
+    """Sesión del lote que no se registró"""
+    indice: int
+    cliente_id: str
+    error: str
+
+class ResultadoRegistro(BaseModel):
+    registradas: List[SesionRegistrada]
+    series: int  # Series insertadas
+    errores: List[ErrorRegistro] = []
+
+class Sesion(BaseModel):
+    """Sesión registrada con sus totales; volumen = Σ repeticiones × peso"""
+    id: int
+    usuario_id: Optional[int] = None
+    rutina_id: Optional[int] = None
+    cliente_id: str
+    iniciada_en: datetime
+    terminada_en: datetime
+    notas: Optional[str] = None
+    num_series: int
+    repeticiones: int
+    volumen: int
+    fecha_registro: datetime
+
+class SerieRealizada(BaseModel):
+    orden: int
+    ejercicio_id: int
+    ejercicio: Optional[str] = None  # Nombre del ejercicio; null si ya no existe
+    repeticiones: int
+    peso: Optional[int] = None
+    realizada_en: datetime
+
+class SesionDetalle(Sesion):
+    series: List[SerieRealizada]
+
+class PuntoHistorial(BaseModel):
+    """Totales de las series de un periodo (o de una sesión)"""
+    periodo: date  # Primer día del periodo, o el día de la sesión
+    sesion_id: Optional[int] = None  # Solo al agrupar por sesión
+    sesiones: int
+    series: int
+    repeticiones: int
+    volumen: int
+    peso_maximo: Optional[int] = None
+
+class Progreso(BaseModel):
+    """Totales y récords de un usuario en un ejercicio; 1RM estimado con la fórmula de Epley"""
+    ejercicio_id: int
+    ejercicio: Optional[str] = None  # Nombre del ejercicio; null si ya no existe
+    series: int
+    repeticiones: int
+    volumen: int
+    peso_maximo: Optional[int] = None
+    peso_maximo_en: Optional[datetime] = None
+    mejor_1rm: Optional[float] = None
+    mejor_1rm_en: Optional[datetime] = None
+    primera_serie_en: datetime
+    ultima_serie_en: datetime
+
+class SemanaProgreso(BaseModel):
+    semana: date  # Lunes de la semana
+    series: int
+    repeticiones: int
+    volumen: int
+    peso_maximo: Optional[int] = None
+    mejor_1rm: Optional[float] = None
+    volumen_medio: float  # Media del volumen de esta semana y las tres anteriores
+
+class ProgresoDetalle(Progreso):
+    semanas: List[SemanaProgreso]
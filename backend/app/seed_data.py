@@ -1,332 +1,195 @@
 """
-Script para cargar datos de ejemplo en la base de datos
+Carga de datos en la base de datos: las rutinas de ejemplo y conjuntos
+sintéticos del tamaño que se pida (para benchmarks y pruebas de carga).
+
+Todo se inserta con insert() en lotes (executemany), sin crear objetos ORM.
+Se ejecuta desde la línea de comandos (python -m app.cli seed), no al
+arrancar la aplicación.
 """
-from app.database import SessionLocal
-from app.models import Rutina, Ejercicio, DiaEnum
+import random
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import Rutina, Ejercicio, DiaEnum, Tenant
+from app.plan import reconstruir_resumenes
+from app.tenants import TENANT_PRINCIPAL
+
+# ============ RUTINAS DE EJEMPLO ============
+
+# (nombre, dia_semana, series, repeticiones, peso, notas, orden)
+RUTINAS_EJEMPLO = [
+    {
+        "nombre": "Push Day",
+        "descripcion": "Día de empuje: pecho, espalda y tríceps. Enfoque en movimientos compuestos.",
+        "ejercicios": [
+            ("Press de Banca", DiaEnum.LUNES, 4, 8, 100, "Movimiento principal, controlar el descenso", 1),
+            ("Aperturas con Mancuernas", DiaEnum.LUNES, 3, 10, 30, "Aislamiento de pecho", 2),
+            ("Fondos en Paralelas", DiaEnum.LUNES, 3, 8, 25, "Añadir peso si es necesario", 3),
+            ("Press Militar", DiaEnum.LUNES, 3, 8, 50, "Hombros y pecho superior", 4),
+            ("Remo Barbell", DiaEnum.MIERCOLES, 4, 6, 120, "Espalda ancha y gruesa", 1),
+            ("Jalón Polea Alta", DiaEnum.MIERCOLES, 3, 10, 80, "Aislamiento de espalda", 2),
+            ("Extensiones de Tríceps", DiaEnum.MIERCOLES, 3, 12, 40, "Control total del movimiento", 3),
+            ("Dominadas", DiaEnum.VIERNES, 4, 8, None, "Peso corporal, añadir banda si es necesario", 1),
+        ],
+    },
+    {
+        "nombre": "Leg Day",
+        "descripcion": "Día intenso de piernas. Trabajar cuádriceps, isquiotibiales y glúteos.",
+        "ejercicios": [
+            ("Sentadillas", DiaEnum.MARTES, 5, 5, 150, "Movimiento fundamental, forma perfecta", 1),
+            ("Prensa de Piernas", DiaEnum.MARTES, 3, 10, 300, "Descenso controlado", 2),
+            ("Extensiones de Cuádriceps", DiaEnum.MARTES, 3, 12, 100, "Aislamiento puro", 3),
+            ("Flexiones de Isquiotibiales", DiaEnum.MARTES, 3, 12, 80, "Equilibrio muscular", 4),
+            ("Peso Muerto", DiaEnum.JUEVES, 4, 6, 180, "Máxima intensidad, técnica perfecta", 1),
+            ("Sentadilla Búlgara", DiaEnum.JUEVES, 3, 10, 40, "Por pierna", 2),
+            ("Curl de Piernas", DiaEnum.JUEVES, 3, 12, 90, "Terminar los isquiotibiales", 3),
+        ],
+    },
+    {
+        "nombre": "Full Body",
+        "descripcion": "Rutina de cuerpo completo para días de entrenamiento moderado. Ideal para 3 días por semana.",
+        "ejercicios": [
+            ("Sentadillas", DiaEnum.LUNES, 3, 8, 120, "Calentamiento incluido", 1),
+            ("Press de Banca", DiaEnum.LUNES, 3, 8, 80, "Pecho", 2),
+            ("Remo Barbell", DiaEnum.LUNES, 3, 8, 100, "Espalda", 3),
+            ("Flexiones de Isquiotibiales", DiaEnum.LUNES, 2, 12, 70, "Posterior", 4),
+            ("Peso Muerto", DiaEnum.MIERCOLES, 3, 6, 140, "Máxima potencia", 1),
+            ("Dominadas", DiaEnum.MIERCOLES, 3, 8, None, "Espalda y brazos", 2),
+            ("Press Militar", DiaEnum.MIERCOLES, 3, 8, 45, "Hombros", 3),
+            ("Flexiones", DiaEnum.MIERCOLES, 3, 12, None, "Peso corporal", 4),
+            ("Sentadilla Búlgara", DiaEnum.VIERNES, 3, 10, 35, "Por pierna", 1),
+            ("Aperturas con Mancuernas", DiaEnum.VIERNES, 3, 12, 25, "Pecho aislado", 2),
+            ("Jalón Polea", DiaEnum.VIERNES, 3, 12, 70, "Espalda", 3),
+            ("Extensiones de Tríceps", DiaEnum.VIERNES, 3, 12, 35, "Brazos", 4),
+        ],
+    },
+]
+
+CAMPOS_EJERCICIO = ("nombre", "dia_semana", "series", "repeticiones", "peso", "notas", "orden")
+
+# ============ DATOS SINTÉTICOS ============
+
+PALABRAS = [
+    "push", "pull", "leg", "full", "body", "upper", "lower", "core", "power",
+    "fuerza", "hipertrofia", "resistencia", "cardio", "movilidad", "volumen",
+    "definicion", "principiante", "avanzado", "intermedio", "express",
+]
+EJERCICIOS = [
+    "Press de Banca", "Sentadillas", "Peso Muerto", "Remo Barbell", "Dominadas",
+    "Press Militar", "Fondos en Paralelas", "Curl de Piernas", "Jalón Polea",
+    "Extensiones de Tríceps", "Sentadilla Búlgara", "Aperturas con Mancuernas",
+]
+LOTE = 10_000
+
+
+def generar_sinteticos(
+    total: int, ejercicios_por_rutina: int, semilla: int = 42, primer_id: int = 1,
+    tenants: Sequence[int] = (TENANT_PRINCIPAL,)
+) -> Iterator[tuple[list[dict], list[dict]]]:
+    """
+    Genera lotes (rutinas, ejercicios) de hasta LOTE rutinas cada uno,
+    repartidas por turnos entre los tenants indicados. Los ids se asignan
+    aquí para no tener que leerlos de vuelta; con la misma semilla se
+    obtiene siempre el mismo conjunto.
+    """
+    rnd = random.Random(semilla)
+    dias = list(DiaEnum)
+    for inicio in range(primer_id, primer_id + total, LOTE):
+        ids = range(inicio, min(inicio + LOTE, primer_id + total))
+        rutinas = [
+            {
+                "id": i,
+                "nombre": f"{' '.join(rnd.sample(PALABRAS, 3))} {i}",
+                "descripcion": " ".join(rnd.choices(PALABRAS, k=8)),
+                "tenant_id": tenants[(i - primer_id) % len(tenants)],
+            }
+            for i in ids
+        ]
+        ejercicios = [
+            {
+                "rutina_id": i,
+                "tenant_id": tenants[(i - primer_id) % len(tenants)],
+                "nombre": rnd.choice(EJERCICIOS),
+                "dia_semana": rnd.choice(dias),
+                "series": rnd.randint(2, 5),
+                "repeticiones": rnd.randint(5, 15),
+                "peso": rnd.randint(10, 150),
+                "orden": orden,
+            }
+            for i in ids
+            for orden in range(1, ejercicios_por_rutina + 1)
+        ]
+        yield rutinas, ejercicios
+
 
-def seed_database():
-    """Carga rutinas y ejercicios de ejemplo"""
-    db = SessionLocal()
-    
-    # Verificar si ya hay datos
-    rutinas_existentes = db.query(Rutina).count()
-    if rutinas_existentes > 0:
-        print("✓ Base de datos ya contiene datos. Saltando seed.")
-        db.close()
+def _ajustar_secuencias(conn: Connection):
+    """Con ids explícitos PostgreSQL no avanza las secuencias SERIAL"""
+    if conn.dialect.name != "postgresql":
         return
-    
-    # ============ RUTINA 1: PUSH DAY ============
-    push_day = Rutina(
-        nombre="Push Day",
-        descripcion="Día de empuje: pecho, espalda y tríceps. Enfoque en movimientos compuestos."
-    )
-    db.add(push_day)
-    db.flush()
-    
-    ejercicios_push = [
-        Ejercicio(
-            nombre="Press de Banca",
-            dia_semana=DiaEnum.LUNES,
-            series=4,
-            repeticiones=8,
-            peso=100,
-            notas="Movimiento principal, controlar el descenso",
-            orden=1,
-            rutina_id=push_day.id
-        ),
-        Ejercicio(
-            nombre="Aperturas con Mancuernas",
-            dia_semana=DiaEnum.LUNES,
-            series=3,
-            repeticiones=10,
-            peso=30,
-            notas="Aislamiento de pecho",
-            orden=2,
-            rutina_id=push_day.id
-        ),
-        Ejercicio(
-            nombre="Fondos en Paralelas",
-            dia_semana=DiaEnum.LUNES,
-            series=3,
-            repeticiones=8,
-            peso=25,
-            notas="Añadir peso si es necesario",
-            orden=3,
-            rutina_id=push_day.id
-        ),
-        Ejercicio(
-            nombre="Press Militar",
-            dia_semana=DiaEnum.LUNES,
-            series=3,
-            repeticiones=8,
-            peso=50,
-            notas="Hombros y pecho superior",
-            orden=4,
-            rutina_id=push_day.id
-        ),
-        Ejercicio(
-            nombre="Remo Barbell",
-            dia_semana=DiaEnum.MIERCOLES,
-            series=4,
-            repeticiones=6,
-            peso=120,
-            notas="Espalda ancha y gruesa",
-            orden=1,
-            rutina_id=push_day.id
-        ),
-        Ejercicio(
-            nombre="Jalón Polea Alta",
-            dia_semana=DiaEnum.MIERCOLES,
-            series=3,
-            repeticiones=10,
-            peso=80,
-            notas="Aislamiento de espalda",
-            orden=2,
-            rutina_id=push_day.id
-        ),
-        Ejercicio(
-            nombre="Extensiones de Tríceps",
-            dia_semana=DiaEnum.MIERCOLES,
-            series=3,
-            repeticiones=12,
-            peso=40,
-            notas="Control total del movimiento",
-            orden=3,
-            rutina_id=push_day.id
-        ),
-        Ejercicio(
-            nombre="Dominadas",
-            dia_semana=DiaEnum.VIERNES,
-            series=4,
-            repeticiones=8,
-            peso=None,
-            notas="Peso corporal, añadir banda si es necesario",
-            orden=1,
-            rutina_id=push_day.id
-        ),
-    ]
-    
-    # ============ RUTINA 2: LEG DAY ============
-    leg_day = Rutina(
-        nombre="Leg Day",
-        descripcion="Día intenso de piernas. Trabajar cuádriceps, isquiotibiales y glúteos."
-    )
-    db.add(leg_day)
-    db.flush()
-    
-    ejercicios_leg = [
-        Ejercicio(
-            nombre="Sentadillas",
-            dia_semana=DiaEnum.MARTES,
-            series=5,
-            repeticiones=5,
-            peso=150,
-            notas="Movimiento fundamental, forma perfecta",
-            orden=1,
-            rutina_id=leg_day.id
-        ),
-        Ejercicio(
-            nombre="Prensa de Piernas",
-            dia_semana=DiaEnum.MARTES,
-            series=3,
-            repeticiones=10,
-            peso=300,
-            notas="Descenso controlado",
-            orden=2,
-            rutina_id=leg_day.id
-        ),
-        Ejercicio(
-            nombre="Extensiones de Cuádriceps",
-            dia_semana=DiaEnum.MARTES,
-            series=3,
-            repeticiones=12,
-            peso=100,
-            notas="Aislamiento puro",
-            orden=3,
-            rutina_id=leg_day.id
-        ),
-        Ejercicio(
-            nombre="Flexiones de Isquiotibiales",
-            dia_semana=DiaEnum.MARTES,
-            series=3,
-            repeticiones=12,
-            peso=80,
-            notas="Equilibrio muscular",
-            orden=4,
-            rutina_id=leg_day.id
-        ),
-        Ejercicio(
-            nombre="Peso Muerto",
-            dia_semana=DiaEnum.JUEVES,
-            series=4,
-            repeticiones=6,
-            peso=180,
-            notas="Máxima intensidad, técnica perfecta",
-            orden=1,
-            rutina_id=leg_day.id
-        ),
-        Ejercicio(
-            nombre="Sentadilla Búlgara",
-            dia_semana=DiaEnum.JUEVES,
-            series=3,
-            repeticiones=10,
-            peso=40,
-            notas="Por pierna",
-            orden=2,
-            rutina_id=leg_day.id
-        ),
-        Ejercicio(
-            nombre="Curl de Piernas",
-            dia_semana=DiaEnum.JUEVES,
-            series=3,
-            repeticiones=12,
-            peso=90,
-            notas="Terminar los isquiotibiales",
-            orden=3,
-            rutina_id=leg_day.id
-        ),
-    ]
-    
-    # ============ RUTINA 3: FULL BODY ============
-    full_body = Rutina(
-        nombre="Full Body",
-        descripcion="Rutina de cuerpo completo para días de entrenamiento moderado. Ideal para 3 días por semana."
-    )
-    db.add(full_body)
-    db.flush()
-    
-    ejercicios_full = [
-        Ejercicio(
-            nombre="Sentadillas",
-            dia_semana=DiaEnum.LUNES,
-            series=3,
-            repeticiones=8,
-            peso=120,
-            notas="Calentamiento incluido",
-            orden=1,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Press de Banca",
-            dia_semana=DiaEnum.LUNES,
-            series=3,
-            repeticiones=8,
-            peso=80,
-            notas="Pecho",
-            orden=2,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Remo Barbell",
-            dia_semana=DiaEnum.LUNES,
-            series=3,
-            repeticiones=8,
-            peso=100,
-            notas="Espalda",
-            orden=3,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Flexiones de Isquiotibiales",
-            dia_semana=DiaEnum.LUNES,
-            series=2,
-            repeticiones=12,
-            peso=70,
-            notas="Posterior",
-            orden=4,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Peso Muerto",
-            dia_semana=DiaEnum.MIERCOLES,
-            series=3,
-            repeticiones=6,
-            peso=140,
-            notas="Máxima potencia",
-            orden=1,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Dominadas",
-            dia_semana=DiaEnum.MIERCOLES,
-            series=3,
-            repeticiones=8,
-            peso=None,
-            notas="Espalda y brazos",
-            orden=2,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Press Militar",
-            dia_semana=DiaEnum.MIERCOLES,
-            series=3,
-            repeticiones=8,
-            peso=45,
-            notas="Hombros",
-            orden=3,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Flexiones",
-            dia_semana=DiaEnum.MIERCOLES,
-            series=3,
-            repeticiones=12,
-            peso=None,
-            notas="Peso corporal",
-            orden=4,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Sentadilla Búlgara",
-            dia_semana=DiaEnum.VIERNES,
-            series=3,
-            repeticiones=10,
-            peso=35,
-            notas="Por pierna",
-            orden=1,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Aperturas con Mancuernas",
-            dia_semana=DiaEnum.VIERNES,
-            series=3,
-            repeticiones=12,
-            peso=25,
-            notas="Pecho aislado",
-            orden=2,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Jalón Polea",
-            dia_semana=DiaEnum.VIERNES,
-            series=3,
-            repeticiones=12,
-            peso=70,
-            notas="Espalda",
-            orden=3,
-            rutina_id=full_body.id
-        ),
-        Ejercicio(
-            nombre="Extensiones de Tríceps",
-            dia_semana=DiaEnum.VIERNES,
-            series=3,
-            repeticiones=12,
-            peso=35,
-            notas="Brazos",
-            orden=4,
-            rutina_id=full_body.id
-        ),
-    ]
-    
-    # Agregar todos los ejercicios
-    db.add_all(ejercicios_push)
-    db.add_all(ejercicios_leg)
-    db.add_all(ejercicios_full)
-    
-    # Guardar todo
-    db.commit()
+    for tabla in ("tenants", "rutinas", "ejercicios"):
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), "
+            f"coalesce((SELECT max(id) FROM {tabla}), 0) + 1, false)"
+        ))
+
+
+def crear_tenants(conn: Connection, ids: Iterable[int]):
+    """Crea los tenants con esos ids que no existan todavía ("Tenant <id>")"""
+    nuevos = sorted(set(ids) - set(conn.scalars(select(Tenant.id))))
+    if nuevos:
+        ahora = datetime.utcnow()
+        conn.execute(insert(Tenant), [{"id": i, "nombre": f"Tenant {i}", "fecha_creacion": ahora} for i in nuevos])
+
+
+def cargar_sinteticos(
+    motor: Engine, total: int, ejercicios_por_rutina: int = 5, semilla: int = 42,
+    tenants: Sequence[int] = (TENANT_PRINCIPAL,)
+):
+    """
+    Inserta `total` rutinas sintéticas a continuación de las existentes,
+    repartidas entre los tenants indicados (los que no existan se crean)
+    """
+    with motor.begin() as conn:
+        crear_tenants(conn, tenants)
+        primer_id = (conn.scalar(select(func.max(Rutina.id))) or 0) + 1
+        for rutinas, ejercicios in generar_sinteticos(total, ejercicios_por_rutina, semilla, primer_id, tenants):
+            conn.execute(insert(Rutina), rutinas)
+            if ejercicios:
+                conn.execute(insert(Ejercicio), ejercicios)
+        reconstruir_resumenes(conn, primer_id)
+        _ajustar_secuencias(conn)
+
+
+# ============ SEED ============
+
+def seed_database(motor: Optional[Engine] = None) -> bool:
+    """Carga las rutinas de ejemplo si la BD está vacía. Devuelve si las cargó."""
+    if motor is None:
+        from app.database import engine as motor
+
+    with motor.begin() as conn:
+        if conn.scalar(select(Rutina.id).limit(1)) is not None:
+            print("✓ Base de datos ya contiene datos. Saltando seed.")
+            return False
+
+        ids = dict(conn.execute(
+            insert(Rutina).returning(Rutina.nombre, Rutina.id),
+            [
+                {"nombre": r["nombre"], "descripcion": r["descripcion"], "tenant_id": TENANT_PRINCIPAL}
+                for r in RUTINAS_EJEMPLO
+            ]
+        ).all())
+        conn.execute(insert(Ejercicio), [
+            {**dict(zip(CAMPOS_EJERCICIO, ejercicio)), "rutina_id": ids[rutina["nombre"]], "tenant_id": TENANT_PRINCIPAL}
+            for rutina in RUTINAS_EJEMPLO
+            for ejercicio in rutina["ejercicios"]
+        ])
+        reconstruir_resumenes(conn)
+
     print("✓ Datos de ejemplo cargados exitosamente")
-    print("  - Push Day (8 ejercicios)")
-    print("  - Leg Day (7 ejercicios)")
-    print("  - Full Body (12 ejercicios)")
-    db.close()
\ No newline at end of file
+    for rutina in RUTINAS_EJEMPLO:
+        print(f"  - {rutina['nombre']} ({len(rutina['ejercicios'])} ejercicios)")
+    return True
@@ -0,0 +1,19 @@
+"""
+Serialización de las respuestas de lectura sin pasar por Pydantic.
+
+Los datos de las lecturas salen de la BD, donde ya se validaron al
+escribirse: volver a validarlos con model_validate() solo cuesta tiempo.
+consultas.py los devuelve como dicts con la forma exacta de los esquemas
+(RutinaListado, RutinaDetalle, PlanSemanal) y aquí se codifican con orjson,
+que además entiende datetime y Enum sin conversión previa.
+
+Los endpoints siguen declarando response_model para la documentación
+(OpenAPI); al devolver una Response FastAPI no la vuelve a validar.
+"""
+import orjson
+
+
+def a_json(datos) -> bytes:
+    """JSON compacto, como el de model_dump_json()"""
+    return orjson.dumps(datos)
+
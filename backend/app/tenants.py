@@ -0,0 +1,162 @@
+"""
+Tenants (gimnasios u organizaciones) y usuarios dueños de las rutinas.
+
+Cada petición trabaja dentro de un tenant, que llega en la cabecera
+X-Tenant-ID (y el usuario, si se conoce, en X-Usuario-ID). La API no
+autentica: se supone detrás de un gateway que valida la identidad y fija
+esas cabeceras. Sin X-Tenant-ID se usa TENANT_POR_DEFECTO (el tenant 1 que
+crea la migración), salvo con TENANT_OBLIGATORIO=true.
+
+Todas las consultas de crud.py, plantillas.py, busqueda.py, plan.py, analitica.py,
+intercambio.py y entrenamientos.py filtran por tenant_id y los índices de rutinas empiezan por
+tenant_id: el coste de una petición depende de las filas de su tenant, no
+del total. Las rutinas de la papelera (deleted_at) quedan fuera de
+filtro_tenant e ids_del_tenant: para la API ya no existen (ver papelera.py).
+
+Los ejercicios llevan el tenant_id de su rutina, repetido para que los
+índices de búsqueda empiecen por tenant_id (migración 0013). Todo lo que
+inserta ejercicios tiene que copiarlo: crud.py, plantillas.py (CAMPOS_COPIA),
+intercambio.py y seed_data.py. filtro_tenant(Ejercicio, ...) sigue pasando
+por la rutina a propósito: la papelera solo se marca en rutinas.deleted_at.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Query
+from sqlalchemy import and_, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import ajustes
+from app.database import SesionBD, ejecutar, get_db
+from app.models import Rutina, Tenant, Usuario
+
+TENANT_PRINCIPAL = 1  # Lo crea la migración 0007; ahí quedan las rutinas anteriores
+TENANT_POR_DEFECTO = ajustes.tenant_por_defecto
+TENANT_OBLIGATORIO = ajustes.tenant_obligatorio
+
+# Pares (tenant, usuario) ya comprobados en este proceso (los tenants no se borran desde la API)
+MAX_CONOCIDOS = 10_000
+_conocidos: set[tuple[int, Optional[int]]] = set()
+
+
+@dataclass(frozen=True)
+class Contexto:
+    """Tenant y usuario de la petición"""
+    tenant_id: int
+    usuario_id: Optional[int] = None
+
+
+def filtro_tenant(modelo, tenant_id: int):
+    """
+    Condición que deja solo las filas del tenant que no están en la papelera
+    (deleted_at IS NULL es el predicado de los índices parciales de rutinas).
+    Para los ejercicios es un EXISTS correlacionado con su rutina (se
+    resuelve por clave primaria): su propio tenant_id no dice si la rutina
+    está en la papelera.
+    """
+    if modelo is Rutina:
+        return and_(Rutina.tenant_id == tenant_id, Rutina.deleted_at.is_(None))
+    return select(Rutina.id).where(
+        Rutina.id == modelo.rutina_id, Rutina.tenant_id == tenant_id, Rutina.deleted_at.is_(None)
+    ).exists()
+
+
+def ids_del_tenant(tenant_id: int, rutina_ids: Optional[list[int]] = None):
+    """Subconsulta con los ids de las rutinas del tenant (todas o las indicadas)"""
+    consulta = select(Rutina.id).where(filtro_tenant(Rutina, tenant_id))
+    if rutina_ids:
+        consulta = consulta.where(Rutina.id.in_(rutina_ids))
+    return consulta
+
+
+# ============ CONTEXTO DE LA PETICIÓN ============
+
+def _comprobar(db: Session, tenant_id: int, usuario_id: Optional[int]) -> Optional[str]:
+    """Mensaje de error si el tenant no existe o el usuario no es suyo; None si todo está bien"""
+    try:
+        if db.scalar(select(Tenant.id).where(Tenant.id == tenant_id)) is None:
+            return "tenant"
+        if usuario_id is not None and db.scalar(
+            select(Usuario.id).where(Usuario.id == usuario_id, Usuario.tenant_id == tenant_id)
+        ) is None:
+            return "usuario"
+        return None
+    finally:
+        # Termina la transacción de lectura: las respuestas por trozos no retienen la conexión
+        db.rollback()
+
+
+async def resolver_contexto(db: SesionBD, tenant_id: Optional[int], usuario_id: Optional[int]) -> Contexto:
+    if tenant_id is None:
+        if TENANT_OBLIGATORIO:
+            raise HTTPException(status_code=400, detail="Falta la cabecera X-Tenant-ID")
+        tenant_id = TENANT_POR_DEFECTO
+
+    if (tenant_id, usuario_id) not in _conocidos:
+        error = await ejecutar(db, _comprobar, tenant_id, usuario_id)
+        if error == "tenant":
+            raise HTTPException(status_code=404, detail="Tenant no encontrado")
+        if error == "usuario":
+            raise HTTPException(status_code=403, detail="El usuario no pertenece al tenant")
+        if len(_conocidos) >= MAX_CONOCIDOS:
+            _conocidos.clear()
+        _conocidos.add((tenant_id, usuario_id))
+
+    return Contexto(tenant_id, usuario_id)
+
+
+async def contexto_actual(
+    x_tenant_id: Optional[int] = Header(None, description="Tenant de la petición (fijado por el gateway)"),
+    x_usuario_id: Optional[int] = Header(None, description="Usuario que hace la petición, si se conoce"),
+    db: SesionBD = Depends(get_db)
+) -> Contexto:
+    """Dependencia de los endpoints: el tenant y el usuario de las cabeceras, ya comprobados"""
+    return await resolver_contexto(db, x_tenant_id, x_usuario_id)
+
+
+async def contexto_eventos(
+    tenant: Optional[int] = Query(None, description="Tenant, si no se puede enviar X-Tenant-ID (EventSource)"),
+    x_tenant_id: Optional[int] = Header(None),
+    db: SesionBD = Depends(get_db)
+) -> Contexto:
+    """Como contexto_actual, pero EventSource no envía cabeceras: admite ?tenant="""
+    return await resolver_contexto(db, x_tenant_id if x_tenant_id is not None else tenant, None)
+
+
+# ============ ALTAS ============
+
+def crear_tenant(db: Session, nombre: str) -> int:
+    """Crea un tenant y devuelve su id (nombre único sin distinguir mayúsculas)"""
+    try:
+        tenant_id = db.scalar(
+            insert(Tenant).values(nombre=nombre.strip()).returning(Tenant.id)
+        )
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Ya existe un tenant con ese nombre")
+    db.commit()
+    return tenant_id
+
+
+def listar_usuarios(db: Session, tenant_id: int) -> list[dict]:
+    filas = db.execute(
+        select(Usuario.nombre, Usuario.email, Usuario.id, Usuario.tenant_id, Usuario.fecha_creacion)
+        .where(Usuario.tenant_id == tenant_id)
+        .order_by(func.lower(Usuario.email))
+    )
+    return [fila._asdict() for fila in filas]
+
+
+def crear_usuario(db: Session, tenant_id: int, nombre: str, email: str) -> dict:
+    try:
+        fila = db.execute(
+            insert(Usuario)
+            .values(tenant_id=tenant_id, nombre=nombre.strip(), email=email.strip())
+            .returning(Usuario.nombre, Usuario.email, Usuario.id, Usuario.tenant_id, Usuario.fecha_creacion)
+        ).one()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Ya existe un usuario con ese email en el tenant")
+    db.commit()
+    return fila._asdict()
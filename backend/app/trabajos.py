@@ -0,0 +1,673 @@
+"""
+Trabajos en segundo plano: importaciones, exportaciones, recálculo de
+resúmenes y clonados masivos, fuera del proceso que atiende la petición.
+
+La cola es la tabla trabajos, en la misma base de datos (sin broker): el
+endpoint inserta el trabajo y responde 202 con él; un Despachador lo reclama
+y lo ejecuta en un ProcessPoolExecutor. El despachador se arranca junto a
+uvicorn con `python -m app.cli worker --procesos 4`, o dentro de cada worker
+de uvicorn con TRABAJOS_PROCESOS > 0.
+
+- Reclamar: UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)
+  RETURNING id. En PostgreSQL varios despachadores reclaman a la vez sin
+  esperarse ni repetir trabajos; en SQLite el UPDATE ya es atómico.
+- Progreso: cada tipo informa de hecho/total con Ejecucion.progreso(), que
+  escribe como mucho cada PROGRESO_SEGUNDOS y comprueba si se pidió cancelar.
+- Reintentos: un trabajo que falla vuelve a la cola tras una espera
+  exponencial con jitter, hasta max_intentos. Los errores HTTPException (la
+  rutina ya no existe...) no se reintentan.
+- Cancelar: un trabajo pendiente se cancela al momento; uno en curso, en su
+  siguiente progreso (lo ya hecho, p. ej. los lotes importados, se queda).
+- Caídas: el despachador renueva el latido de sus trabajos; los que llevan
+  TRABAJOS_CADUCIDAD_SEGUNDOS sin latido (su worker murió) vuelven a la
+  cola como un intento fallido. Reintentar es seguro: importar y clonar
+  saltan los nombres que ya existen.
+- Archivos: la exportación escribe su archivo en trabajos_trozos, de
+  TROZO_SALIDA en TROZO_SALIDA bytes, y /trabajos/{id}/archivo lo envía
+  trozo a trozo; ni el worker ni la descarga lo tienen entero en memoria.
+  Pasado TRABAJOS_MAX_SALIDA_BYTES el trabajo falla.
+- Limpieza: cada PURGA_SEGUNDOS borra los trabajos terminados antiguos,
+  purga la papelera de rutinas (papelera.purgar) y mantiene las particiones
+  de las series realizadas (entrenamientos.mantener).
+
+Al terminar un trabajo se publica "trabajo.terminado" y, si modificó
+rutinas, se invalidan los listados del tenant. Con `app.cli worker` los
+procesos de uvicorn solo se enteran con EVENTOS_BACKEND=postgres; con el
+backend local sus listados se actualizan al caducar la cache (TTL).
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import random
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, delete, func, insert, null, select, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from app import entrenamientos, intercambio, papelera
+from app.cache import invalidar_listas
+from app.config import ajustes
+from app.database import SessionLocal, engine
+from app.eventos import hub, publicar
+from app.models import ESTADOS_TRABAJO, Rutina, RutinaResumen, Trabajo, TrozoSalida
+from app.plan import crear_resumenes
+from app.plantillas import clonar_rutina
+from app.schemas import ClonarLote, ClonarRutina
+from app.tenants import filtro_tenant
+
+logger = logging.getLogger(__name__)
+
+TRABAJOS_PROCESOS = ajustes.trabajos_procesos
+TRABAJOS_INTERVALO_SEGUNDOS = ajustes.trabajos_intervalo_segundos
+TRABAJOS_MAX_INTENTOS = ajustes.trabajos_max_intentos
+TRABAJOS_ESPERA_BASE_SEGUNDOS = ajustes.trabajos_espera_base_segundos
+TRABAJOS_ESPERA_MAXIMA_SEGUNDOS = ajustes.trabajos_espera_maxima_segundos
+TRABAJOS_LATIDO_SEGUNDOS = ajustes.trabajos_latido_segundos
+TRABAJOS_CADUCIDAD_SEGUNDOS = ajustes.trabajos_caducidad_segundos
+TRABAJOS_RETENCION_HORAS = ajustes.trabajos_retencion_horas
+TRABAJOS_MAX_ENTRADA_BYTES = ajustes.trabajos_max_entrada_bytes
+TRABAJOS_MAX_SALIDA_BYTES = ajustes.trabajos_max_salida_bytes
+
+PENDIENTE, EN_CURSO, COMPLETADO, FALLIDO, CANCELADO = ESTADOS_TRABAJO
+TERMINADOS = (COMPLETADO, FALLIDO, CANCELADO)
+
+PROGRESO_SEGUNDOS = 0.5  # Como mucho una escritura de progreso cada medio segundo por trabajo
+PURGA_SEGUNDOS = 3600  # Cada cuánto borra el despachador los trabajos caducados
+TROZO_ENTRADA = 64 * 1024
+TROZO_SALIDA = 1024 * 1024  # Bytes por fila de trabajos_trozos
+LOTE_RESUMENES = 1000
+
+CAMPOS_TRABAJO = (
+    "id", "tipo", "estado", "hecho", "total", "intentos", "max_intentos", "cancelar", "error", "resultado",
+    "fecha_creacion", "disponible_en", "iniciado_en", "terminado_en",
+)
+COLUMNAS_TRABAJO = tuple(getattr(Trabajo, campo) for campo in CAMPOS_TRABAJO)
+
+
+# ============ PETICIONES ============
+
+def encolar(
+    db: Session, tenant_id: int, tipo: str, parametros: Optional[dict] = None,
+    entrada: Optional[bytes] = None, usuario_id: Optional[int] = None
+) -> dict:
+    """Inserta un trabajo pendiente y lo devuelve con la forma de Trabajo"""
+    ahora = datetime.utcnow()
+    fila = db.execute(
+        insert(Trabajo)
+        .values(
+            tenant_id=tenant_id, usuario_id=usuario_id, tipo=tipo, parametros=parametros, entrada=entrada,
+            max_intentos=TRABAJOS_MAX_INTENTOS, disponible_en=ahora, fecha_creacion=ahora,
+        )
+        .returning(*COLUMNAS_TRABAJO)
+    ).one()
+    db.commit()
+    return dict(zip(CAMPOS_TRABAJO, fila))
+
+
+def encolar_clonado(
+    db: Session, tenant_id: int, rutina_id: int, datos: ClonarLote, usuario_id: Optional[int] = None
+) -> dict:
+    """Trabajo "clonar" (404 al momento si la rutina no es del tenant)"""
+    if db.scalar(select(Rutina.id).where(Rutina.id == rutina_id, filtro_tenant(Rutina, tenant_id))) is None:
+        raise HTTPException(status_code=404, detail="Rutina no encontrada")
+    parametros = {"rutina_id": rutina_id, "modo": datos.modo, "nombres": datos.nombres}
+    return encolar(db, tenant_id, "clonar", parametros, usuario_id=usuario_id)
+
+
+def obtener_trabajo(db: Session, tenant_id: int, trabajo_id: int) -> dict:
+    fila = db.execute(
+        select(*COLUMNAS_TRABAJO).where(Trabajo.id == trabajo_id, Trabajo.tenant_id == tenant_id)
+    ).first()
+    if fila is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return dict(zip(CAMPOS_TRABAJO, fila))
+
+
+def listar_trabajos(db: Session, tenant_id: int, limite: int, estado: Optional[str] = None) -> list[dict]:
+    """Trabajos del tenant, los más recientes primero"""
+    consulta = (
+        select(*COLUMNAS_TRABAJO)
+        .where(Trabajo.tenant_id == tenant_id)
+        .order_by(Trabajo.fecha_creacion.desc(), Trabajo.id.desc())
+        .limit(limite)
+    )
+    if estado is not None:
+        consulta = consulta.where(Trabajo.estado == estado)
+    return [dict(zip(CAMPOS_TRABAJO, fila)) for fila in db.execute(consulta)]
+
+
+def cancelar_trabajo(db: Session, tenant_id: int, trabajo_id: int) -> dict:
+    """
+    Pendiente: queda cancelado. En curso: se marca cancelar y lo atiende el
+    propio trabajo en su siguiente progreso. 409 si ya terminó.
+    """
+    pendiente = Trabajo.estado == PENDIENTE
+    fila = db.execute(
+        update(Trabajo)
+        .where(Trabajo.id == trabajo_id, Trabajo.tenant_id == tenant_id, Trabajo.estado.in_((PENDIENTE, EN_CURSO)))
+        .values(
+            cancelar=True,
+            estado=case((pendiente, CANCELADO), else_=Trabajo.estado),
+            terminado_en=case((pendiente, datetime.utcnow()), else_=Trabajo.terminado_en),
+            entrada=case((pendiente, null()), else_=Trabajo.entrada),
+        )
+        .returning(*COLUMNAS_TRABAJO),
+        execution_options={"synchronize_session": False}
+    ).first()
+    if fila is None:
+        db.rollback()
+        trabajo = obtener_trabajo(db, tenant_id, trabajo_id)
+        raise HTTPException(status_code=409, detail=f"El trabajo ya terminó ({trabajo['estado']})")
+    db.commit()
+    return dict(zip(CAMPOS_TRABAJO, fila))
+
+
+def obtener_archivo(db: Session, tenant_id: int, trabajo_id: int) -> dict:
+    """
+    {"intento", "formato", "bytes"} del archivo que generó un trabajo
+    "exportar" completado; su contenido se lee con trozos_archivo()
+    """
+    fila = db.execute(
+        select(Trabajo.tipo, Trabajo.estado, Trabajo.intentos, Trabajo.parametros, Trabajo.resultado)
+        .where(Trabajo.id == trabajo_id, Trabajo.tenant_id == tenant_id)
+    ).first()
+    if fila is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if fila.tipo != "exportar" or fila.estado != COMPLETADO:
+        raise HTTPException(status_code=409, detail=f"El trabajo no tiene archivo ({fila.estado})")
+    return {"intento": fila.intentos, "formato": fila.parametros["formato"], "bytes": fila.resultado["bytes"]}
+
+
+def _consulta_trozo(trabajo_id: int, intento: int, numero: int):
+    return select(TrozoSalida.datos).where(
+        TrozoSalida.trabajo_id == trabajo_id, TrozoSalida.intento == intento, TrozoSalida.numero == numero
+    )
+
+
+def _trozos_sincrono(motor: Engine, trabajo_id: int, intento: int) -> Iterator[bytes]:
+    with motor.connect() as conn:
+        for numero in itertools.count():
+            datos = conn.scalar(_consulta_trozo(trabajo_id, intento, numero))
+            if datos is None:
+                return
+            yield datos
+
+
+async def _trozos_async(motor: AsyncEngine, trabajo_id: int, intento: int) -> AsyncIterator[bytes]:
+    async with motor.connect() as conn:
+        for numero in itertools.count():
+            datos = await conn.scalar(_consulta_trozo(trabajo_id, intento, numero))
+            if datos is None:
+                return
+            yield datos
+
+
+async def trozos_archivo(motor: Engine | AsyncEngine, trabajo_id: int, intento: int) -> AsyncIterator[bytes]:
+    """
+    El archivo de obtener_archivo(), un trozo por consulta. Usa su propia
+    conexión del motor: la respuesta se sigue enviando después de que el endpoint termine.
+    """
+    if isinstance(motor, AsyncEngine):
+        trozos = _trozos_async(motor, trabajo_id, intento)
+    else:
+        # Cada trozo se lee en el threadpool
+        trozos = iterate_in_threadpool(_trozos_sincrono(motor, trabajo_id, intento))
+    async for datos in trozos:
+        yield datos
+
+
+# ============ EJECUCIÓN ============
+
+class TrabajoCancelado(Exception):
+    """Se pidió cancelar el trabajo mientras estaba en curso"""
+
+
+class Ejecucion:
+    """Lo que recibe la función de cada tipo: sesión, datos del trabajo y progreso"""
+
+    def __init__(self, db: Session, trabajo_id: int, fila):
+        self.db = db
+        self.id = trabajo_id
+        self.tenant_id = fila.tenant_id
+        self.usuario_id = fila.usuario_id
+        self.intento = fila.intentos
+        self.parametros = fila.parametros or {}
+        self.hecho, self.total = 0, None
+        self._comprobado = time.monotonic()
+
+    def _toca(self) -> bool:
+        if time.monotonic() - self._comprobado < PROGRESO_SEGUNDOS:
+            return False
+        self._comprobado = time.monotonic()
+        return True
+
+    def progreso(self, hecho: int, total: Optional[int] = None):
+        """
+        Anota el avance y, cada PROGRESO_SEGUNDOS, lo guarda y comprueba si
+        se pidió cancelar (TrabajoCancelado). Hace commit: se llama entre
+        transacciones.
+        """
+        self.hecho, self.total = hecho, total
+        if not self._toca():
+            return
+        cancelar = self.db.scalar(
+            update(Trabajo).where(Trabajo.id == self.id).values(hecho=hecho, total=total).returning(Trabajo.cancelar),
+            execution_options={"synchronize_session": False}
+        )
+        self.db.commit()
+        if cancelar:
+            raise TrabajoCancelado()
+
+    def comprobar_cancelacion(self):
+        """Como progreso() pero sin escribir (p. ej. mientras se recorre un cursor de otra conexión)"""
+        if not self._toca():
+            return
+        cancelar = self.db.scalar(select(Trabajo.cancelar).where(Trabajo.id == self.id))
+        self.db.commit()
+        if cancelar:
+            raise TrabajoCancelado()
+
+
+def _importar(ejecucion: Ejecucion) -> dict:
+    """El archivo recibido, con intercambio.importar; hecho/total en bytes"""
+    db = ejecucion.db
+    entrada = db.scalar(select(Trabajo.entrada).where(Trabajo.id == ejecucion.id))
+    db.commit()
+    total, leidos = len(entrada), 0
+
+    async def trozos():
+        nonlocal leidos
+        for inicio in range(0, total, TROZO_ENTRADA):
+            leidos = min(inicio + TROZO_ENTRADA, total)
+            yield entrada[inicio:leidos]
+
+    async def guardar(lote):
+        resultado = intercambio.guardar_lote(db, ejecucion.tenant_id, lote, ejecucion.usuario_id)
+        ejecucion.progreso(leidos, total)
+        return resultado
+
+    informe = asyncio.run(intercambio.importar(trozos(), ejecucion.parametros["formato"], guardar))
+    ejecucion.hecho, ejecucion.total = total, total
+    return informe
+
+
+def _exportar(ejecucion: Ejecucion) -> dict:
+    """
+    Genera el archivo (intercambio.exportar_en) y lo guarda en trabajos_trozos
+    a medida que se lee; hecho en bytes. Lee y escribe por la misma conexión,
+    con un solo commit al final: si falla o se cancela no queda ningún trozo.
+    """
+    formato = ejecucion.parametros["formato"]
+    pendiente, numero, tamano = bytearray(), 0, 0
+    with engine.connect() as conn:
+        def guardar(datos: bytes):
+            nonlocal numero
+            conn.execute(
+                insert(TrozoSalida)
+                .values(trabajo_id=ejecucion.id, intento=ejecucion.intento, numero=numero, datos=datos)
+            )
+            numero += 1
+
+        with closing(intercambio.exportar_en(conn, ejecucion.tenant_id, formato)) as bloques:
+            for texto in bloques:
+                datos = texto.encode()
+                tamano += len(datos)
+                if tamano > TRABAJOS_MAX_SALIDA_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"La exportación supera {TRABAJOS_MAX_SALIDA_BYTES} bytes (TRABAJOS_MAX_SALIDA_BYTES)"
+                    )
+                pendiente += datos
+                while len(pendiente) >= TROZO_SALIDA:
+                    guardar(bytes(pendiente[:TROZO_SALIDA]))
+                    del pendiente[:TROZO_SALIDA]
+                ejecucion.comprobar_cancelacion()
+        if pendiente:
+            guardar(bytes(pendiente))
+        conn.commit()
+    ejecucion.hecho = ejecucion.total = tamano
+    return {"formato": formato, "bytes": tamano}
+
+
+def _resumenes(ejecucion: Ejecucion) -> dict:
+    """Recalcula rutina_resumen de las rutinas del tenant por lotes; hecho/total en rutinas"""
+    db, tenant_id = ejecucion.db, ejecucion.tenant_id
+    total = db.scalar(select(func.count()).select_from(Rutina).where(filtro_tenant(Rutina, tenant_id)))
+    hecho, ultima = 0, None
+    while True:
+        # Por (fecha_creacion, id): recorre el índice (tenant_id, fecha_creacion, id)
+        consulta = select(Rutina.fecha_creacion, Rutina.id).where(filtro_tenant(Rutina, tenant_id))
+        if ultima is not None:
+            consulta = consulta.where(tuple_(Rutina.fecha_creacion, Rutina.id) > tuple_(*ultima))
+        filas = db.execute(consulta.order_by(Rutina.fecha_creacion, Rutina.id).limit(LOTE_RESUMENES)).all()
+        if not filas:
+            break
+        ids = [fila.id for fila in filas]
+        db.execute(
+            delete(RutinaResumen).where(RutinaResumen.rutina_id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        crear_resumenes(db, ids)
+        db.commit()
+        hecho, ultima = hecho + len(ids), tuple(filas[-1])
+        ejecucion.progreso(hecho, total)
+    ejecucion.hecho, ejecucion.total = hecho, hecho
+    return {"rutinas": hecho}
+
+
+def _clonar(ejecucion: Ejecucion) -> dict:
+    """Un clon por nombre (plantillas.clonar_rutina, una transacción cada uno); hecho/total en clones"""
+    parametros = ejecucion.parametros
+    nombres = parametros["nombres"]
+    rutinas, errores = [], []
+    for hecho, nombre in enumerate(nombres, 1):
+        datos = ClonarRutina(nombre=nombre, modo=parametros["modo"])
+        try:
+            nueva = clonar_rutina(
+                ejecucion.db, ejecucion.tenant_id, parametros["rutina_id"], datos, ejecucion.usuario_id
+            )
+            rutinas.append(nueva["id"])
+        except HTTPException as error:
+            if error.status_code == 404:
+                raise  # La rutina original ya no existe: el resto fallaría igual
+            errores.append({"nombre": nombre, "error": error.detail})
+        ejecucion.progreso(hecho, len(nombres))
+    return {"rutinas": rutinas, "errores": errores}
+
+
+# Función de cada tipo: devuelve el resultado (dict JSON) y deja el avance final en la Ejecucion
+TIPOS = {
+    "importar": _importar,
+    "exportar": _exportar,
+    "resumenes": _resumenes,
+    "clonar": _clonar,
+}
+# Al terminar se invalidan los listados del tenant
+MODIFICAN_RUTINAS = {"importar", "resumenes", "clonar"}
+
+
+def espera_reintento(intento: int) -> float:
+    """Segundos hasta reintentar tras fallar el intento n: exponencial, con tope y jitter"""
+    espera = min(TRABAJOS_ESPERA_BASE_SEGUNDOS * 2 ** (intento - 1), TRABAJOS_ESPERA_MAXIMA_SEGUNDOS)
+    return espera * random.uniform(0.5, 1)
+
+
+def ejecutar_trabajo(trabajo_id: int) -> Optional[dict]:
+    """
+    Ejecuta un trabajo ya reclamado (en un proceso del pool) y guarda cómo
+    terminó. Devuelve {"tenant_id", "tipo", "estado"}, o None si entretanto
+    dejó de ser suyo (p. ej. se dio por caído y lo reclamó otro).
+    """
+    with SessionLocal() as db:
+        fila = db.execute(
+            select(
+                Trabajo.tenant_id, Trabajo.usuario_id, Trabajo.tipo, Trabajo.parametros,
+                Trabajo.intentos, Trabajo.max_intentos, Trabajo.cancelar
+            )
+            .where(Trabajo.id == trabajo_id, Trabajo.estado == EN_CURSO)
+        ).first()
+        db.commit()
+        if fila is None:
+            return None
+
+        ejecucion = Ejecucion(db, trabajo_id, fila)
+        funcion = TIPOS.get(fila.tipo)
+        try:
+            if funcion is None:
+                raise HTTPException(status_code=400, detail=f"Tipo de trabajo desconocido: {fila.tipo}")
+            if fila.cancelar:
+                raise TrabajoCancelado()
+            resultado = funcion(ejecucion)
+            valores = {"estado": COMPLETADO, "resultado": resultado, "error": None}
+        except TrabajoCancelado:
+            db.rollback()
+            valores = {"estado": CANCELADO}
+        except Exception as error:
+            db.rollback()
+            if isinstance(error, HTTPException):
+                valores = {"estado": FALLIDO, "error": str(error.detail)}
+            else:
+                logger.exception("Trabajo %s (%s): intento %s fallido", trabajo_id, fila.tipo, fila.intentos)
+                valores = {"estado": FALLIDO, "error": f"{type(error).__name__}: {error}"[:2000]}
+                if fila.intentos < fila.max_intentos:
+                    espera = timedelta(seconds=espera_reintento(fila.intentos))
+                    valores.update(estado=PENDIENTE, disponible_en=datetime.utcnow() + espera)
+
+        if valores["estado"] != PENDIENTE:
+            valores.update(terminado_en=datetime.utcnow(), entrada=None)
+        resultado = db.execute(
+            update(Trabajo)
+            .where(Trabajo.id == trabajo_id, Trabajo.estado == EN_CURSO, Trabajo.intentos == fila.intentos)
+            .values(hecho=ejecucion.hecho, total=ejecucion.total, latido=None, **valores),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        if resultado.rowcount == 0:
+            return None
+    return {"tenant_id": fila.tenant_id, "tipo": fila.tipo, "estado": valores["estado"]}
+
+
+# ============ DESPACHADOR ============
+
+def reclamar(db: Session, cuantos: int) -> list[int]:
+    """
+    Pasa a en curso hasta `cuantos` trabajos pendientes ya disponibles, los
+    más antiguos primero (índice parcial ix_trabajos_pendientes), y devuelve sus ids.
+    """
+    ahora = datetime.utcnow()
+    siguientes = (
+        select(Trabajo.id)
+        .where(Trabajo.estado == PENDIENTE, Trabajo.disponible_en <= ahora)
+        .order_by(Trabajo.disponible_en, Trabajo.id)
+        .limit(cuantos)
+        .with_for_update(skip_locked=True)
+    )
+    ids = db.scalars(
+        update(Trabajo)
+        .where(Trabajo.id.in_(siguientes), Trabajo.estado == PENDIENTE)
+        .values(estado=EN_CURSO, intentos=Trabajo.intentos + 1, iniciado_en=ahora, latido=ahora)
+        .returning(Trabajo.id),
+        execution_options={"synchronize_session": False}
+    ).all()
+    db.commit()
+    return ids
+
+
+def renovar_latidos(db: Session, ids: list[int]):
+    db.execute(
+        update(Trabajo).where(Trabajo.id.in_(ids), Trabajo.estado == EN_CURSO).values(latido=datetime.utcnow()),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+
+
+def devolver_a_la_cola(db: Session, condicion, error: str) -> int:
+    """
+    Los trabajos en curso que cumplen la condición cuentan el intento como
+    fallido: vuelven a pendientes o, sin intentos, quedan fallidos (cancelados
+    si se pidió). Devuelve cuántos.
+    """
+    ahora = datetime.utcnow()
+    reintentar = and_(~Trabajo.cancelar, Trabajo.intentos < Trabajo.max_intentos)
+    resultado = db.execute(
+        update(Trabajo)
+        .where(Trabajo.estado == EN_CURSO, condicion)
+        .values(
+            estado=case((Trabajo.cancelar, CANCELADO), (reintentar, PENDIENTE), else_=FALLIDO),
+            error=case((Trabajo.cancelar, Trabajo.error), else_=error),
+            disponible_en=ahora,
+            terminado_en=case((reintentar, null()), else_=ahora),
+            latido=None,
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return resultado.rowcount
+
+
+def recuperar_caidos(db: Session) -> int:
+    """Trabajos en curso sin latido desde hace TRABAJOS_CADUCIDAD_SEGUNDOS (índice ix_trabajos_en_curso)"""
+    limite = datetime.utcnow() - timedelta(seconds=TRABAJOS_CADUCIDAD_SEGUNDOS)
+    return devolver_a_la_cola(db, Trabajo.latido < limite, "El worker dejó de responder")
+
+
+def purgar_terminados(db: Session) -> int:
+    """Borra los trabajos terminados hace más de TRABAJOS_RETENCION_HORAS (con sus archivos)"""
+    limite = datetime.utcnow() - timedelta(hours=TRABAJOS_RETENCION_HORAS)
+    # Los trozos, aparte: SQLite no aplica ON DELETE CASCADE
+    terminados = select(Trabajo.id).where(Trabajo.terminado_en < limite)
+    db.execute(
+        delete(TrozoSalida).where(TrozoSalida.trabajo_id.in_(terminados)),
+        execution_options={"synchronize_session": False}
+    )
+    resultado = db.execute(
+        delete(Trabajo).where(Trabajo.terminado_en < limite), execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return resultado.rowcount
+
+
+def _en_sesion(funcion, *args):
+    with SessionLocal() as db:
+        return funcion(db, *args)
+
+
+def _iniciar_proceso():
+    # Ctrl+C lo atiende el despachador, que espera a que acaben los trabajos en curso
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+
+
+class Despachador:
+    """
+    Reclama trabajos mientras tiene procesos libres y los ejecuta en un
+    ProcessPoolExecutor (spawn: cada proceso abre sus propias conexiones).
+    Corre en el event loop; las consultas de la cola van al threadpool.
+    """
+
+    def __init__(self, procesos: int, intervalo: float = TRABAJOS_INTERVALO_SEGUNDOS):
+        self.procesos = procesos
+        self.intervalo = intervalo
+        self._parar = asyncio.Event()
+        self._en_vuelo: dict[asyncio.Future, int] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _crear_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            self.procesos, mp_context=multiprocessing.get_context("spawn"), initializer=_iniciar_proceso
+        )
+
+    def detener(self):
+        """Deja de reclamar; ejecutar() vuelve cuando acaban los trabajos en curso"""
+        self._parar.set()
+
+    async def ejecutar(self):
+        self._pool = self._crear_pool()
+        parar = asyncio.ensure_future(self._parar.wait())
+        mantenido, purgado = 0.0, 0.0
+        logger.info("Despachador de trabajos con %d procesos", self.procesos)
+        try:
+            while not self._parar.is_set():
+                try:
+                    ahora = time.monotonic()
+                    if ahora - mantenido >= TRABAJOS_LATIDO_SEGUNDOS:
+                        purgar = ahora - purgado >= PURGA_SEGUNDOS
+                        mantenido, purgado = ahora, ahora if purgar else purgado
+                        await self._mantener(purgar)
+                    libres = self.procesos - len(self._en_vuelo)
+                    if libres > 0:
+                        for trabajo_id in await run_in_threadpool(_en_sesion, reclamar, libres):
+                            futuro = asyncio.wrap_future(self._pool.submit(ejecutar_trabajo, trabajo_id))
+                            self._en_vuelo[futuro] = trabajo_id
+                    # Hasta que acabe un trabajo (queda un proceso libre) o pase el intervalo
+                    await asyncio.wait(
+                        {parar, *self._en_vuelo}, timeout=self.intervalo, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    await self._recoger()
+                except Exception:
+                    logger.exception("Error en el despachador de trabajos")
+                    await asyncio.sleep(self.intervalo)
+            if self._en_vuelo:
+                logger.info("Esperando a %d trabajos en curso", len(self._en_vuelo))
+                await asyncio.wait(set(self._en_vuelo))
+                await self._recoger()
+        finally:
+            parar.cancel()
+            await run_in_threadpool(self._pool.shutdown, True, cancel_futures=True)
+
+    async def _mantener(self, purgar: bool):
+        """Latido de los trabajos en curso, recuperación de los caídos y limpieza (trabajos, papelera, particiones)"""
+        if self._en_vuelo:
+            await run_in_threadpool(_en_sesion, renovar_latidos, list(self._en_vuelo.values()))
+        recuperados = await run_in_threadpool(_en_sesion, recuperar_caidos)
+        if recuperados:
+            logger.warning("%d trabajos sin latido vuelven a la cola", recuperados)
+        if purgar:
+            borrados = await run_in_threadpool(_en_sesion, purgar_terminados)
+            if borrados:
+                logger.info("%d trabajos terminados borrados", borrados)
+            purgadas = await run_in_threadpool(_en_sesion, papelera.purgar)
+            if purgadas:
+                logger.info("%d rutinas purgadas de la papelera", purgadas)
+            antiguas = await run_in_threadpool(_en_sesion, entrenamientos.mantener)
+            if antiguas["sesiones"] or antiguas["borradas"]:
+                logger.info(
+                    "%d sesiones antiguas borradas (particiones: %s)",
+                    antiguas["sesiones"], ", ".join(antiguas["borradas"]) or "ninguna"
+                )
+
+    async def _recoger(self):
+        roto = False
+        for futuro in [futuro for futuro in self._en_vuelo if futuro.done()]:
+            trabajo_id = self._en_vuelo.pop(futuro)
+            try:
+                fin = futuro.result()
+            except Exception as error:
+                # El proceso murió (BrokenProcessPool): el intento cuenta como fallido
+                logger.error("Trabajo %s: el proceso terminó sin resultado (%r)", trabajo_id, error)
+                roto = roto or isinstance(error, BrokenProcessPool)
+                await run_in_threadpool(
+                    _en_sesion, devolver_a_la_cola, Trabajo.id == trabajo_id, f"{type(error).__name__}: {error}"
+                )
+                continue
+            if fin is not None:
+                self._terminado(trabajo_id, fin)
+        if roto:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._crear_pool()
+
+    def _terminado(self, trabajo_id: int, fin: dict):
+        logger.info("Trabajo %s (%s): %s", trabajo_id, fin["tipo"], fin["estado"])
+        # También si falló o se canceló a medias: pudo importar o clonar una parte
+        if fin["tipo"] in MODIFICAN_RUTINAS:
+            invalidar_listas(fin["tenant_id"])
+        if fin["estado"] in TERMINADOS:
+            publicar(
+                "trabajo.terminado", fin["tenant_id"],
+                trabajo_id=trabajo_id, trabajo_tipo=fin["tipo"], estado=fin["estado"]
+            )
+
+
+async def servir(procesos: int):
+    """Despachador independiente (python -m app.cli worker) hasta SIGINT o SIGTERM"""
+    despachador = Despachador(procesos)
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(senal, despachador.detener)
+    # Con EVENTOS_BACKEND=postgres, los eventos llegan a los procesos de uvicorn
+    await hub.iniciar()
+    try:
+        await despachador.ejecutar()
+    finally:
+        await hub.detener()
@@ -0,0 +1,7 @@
+"""
+Benchmarks del backend.
+
+Se ejecutan desde la carpeta backend/ como módulos, por ejemplo:
+
+    python -m benchmarks.bench_busqueda --tamanos 10000 100000
+"""
@@ -0,0 +1,166 @@
+"""
+Compresión de las respuestas (app/compresion.py): bytes enviados y coste de CPU.
+
+Genera cuerpos reales a partir de rutinas sintéticas (listados de varios
+tamaños, un detalle y una exportación NDJSON) y, para cada algoritmo
+disponible y varios niveles, mide el tamaño comprimido, la proporción y el
+tiempo de CPU (process_time) por compresión.
+
+Después pide los mismos endpoints a través de la aplicación (ASGI, con el
+middleware) con cada Accept-Encoding y comprueba que el cuerpo descomprimido
+coincide con el original.
+
+    python -m benchmarks.bench_compresion
+    python -m benchmarks.bench_compresion --rutinas 20000 --salida compresion.json
+
+zstd y br solo se miden si están instalados (pip install zstandard brotli).
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+
+NIVELES_MEDIDOS = {"gzip": [1, 6, 9], "br": [1, 4, 6, 11], "zstd": [1, 3, 9, 19]}
+
+
+def _cuerpos(motor, rutinas_exportadas):
+    from sqlalchemy.orm import sessionmaker
+
+    from app import crud, intercambio
+    from app.serializacion import a_json
+    from app.tenants import TENANT_PRINCIPAL
+
+    Sesion = sessionmaker(bind=motor)
+    cuerpos = {}
+    with Sesion() as db:
+        cuerpos["detalle"] = a_json(crud.obtener_rutina(db, TENANT_PRINCIPAL, 1))
+        for limite in (10, 50, 200):
+            cuerpos[f"listado (limit={limite})"] = a_json(crud.listar_rutinas(db, TENANT_PRINCIPAL, limite, None, "fecha_creacion"))
+
+    async def exportar():
+        trozos = [t async for t in intercambio.exportar(motor, TENANT_PRINCIPAL, "ndjson")]
+        return b"".join(trozos)
+
+    exportado = asyncio.run(exportar())
+    lineas = exportado.split(b"\n")[:rutinas_exportadas]
+    cuerpos[f"exportar ({len(lineas)} rutinas)"] = b"\n".join(lineas) + b"\n"
+    return cuerpos
+
+
+def _cpu_ms(algoritmo, cuerpo, nivel, minimo_segundos=0.2):
+    """Mediana del tiempo de CPU de una compresión, repitiendo al menos minimo_segundos"""
+    from app.compresion import comprimir
+
+    tiempos = []
+    inicio_total = time.process_time()
+    while len(tiempos) < 5 or time.process_time() - inicio_total < minimo_segundos:
+        inicio = time.process_time()
+        comprimido = comprimir(algoritmo, cuerpo, nivel)
+        tiempos.append(time.process_time() - inicio)
+        if len(tiempos) >= 1000:
+            break
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1000, comprimido
+
+
+def _descomprimir(algoritmo, datos):
+    if algoritmo == "gzip":
+        return gzip.decompress(datos)
+    if algoritmo == "br":
+        import brotli
+        return brotli.decompress(datos)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(datos)
+
+
+def _por_http(algoritmos):
+    """Endpoints pedidos a través del middleware con cada Accept-Encoding"""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    resultados = []
+    with TestClient(app) as cliente:
+        for ruta in ("/api/rutinas?limit=200", "/api/rutinas/1", "/api/rutinas/exportar"):
+            original = cliente.get(ruta, headers={"Accept-Encoding": "identity"}).content
+            for algoritmo in algoritmos:
+                with cliente.stream("GET", ruta, headers={"Accept-Encoding": algoritmo}) as respuesta:
+                    en_red = b"".join(respuesta.iter_raw())
+                    codificacion = respuesta.headers.get("content-encoding")
+                resultados.append({
+                    "ruta": ruta, "algoritmo": algoritmo, "content_encoding": codificacion,
+                    "bytes_original": len(original), "bytes_red": len(en_red),
+                    "coinciden": codificacion == algoritmo and _descomprimir(algoritmo, en_red) == original,
+                })
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rutinas", type=int, default=5000)
+    parser.add_argument("--ejercicios-por-rutina", type=int, default=8)
+    parser.add_argument("--rutinas-exportadas", type=int, default=2000,
+                        help="Rutinas del cuerpo de exportación medido")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    # app.database lee DATABASE_URL al importarse: se fija antes de cualquier import de app
+    ruta_bd = os.path.join(tempfile.mkdtemp(), "bench_compresion.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_bd}"
+
+    from alembic import command
+    from sqlalchemy.engine import make_url
+
+    from app.compresion import COMPRESORES, NIVELES
+    from app.database import configuracion_alembic, crear_motor
+    from app.seed_data import cargar_sinteticos
+
+    motor = crear_motor(make_url(os.environ["DATABASE_URL"]))
+    with motor.begin() as conn:
+        command.upgrade(configuracion_alembic(conn), "head")
+    cargar_sinteticos(motor, args.rutinas, args.ejercicios_por_rutina)
+
+    algoritmos = [a for a in ("gzip", "br", "zstd") if a in COMPRESORES]
+    resultados = []
+    for nombre, cuerpo in _cuerpos(motor, args.rutinas_exportadas).items():
+        for algoritmo in algoritmos:
+            for nivel in NIVELES_MEDIDOS[algoritmo]:
+                cpu_ms, comprimido = _cpu_ms(algoritmo, cuerpo, nivel)
+                resultados.append({
+                    "cuerpo": nombre, "algoritmo": algoritmo, "nivel": nivel,
+                    "por_defecto": nivel == NIVELES[algoritmo],
+                    "bytes": len(cuerpo), "bytes_comprimidos": len(comprimido),
+                    "proporcion": round(len(cuerpo) / len(comprimido), 1),
+                    "cpu_ms": round(cpu_ms, 3),
+                    "mb_s": round(len(cuerpo) / 1024 / 1024 / (cpu_ms / 1000), 1) if cpu_ms else None,
+                })
+
+    print(f"\n{'cuerpo':<26}{'algoritmo':>10}{'nivel':>7}{'bytes':>10}{'comprimido':>12}{'×':>7}{'CPU ms':>9}{'MB/s':>8}")
+    for r in resultados:
+        nivel = f"{r['nivel']}{'*' if r['por_defecto'] else ''}"
+        print(
+            f"{r['cuerpo']:<26}{r['algoritmo']:>10}{nivel:>7}{r['bytes']:>10}{r['bytes_comprimidos']:>12}"
+            f"{r['proporcion']:>7}{r['cpu_ms']:>9}{r['mb_s'] if r['mb_s'] is not None else '-':>8}"
+        )
+    print("* nivel configurado (COMPRESION_NIVEL_*)")
+
+    http = _por_http(algoritmos)
+    print(f"\n{'ruta':<26}{'algoritmo':>10}{'bytes':>10}{'en red':>10}{'coinciden':>11}")
+    for r in http:
+        print(f"{r['ruta']:<26}{r['algoritmo']:>10}{r['bytes_original']:>10}{r['bytes_red']:>10}"
+              f"{'sí' if r['coinciden'] else 'NO':>11}")
+
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            json.dump({
+                "rutinas": args.rutinas,
+                "ejercicios_por_rutina": args.ejercicios_por_rutina,
+                "resultados": resultados,
+                "http": http,
+            }, archivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
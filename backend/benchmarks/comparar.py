@@ -0,0 +1,78 @@
+"""
+Compara dos resultados de bench_api (por ejemplo, de dos commits).
+
+    python -m benchmarks.comparar base.json nuevo.json --umbral 10
+
+Marca como regresión un escenario cuyo p95 sube o cuyas req/s bajan más del
+umbral (en %), o que ejecuta más sentencias SQL por petición. Sale con
+código 1 si hay alguna regresión, para usarlo en CI.
+"""
+import argparse
+import json
+import sys
+
+
+def cambio(antes, despues):
+    if not antes:
+        return 0.0
+    return (despues - antes) / antes * 100
+
+
+def comparar(base, nuevo, umbral):
+    filas, regresiones = [], []
+    for modo, datos in nuevo["modos"].items():
+        anteriores = {e["escenario"]: e for e in base["modos"].get(modo, {}).get("escenarios", [])}
+        for actual in datos["escenarios"]:
+            previo = anteriores.get(actual["escenario"])
+            if previo is None:
+                continue
+            rps = cambio(previo["rps"], actual["rps"])
+            p95 = cambio(previo["p95_ms"], actual["p95_ms"])
+            sql_antes, sql_despues = previo.get("sql_por_peticion"), actual.get("sql_por_peticion")
+
+            motivos = []
+            if rps < -umbral:
+                motivos.append(f"req/s {rps:+.0f}%")
+            if p95 > umbral:
+                motivos.append(f"p95 {p95:+.0f}%")
+            if sql_antes is not None and sql_despues is not None and sql_despues > sql_antes:
+                motivos.append(f"sql {sql_antes} -> {sql_despues}")
+            if actual["errores"] > previo["errores"]:
+                motivos.append(f"errores {previo['errores']} -> {actual['errores']}")
+
+            filas.append((modo, actual["escenario"], rps, p95, sql_antes, sql_despues, motivos))
+            if motivos:
+                regresiones.append((modo, actual["escenario"], motivos))
+    return filas, regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=10, help="Variación tolerada en %% (por defecto 10)")
+    args = parser.parse_args()
+
+    with open(args.base) as archivo:
+        base = json.load(archivo)
+    with open(args.nuevo) as archivo:
+        nuevo = json.load(archivo)
+
+    print(f"base: {base.get('commit')} ({base.get('fecha')})   nuevo: {nuevo.get('commit')} ({nuevo.get('fecha')})")
+    filas, regresiones = comparar(base, nuevo, args.umbral)
+    print(f"\n{'modo':<9}{'escenario':<24}{'req/s':>9}{'p95':>9}{'sql':>14}")
+    for modo, escenario, rps, p95, sql_antes, sql_despues, motivos in filas:
+        sql = f"{sql_antes} -> {sql_despues}" if sql_antes is not None else "-"
+        marca = "  ✗" if motivos else ""
+        print(f"{modo:<9}{escenario:<24}{rps:>+8.0f}%{p95:>+8.0f}%{sql:>14}{marca}")
+
+    if regresiones:
+        print(f"\n{len(regresiones)} regresiones (umbral {args.umbral}%):")
+        for modo, escenario, motivos in regresiones:
+            print(f"  {modo}/{escenario}: {', '.join(motivos)}")
+        sys.exit(1)
+    print("\nSin regresiones")
+
+
+if __name__ == "__main__":
+    main()
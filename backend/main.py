@@ -1,7 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import init_db
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.database import ARRANQUE_BD, MOTORES, async_engine, engine, init_db, verificar_esquema
+from app import metricas
+from app.cache import invalidar_por_evento
+from app.eventos import BackendLocal, hub
+from app.compresion import MiddlewareCompresion
 from app.routes import router
+from app.trabajos import TRABAJOS_PROCESOS, Despachador
+import asyncio
 import logging
 
 # Configurar logging
@@ -25,20 +32,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión de las respuestas según Accept-Encoding (zstd, br, gzip)
+app.add_middleware(MiddlewareCompresion)
+
+# Métricas de peticiones y de la BD (se exponen en /metrics)
+app.add_middleware(metricas.MiddlewareMetricas)
+metricas.instrumentar(MOTORES)
+
 # Incluir las rutas
 app.include_router(router, prefix="/api")
 
-# Crear las tablas al iniciar la aplicación
+# Las migraciones y el seed no se ejecutan aquí (se repetirían en cada
+# worker): se lanzan una vez con `python -m app.cli bootstrap`
 @app.on_event("startup")
 async def startup():
-    logger.info("Inicializando base de datos...")
-    init_db()
-    logger.info("Base de datos inicializada correctamente")
-    
-    # Cargar datos de ejemplo
-    from app.seed_data import seed_database
-    logger.info("Cargando datos de ejemplo...")
-    seed_database()
+    if ARRANQUE_BD == "migrar":
+        logger.info("Aplicando migraciones...")
+        init_db()
+    elif ARRANQUE_BD == "verificar":
+        verificar_esquema()
+        logger.info("Esquema de la base de datos al día")
+    # Con un backend entre procesos, los cambios de otros workers invalidan la cache de este
+    if not isinstance(hub.backend, BackendLocal) and invalidar_por_evento not in hub.oyentes:
+        hub.oyentes.append(invalidar_por_evento)
+    await hub.iniciar()
+    # Trabajos en segundo plano dentro de este worker (normalmente: python -m app.cli worker)
+    if TRABAJOS_PROCESOS:
+        despachador = Despachador(TRABAJOS_PROCESOS)
+        app.state.despachador = (despachador, asyncio.create_task(despachador.ejecutar()))
+
+@app.on_event("shutdown")
+async def shutdown():
+    if hasattr(app.state, "despachador"):
+        despachador, tarea = app.state.despachador
+        despachador.detener()
+        await tarea
+    await hub.detener()
     
 # Endpoint de prueba (health check)
 @app.get("/", tags=["Health"])
@@ -51,7 +80,19 @@ async def root():
 
 @app.get("/health", tags=["Health"])
 async def health_check():
-    return {"status": "ok"}
+    """Readiness: 503 si la BD no responde o el pool de conexiones está agotado"""
+    listo, detalle = await metricas.comprobar_salud(engine, async_engine)
+    return JSONResponse(
+        {"status": "ok" if listo else "error", **detalle},
+        status_code=200 if listo else 503
+    )
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(
+        metricas.exportar(MOTORES), media_type="text/plain; version=0.0.4"
+    )
 
 if __name__ == "__main__":
     import uvicorn
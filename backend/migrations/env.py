@@ -0,0 +1,78 @@
+"""
+Entorno de Alembic.
+
+Usa la conexión que recibe en config.attributes["connection"] (así la usa
+database.init_db) o, si se ejecuta desde la línea de comandos
+(alembic upgrade head), crea una con la URL síncrona de DATABASE_URL.
+"""
+import re
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from app.models import Base
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configurar_logging", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def _url():
+    url = config.get_main_option("sqlalchemy.url")
+    if url:
+        return url
+    from app.database import URL_SINCRONA
+    return URL_SINCRONA.render_as_string(hide_password=False)
+
+
+# Particiones mensuales de series_realizadas (PostgreSQL), p. ej. series_realizadas_2026_10
+PARTICION = re.compile(r"^series_realizadas_\d{4}_\d{2}$")
+
+
+def _incluir_objeto(objeto, nombre, tipo, reflejado, comparado_con):
+    # Las tablas de FTS5 las crean las migraciones de búsqueda y las particiones
+    # app.entrenamientos, no el modelo
+    return not (tipo == "table" and ("_fts" in nombre or PARTICION.match(nombre)))
+
+
+def _configurar(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=_incluir_objeto,
+        # SQLite no soporta ALTER TABLE completo: se recrea la tabla
+        render_as_batch=connection.dialect.name == "sqlite",
+        compare_type=True,
+    )
+
+
+def run_migrations_offline():
+    context.configure(url=_url(), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configurar(connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    motor = create_engine(_url())
+    with motor.connect() as connection:
+        _configurar(connection)
+        with context.begin_transaction():
+            context.run_migrations()
+    motor.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
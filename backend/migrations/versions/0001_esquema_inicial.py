@@ -0,0 +1,57 @@
+"""Esquema inicial: rutinas y ejercicios
+
+Corresponde a las tablas que creaba Base.metadata.create_all antes de usar
+migraciones. Las bases de datos creadas así se marcan con esta revisión
+(database.init_db) y continúan desde aquí.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+DIAS = ("LUNES", "MARTES", "MIERCOLES", "JUEVES", "VIERNES", "SABADO", "DOMINGO")
+
+
+def upgrade():
+    op.create_table(
+        "rutinas",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("nombre", sa.String(length=100), nullable=False),
+        sa.Column("descripcion", sa.Text(), nullable=True),
+        sa.Column("fecha_creacion", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_rutinas_id", "rutinas", ["id"])
+    op.create_index("ix_rutinas_nombre", "rutinas", ["nombre"], unique=True)
+
+    op.create_table(
+        "ejercicios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("nombre", sa.String(length=100), nullable=False),
+        sa.Column("dia_semana", sa.Enum(*DIAS, name="diaenum"), nullable=False),
+        sa.Column("series", sa.Integer(), nullable=False),
+        sa.Column("repeticiones", sa.Integer(), nullable=False),
+        sa.Column("peso", sa.Integer(), nullable=True),
+        sa.Column("notas", sa.Text(), nullable=True),
+        sa.Column("orden", sa.Integer(), nullable=False),
+        sa.Column(
+            "rutina_id", sa.Integer(),
+            sa.ForeignKey("rutinas.id", ondelete="CASCADE"), nullable=False
+        ),
+    )
+    op.create_index("ix_ejercicios_id", "ejercicios", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_ejercicios_id", table_name="ejercicios")
+    op.drop_table("ejercicios")
+    op.drop_index("ix_rutinas_nombre", table_name="rutinas")
+    op.drop_index("ix_rutinas_id", table_name="rutinas")
+    op.drop_table("rutinas")
+    sa.Enum(name="diaenum").drop(op.get_bind(), checkfirst=True)
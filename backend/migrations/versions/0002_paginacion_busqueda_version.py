@@ -0,0 +1,120 @@
+"""Paginación por cursor, índices de búsqueda y versión de rutina
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# El DDL de búsqueda se copia aquí tal como era en esta revisión: si se
+# importara de app.busqueda, cambiar ese módulo cambiaría lo que hace la migración
+DDL_POSTGRESQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_rutinas_nombre_trgm "
+    "ON rutinas USING gin (lower(nombre) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_rutinas_descripcion_trgm "
+    "ON rutinas USING gin (lower(coalesce(descripcion, '')) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_ejercicios_nombre_trgm "
+    "ON ejercicios USING gin (lower(nombre) gin_trgm_ops)",
+]
+INDICES_POSTGRESQL = ["ix_rutinas_nombre_trgm", "ix_rutinas_descripcion_trgm", "ix_ejercicios_nombre_trgm"]
+
+# Dos tablas FTS5: una por rutina (nombre, descripción) y otra por ejercicio
+DDL_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS rutinas_fts "
+    "USING fts5(nombre, descripcion, tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS ejercicios_fts "
+    "USING fts5(nombre, rutina_id UNINDEXED, tokenize='trigram')",
+    "INSERT INTO rutinas_fts(rowid, nombre, descripcion) "
+    "SELECT id, nombre, coalesce(descripcion, '') FROM rutinas",
+    "INSERT INTO ejercicios_fts(rowid, nombre, rutina_id) "
+    "SELECT id, nombre, rutina_id FROM ejercicios",
+    "CREATE TRIGGER IF NOT EXISTS rutinas_fts_ai AFTER INSERT ON rutinas BEGIN "
+    "INSERT INTO rutinas_fts(rowid, nombre, descripcion) "
+    "VALUES (new.id, new.nombre, coalesce(new.descripcion, '')); END",
+    "CREATE TRIGGER IF NOT EXISTS rutinas_fts_au AFTER UPDATE OF nombre, descripcion ON rutinas BEGIN "
+    "UPDATE rutinas_fts SET nombre = new.nombre, descripcion = coalesce(new.descripcion, '') "
+    "WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS rutinas_fts_ad AFTER DELETE ON rutinas BEGIN "
+    "DELETE FROM rutinas_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS ejercicios_fts_ai AFTER INSERT ON ejercicios BEGIN "
+    "INSERT INTO ejercicios_fts(rowid, nombre, rutina_id) "
+    "VALUES (new.id, new.nombre, new.rutina_id); END",
+    "CREATE TRIGGER IF NOT EXISTS ejercicios_fts_au AFTER UPDATE OF nombre, rutina_id ON ejercicios BEGIN "
+    "UPDATE ejercicios_fts SET nombre = new.nombre, rutina_id = new.rutina_id "
+    "WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS ejercicios_fts_ad AFTER DELETE ON ejercicios BEGIN "
+    "DELETE FROM ejercicios_fts WHERE rowid = old.id; END",
+]
+OBJETOS_SQLITE = {
+    "trigger": ["rutinas_fts_ai", "rutinas_fts_au", "rutinas_fts_ad",
+                "ejercicios_fts_ai", "ejercicios_fts_au", "ejercicios_fts_ad"],
+    "table": ["rutinas_fts", "ejercicios_fts"],
+}
+
+
+def _fts5_disponible(conn) -> bool:
+    try:
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE temp.prueba_fts USING fts5(x, tokenize='trigram')")
+        conn.exec_driver_sql("DROP TABLE temp.prueba_fts")
+        return True
+    except Exception:
+        return False
+
+
+def _crear_indices_busqueda(conn):
+    """Índices de búsqueda según el motor (idempotente)"""
+    if conn.dialect.name == "postgresql":
+        for sentencia in DDL_POSTGRESQL:
+            conn.exec_driver_sql(sentencia)
+
+    elif conn.dialect.name == "sqlite":
+        if conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'ejercicios_fts'").first():
+            return
+        if not _fts5_disponible(conn):
+            logger.warning("SQLite sin FTS5/trigram: la búsqueda usará LIKE")
+            return
+        # Bases creadas antes de esta migración (una sola tabla FTS con los
+        # nombres de los ejercicios concatenados): se rehacen desde cero
+        for tipo in ("trigger", "table"):
+            for nombre in OBJETOS_SQLITE[tipo]:
+                conn.exec_driver_sql(f"DROP {tipo.upper()} IF EXISTS {nombre}")
+        for sentencia in DDL_SQLITE:
+            conn.exec_driver_sql(sentencia)
+
+
+def upgrade():
+    columnas = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("rutinas")}
+    if "version" not in columnas:
+        with op.batch_alter_table("rutinas") as tabla:
+            tabla.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+    op.create_index(
+        "ix_rutinas_fecha_creacion_id", "rutinas", ["fecha_creacion", "id"], if_not_exists=True
+    )
+    _crear_indices_busqueda(op.get_bind())
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        for indice in INDICES_POSTGRESQL:
+            op.execute(f"DROP INDEX IF EXISTS {indice}")
+    elif bind.dialect.name == "sqlite":
+        for tipo in ("trigger", "table"):
+            for nombre in OBJETOS_SQLITE[tipo]:
+                op.execute(f"DROP {tipo.upper()} IF EXISTS {nombre}")
+
+    op.drop_index("ix_rutinas_fecha_creacion_id", table_name="rutinas")
+    with op.batch_alter_table("rutinas") as tabla:
+        tabla.drop_column("version")
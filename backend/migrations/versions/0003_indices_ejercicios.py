@@ -0,0 +1,40 @@
+"""Índices compuestos de ejercicios y nombre de rutina único sin mayúsculas
+
+- (rutina_id, orden, id): carga ordenada del detalle y búsqueda de hijos
+  al borrar una rutina (ON DELETE CASCADE).
+- (rutina_id, dia_semana, orden): vista por día del plan semanal.
+- lower(nombre) único: la unicidad sin distinguir mayúsculas pasa a
+  garantizarla la base de datos.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_ejercicios_rutina_orden", "ejercicios", ["rutina_id", "orden", "id"],
+        if_not_exists=True
+    )
+    op.create_index(
+        "ix_ejercicios_rutina_dia_orden", "ejercicios", ["rutina_id", "dia_semana", "orden"],
+        if_not_exists=True
+    )
+    op.create_index(
+        "ux_rutinas_nombre_lower", "rutinas", [sa.text("lower(nombre)")],
+        unique=True, if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_index("ux_rutinas_nombre_lower", table_name="rutinas")
+    op.drop_index("ix_ejercicios_rutina_dia_orden", table_name="ejercicios")
+    op.drop_index("ix_ejercicios_rutina_orden", table_name="ejercicios")
@@ -0,0 +1,25 @@
+"""Versión de ejercicios para concurrencia optimista (If-Match)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("ejercicios", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        # Sin batch: recrear la tabla borraría los triggers de búsqueda (FTS5)
+        op.execute("ALTER TABLE ejercicios DROP COLUMN version")
+    else:
+        op.drop_column("ejercicios", "version")
@@ -0,0 +1,39 @@
+"""Resumen de totales por rutina para las tarjetas del listado
+
+Una fila por rutina con el número de ejercicios y de días, y la suma de
+series, repeticiones y volumen (series × repeticiones × peso). La mantiene
+al día plan.refrescar_resumen; aquí se calcula para los datos existentes.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rutina_resumen",
+        sa.Column("rutina_id", sa.Integer(), sa.ForeignKey("rutinas.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("num_ejercicios", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("num_dias", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("series", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("repeticiones", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("volumen", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        "INSERT INTO rutina_resumen (rutina_id, num_ejercicios, num_dias, series, repeticiones, volumen) "
+        "SELECT rutina_id, count(*), count(DISTINCT dia_semana), sum(series), sum(repeticiones), "
+        "sum(series * repeticiones * coalesce(peso, 0)) "
+        "FROM ejercicios GROUP BY rutina_id"
+    )
+
+
+def downgrade():
+    op.drop_table("rutina_resumen")
@@ -0,0 +1,28 @@
+"""Fecha de la última modificación de cada rutina (Last-Modified)
+
+NULL mientras la rutina no se modifique desde que se creó: entonces la
+fecha de referencia es fecha_creacion. Por eso no hace falta rellenarla.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("rutinas", sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        # Sin batch: recrear la tabla borraría los triggers de búsqueda (FTS5)
+        op.execute("ALTER TABLE rutinas DROP COLUMN updated_at")
+    else:
+        op.drop_column("rutinas", "updated_at")
@@ -0,0 +1,169 @@
+"""Tenants y usuarios dueños de las rutinas
+
+- tenants y usuarios (email único por tenant, sin distinguir mayúsculas).
+- rutinas.tenant_id (obligatorio) y rutinas.usuario_id (quién la creó).
+  Las rutinas existentes pasan al tenant 1, "Principal", que se crea aquí.
+- El nombre de rutina pasa a ser único por tenant: (tenant_id, lower(nombre)).
+- Los índices de rutinas empiezan por tenant_id: (tenant_id, fecha_creacion, id)
+  y (tenant_id, nombre, id) reemplazan a los de la paginación, y en
+  PostgreSQL los de trigramas pasan a ser (tenant_id, ...) con btree_gin.
+
+En SQLite añadir una FK exige recrear la tabla (batch), lo que borra sus
+triggers de búsqueda (FTS5): se guardan antes y se vuelven a crear.
+Para deshacerla, los nombres de rutina deben ser únicos entre todos los tenants.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+TENANT_PRINCIPAL = 1
+
+# Índices de trigramas por tenant: con btree_gin, tenant_id y los trigramas
+# comparten un índice GIN. Reemplazan a los de rutinas de la migración 0002.
+DDL_POSTGRESQL_TENANT = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    "CREATE INDEX IF NOT EXISTS ix_rutinas_tenant_nombre_trgm "
+    "ON rutinas USING gin (tenant_id, lower(nombre) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_rutinas_tenant_descripcion_trgm "
+    "ON rutinas USING gin (tenant_id, lower(coalesce(descripcion, '')) gin_trgm_ops)",
+    "DROP INDEX IF EXISTS ix_rutinas_nombre_trgm",
+    "DROP INDEX IF EXISTS ix_rutinas_descripcion_trgm",
+]
+INDICES_POSTGRESQL_TENANT = ["ix_rutinas_tenant_nombre_trgm", "ix_rutinas_tenant_descripcion_trgm"]
+
+# Los de la migración 0002, para deshacerla
+DDL_POSTGRESQL_RUTINAS = [
+    "CREATE INDEX IF NOT EXISTS ix_rutinas_nombre_trgm "
+    "ON rutinas USING gin (lower(nombre) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_rutinas_descripcion_trgm "
+    "ON rutinas USING gin (lower(coalesce(descripcion, '')) gin_trgm_ops)",
+]
+
+
+def _recrear_rutinas(cambios):
+    """batch_alter_table en SQLite conservando los triggers de rutinas"""
+    triggers = [fila[0] for fila in op.get_bind().exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'rutinas'"
+    )]
+    with op.batch_alter_table("rutinas", recreate="always") as tabla:
+        cambios(tabla)
+    for sql in triggers:
+        op.execute(sql)
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+
+    tenants = op.create_table(
+        "tenants",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("nombre", sa.String(100), nullable=False),
+        sa.Column("fecha_creacion", sa.DateTime(), nullable=False),
+    )
+    op.bulk_insert(tenants, [{"id": TENANT_PRINCIPAL, "nombre": "Principal", "fecha_creacion": datetime.utcnow()}])
+    if dialecto == "postgresql":
+        op.execute("SELECT setval(pg_get_serial_sequence('tenants', 'id'), (SELECT max(id) FROM tenants))")
+
+    op.create_table(
+        "usuarios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("nombre", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("fecha_creacion", sa.DateTime(), nullable=False),
+    )
+
+    # Los índices de expresiones no sobreviven a la copia de batch: se quitan antes
+    op.drop_index("ux_rutinas_nombre_lower", table_name="rutinas")
+    op.drop_index("ix_rutinas_nombre", table_name="rutinas")
+    op.drop_index("ix_rutinas_fecha_creacion_id", table_name="rutinas")
+
+    # Las rutinas existentes pasan al tenant principal con un DEFAULT que luego se quita
+    # (en PostgreSQL, con DEFAULT constante, sin reescribir la tabla)
+    if dialecto == "sqlite":
+        # En batch las FKs necesitan nombre
+        def agregar(tabla):
+            tabla.add_column(sa.Column(
+                "tenant_id", sa.Integer(), nullable=False, server_default=str(TENANT_PRINCIPAL)
+            ))
+            tabla.add_column(sa.Column("usuario_id", sa.Integer(), nullable=True))
+            tabla.create_foreign_key(
+                "fk_rutinas_tenant_id_tenants", "tenants", ["tenant_id"], ["id"], ondelete="CASCADE"
+            )
+            tabla.create_foreign_key(
+                "fk_rutinas_usuario_id_usuarios", "usuarios", ["usuario_id"], ["id"], ondelete="SET NULL"
+            )
+        _recrear_rutinas(agregar)
+        _recrear_rutinas(lambda tabla: tabla.alter_column("tenant_id", server_default=None))
+    else:
+        op.add_column("rutinas", sa.Column(
+            "tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"),
+            nullable=False, server_default=str(TENANT_PRINCIPAL)
+        ))
+        op.alter_column("rutinas", "tenant_id", server_default=None)
+        op.add_column("rutinas", sa.Column(
+            "usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True
+        ))
+
+    # Después de batch, que refleja tenants y usuarios y avisa de los índices de expresiones
+    op.create_index("ux_tenants_nombre_lower", "tenants", [sa.text("lower(nombre)")], unique=True)
+    op.create_index(
+        "ux_usuarios_tenant_email_lower", "usuarios", ["tenant_id", sa.text("lower(email)")], unique=True
+    )
+    op.create_index(
+        "ux_rutinas_tenant_nombre_lower", "rutinas", ["tenant_id", sa.text("lower(nombre)")], unique=True
+    )
+    op.create_index("ix_rutinas_tenant_fecha_id", "rutinas", ["tenant_id", "fecha_creacion", "id"])
+    op.create_index("ix_rutinas_tenant_nombre_id", "rutinas", ["tenant_id", "nombre", "id"])
+    op.create_index(
+        "ix_rutinas_tenant_usuario_fecha", "rutinas", ["tenant_id", "usuario_id", "fecha_creacion", "id"]
+    )
+
+    if dialecto == "postgresql":
+        for sentencia in DDL_POSTGRESQL_TENANT:
+            op.execute(sentencia)
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+
+    if dialecto == "postgresql":
+        for indice in INDICES_POSTGRESQL_TENANT:
+            op.execute(f"DROP INDEX IF EXISTS {indice}")
+        for sentencia in DDL_POSTGRESQL_RUTINAS:
+            op.execute(sentencia)
+
+    op.drop_index("ix_rutinas_tenant_usuario_fecha", table_name="rutinas")
+    op.drop_index("ix_rutinas_tenant_nombre_id", table_name="rutinas")
+    op.drop_index("ix_rutinas_tenant_fecha_id", table_name="rutinas")
+    op.drop_index("ux_rutinas_tenant_nombre_lower", table_name="rutinas")
+    op.drop_index("ux_usuarios_tenant_email_lower", table_name="usuarios")
+    op.drop_index("ux_tenants_nombre_lower", table_name="tenants")
+
+    if dialecto == "sqlite":
+        def quitar(tabla):
+            tabla.drop_constraint("fk_rutinas_usuario_id_usuarios", type_="foreignkey")
+            tabla.drop_constraint("fk_rutinas_tenant_id_tenants", type_="foreignkey")
+            tabla.drop_column("usuario_id")
+            tabla.drop_column("tenant_id")
+        _recrear_rutinas(quitar)
+    else:
+        op.drop_column("rutinas", "usuario_id")
+        op.drop_column("rutinas", "tenant_id")
+
+    op.create_index("ix_rutinas_fecha_creacion_id", "rutinas", ["fecha_creacion", "id"])
+    op.create_index("ix_rutinas_nombre", "rutinas", ["nombre"], unique=True)
+    op.create_index("ux_rutinas_nombre_lower", "rutinas", [sa.text("lower(nombre)")], unique=True)
+
+    op.drop_table("usuarios")
+    op.drop_table("tenants")
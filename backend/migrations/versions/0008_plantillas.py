@@ -0,0 +1,51 @@
+"""Plantillas y rutinas que comparten sus ejercicios
+
+- rutinas.es_plantilla: rutina de la biblioteca del tenant, con los
+  ejercicios inmutables.
+- rutinas.plantilla_id: la rutina no tiene ejercicios propios y muestra los
+  de esa plantilla hasta que se modifican (copy-on-write, ver plantillas.py).
+- Índices parciales para listar las plantillas de un tenant y encontrar las
+  rutinas que comparten una plantilla.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    sqlite = op.get_bind().dialect.name == "sqlite"
+
+    op.add_column("rutinas", sa.Column("es_plantilla", sa.Boolean(), nullable=False, server_default=sa.false()))
+    if sqlite:
+        # Sin batch: recrear la tabla borraría los triggers de búsqueda (FTS5)
+        op.execute("ALTER TABLE rutinas ADD COLUMN plantilla_id INTEGER REFERENCES rutinas (id)")
+    else:
+        op.add_column("rutinas", sa.Column("plantilla_id", sa.Integer(), sa.ForeignKey("rutinas.id"), nullable=True))
+
+    op.create_index(
+        "ix_rutinas_tenant_plantillas", "rutinas", ["tenant_id", "fecha_creacion", "id"],
+        postgresql_where=sa.text("es_plantilla"), sqlite_where=sa.text("es_plantilla = 1")
+    )
+    op.create_index(
+        "ix_rutinas_plantilla_id", "rutinas", ["plantilla_id"],
+        postgresql_where=sa.text("plantilla_id IS NOT NULL"), sqlite_where=sa.text("plantilla_id IS NOT NULL")
+    )
+
+
+def downgrade():
+    op.drop_index("ix_rutinas_plantilla_id", table_name="rutinas")
+    op.drop_index("ix_rutinas_tenant_plantillas", table_name="rutinas")
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("ALTER TABLE rutinas DROP COLUMN plantilla_id")
+        op.execute("ALTER TABLE rutinas DROP COLUMN es_plantilla")
+    else:
+        op.drop_column("rutinas", "plantilla_id")
+        op.drop_column("rutinas", "es_plantilla")
@@ -0,0 +1,62 @@
+"""Cola de trabajos en segundo plano
+
+- trabajos: importaciones, exportaciones, recálculo de resúmenes y clonados
+  masivos que ejecuta el despachador de trabajos.py fuera de las peticiones.
+- Índices parciales de la cola: los pendientes por disponible_en (lo que
+  recorre cada reclamación) y los que están en curso por latido.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "trabajos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("tipo", sa.String(30), nullable=False),
+        sa.Column("estado", sa.String(20), nullable=False, server_default="pendiente"),
+        sa.Column("parametros", sa.JSON(), nullable=True),
+        sa.Column("entrada", sa.LargeBinary(), nullable=True),
+        sa.Column("salida", sa.LargeBinary(), nullable=True),
+        sa.Column("resultado", sa.JSON(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("hecho", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("intentos", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_intentos", sa.Integer(), nullable=False, server_default="3"),
+        sa.Column("cancelar", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("disponible_en", sa.DateTime(), nullable=False),
+        sa.Column("latido", sa.DateTime(), nullable=True),
+        sa.Column("fecha_creacion", sa.DateTime(), nullable=False),
+        sa.Column("iniciado_en", sa.DateTime(), nullable=True),
+        sa.Column("terminado_en", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_trabajos_tenant_fecha_id", "trabajos", ["tenant_id", "fecha_creacion", "id"])
+    op.create_index("ix_trabajos_terminado_en", "trabajos", ["terminado_en"])
+    op.create_index(
+        "ix_trabajos_pendientes", "trabajos", ["disponible_en", "id"],
+        postgresql_where=sa.text("estado = 'pendiente'"), sqlite_where=sa.text("estado = 'pendiente'")
+    )
+    op.create_index(
+        "ix_trabajos_en_curso", "trabajos", ["latido"],
+        postgresql_where=sa.text("estado = 'en_curso'"), sqlite_where=sa.text("estado = 'en_curso'")
+    )
+
+
+def downgrade():
+    op.drop_index("ix_trabajos_en_curso", table_name="trabajos")
+    op.drop_index("ix_trabajos_pendientes", table_name="trabajos")
+    op.drop_index("ix_trabajos_terminado_en", table_name="trabajos")
+    op.drop_index("ix_trabajos_tenant_fecha_id", table_name="trabajos")
+    op.drop_table("trabajos")
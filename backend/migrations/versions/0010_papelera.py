@@ -0,0 +1,85 @@
+"""Papelera de rutinas (borrado lógico)
+
+- rutinas.deleted_at: eliminar una rutina solo la marca; la purga de
+  papelera.py la borra con sus ejercicios más tarde, por lotes.
+- Los índices de rutinas pasan a ser parciales (deleted_at IS NULL), también
+  el de nombre único: una rutina en la papelera no reserva su nombre.
+- Índices parciales de la papelera: por tenant y fecha de borrado, y por
+  fecha de borrado para la purga.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+VIGENTES = "deleted_at IS NULL"
+ELIMINADAS = "deleted_at IS NOT NULL"
+
+
+def _indices_rutinas(donde: str | None, plantillas: str):
+    """(Re)crea los índices de rutinas, parciales con `donde` si se indica"""
+    parcial = {"postgresql_where": sa.text(donde), "sqlite_where": sa.text(donde)} if donde else {}
+    op.create_index("ix_rutinas_tenant_fecha_id", "rutinas", ["tenant_id", "fecha_creacion", "id"], **parcial)
+    op.create_index("ix_rutinas_tenant_nombre_id", "rutinas", ["tenant_id", "nombre", "id"], **parcial)
+    op.create_index(
+        "ix_rutinas_tenant_usuario_fecha", "rutinas", ["tenant_id", "usuario_id", "fecha_creacion", "id"], **parcial
+    )
+    op.create_index(
+        "ux_rutinas_tenant_nombre_lower", "rutinas", ["tenant_id", sa.text("lower(nombre)")], unique=True, **parcial
+    )
+    op.create_index(
+        "ix_rutinas_tenant_plantillas", "rutinas", ["tenant_id", "fecha_creacion", "id"],
+        postgresql_where=sa.text(plantillas), sqlite_where=sa.text(plantillas)
+    )
+
+
+def _borrar_indices_rutinas():
+    for nombre in (
+        "ix_rutinas_tenant_plantillas", "ux_rutinas_tenant_nombre_lower", "ix_rutinas_tenant_usuario_fecha",
+        "ix_rutinas_tenant_nombre_id", "ix_rutinas_tenant_fecha_id",
+    ):
+        op.drop_index(nombre, table_name="rutinas")
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+    es_plantilla = "es_plantilla" if dialecto == "postgresql" else "es_plantilla = 1"
+
+    # Sin FK: add_column no recrea la tabla en SQLite (los triggers FTS5 siguen)
+    op.add_column("rutinas", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+    _borrar_indices_rutinas()
+    _indices_rutinas(VIGENTES, f"{es_plantilla} AND {VIGENTES}")
+    op.create_index(
+        "ix_rutinas_tenant_eliminadas", "rutinas", ["tenant_id", "deleted_at", "id"],
+        postgresql_where=sa.text(ELIMINADAS), sqlite_where=sa.text(ELIMINADAS)
+    )
+    op.create_index(
+        "ix_rutinas_eliminadas", "rutinas", ["deleted_at"],
+        postgresql_where=sa.text(ELIMINADAS), sqlite_where=sa.text(ELIMINADAS)
+    )
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+    es_plantilla = "es_plantilla" if dialecto == "postgresql" else "es_plantilla = 1"
+
+    # Lo que está en la papelera se pierde: sin deleted_at volvería a verse
+    op.execute("DELETE FROM ejercicios WHERE rutina_id IN (SELECT id FROM rutinas WHERE deleted_at IS NOT NULL)")
+    op.execute("DELETE FROM rutina_resumen WHERE rutina_id IN (SELECT id FROM rutinas WHERE deleted_at IS NOT NULL)")
+    op.execute("DELETE FROM rutinas WHERE deleted_at IS NOT NULL")
+
+    op.drop_index("ix_rutinas_eliminadas", table_name="rutinas")
+    op.drop_index("ix_rutinas_tenant_eliminadas", table_name="rutinas")
+    _borrar_indices_rutinas()
+    _indices_rutinas(None, es_plantilla)
+    if dialecto == "sqlite":
+        op.execute("ALTER TABLE rutinas DROP COLUMN deleted_at")
+    else:
+        op.drop_column("rutinas", "deleted_at")
@@ -0,0 +1,72 @@
+"""Registro de entrenamientos: sesiones y series realizadas
+
+- sesiones: una fila por entrenamiento, con sus totales; (tenant_id,
+  cliente_id) es único para que reenviar una sesión no la duplique.
+- series_realizadas: de solo inserción. En PostgreSQL, particionada por rango
+  de realizada_en (un mes por partición; las crea entrenamientos.py según se
+  necesitan, así que aquí no se crea ninguna) y con un índice BRIN por fecha.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "sesiones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("rutina_id", sa.Integer(), sa.ForeignKey("rutinas.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("cliente_id", sa.String(64), nullable=False),
+        sa.Column("iniciada_en", sa.DateTime(), nullable=False),
+        sa.Column("terminada_en", sa.DateTime(), nullable=False),
+        sa.Column("notas", sa.Text(), nullable=True),
+        sa.Column("num_series", sa.Integer(), nullable=False),
+        sa.Column("repeticiones", sa.Integer(), nullable=False),
+        sa.Column("volumen", sa.BigInteger(), nullable=False),
+        sa.Column("fecha_registro", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ux_sesiones_tenant_cliente", "sesiones", ["tenant_id", "cliente_id"], unique=True)
+    op.create_index("ix_sesiones_tenant_fecha_id", "sesiones", ["tenant_id", "iniciada_en", "id"])
+    op.create_index(
+        "ix_sesiones_tenant_usuario_fecha", "sesiones", ["tenant_id", "usuario_id", "iniciada_en", "id"]
+    )
+
+    op.create_table(
+        "series_realizadas",
+        sa.Column("sesion_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("orden", sa.SmallInteger(), primary_key=True, autoincrement=False),
+        sa.Column("realizada_en", sa.DateTime(), primary_key=True),
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), nullable=True),
+        sa.Column("ejercicio_id", sa.Integer(), nullable=False),
+        sa.Column("repeticiones", sa.Integer(), nullable=False),
+        sa.Column("peso", sa.Integer(), nullable=True),
+        postgresql_partition_by="RANGE (realizada_en)",
+    )
+    # En PostgreSQL se crean en la tabla particionada y cada partición hereda los suyos
+    op.create_index(
+        "ix_series_tenant_ejercicio_usuario_fecha", "series_realizadas",
+        ["tenant_id", "ejercicio_id", "usuario_id", "realizada_en"]
+    )
+    op.create_index("ix_series_realizada_en", "series_realizadas", ["realizada_en"], postgresql_using="brin")
+
+
+def downgrade():
+    op.drop_index("ix_series_realizada_en", table_name="series_realizadas")
+    op.drop_index("ix_series_tenant_ejercicio_usuario_fecha", table_name="series_realizadas")
+    # En PostgreSQL también borra las particiones
+    op.drop_table("series_realizadas")
+    op.drop_index("ix_sesiones_tenant_usuario_fecha", table_name="sesiones")
+    op.drop_index("ix_sesiones_tenant_fecha_id", table_name="sesiones")
+    op.drop_index("ux_sesiones_tenant_cliente", table_name="sesiones")
+    op.drop_table("sesiones")
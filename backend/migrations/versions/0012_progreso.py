@@ -0,0 +1,111 @@
+"""Progreso por usuario y ejercicio: récords y volumen semanal
+
+- progreso_ejercicios: totales, peso máximo y mejor 1RM estimado de cada
+  usuario en cada ejercicio.
+- progreso_semanas: los mismos totales por semana (lunes a domingo).
+
+Las mantiene progreso.py al registrar series. Se rellenan aquí desde las
+series ya registradas, con el mismo cálculo que progreso.reconstruir() en
+esta revisión (copiado en SQL para que no dependa de los modelos actuales).
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+# 1RM estimado de una serie (Epley, de 1 a 12 repeticiones) de la tabla con alias {s}
+UN_RM = (
+    "CASE WHEN {s}.repeticiones = 1 THEN CAST({s}.peso AS FLOAT) "
+    "WHEN {s}.repeticiones BETWEEN 2 AND 12 "
+    "THEN CAST({s}.peso AS FLOAT) * (1.0 + CAST({s}.repeticiones AS FLOAT) / 30.0) END"
+)
+
+# Totales por usuario y ejercicio; la fecha de cada récord es la de la
+# primera serie que lo alcanzó
+RELLENAR_EJERCICIOS = f"""
+INSERT INTO progreso_ejercicios (
+    tenant_id, usuario_id, ejercicio_id, series, repeticiones, volumen, peso_maximo, peso_maximo_en,
+    mejor_1rm, mejor_1rm_en, primera_serie_en, ultima_serie_en
+)
+SELECT t.tenant_id, t.usuario_id, t.ejercicio_id, t.series, t.repeticiones, t.volumen, t.peso_maximo,
+    (SELECT min(o.realizada_en) FROM series_realizadas AS o
+     WHERE o.tenant_id = t.tenant_id AND o.ejercicio_id = t.ejercicio_id AND o.usuario_id = t.usuario_id
+     AND o.peso = t.peso_maximo),
+    t.mejor_1rm,
+    (SELECT min(o.realizada_en) FROM series_realizadas AS o
+     WHERE o.tenant_id = t.tenant_id AND o.ejercicio_id = t.ejercicio_id AND o.usuario_id = t.usuario_id
+     AND {UN_RM.format(s="o")} = t.mejor_1rm),
+    t.primera_serie_en, t.ultima_serie_en
+FROM (
+    SELECT s.tenant_id, s.usuario_id, s.ejercicio_id, count(*) AS series, sum(s.repeticiones) AS repeticiones,
+        sum(s.repeticiones * coalesce(s.peso, 0)) AS volumen, max(s.peso) AS peso_maximo,
+        max({UN_RM.format(s="s")}) AS mejor_1rm,
+        min(s.realizada_en) AS primera_serie_en, max(s.realizada_en) AS ultima_serie_en
+    FROM series_realizadas AS s
+    WHERE s.usuario_id IS NOT NULL
+    GROUP BY s.tenant_id, s.usuario_id, s.ejercicio_id
+) AS t
+"""
+
+# Lunes de la semana de cada serie
+SEMANA = {
+    "postgresql": "CAST(date_trunc('week', s.realizada_en) AS DATE)",
+    "sqlite": "date(s.realizada_en, 'weekday 0', '-6 days')",
+}
+
+RELLENAR_SEMANAS = f"""
+INSERT INTO progreso_semanas (
+    tenant_id, usuario_id, ejercicio_id, semana, series, repeticiones, volumen, peso_maximo, mejor_1rm
+)
+SELECT s.tenant_id, s.usuario_id, s.ejercicio_id, {{semana}}, count(*), sum(s.repeticiones),
+    sum(s.repeticiones * coalesce(s.peso, 0)), max(s.peso), max({UN_RM.format(s="s")})
+FROM series_realizadas AS s
+WHERE s.usuario_id IS NOT NULL
+GROUP BY s.tenant_id, s.usuario_id, s.ejercicio_id, {{semana}}
+"""
+
+
+def upgrade():
+    op.create_table(
+        "progreso_ejercicios",
+        sa.Column("tenant_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("usuario_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("ejercicio_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("series", sa.Integer(), nullable=False),
+        sa.Column("repeticiones", sa.Integer(), nullable=False),
+        sa.Column("volumen", sa.BigInteger(), nullable=False),
+        sa.Column("peso_maximo", sa.Integer(), nullable=True),
+        sa.Column("peso_maximo_en", sa.DateTime(), nullable=True),
+        sa.Column("mejor_1rm", sa.Float(), nullable=True),
+        sa.Column("mejor_1rm_en", sa.DateTime(), nullable=True),
+        sa.Column("primera_serie_en", sa.DateTime(), nullable=False),
+        sa.Column("ultima_serie_en", sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        "progreso_semanas",
+        sa.Column("tenant_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("usuario_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("ejercicio_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("semana", sa.Date(), primary_key=True),
+        sa.Column("series", sa.Integer(), nullable=False),
+        sa.Column("repeticiones", sa.Integer(), nullable=False),
+        sa.Column("volumen", sa.BigInteger(), nullable=False),
+        sa.Column("peso_maximo", sa.Integer(), nullable=True),
+        sa.Column("mejor_1rm", sa.Float(), nullable=True),
+    )
+
+    # Las series registradas antes de esta migración
+    op.execute(RELLENAR_EJERCICIOS)
+    op.execute(RELLENAR_SEMANAS.format(semana=SEMANA[op.get_bind().dialect.name]))
+
+
+def downgrade():
+    op.drop_table("progreso_semanas")
+    op.drop_table("progreso_ejercicios")
@@ -0,0 +1,134 @@
+"""Índices de búsqueda por tenant
+
+- ejercicios.tenant_id (obligatorio): el de su rutina, repetido para que
+  los índices de búsqueda de ejercicios empiecen por tenant_id.
+- PostgreSQL: ix_ejercicios_tenant_nombre_trgm (tenant_id, lower(nombre))
+  con btree_gin reemplaza a ix_ejercicios_nombre_trgm.
+- SQLite: las tablas FTS5 se rehacen con rowid = tenant_id * 2^32 + id.
+  FTS5 solo sabe filtrar por MATCH y por rowid; una columna UNINDEXED
+  tenant_id se comprobaría fila a fila después del MATCH, mientras que un
+  rango de rowid lo recorre solo dentro del tenant.
+
+En SQLite añadir la FK exige recrear ejercicios (batch), lo que borra sus
+triggers: se vuelven a crear junto con las tablas FTS5.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+# 2^32: cada tenant tiene su tramo de rowids en las tablas FTS5
+TRAMO = 4294967296
+
+DDL_POSTGRESQL = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    "CREATE INDEX IF NOT EXISTS ix_ejercicios_tenant_nombre_trgm "
+    "ON ejercicios USING gin (tenant_id, lower(nombre) gin_trgm_ops)",
+    "DROP INDEX IF EXISTS ix_ejercicios_nombre_trgm",
+]
+# El de la migración 0002, para deshacerla
+DDL_POSTGRESQL_ANTERIOR = [
+    "CREATE INDEX IF NOT EXISTS ix_ejercicios_nombre_trgm "
+    "ON ejercicios USING gin (lower(nombre) gin_trgm_ops)",
+    "DROP INDEX IF EXISTS ix_ejercicios_tenant_nombre_trgm",
+]
+
+# batch sin reflejar rutinas ni tenants (avisarían de sus índices de expresiones)
+SIN_REFERENCIAS = {"resolve_fks": False}
+
+OBJETOS_SQLITE = {
+    "trigger": ["rutinas_fts_ai", "rutinas_fts_au", "rutinas_fts_ad",
+                "ejercicios_fts_ai", "ejercicios_fts_au", "ejercicios_fts_ad"],
+    "table": ["rutinas_fts", "ejercicios_fts"],
+}
+
+
+def _ddl_sqlite(rowid: str) -> list[str]:
+    """
+    DDL de las tablas FTS5 y sus triggers. rowid es la expresión del rowid
+    de una fila de rutinas o ejercicios, con {f} en lugar de la tabla o de new/old.
+    """
+    return [
+        "CREATE VIRTUAL TABLE rutinas_fts USING fts5(nombre, descripcion, tokenize='trigram')",
+        "CREATE VIRTUAL TABLE ejercicios_fts USING fts5(nombre, rutina_id UNINDEXED, tokenize='trigram')",
+        "INSERT INTO rutinas_fts(rowid, nombre, descripcion) "
+        f"SELECT {rowid.format(f='rutinas')}, nombre, coalesce(descripcion, '') FROM rutinas",
+        "INSERT INTO ejercicios_fts(rowid, nombre, rutina_id) "
+        f"SELECT {rowid.format(f='ejercicios')}, nombre, rutina_id FROM ejercicios",
+        "CREATE TRIGGER rutinas_fts_ai AFTER INSERT ON rutinas BEGIN "
+        "INSERT INTO rutinas_fts(rowid, nombre, descripcion) "
+        f"VALUES ({rowid.format(f='new')}, new.nombre, coalesce(new.descripcion, '')); END",
+        "CREATE TRIGGER rutinas_fts_au AFTER UPDATE OF nombre, descripcion ON rutinas BEGIN "
+        "UPDATE rutinas_fts SET nombre = new.nombre, descripcion = coalesce(new.descripcion, '') "
+        f"WHERE rowid = {rowid.format(f='new')}; END",
+        "CREATE TRIGGER rutinas_fts_ad AFTER DELETE ON rutinas BEGIN "
+        f"DELETE FROM rutinas_fts WHERE rowid = {rowid.format(f='old')}; END",
+        "CREATE TRIGGER ejercicios_fts_ai AFTER INSERT ON ejercicios BEGIN "
+        "INSERT INTO ejercicios_fts(rowid, nombre, rutina_id) "
+        f"VALUES ({rowid.format(f='new')}, new.nombre, new.rutina_id); END",
+        "CREATE TRIGGER ejercicios_fts_au AFTER UPDATE OF nombre, rutina_id ON ejercicios BEGIN "
+        "UPDATE ejercicios_fts SET nombre = new.nombre, rutina_id = new.rutina_id "
+        f"WHERE rowid = {rowid.format(f='new')}; END",
+        "CREATE TRIGGER ejercicios_fts_ad AFTER DELETE ON ejercicios BEGIN "
+        f"DELETE FROM ejercicios_fts WHERE rowid = {rowid.format(f='old')}; END",
+    ]
+
+
+def _rehacer_fts(rowid: str):
+    """Borra y vuelve a crear las tablas FTS5 (solo si ya existían)"""
+    bind = op.get_bind()
+    if not bind.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'ejercicios_fts'").first():
+        return
+    for tipo in ("trigger", "table"):
+        for nombre in OBJETOS_SQLITE[tipo]:
+            op.execute(f"DROP {tipo.upper()} IF EXISTS {nombre}")
+    for sentencia in _ddl_sqlite(rowid):
+        op.execute(sentencia)
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+
+    op.add_column("ejercicios", sa.Column("tenant_id", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE ejercicios SET tenant_id = "
+        "(SELECT rutinas.tenant_id FROM rutinas WHERE rutinas.id = ejercicios.rutina_id)"
+    )
+    if dialecto == "sqlite":
+        # En batch las FKs necesitan nombre
+        with op.batch_alter_table("ejercicios", recreate="always", reflect_kwargs=SIN_REFERENCIAS) as tabla:
+            tabla.alter_column("tenant_id", existing_type=sa.Integer(), nullable=False)
+            tabla.create_foreign_key(
+                "fk_ejercicios_tenant_id_tenants", "tenants", ["tenant_id"], ["id"], ondelete="CASCADE"
+            )
+        _rehacer_fts(f"{{f}}.tenant_id * {TRAMO} + {{f}}.id")
+    else:
+        op.alter_column("ejercicios", "tenant_id", existing_type=sa.Integer(), nullable=False)
+        op.create_foreign_key(
+            "fk_ejercicios_tenant_id_tenants", "ejercicios", "tenants", ["tenant_id"], ["id"], ondelete="CASCADE"
+        )
+        if dialecto == "postgresql":
+            for sentencia in DDL_POSTGRESQL:
+                op.execute(sentencia)
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == "sqlite":
+        with op.batch_alter_table("ejercicios", recreate="always", reflect_kwargs=SIN_REFERENCIAS) as tabla:
+            tabla.drop_constraint("fk_ejercicios_tenant_id_tenants", type_="foreignkey")
+            tabla.drop_column("tenant_id")
+        _rehacer_fts("{f}.id")
+    else:
+        if dialecto == "postgresql":
+            for sentencia in DDL_POSTGRESQL_ANTERIOR:
+                op.execute(sentencia)
+        op.drop_constraint("fk_ejercicios_tenant_id_tenants", "ejercicios", type_="foreignkey")
+        op.drop_column("ejercicios", "tenant_id")
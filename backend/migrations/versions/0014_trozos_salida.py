@@ -0,0 +1,43 @@
+"""Archivo de las exportaciones en trozos
+
+- trabajos_trozos: el archivo que genera un trabajo "exportar", en trozos
+  por (trabajo_id, intento, numero). Sustituye a trabajos.salida, que
+  guardaba el archivo entero en una sola fila.
+
+En SQLite, DROP COLUMN necesita SQLite 3.35 o posterior.
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "trabajos_trozos",
+        sa.Column(
+            "trabajo_id", sa.Integer(), sa.ForeignKey("trabajos.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("intento", sa.Integer(), primary_key=True),
+        sa.Column("numero", sa.Integer(), primary_key=True),
+        sa.Column("datos", sa.LargeBinary(), nullable=False),
+    )
+    # Los archivos ya generados pasan a ser un único trozo
+    op.execute(
+        "INSERT INTO trabajos_trozos (trabajo_id, intento, numero, datos) "
+        "SELECT id, intentos, 0, salida FROM trabajos WHERE salida IS NOT NULL"
+    )
+    op.drop_column("trabajos", "salida")
+
+
+def downgrade():
+    # Los archivos generados no se recuperan: habría que exportar de nuevo
+    op.add_column("trabajos", sa.Column("salida", sa.LargeBinary(), nullable=True))
+    op.drop_table("trabajos_trozos")
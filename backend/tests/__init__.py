@@ -0,0 +1,9 @@
+"""
+Pruebas del backend.
+
+Usan una base SQLite temporal migrada a head y la aplicación con
+TestClient. Se ejecutan desde la carpeta backend/:
+
+    pip install -r tests/requirements.txt
+    python -m pytest -q
+"""
@@ -0,0 +1,75 @@
+"""
+Fixtures comunes: una base SQLite temporal para toda la sesión de pruebas
+y la aplicación sobre ella.
+
+DATABASE_URL se fija antes de importar app: la configuración y los motores
+se crean al importar app.database.
+"""
+import itertools
+import os
+import tempfile
+
+import pytest
+
+_directorio = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio.name, 'pruebas.db')}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import cache  # noqa: E402
+from app.database import contar_sentencias, init_db  # noqa: E402
+
+DIAS = ["Lunes", "Martes", "Miércoles"]
+
+_numeros = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient sobre la base migrada a head (sin startup: no hay workers ni verificación)"""
+    init_db()
+    from main import app
+    return TestClient(app)
+
+
+def ejercicio(i: int, nombre: str = "Ejercicio") -> dict:
+    """Cuerpo de un EjercicioCreate; reparte los ejercicios entre tres días"""
+    return {
+        "nombre": f"{nombre} {i}", "dia_semana": DIAS[i % len(DIAS)],
+        "series": 3, "repeticiones": 10, "peso": 20 + i, "orden": i,
+    }
+
+
+@pytest.fixture
+def crear_rutina(client):
+    """Crea una rutina con n ejercicios y devuelve su detalle"""
+    def crear(n: int = 0, nombre: str = "Rutina", descripcion: str = None, ejercicio_nombre: str = "Ejercicio"):
+        respuesta = client.post(
+            "/api/rutinas", json={"nombre": f"{nombre} {next(_numeros)}", "descripcion": descripcion}
+        )
+        assert respuesta.status_code == 201, respuesta.text
+        rutina_id = respuesta.json()["id"]
+        if n:
+            respuesta = client.post(
+                f"/api/rutinas/{rutina_id}/ejercicios/lote",
+                json={"ejercicios": [ejercicio(i, ejercicio_nombre) for i in range(n)]},
+            )
+            assert respuesta.status_code == 201, respuesta.text
+        return client.get(f"/api/rutinas/{rutina_id}").json()
+    return crear
+
+
+@pytest.fixture
+def sentencias():
+    """
+    contar_sentencias() con la cache de respuestas vacía, para que las
+    lecturas lleguen a la BD:
+
+        with sentencias() as contador:
+            client.get("/api/rutinas/1")
+        assert contador.total == 1
+    """
+    def contar():
+        cache.cache.limpiar()
+        return contar_sentencias()
+    return contar
@@ -0,0 +1,182 @@
+"""
+Búsqueda con FTS5 (SQLite): coincidencias por trigramas, orden por bm25(),
+textos con caracteres de LIKE, el recorrido con LIKE para textos cortos y
+los triggers que mantienen las tablas FTS5.
+"""
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app import papelera
+from app.busqueda import PESO_DESCRIPCION, PESO_NOMBRE, TRAMO_TENANT
+from app.database import SessionLocal, engine
+from app.tenants import TENANT_PRINCIPAL, crear_tenant
+from tests.conftest import ejercicio
+
+
+def buscar(client, texto, tenant_id=TENANT_PRINCIPAL):
+    respuesta = client.get(
+        "/api/rutinas/buscar", params={"nombre": texto, "limite": 100}, headers={"X-Tenant-ID": str(tenant_id)}
+    )
+    assert respuesta.status_code == 200, respuesta.text
+    return [fila["id"] for fila in respuesta.json()]
+
+
+def en_fts(tabla: str, tenant_id: int, id_: int) -> bool:
+    """Si la fila está en la tabla FTS5 (rowid = tenant_id * 2^32 + id)"""
+    with engine.connect() as conn:
+        return conn.execute(
+            text(f"SELECT 1 FROM {tabla} WHERE rowid = :rowid"), {"rowid": tenant_id * TRAMO_TENANT + id_}
+        ).first() is not None
+
+
+# ============ COINCIDENCIAS Y RELEVANCIA ============
+
+def test_trigramas_dentro_de_palabras(client, crear_rutina):
+    rutina = crear_rutina(nombre="Sentadillas Quimbolo")
+    con_ejercicio = crear_rutina(2, ejercicio_nombre="Remo Quimbolero")
+    assert set(buscar(client, "imbol")) == {rutina["id"], con_ejercicio["id"]}
+    # Sin distinguir mayúsculas
+    assert rutina["id"] in buscar(client, "QUIMBOLO")
+    assert buscar(client, "quimbolox") == []
+
+
+def test_orden_bm25(client, crear_rutina):
+    en_descripcion = crear_rutina(nombre="Fondos", descripcion="serie zarcuela")
+    en_nombre = crear_rutina(nombre="Zarcuela")
+    en_nombre_y_ejercicio = crear_rutina(1, nombre="Zarcuela doble", ejercicio_nombre="Zarcuela")
+    # En la tabla de rutinas el nombre pesa más que la descripción
+    assert PESO_NOMBRE > PESO_DESCRIPCION
+    # y las coincidencias de los ejercicios se suman a las de la rutina
+    assert buscar(client, "zarcuela") == [en_nombre_y_ejercicio["id"], en_nombre["id"], en_descripcion["id"]]
+
+
+def test_cada_ejercicio_suma(client, crear_rutina):
+    en_uno = crear_rutina(1, ejercicio_nombre="Velmorino")
+    en_tres = crear_rutina(3, ejercicio_nombre="Velmorino")
+    assert buscar(client, "velmorino") == [en_tres["id"], en_uno["id"]]
+
+
+def test_limite_despues_del_orden(client, crear_rutina):
+    crear_rutina(nombre="Plancha", descripcion="trebolina")
+    mejor = crear_rutina(nombre="Trebolina")
+    respuesta = client.get("/api/rutinas/buscar", params={"nombre": "trebolina", "limite": 1})
+    assert [fila["id"] for fila in respuesta.json()] == [mejor["id"]]
+
+
+# ============ CARACTERES ESPECIALES ============
+
+def test_porcentaje_y_guion_bajo_son_literales(client, crear_rutina):
+    con_porcentaje = crear_rutina(nombre="Press 73% carga")
+    sin_porcentaje = crear_rutina(nombre="Press 735 carga")
+    con_guion = crear_rutina(nombre="Curl x_7 brazo")
+    sin_guion = crear_rutina(nombre="Curl xy7 brazo")
+
+    # Con FTS5 (3 caracteres o más)
+    assert buscar(client, "73%") == [con_porcentaje["id"]]
+    assert buscar(client, "x_7") == [con_guion["id"]]
+    # Con LIKE (menos de 3): escapados, no son comodines
+    porcentaje = buscar(client, "3%")
+    assert con_porcentaje["id"] in porcentaje and sin_porcentaje["id"] not in porcentaje
+    guion = buscar(client, "_7")
+    assert con_guion["id"] in guion and sin_guion["id"] not in guion
+
+
+def test_comillas_y_escape(client, crear_rutina):
+    rutina = crear_rutina(nombre='Remo "pendlay" !x')
+    assert buscar(client, '"pendlay"') == [rutina["id"]]
+    assert rutina["id"] in buscar(client, "!x")
+
+
+# ============ TEXTOS CORTOS ============
+
+def test_menos_de_tres_caracteres_usa_like(client, crear_rutina, sentencias):
+    rutina = crear_rutina(nombre="Rutina qj")
+    con_ejercicio = crear_rutina(1, ejercicio_nombre="Jalón qj")
+    with sentencias() as contador:
+        encontradas = buscar(client, "QJ")
+    assert set(encontradas) == {rutina["id"], con_ejercicio["id"]}
+    sql = " ".join(contador.sentencias)
+    assert "LIKE" in sql and "MATCH" not in sql
+
+
+def test_tres_caracteres_usa_fts(client, crear_rutina, sentencias):
+    rutina = crear_rutina(nombre="Rutina qjw")
+    buscar(client, "qjw")
+    with sentencias() as contador:
+        assert buscar(client, "qjw") == [rutina["id"]]
+    assert "MATCH" in " ".join(contador.sentencias)
+
+
+# ============ TRIGGERS ============
+
+def test_rutina_creada_modificada_y_borrada(client, crear_rutina):
+    rutina = crear_rutina(nombre="Gorvantal", descripcion="antes")
+    assert buscar(client, "gorvantal") == [rutina["id"]]
+
+    client.patch(f"/api/rutinas/{rutina['id']}", json={"nombre": "Melquiador", "descripcion": "luzbreta"})
+    assert buscar(client, "gorvantal") == []
+    assert buscar(client, "melquiador") == [rutina["id"]]
+    assert buscar(client, "luzbreta") == [rutina["id"]]
+
+    # Papelera: deja de aparecer y vuelve al restaurarla
+    assert client.delete(f"/api/rutinas/{rutina['id']}").status_code == 204
+    assert buscar(client, "melquiador") == []
+    assert client.post(f"/api/rutinas/{rutina['id']}/restaurar").status_code == 200
+    assert buscar(client, "melquiador") == [rutina["id"]]
+
+    # La purga la borra también de la tabla FTS5
+    client.delete(f"/api/rutinas/{rutina['id']}")
+    with SessionLocal() as db:
+        papelera.purgar(db, timedelta(0))
+    assert not en_fts("rutinas_fts", TENANT_PRINCIPAL, rutina["id"])
+
+
+def test_ejercicio_creado_modificado_y_borrado(client, crear_rutina):
+    rutina = crear_rutina()
+    nuevo = client.post(
+        f"/api/rutinas/{rutina['id']}/ejercicios", json=ejercicio(1, "Trompileta")
+    ).json()
+    assert buscar(client, "trompileta") == [rutina["id"]]
+
+    client.patch(f"/api/ejercicios/{nuevo['id']}", json={"nombre": "Bisaltero"})
+    assert buscar(client, "trompileta") == []
+    assert buscar(client, "bisaltero") == [rutina["id"]]
+
+    assert client.delete(f"/api/ejercicios/{nuevo['id']}").status_code == 204
+    assert buscar(client, "bisaltero") == []
+    assert not en_fts("ejercicios_fts", TENANT_PRINCIPAL, nuevo["id"])
+
+
+def test_ejercicios_reemplazados(client, crear_rutina):
+    rutina = crear_rutina(2, ejercicio_nombre="Canfurio")
+    client.put(f"/api/rutinas/{rutina['id']}/ejercicios", json={"ejercicios": [ejercicio(0, "Dalmestro")]})
+    assert buscar(client, "canfurio") == []
+    assert buscar(client, "dalmestro") == [rutina["id"]]
+
+
+def test_ejercicios_purgados_con_su_rutina(client, crear_rutina):
+    rutina = crear_rutina(2, ejercicio_nombre="Pelvandor")
+    client.delete(f"/api/rutinas/{rutina['id']}")
+    assert buscar(client, "pelvandor") == []
+    with SessionLocal() as db:
+        papelera.purgar(db, timedelta(0))
+    for fila in rutina["ejercicios"]:
+        assert not en_fts("ejercicios_fts", TENANT_PRINCIPAL, fila["id"])
+
+
+# ============ TENANTS ============
+
+def test_solo_el_tenant(client, crear_rutina):
+    with SessionLocal() as db:
+        otro = crear_tenant(db, "Tenant de búsqueda")
+    propia = crear_rutina(1, nombre="Ostravilo", ejercicio_nombre="Ostravilo")
+    ajena = client.post(
+        "/api/rutinas", json={"nombre": "Ostravilo ajena"}, headers={"X-Tenant-ID": str(otro)}
+    ).json()
+    assert en_fts("rutinas_fts", otro, ajena["id"])
+
+    assert buscar(client, "ostravilo") == [propia["id"]]
+    assert buscar(client, "ostravilo", otro) == [ajena["id"]]
+    # También con LIKE
+    assert buscar(client, "av", otro) == [ajena["id"]]
@@ -0,0 +1,69 @@
+"""
+Reordenar rutinas que comparten una plantilla: la respuesta trae los
+ejercicios que ve GET /rutinas/{id}, y un orden vacío no escribe nada.
+"""
+import pytest
+
+from app.database import SessionLocal
+from app.tenants import crear_tenant
+
+
+@pytest.fixture
+def compartida(client, crear_rutina):
+    """(plantilla, rutina que la comparte), con los detalles de ambas"""
+    origen = crear_rutina(2)
+    plantilla = client.post(f"/api/rutinas/{origen['id']}/clonar", json={"modo": "plantilla"}).json()
+    rutina = client.post(f"/api/rutinas/{plantilla['id']}/clonar", json={"modo": "compartida"}).json()
+    assert rutina["plantilla_id"] == plantilla["id"]
+    return client.get(f"/api/rutinas/{plantilla['id']}").json(), client.get(f"/api/rutinas/{rutina['id']}").json()
+
+
+def reordenar(client, rutina_id, dias, version=None, **cabeceras):
+    if version is not None:
+        cabeceras["If-Match"] = f'"{version}"'
+    return client.put(f"/api/rutinas/{rutina_id}/ejercicios/orden", json={"dias": dias}, headers=cabeceras)
+
+
+def test_orden_vacio_no_cambia_nada(client, compartida):
+    plantilla, rutina = compartida
+    respuesta = reordenar(client, rutina["id"], [{"dia_semana": "Lunes", "ejercicios": []}], rutina["version"])
+    assert respuesta.status_code == 200
+    assert respuesta.json() == rutina
+    assert len(respuesta.json()["ejercicios"]) == len(plantilla["ejercicios"]) == 2
+    assert client.get(f"/api/rutinas/{rutina['id']}").json() == rutina
+
+
+def test_orden_vacio_comprueba_la_rutina(client, compartida):
+    plantilla, rutina = compartida
+    vacio = [{"dia_semana": "Lunes", "ejercicios": []}]
+    assert reordenar(client, rutina["id"], vacio, rutina["version"] + 1).status_code == 412
+    assert reordenar(client, plantilla["id"], vacio).status_code == 409
+    assert reordenar(client, 10**9, vacio).status_code == 404
+    with SessionLocal() as db:
+        otro = crear_tenant(db, "Tenant de plantillas")
+    assert reordenar(client, rutina["id"], vacio, **{"X-Tenant-ID": str(otro)}).status_code == 404
+
+
+def test_reordenar_compartida_devuelve_la_copia(client, compartida):
+    plantilla, rutina = compartida
+    ids = [fila["id"] for fila in plantilla["ejercicios"]][::-1]
+    respuesta = reordenar(client, rutina["id"], [{"dia_semana": "Martes", "ejercicios": ids}], rutina["version"])
+    assert respuesta.status_code == 200
+    detalle = respuesta.json()
+    assert detalle == client.get(f"/api/rutinas/{rutina['id']}").json()
+    # Copy-on-write: ejercicios propios, con ids nuevos y en el orden pedido
+    assert detalle["plantilla_id"] is None
+    assert detalle["version"] == rutina["version"] + 1
+    assert [fila["nombre"] for fila in detalle["ejercicios"]] == [
+        fila["nombre"] for fila in plantilla["ejercicios"]
+    ][::-1]
+    assert not {fila["id"] for fila in detalle["ejercicios"]} & set(ids)
+
+
+def test_otro_tenant_no_reordena(client, crear_rutina):
+    rutina = crear_rutina(2)
+    with SessionLocal() as db:
+        otro = crear_tenant(db, "Tenant sin acceso")
+    ids = [fila["id"] for fila in rutina["ejercicios"]]
+    respuesta = reordenar(client, rutina["id"], [{"dia_semana": "Lunes", "ejercicios": ids}], **{"X-Tenant-ID": str(otro)})
+    assert respuesta.status_code == 404
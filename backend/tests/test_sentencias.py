@@ -0,0 +1,154 @@
+"""
+Sentencias SQL por petición.
+
+Cada endpoint ejecuta un número fijo de sentencias, tenga la rutina 1 o 25
+ejercicios: si una consulta pasa a hacerse por ejercicio (N+1), el total
+cambia y la prueba falla.
+"""
+import pytest
+
+from tests.conftest import ejercicio
+
+TAMANOS = [1, 25]
+
+
+@pytest.mark.parametrize("n", TAMANOS)
+def test_listado(client, crear_rutina, sentencias, n):
+    for _ in range(3):
+        crear_rutina(n)
+    with sentencias() as contador:
+        respuesta = client.get("/api/rutinas?limit=20")
+    assert respuesta.status_code == 200
+    assert len(respuesta.json()["items"]) >= 3
+    # Rutinas y resumen en una sola consulta
+    assert contador.total == 1
+
+
+@pytest.mark.parametrize("n", TAMANOS)
+def test_detalle(client, crear_rutina, sentencias, n):
+    rutina = crear_rutina(n)
+    with sentencias() as contador:
+        respuesta = client.get(f"/api/rutinas/{rutina['id']}")
+    assert len(respuesta.json()["ejercicios"]) == n
+    # Rutina y ejercicios en una sola consulta
+    assert contador.total == 1
+
+
+@pytest.mark.parametrize("n", TAMANOS)
+def test_plan(client, crear_rutina, sentencias, n):
+    rutina = crear_rutina(n)
+    with sentencias() as contador:
+        respuesta = client.get(f"/api/rutinas/{rutina['id']}/plan")
+    assert respuesta.status_code == 200
+    # Rutina, totales por día y ejercicios
+    assert contador.total == 3
+
+
+@pytest.mark.parametrize("n", TAMANOS)
+def test_busqueda(client, crear_rutina, sentencias, n):
+    crear_rutina(n, ejercicio_nombre=f"Remo contado{n}")
+    crear_rutina(n, descripcion=f"remo contado{n}")
+    # La primera búsqueda comprueba una vez si hay FTS5
+    client.get("/api/rutinas/buscar?nombre=remo")
+    with sentencias() as contador:
+        respuesta = client.get(f"/api/rutinas/buscar?nombre=contado{n}")
+    assert len(respuesta.json()) == 2
+    # Candidatos por relevancia y sus filas de listado
+    assert contador.total == 2
+
+
+@pytest.mark.parametrize("n", TAMANOS)
+def test_lote(client, crear_rutina, sentencias, n):
+    rutina = crear_rutina()
+    with sentencias() as contador:
+        respuesta = client.post(
+            f"/api/rutinas/{rutina['id']}/ejercicios/lote",
+            json={"ejercicios": [ejercicio(i) for i in range(n)]},
+        )
+    assert respuesta.status_code == 201
+    assert len(respuesta.json()) == n
+    # Rutina, INSERT ... RETURNING de todos, updated_at y resumen
+    assert contador.total == 4
+
+
+@pytest.mark.parametrize("n", TAMANOS)
+def test_reemplazo(client, crear_rutina, sentencias, n):
+    rutina = crear_rutina(n)
+    with sentencias() as contador:
+        respuesta = client.put(
+            f"/api/rutinas/{rutina['id']}/ejercicios",
+            json={"ejercicios": [ejercicio(i, "Nuevo") for i in range(n)]},
+        )
+    assert respuesta.status_code == 200
+    assert len(respuesta.json()) == n
+    # Como el lote, más el DELETE de los anteriores
+    assert contador.total == 5
+
+
+@pytest.mark.parametrize("n", TAMANOS)
+def test_reordenar(client, crear_rutina, sentencias, n):
+    rutina = crear_rutina(n)
+    por_dia = {}
+    for fila in rutina["ejercicios"]:
+        por_dia.setdefault(fila["dia_semana"], []).append(fila["id"])
+    dias = [{"dia_semana": dia, "ejercicios": ids[::-1]} for dia, ids in por_dia.items()]
+    with sentencias() as contador:
+        respuesta = client.put(
+            f"/api/rutinas/{rutina['id']}/ejercicios/orden",
+            json={"dias": dias}, headers={"If-Match": f'"{rutina["version"]}"'},
+        )
+    assert respuesta.status_code == 200
+    # Versión de la rutina, un UPDATE ... CASE para todos, resumen y detalle
+    assert contador.total == 4
+
+
+def test_reordenar_sin_ejercicios(client, crear_rutina, sentencias):
+    rutina = crear_rutina(3)
+    with sentencias() as contador:
+        respuesta = client.put(
+            f"/api/rutinas/{rutina['id']}/ejercicios/orden",
+            json={"dias": [{"dia_semana": "Lunes", "ejercicios": []}]},
+            headers={"If-Match": f'"{rutina["version"]}"'},
+        )
+    assert respuesta.json()["version"] == rutina["version"]
+    # Solo la lectura del detalle: nada que escribir
+    assert contador.total == 1
+
+
+def test_patch_rutina(client, crear_rutina, sentencias):
+    rutina = crear_rutina(3)
+    with sentencias() as contador:
+        respuesta = client.patch(
+            f"/api/rutinas/{rutina['id']}", json={"descripcion": "otra"},
+            headers={"If-Match": f'"{rutina["version"]}"'},
+        )
+    assert respuesta.status_code == 200
+    assert respuesta.json()["version"] == rutina["version"] + 1
+    # Un UPDATE ... RETURNING con la versión en el WHERE
+    assert contador.total == 1
+
+
+def test_patch_ejercicio(client, crear_rutina, sentencias):
+    fila = crear_rutina(3)["ejercicios"][0]
+    with sentencias() as contador:
+        respuesta = client.patch(
+            f"/api/ejercicios/{fila['id']}", json={"peso": 99},
+            headers={"If-Match": f'"{fila["version"]}"'},
+        )
+    assert respuesta.status_code == 200
+    assert respuesta.json()["peso"] == 99
+    # UPDATE ... RETURNING con la versión en el WHERE, updated_at de la rutina y resumen
+    assert contador.total == 3
+
+
+def test_patch_ejercicio_version_antigua(client, crear_rutina, sentencias):
+    fila = crear_rutina(3)["ejercicios"][0]
+    client.patch(f"/api/ejercicios/{fila['id']}", json={"peso": 50})
+    with sentencias() as contador:
+        respuesta = client.patch(
+            f"/api/ejercicios/{fila['id']}", json={"peso": 99},
+            headers={"If-Match": f'"{fila["version"]}"'},
+        )
+    assert respuesta.status_code == 412
+    # El UPDATE no afecta a ninguna fila y dos consultas eligen entre 404, 409 y 412
+    assert contador.total == 3
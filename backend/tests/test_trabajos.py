@@ -0,0 +1,85 @@
+"""
+Exportación en segundo plano: el archivo se guarda en trabajos_trozos y se
+descarga trozo a trozo; pasado TRABAJOS_MAX_SALIDA_BYTES el trabajo falla.
+
+Los trabajos se ejecutan aquí mismo (reclamar + ejecutar_trabajo), sin despachador.
+"""
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from app import trabajos
+from app.database import SessionLocal
+from app.models import TrozoSalida
+
+
+def exportar(client, formato="ndjson") -> dict:
+    respuesta = client.post("/api/trabajos/exportar", params={"formato": formato})
+    assert respuesta.status_code == 202
+    with SessionLocal() as db:
+        assert trabajos.reclamar(db, 1) == [respuesta.json()["id"]]
+    trabajos.ejecutar_trabajo(respuesta.json()["id"])
+    return client.get(f"/api/trabajos/{respuesta.json()['id']}").json()
+
+
+def trozos(trabajo_id: int) -> list[int]:
+    """Tamaño de cada trozo guardado del trabajo"""
+    with SessionLocal() as db:
+        return db.scalars(
+            select(func.length(TrozoSalida.datos))
+            .where(TrozoSalida.trabajo_id == trabajo_id)
+            .order_by(TrozoSalida.intento, TrozoSalida.numero)
+        ).all()
+
+
+def test_archivo_en_trozos(client, crear_rutina, monkeypatch):
+    for _ in range(5):
+        crear_rutina(3)
+    monkeypatch.setattr(trabajos, "TROZO_SALIDA", 1000)
+    for formato in ("ndjson", "csv"):
+        trabajo = exportar(client, formato)
+        assert trabajo["estado"] == "completado"
+        esperado = client.get("/api/rutinas/exportar", params={"formato": formato}).content
+
+        tamanos = trozos(trabajo["id"])
+        assert len(tamanos) > 1 and max(tamanos) == 1000
+        assert sum(tamanos) == len(esperado) == trabajo["resultado"]["bytes"] == trabajo["hecho"]
+
+        respuesta = client.get(f"/api/trabajos/{trabajo['id']}/archivo")
+        assert respuesta.status_code == 200
+        assert respuesta.content == esperado
+        # Sin comprimir se conoce la longitud de antemano
+        sin_comprimir = client.get(f"/api/trabajos/{trabajo['id']}/archivo", headers={"Accept-Encoding": "identity"})
+        assert sin_comprimir.headers["content-length"] == str(len(esperado))
+        assert sin_comprimir.content == esperado
+
+
+def test_supera_el_maximo(client, crear_rutina, monkeypatch):
+    crear_rutina(3)
+    monkeypatch.setattr(trabajos, "TROZO_SALIDA", 100)
+    monkeypatch.setattr(trabajos, "TRABAJOS_MAX_SALIDA_BYTES", 500)
+    trabajo = exportar(client)
+    # Sin reintentos y sin trozos a medias
+    assert trabajo["estado"] == "fallido"
+    assert trabajo["intentos"] == 1
+    assert "TRABAJOS_MAX_SALIDA_BYTES" in trabajo["error"]
+    assert trozos(trabajo["id"]) == []
+    assert client.get(f"/api/trabajos/{trabajo['id']}/archivo").status_code == 409
+
+
+def test_sin_archivo(client):
+    respuesta = client.post("/api/trabajos/resumenes")
+    assert client.get(f"/api/trabajos/{respuesta.json()['id']}/archivo").status_code == 409
+    assert client.get("/api/trabajos/999999999/archivo").status_code == 404
+    client.post(f"/api/trabajos/{respuesta.json()['id']}/cancelar")
+
+
+def test_purga_borra_los_trozos(client, crear_rutina, monkeypatch):
+    crear_rutina(1)
+    trabajo = exportar(client)
+    assert trozos(trabajo["id"])
+    monkeypatch.setattr(trabajos, "TRABAJOS_RETENCION_HORAS", 0)
+    with SessionLocal() as db:
+        assert trabajos.purgar_terminados(db) >= 1
+    assert trozos(trabajo["id"]) == []
+    assert client.get(f"/api/trabajos/{trabajo['id']}").status_code == 404
@@ -7,7 +7,9 @@ export default function RutinaCard({ rutina, onView, onEdit, onDelete }) {
     year: 'numeric',
   });
 
-  const ejerciciosCount = rutina.ejercicios?.length || 0;
+  // Totales calculados en el servidor (null si la rutina nunca tuvo ejercicios)
+  const resumen = rutina.resumen || {};
+  const ejerciciosCount = resumen.num_ejercicios || 0;
 
   return (
     <div className="rutina-card animate-slide-in">
@@ -26,10 +28,28 @@ export default function RutinaCard({ rutina, onView, onEdit, onDelete }) {
           <span className="info-text">{fechaFormato}</span>
         </div>
         {ejerciciosCount > 0 && (
-          <div className="info-item">
-            <span className="info-icon">💪</span>
-            <span className="info-text">{ejerciciosCount} ejercicios</span>
-          </div>
+          <>
+            <div className="info-item">
+              <span className="info-icon">🗓️</span>
+              <span className="info-text">
+                {resumen.num_dias} {resumen.num_dias === 1 ? 'día' : 'días'} por semana
+              </span>
+            </div>
+            <div className="info-item">
+              <span className="info-icon">💪</span>
+              <span className="info-text">
+                {resumen.series} series · {resumen.repeticiones} repeticiones
+              </span>
+            </div>
+            {resumen.volumen > 0 && (
+              <div className="info-item">
+                <span className="info-icon">🏋️</span>
+                <span className="info-text">
+                  {resumen.volumen.toLocaleString('es-ES')} kg de volumen
+                </span>
+              </div>
+            )}
+          </>
         )}
       </div>
 
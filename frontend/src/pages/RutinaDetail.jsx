@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { rutinasAPI, ejerciciosAPI } from '../services/api';
+import { rutinasAPI, ejerciciosAPI, eventosAPI } from '../services/api';
 import EjercicioItem from '../components/EjercicioItem';
 import './RutinaDetail.css';
 
@@ -12,11 +12,23 @@ export default function RutinaDetail({ rutinaId, onBack, onEdit }) {
     cargarRutina();
   }, [rutinaId]);
 
-  const cargarRutina = async () => {
-    setLoading(true);
+  // Se recarga cuando cambia esta rutina (desde aquí o desde otro cliente)
+  useEffect(() => {
+    return eventosAPI.suscribir((evento) => {
+      if (evento.tipo === 'rutina.eliminada' && evento.rutina_id === rutinaId) {
+        setRutina(null);
+      } else if (evento.tipo === 'resync' || evento.rutina_id === rutinaId) {
+        cargarRutina({ silencioso: true });
+      }
+    });
+  }, [rutinaId]);
+
+  const cargarRutina = async ({ silencioso = false } = {}) => {
+    if (!silencioso) setLoading(true);
     setError(null);
     try {
-      const datos = await rutinasAPI.obtenerPorId(rutinaId);
+      // El servidor devuelve los ejercicios ya agrupados por día y ordenados
+      const datos = await rutinasAPI.obtenerPlan(rutinaId);
       setRutina(datos);
     } catch (err) {
       setError('Error al cargar la rutina');
@@ -26,36 +38,11 @@ export default function RutinaDetail({ rutinaId, onBack, onEdit }) {
     }
   };
 
-  const agruparEjerciciosPorDia = (ejercicios) => {
-    const dias = [
-      'Lunes',
-      'Martes',
-      'Miércoles',
-      'Jueves',
-      'Viernes',
-      'Sábado',
-      'Domingo',
-    ];
-
-    const agrupados = {};
-    dias.forEach((dia) => {
-      agrupados[dia] = [];
-    });
-
-    ejercicios.forEach((ej) => {
-      if (agrupados[ej.dia_semana]) {
-        agrupados[ej.dia_semana].push(ej);
-      }
-    });
-
-    return agrupados;
-  };
-
   const handleDeleteEjercicio = async (id) => {
     if (window.confirm('¿Eliminar este ejercicio?')) {
       try {
-        await ejerciciosAPI.eliminar(id);
-        cargarRutina();
+        // La recarga llega con el evento ejercicio.eliminado
+        await ejerciciosAPI.eliminar(id, rutinaId);
       } catch (err) {
         alert('Error al eliminar el ejercicio');
         console.error(err);
@@ -96,11 +83,6 @@ export default function RutinaDetail({ rutinaId, onBack, onEdit }) {
     );
   }
 
-  const ejerciciosPorDia = agruparEjerciciosPorDia(rutina.ejercicios || []);
-  const diasConEjercicios = Object.entries(ejerciciosPorDia).filter(
-    ([, ejercicios]) => ejercicios.length > 0
-  );
-
   return (
     <div className="page-container">
       <div className="detail-header">
@@ -116,7 +98,7 @@ export default function RutinaDetail({ rutinaId, onBack, onEdit }) {
         </button>
       </div>
 
-      {diasConEjercicios.length === 0 ? (
+      {rutina.dias.length === 0 ? (
         <div className="empty-state">
           <div className="empty-icon">📭</div>
           <h3>Sin ejercicios</h3>
@@ -127,22 +109,24 @@ export default function RutinaDetail({ rutinaId, onBack, onEdit }) {
         </div>
       ) : (
         <div className="ejercicios-container">
-          {diasConEjercicios.map(([dia, ejercicios]) => (
-            <div key={dia} className="dia-section">
+          {rutina.dias.map((dia) => (
+            <div key={dia.dia_semana} className="dia-section">
               <h3 className="dia-title">
                 <span className="dia-icon">📅</span>
-                {dia}
+                {dia.dia_semana}
+                <span className="dia-totales">
+                  {dia.series} series · {dia.repeticiones} reps
+                  {dia.volumen > 0 && ` · ${dia.volumen.toLocaleString('es-ES')} kg`}
+                </span>
               </h3>
               <div className="ejercicios-list">
-                {ejercicios
-                  .sort((a, b) => a.orden - b.orden)
-                  .map((ejercicio) => (
-                    <EjercicioItem
-                      key={ejercicio.id}
-                      ejercicio={ejercicio}
-                      onDelete={() => handleDeleteEjercicio(ejercicio.id)}
-                    />
-                  ))}
+                {dia.ejercicios.map((ejercicio) => (
+                  <EjercicioItem
+                    key={ejercicio.id}
+                    ejercicio={ejercicio}
+                    onDelete={() => handleDeleteEjercicio(ejercicio.id)}
+                  />
+                ))}
               </div>
             </div>
           ))}
@@ -47,7 +47,14 @@ export default function RutinaForm({ rutinaId, onSuccess }) {
       if (rutinaId) {
         await rutinasAPI.actualizar(rutinaId, formData);
       } else {
-        await rutinasAPI.crear(formData);
+        const nueva = await rutinasAPI.crear(formData);
+        // Guardar de una vez los ejercicios agregados antes de crear la rutina
+        if (ejercicios.length > 0) {
+          await ejerciciosAPI.crearLote(
+            nueva.id,
+            ejercicios.map(({ id, rutina_id, ...datos }) => datos)
+          );
+        }
       }
       onSuccess();
     } catch (err) {
@@ -63,14 +70,24 @@ export default function RutinaForm({ rutinaId, onSuccess }) {
       if (editingEjercicio) {
         const actualizado = await ejerciciosAPI.actualizar(
           editingEjercicio.id,
-          datoEjercicio
-        );
-        setEjercicios(
-          ejercicios.map((e) => (e.id === editingEjercicio.id ? actualizado : e))
+          datoEjercicio,
+          rutinaId
         );
+        if (rutina?.plantilla_id) {
+          // Compartía una plantilla: ahora tiene ejercicios propios, con otros ids
+          await cargarRutina();
+        } else {
+          setEjercicios(
+            ejercicios.map((e) => (e.id === editingEjercicio.id ? actualizado : e))
+          );
+        }
       } else if (rutinaId) {
         const nuevo = await ejerciciosAPI.crear(rutinaId, datoEjercicio);
-        setEjercicios([...ejercicios, nuevo]);
+        if (rutina?.plantilla_id) {
+          await cargarRutina();
+        } else {
+          setEjercicios([...ejercicios, nuevo]);
+        }
       } else {
         // Agregar localmente si aún no se guardó la rutina
         setEjercicios([
@@ -93,8 +110,12 @@ export default function RutinaForm({ rutinaId, onSuccess }) {
           // Temporal (generado localmente)
           setEjercicios(ejercicios.filter((e) => e.id !== id));
         } else {
-          await ejerciciosAPI.eliminar(id);
-          setEjercicios(ejercicios.filter((e) => e.id !== id));
+          await ejerciciosAPI.eliminar(id, rutinaId);
+          if (rutina?.plantilla_id) {
+            await cargarRutina();
+          } else {
+            setEjercicios(ejercicios.filter((e) => e.id !== id));
+          }
         }
       } catch (err) {
         setError('Error al eliminar el ejercicio');
@@ -1,5 +1,5 @@
-import { useState, useEffect } from 'react';
-import { rutinasAPI } from '../services/api';
+import { useState, useEffect, useRef } from 'react';
+import { rutinasAPI, eventosAPI } from '../services/api';
 import RutinaCard from '../components/RutinaCard';
 import SearchBar from '../components/SearchBar';
 import './Pages.css';
@@ -10,12 +10,30 @@ export default function RutinasList({ onViewDetail, onEdit }) {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
+  const recarga = useRef(null);
 
   // Cargar rutinas al montar el componente
   useEffect(() => {
     cargarRutinas();
   }, []);
 
+  // Cambios hechos desde cualquier cliente: se recarga la lista sin sondear
+  useEffect(() => {
+    const cancelar = eventosAPI.suscribir((evento) => {
+      if (evento.tipo === 'rutina.eliminada') {
+        setRutinas((actuales) => actuales.filter((r) => r.id !== evento.rutina_id));
+        return;
+      }
+      // Varios eventos seguidos (un lote, una importación) provocan una sola recarga
+      clearTimeout(recarga.current);
+      recarga.current = setTimeout(() => cargarRutinas({ silencioso: true }), 300);
+    });
+    return () => {
+      cancelar();
+      clearTimeout(recarga.current);
+    };
+  }, []);
+
   // Filtrar rutinas cuando cambia el término de búsqueda
   useEffect(() => {
     if (searchTerm.trim()) {
@@ -25,20 +43,14 @@ export default function RutinasList({ onViewDetail, onEdit }) {
     }
   }, [searchTerm, rutinas]);
 
-  const cargarRutinas = async () => {
-    setLoading(true);
+  const cargarRutinas = async ({ silencioso = false } = {}) => {
+    if (!silencioso) setLoading(true);
     setError(null);
     try {
+      // Cada rutina trae su resumen (ejercicios, series, volumen): no hace falta el detalle
       const datos = await rutinasAPI.obtenerTodas();
-      // Cargar detalles de cada rutina para contar ejercicios
-      const rutinasConDetalles = await Promise.all(
-        datos.map(async (r) => {
-          const detalle = await rutinasAPI.obtenerPorId(r.id);
-          return detalle;
-        })
-      );
-      setRutinas(rutinasConDetalles);
-      setFiltradas(rutinasConDetalles);
+      setRutinas(datos);
+      setFiltradas(datos);
     } catch (err) {
       setError('Error al cargar las rutinas');
       console.error(err);
@@ -61,7 +73,7 @@ export default function RutinasList({ onViewDetail, onEdit }) {
     if (window.confirm('¿Estás seguro de que quieres eliminar esta rutina?')) {
       try {
         await rutinasAPI.eliminar(id);
-        setRutinas(rutinas.filter((r) => r.id !== id));
+        setRutinas((actuales) => actuales.filter((r) => r.id !== id));
       } catch (err) {
         alert('Error al eliminar la rutina');
         console.error(err);
@@ -3,11 +3,15 @@ import axios from 'axios';
 // URL base de la API (desde variable de entorno o localhost)
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
 
+// Tenant (gimnasio) con el que trabaja el frontend; sin él, el backend usa el de por defecto
+const TENANT_ID = import.meta.env.VITE_TENANT_ID;
+
 // Crear instancia de axios
 const apiClient = axios.create({
   baseURL: API_URL,
   headers: {
     'Content-Type': 'application/json',
+    ...(TENANT_ID ? { 'X-Tenant-ID': TENANT_ID } : {}),
   },
 });
 
@@ -15,16 +19,30 @@ const apiClient = axios.create({
 // ============ SERVICIOS DE RUTINAS ============
 
 export const rutinasAPI = {
-  // Obtener todas las rutinas
-  obtenerTodas: async () => {
+  // Obtener una página de rutinas ({ items, next_cursor, total })
+  obtenerPagina: async ({ cursor, limit = 50, orden, incluirTotal = false } = {}) => {
     try {
-      const response = await apiClient.get('/rutinas');
+      const response = await apiClient.get('/rutinas', {
+        params: { cursor, limit, orden, incluir_total: incluirTotal },
+      });
       return response.data;
     } catch (error) {
       throw error.response?.data || error.message;
     }
   },
 
+  // Obtener todas las rutinas recorriendo las páginas con el cursor
+  obtenerTodas: async ({ orden, limit = 100 } = {}) => {
+    const rutinas = [];
+    let cursor;
+    do {
+      const pagina = await rutinasAPI.obtenerPagina({ cursor, limit, orden });
+      rutinas.push(...pagina.items);
+      cursor = pagina.next_cursor;
+    } while (cursor);
+    return rutinas;
+  },
+
   // Obtener una rutina específica
   obtenerPorId: async (id) => {
     try {
@@ -35,6 +53,16 @@ export const rutinasAPI = {
     }
   },
 
+  // Plan semanal: ejercicios agrupados por día, en orden, con totales por día
+  obtenerPlan: async (id) => {
+    try {
+      const response = await apiClient.get(`/rutinas/${id}/plan`);
+      return response.data;
+    } catch (error) {
+      throw error.response?.data || error.message;
+    }
+  },
+
   // Buscar rutinas por nombre
   buscar: async (nombre) => {
     try {
@@ -57,6 +85,17 @@ export const rutinasAPI = {
     }
   },
 
+  // Clonar una rutina en el servidor: datos = { nombre, descripcion, modo }
+  // (modo: 'copia', 'plantilla' o 'compartida', ver el README del backend)
+  clonar: async (id, datos = {}) => {
+    try {
+      const response = await apiClient.post(`/rutinas/${id}/clonar`, datos);
+      return response.data;
+    } catch (error) {
+      throw error.response?.data || error.message;
+    }
+  },
+
   // Actualizar una rutina
   actualizar: async (id, datos) => {
     try {
@@ -91,20 +130,61 @@ export const ejerciciosAPI = {
     }
   },
 
-  // Actualizar un ejercicio
-  actualizar: async (id, datos) => {
+  // Crear varios ejercicios en una sola petición
+  crearLote: async (rutinaId, ejercicios) => {
     try {
-      const response = await apiClient.put(`/ejercicios/${id}`, datos);
+      const response = await apiClient.post(`/rutinas/${rutinaId}/ejercicios/lote`, {
+        ejercicios,
+      });
       return response.data;
     } catch (error) {
       throw error.response?.data || error.message;
     }
   },
 
-  // Eliminar un ejercicio
-  eliminar: async (id) => {
+  // Reemplazar todos los ejercicios de una rutina
+  reemplazarTodos: async (rutinaId, ejercicios) => {
+    try {
+      const response = await apiClient.put(`/rutinas/${rutinaId}/ejercicios`, {
+        ejercicios,
+      });
+      return response.data;
+    } catch (error) {
+      throw error.response?.data || error.message;
+    }
+  },
+
+  // Reordenar los ejercicios: dias = [{ dia_semana, ejercicios: [ids] }]
+  reordenar: async (rutinaId, version, dias) => {
     try {
-      await apiClient.delete(`/ejercicios/${id}`);
+      const response = await apiClient.put(
+        `/rutinas/${rutinaId}/ejercicios/orden`,
+        { dias },
+        { headers: { 'If-Match': `"${version}"` } },
+      );
+      return response.data;
+    } catch (error) {
+      throw error.response?.data || error.message;
+    }
+  },
+
+  // Actualizar un ejercicio. rutinaId: la rutina que se edita; si comparte
+  // una plantilla, el servidor le copia los ejercicios y cambian sus ids
+  actualizar: async (id, datos, rutinaId) => {
+    try {
+      const response = await apiClient.put(`/ejercicios/${id}`, datos, {
+        params: { rutina_id: rutinaId },
+      });
+      return response.data;
+    } catch (error) {
+      throw error.response?.data || error.message;
+    }
+  },
+
+  // Eliminar un ejercicio (rutinaId: como en actualizar)
+  eliminar: async (id, rutinaId) => {
+    try {
+      await apiClient.delete(`/ejercicios/${id}`, { params: { rutina_id: rutinaId } });
       return true;
     } catch (error) {
       throw error.response?.data || error.message;
@@ -112,4 +192,35 @@ export const ejerciciosAPI = {
   },
 };
 
+// ============ EVENTOS DE CAMBIOS ============
+
+// Una sola conexión SSE (/eventos) compartida por todas las páginas suscritas.
+// EventSource reconecta solo y envía Last-Event-ID: el servidor reenvía lo
+// que se perdió o, si ya no puede, un evento "resync". EventSource no envía
+// cabeceras: el tenant va en ?tenant=.
+let fuenteEventos = null;
+const oyentesEventos = new Set();
+
+export const eventosAPI = {
+  // Llama a onEvento con cada cambio ({ tipo, rutina_id, ... }); devuelve la función para cancelar
+  suscribir: (onEvento) => {
+    oyentesEventos.add(onEvento);
+    if (!fuenteEventos) {
+      const consulta = TENANT_ID ? `?tenant=${encodeURIComponent(TENANT_ID)}` : '';
+      fuenteEventos = new EventSource(`${API_URL}/eventos${consulta}`);
+      fuenteEventos.onmessage = (mensaje) => {
+        const evento = JSON.parse(mensaje.data);
+        oyentesEventos.forEach((oyente) => oyente(evento));
+      };
+    }
+    return () => {
+      oyentesEventos.delete(onEvento);
+      if (oyentesEventos.size === 0) {
+        fuenteEventos.close();
+        fuenteEventos = null;
+      }
+    };
+  },
+};
+
 export default apiClient;
\ No newline at end of file